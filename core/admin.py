@@ -1,10 +1,12 @@
 from django.contrib import admin
-from .models import AuditLog, GlobalSettings
+from .changelist import LargeTableAdminMixin
+from .models import AuditLog, GlobalSettings, IdempotencyKey, StoredBlob
 
 
 @admin.register(AuditLog)
-class AuditLogAdmin(admin.ModelAdmin):
+class AuditLogAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'action', 'resource_type', 'resource_id', 'timestamp')
+    list_select_related = ('user',)
     list_filter = ('action', 'resource_type', 'timestamp')
     search_fields = ('user__phone_number', 'user__first_name', 'user__last_name', 'resource_id')
     readonly_fields = ('user', 'action', 'resource_type', 'resource_id', 'details', 
@@ -34,3 +36,28 @@ class GlobalSettingsAdmin(admin.ModelAdmin):
             if not request.user.is_superuser:
                 return self.readonly_fields + ('key', 'value')
         return self.readonly_fields
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('key', 'user', 'request_method', 'request_path', 'response_status', 'created_at', 'expires_at')
+    list_filter = ('request_method', 'response_status')
+    search_fields = ('key', 'user__email', 'request_path')
+    raw_id_fields = ('user',)
+    list_select_related = ('user',)
+    readonly_fields = ('user', 'key', 'request_method', 'request_path', 'fingerprint',
+                      'response_status', 'response_body', 'created_at', 'expires_at')
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ('sha256', 'size', 'content_type', 'ref_count', 'created_at', 'updated_at')
+    list_filter = ('content_type',)
+    search_fields = ('sha256',)
+    readonly_fields = ('sha256', 'file', 'size', 'content_type', 'ref_count', 'created_at', 'updated_at')
+    
+    def has_add_permission(self, request):
+        return False
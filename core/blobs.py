@@ -0,0 +1,113 @@
+"""
+Stockage adressé par contenu des fichiers uploadés.
+
+Chaque fichier est écrit une seule fois sous `blobs/<aa>/<bb>/<sha256>` ;
+les documents KYC, preuves et preuves de litige identiques pointent vers
+le même chemin. Le compteur de références de `StoredBlob` est tenu par les
+signaux d'enregistrement et de suppression des modèles référents (voir
+`core.signals`), et le ramasse-miettes supprime les fichiers qui ne sont
+plus référencés après un délai de grâce.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import StoredBlob
+
+logger = logging.getLogger(__name__)
+
+# Modèles référençant des fichiers dédupliqués via leur champ file_hash
+BLOB_REFERENCE_MODELS = [
+    'users.KYCDocument',
+    'escrow.Proof',
+    'disputes.DisputeEvidence',
+]
+
+
+def blob_name(sha256: str) -> str:
+    return f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def store_blob(file_obj, sha256: str, size: int, content_type: str = '') -> StoredBlob:
+    """
+    Obtenir le fichier dédupliqué correspondant à une empreinte
+
+    Si le contenu est déjà stocké, rien n'est écrit dans le stockage. Le
+    compteur de références n'est pas modifié ici : il l'est lorsque le
+    modèle référent est enregistré.
+    """
+    blob = StoredBlob.objects.filter(sha256=sha256).first()
+    if blob is not None:
+        # Protéger le fichier du ramasse-miettes jusqu'à son rattachement
+        StoredBlob.objects.filter(pk=blob.pk).update(updated_at=timezone.now())
+        return blob
+
+    name = blob_name(sha256)
+    if not default_storage.exists(name):
+        file_obj.seek(0)
+        stored_name = default_storage.save(name, file_obj)
+        if stored_name != name:
+            # Écriture concurrente du même contenu : garder un seul exemplaire
+            default_storage.delete(stored_name)
+        file_obj.seek(0)
+
+    try:
+        with transaction.atomic():
+            return StoredBlob.objects.create(
+                sha256=sha256, file=name, size=size, content_type=content_type
+            )
+    except IntegrityError:
+        return StoredBlob.objects.get(sha256=sha256)
+
+
+def add_reference(sha256: str):
+    if sha256:
+        StoredBlob.objects.filter(sha256=sha256).update(
+            ref_count=F('ref_count') + 1, updated_at=timezone.now()
+        )
+
+
+def release_reference(sha256: str):
+    if sha256:
+        StoredBlob.objects.filter(sha256=sha256, ref_count__gt=0).update(
+            ref_count=F('ref_count') - 1, updated_at=timezone.now()
+        )
+
+
+def collect_garbage(grace_period: timedelta = None) -> int:
+    """
+    Supprimer les fichiers sans référence depuis plus que le délai de grâce
+
+    Returns:
+        Nombre de fichiers supprimés
+    """
+    if grace_period is None:
+        grace_period = timedelta(seconds=getattr(settings, 'BLOB_GC_GRACE_PERIOD', 86400))
+    cutoff = timezone.now() - grace_period
+
+    candidates = StoredBlob.objects.filter(
+        ref_count=0, updated_at__lt=cutoff
+    ).values_list('pk', flat=True)
+
+    deleted = 0
+    for pk in list(candidates.iterator()):
+        with transaction.atomic():
+            # Revérifier sous verrou : une référence a pu être ajoutée entre-temps
+            blob = StoredBlob.objects.select_for_update().filter(
+                pk=pk, ref_count=0, updated_at__lt=cutoff
+            ).first()
+            if blob is None:
+                continue
+            name = blob.file.name
+            blob.delete()
+            transaction.on_commit(lambda name=name: default_storage.delete(name))
+        deleted += 1
+
+    logger.info(f"{deleted} fichiers dédupliqués supprimés")
+    return deleted
@@ -0,0 +1,65 @@
+"""
+Changelists d'administration des grandes tables.
+
+Au-delà de `ADMIN_ESTIMATED_COUNT_THRESHOLD` lignes, aucun COUNT(*) ne
+parcourt la table : le nombre de lignes d'une liste non filtrée est lu dans
+les statistiques PostgreSQL (`pg_class.reltuples`) et celui d'une liste
+filtrée est compté jusqu'au seuil seulement (COUNT sur une sous-requête
+limitée à seuil + 1 lignes) : exact en dessous, plafonné au-delà. Le total
+non filtré n'est pas affiché (`show_full_result_count`). Les pages au-delà
+du nombre retenu sont signalées comme hors limites par le changelist.
+"""
+
+from typing import Optional
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def get_threshold() -> int:
+    return getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 100000)
+
+
+def estimated_count(model, using: str = 'default') -> Optional[int]:
+    """Nombre de lignes de la table selon les statistiques PostgreSQL (None sinon)"""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [connection.ops.quote_name(model._meta.db_table)]
+        )
+        row = cursor.fetchone()
+    # -1 : table jamais analysée
+    return row[0] if row and row[0] >= 0 else None
+
+
+def capped_count(queryset, limit: int) -> int:
+    """Nombre de lignes du queryset, sans compter au-delà de `limit`"""
+    return queryset.order_by().values('pk')[:limit].count()
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginateur comptant les grandes tables par estimation"""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        model = getattr(queryset, 'model', None)
+        if model is not None:
+            estimate = estimated_count(model, queryset.db)
+            threshold = get_threshold()
+            if estimate is not None and estimate >= threshold:
+                if not queryset.query.where:
+                    return estimate
+                return capped_count(queryset, threshold + 1)
+        return super().count
+
+
+class LargeTableAdminMixin:
+    """Changelist sans COUNT(*) sur les grandes tables"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,180 @@
+"""
+Idempotence des requêtes de création et d'initiation de paiement.
+
+Le client envoie un en-tête `Idempotency-Key` ; la première réponse est
+enregistrée (cache + base) avec l'empreinte de la requête, puis rejouée
+telle quelle pour toute requête identique portant la même clé. Les
+doublons concurrents sont sérialisés par un verrou court dans le cache.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+from .utils import create_api_response
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def _get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _cache_key(user_id, key: str) -> str:
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return f"idempotency:{user_id}:{digest}"
+
+
+def _request_payload(request):
+    data = request.data
+    if hasattr(data, 'lists'):
+        # QueryDict (formulaires) : conserver toutes les valeurs
+        data = {key: values for key, values in data.lists()}
+    return data
+
+
+def request_fingerprint(request) -> str:
+    """Empreinte de la requête : méthode, chemin et corps normalisé"""
+    body = json.dumps(
+        _request_payload(request), sort_keys=True, cls=DjangoJSONEncoder, default=str
+    )
+    raw = f"{request.method}\n{request.path}\n{body}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _error(message, status_code):
+    return Response(create_api_response(False, message), status=status_code)
+
+
+def _replay(stored):
+    response = Response(stored['body'], status=stored['status'])
+    response[REPLAY_HEADER] = 'true'
+    return response
+
+
+def _load(user, key: str, cache_key: str):
+    """Réponse enregistrée pour cette clé (cache puis base)"""
+    stored = cache.get(cache_key)
+    if stored is not None:
+        return stored
+
+    record = IdempotencyKey.objects.filter(
+        user=user, key=key, expires_at__gt=timezone.now()
+    ).only('fingerprint', 'response_status', 'response_body', 'expires_at').first()
+    if record is None:
+        return None
+
+    stored = {
+        'fingerprint': record.fingerprint,
+        'status': record.response_status,
+        'body': record.response_body,
+    }
+    ttl = int((record.expires_at - timezone.now()).total_seconds())
+    if ttl > 0:
+        cache.set(cache_key, stored, ttl)
+    return stored
+
+
+def _store(request, user, key: str, cache_key: str, fingerprint: str, response):
+    """Enregistrer la réponse en base puis dans le cache"""
+    ttl = _get_setting('IDEMPOTENCY_KEY_TTL', 86400)
+    # Normaliser le corps tel qu'il sera rejoué (Decimal, dates...)
+    body = json.loads(json.dumps(response.data, cls=DjangoJSONEncoder))
+    stored = {'fingerprint': fingerprint, 'status': response.status_code, 'body': body}
+
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            # Une clé expirée occupe encore l'emplacement (user, key) : la remplacer
+            IdempotencyKey.objects.filter(user=user, key=key, expires_at__lte=now).delete()
+            IdempotencyKey.objects.create(
+                user=user,
+                key=key,
+                request_method=request.method,
+                request_path=request.path[:255],
+                fingerprint=fingerprint,
+                response_status=response.status_code,
+                response_body=body,
+                expires_at=now + timedelta(seconds=ttl),
+            )
+    except IntegrityError:
+        # Déjà enregistrée par un autre processus : la première réponse fait foi
+        logger.warning(f"Clé d'idempotence déjà enregistrée: {key}")
+        return
+
+    cache.set(cache_key, stored, ttl)
+
+
+def idempotent(view_method):
+    """
+    Rendre une méthode de vue (post) idempotente via l'en-tête Idempotency-Key
+
+    Sans en-tête, la requête est traitée normalement. Seules les réponses
+    non 5xx sont enregistrées, afin qu'une erreur serveur puisse être
+    retentée avec la même clé.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+
+        key = key.strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return _error("Clé d'idempotence invalide", status.HTTP_400_BAD_REQUEST)
+
+        user = request.user if request.user.is_authenticated else None
+        cache_key = _cache_key(user.pk if user else 'anonymous', key)
+        fingerprint = request_fingerprint(request)
+
+        lock_key = f"{cache_key}:lock"
+        lock_timeout = _get_setting('IDEMPOTENCY_LOCK_TIMEOUT', 30)
+        wait_timeout = _get_setting('IDEMPOTENCY_LOCK_WAIT', 5)
+        deadline = time.monotonic() + wait_timeout
+
+        while True:
+            stored = _load(user, key, cache_key)
+            if stored is not None:
+                if stored['fingerprint'] != fingerprint:
+                    return _error(
+                        "Cette clé d'idempotence a déjà été utilisée pour une requête différente",
+                        status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                return _replay(stored)
+
+            if cache.add(lock_key, fingerprint, lock_timeout):
+                break
+
+            # Doublon concurrent : attendre la fin du premier traitement
+            if time.monotonic() >= deadline:
+                return _error(
+                    "Une requête avec cette clé d'idempotence est en cours de traitement",
+                    status.HTTP_409_CONFLICT
+                )
+            time.sleep(0.05)
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code < 500 and getattr(response, 'data', None) is not None:
+                _store(request, user, key, cache_key, fingerprint, response)
+            return response
+        finally:
+            cache.delete(lock_key)
+
+    return wrapper
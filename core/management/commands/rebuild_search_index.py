@@ -0,0 +1,26 @@
+"""
+Réinstallation des index plein texte (colonnes, triggers) et reconstruction.
+
+    python manage.py rebuild_search_index
+
+Utile en SQLite après une migration qui recrée une table indexée (les
+triggers de la table sont alors supprimés).
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.search import SEARCH_INDEXES, install_search_index
+
+
+class Command(BaseCommand):
+    help = "Réinstalle et reconstruit les index de recherche plein texte"
+
+    def handle(self, *args, **options):
+        # Hors transaction : remplissage par lots et CREATE INDEX CONCURRENTLY
+        with connection.schema_editor(atomic=False) as schema_editor:
+            for name, index in SEARCH_INDEXES.items():
+                install_search_index(schema_editor, index.get_model()._meta.db_table, index.fields)
+                self.stdout.write(f"Index {name} installé")
+
+        self.stdout.write(self.style.SUCCESS("Index de recherche reconstruits"))
@@ -32,21 +32,8 @@ class AuditMiddleware(MiddlewareMixin):
             'path': request.path,
         }
         
-        # Log de connexion
-        if request.path == '/api/auth/login/' and request.method == 'POST':
-            try:
-                body = json.loads(request.body) if request.body else {}
-                phone_number = body.get('phone_number', 'Unknown')
-                AuditLog.objects.create(
-                    user=None,
-                    action='LOGIN',
-                    resource_type='Authentication',
-                    details={'phone_number': phone_number, 'attempt': True},
-                    ip_address=request._audit_data['ip_address'],
-                    user_agent=request._audit_data['user_agent'],
-                )
-            except Exception as e:
-                logger.error(f"Erreur audit connexion: {e}")
+        # Les tentatives de connexion sont journalisées par tâche dans
+        # LoginAttempt (users.login_attempts), hors du chemin de connexion
     
     def process_response(self, request, response):
         # Audit pour les requêtes sensibles
@@ -160,9 +147,5 @@ class AuditMiddleware(MiddlewareMixin):
     
     def get_client_ip(self, request):
         """Obtenir l'adresse IP réelle du client"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+        from .utils import get_client_ip
+        return get_client_ip(request)
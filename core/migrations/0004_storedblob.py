@@ -0,0 +1,31 @@
+# Generated by Django 5.0.8 on 2026-10-19 03:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('file', models.FileField(max_length=255, upload_to='')),
+                ('size', models.PositiveBigIntegerField()),
+                ('content_type', models.CharField(blank=True, max_length=100)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Fichier dédupliqué',
+                'verbose_name_plural': 'Fichiers dédupliqués',
+                'indexes': [models.Index(fields=['ref_count', 'updated_at'], name='core_stored_ref_cou_3e9028_idx')],
+            },
+        ),
+    ]
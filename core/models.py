@@ -1,5 +1,7 @@
+import uuid
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 
 
 class TimeStampedModel(models.Model):
@@ -67,3 +69,82 @@ class GlobalSettings(models.Model):
 
     def __str__(self):
         return f"{self.key}: {self.value}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Réponse enregistrée pour une clé d'idempotence (en-tête Idempotency-Key)
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+        null=True, blank=True, related_name='idempotency_keys'
+    )
+    key = models.CharField(max_length=255)
+    request_method = models.CharField(max_length=10)
+    request_path = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField()
+    response_body = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "Clé d'idempotence"
+        verbose_name_plural = "Clés d'idempotence"
+        unique_together = ['user', 'key']
+
+    def __str__(self):
+        return f"{self.request_method} {self.request_path} - {self.key}"
+
+
+class UploadSession(models.Model):
+    """
+    Upload reprenable en plusieurs parties (connexions mobiles lentes)
+    """
+    STATUS_CHOICES = [
+        ('IN_PROGRESS', 'En cours'),
+        ('COMPLETED', 'Terminé'),
+        ('CONSUMED', 'Utilisé'),
+    ]
+
+    upload_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    purpose = models.CharField(max_length=20)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    total_size = models.PositiveBigIntegerField()
+    received_size = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='IN_PROGRESS')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "Session d'upload"
+        verbose_name_plural = "Sessions d'upload"
+
+    def __str__(self):
+        return f"{self.filename} ({self.received_size}/{self.total_size}) - {self.status}"
+
+
+class StoredBlob(models.Model):
+    """
+    Fichier stocké une seule fois, adressé par son empreinte SHA-256
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    content_type = models.CharField(max_length=100, blank=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Fichier dédupliqué"
+        verbose_name_plural = "Fichiers dédupliqués"
+        indexes = [
+            models.Index(fields=['ref_count', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.sha256} ({self.ref_count} références)"
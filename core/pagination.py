@@ -0,0 +1,20 @@
+"""
+Pagination par curseur (keyset) pour les listes volumineuses.
+
+Chaque page reprend après la dernière ligne de la précédente
+(`created_at < curseur`) au lieu d'un OFFSET, et sans COUNT de la liste
+complète : le coût d'une page ne dépend pas de sa position.
+"""
+
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Pages les plus récentes d'abord, ordonnées par (created_at, id)"""
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+
+    @property
+    def max_page_size(self):
+        return getattr(settings, 'KEYSET_MAX_PAGE_SIZE', 100)
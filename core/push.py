@@ -0,0 +1,358 @@
+"""
+Canal de notifications en temps réel (Server-Sent Events sur ASGI).
+
+Les événements (nouveau message, changement de statut d'une transaction ou
+d'un litige) sont publiés après validation de la transaction SQL, pour
+chaque participant concerné :
+
+- en production (`PUSH_REDIS_URL`), un script Lua ajoute l'événement au
+  flux Redis de l'utilisateur (XADD borné par `PUSH_BACKLOG_SIZE`) puis le
+  diffuse sur son canal pub/sub ; chaque processus ASGI n'ouvre qu'une
+  connexion d'abonnement (`push:user:*`) et répartit les événements entre
+  ses connexions locales ;
+- sans Redis (développement, tests), un courtier en mémoire du processus
+  offre le même fonctionnement.
+
+Chaque connexion dispose d'une file bornée (`PUSH_QUEUE_SIZE`) : un client
+trop lent n'accumule pas d'événements en mémoire, sa connexion est fermée
+par un événement `overflow`. Le client se reconnecte avec le dernier
+identifiant reçu (`Last-Event-ID`) et reçoit les événements manqués depuis
+le flux ; si ceux-ci ne sont plus disponibles, un événement `reset`
+l'invite à recharger son état par l'API.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'push:user:'
+STREAM_PREFIX = 'push:stream:'
+
+# Ajout au flux, expiration et diffusion en un aller-retour
+PUBLISH_SCRIPT = """
+local id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', 'event', ARGV[2], 'data', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('PUBLISH', KEYS[2], id .. '\\n' .. ARGV[2] .. '\\n' .. ARGV[3])
+return id
+"""
+
+# Marqueur de fin de connexion placé dans la file d'un client débordé
+OVERFLOW = object()
+
+
+def user_channel(user_id) -> str:
+    return f"{CHANNEL_PREFIX}{user_id}"
+
+
+def stream_key(user_id) -> str:
+    return f"{STREAM_PREFIX}{user_id}"
+
+
+def parse_cursor(cursor) -> Optional[Tuple[int, int]]:
+    """Curseur `millisecondes-séquence` (identifiant de flux Redis)"""
+    try:
+        ms, seq = str(cursor).split('-', 1)
+        return int(ms), int(seq)
+    except (TypeError, ValueError):
+        return None
+
+
+def _get_setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+class Subscription:
+    """Connexion d'un client : file bornée d'événements à transmettre"""
+
+    def __init__(self, user_id, loop, maxsize: int):
+        self.user_id = str(user_id)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def deliver(self, event: Dict):
+        """Ajouter un événement (depuis la boucle de la connexion)"""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.close_overflowed()
+
+    def close_overflowed(self):
+        """Abandonner les événements en attente : le client reprendra par son curseur"""
+        self.overflowed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(OVERFLOW)
+
+
+class BasePushBroker:
+    """Abonnements locaux au processus, communs aux courtiers"""
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    async def subscribe(self, user_id) -> Subscription:
+        subscription = Subscription(
+            user_id, asyncio.get_running_loop(), _get_setting('PUSH_QUEUE_SIZE', 100)
+        )
+        with self._lock:
+            self._subscriptions[subscription.user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def _local_subscriptions(self, user_id) -> List[Subscription]:
+        with self._lock:
+            return list(self._subscriptions.get(str(user_id), ()))
+
+    def dispatch(self, user_id, event: Dict):
+        """Transmettre un événement aux connexions locales de l'utilisateur"""
+        for subscription in self._local_subscriptions(user_id):
+            subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+
+    def publish(self, messages: Sequence[Tuple[Iterable, str, str]]):
+        raise NotImplementedError
+
+    async def backlog(self, user_id, cursor: str) -> Optional[List[Dict]]:
+        raise NotImplementedError
+
+
+class LocalPushBroker(BasePushBroker):
+    """Courtier en mémoire du processus (développement et tests)"""
+
+    def __init__(self):
+        super().__init__()
+        self._streams = {}
+        self._sequence = itertools.count()
+        self._last_ms = 0
+
+    def _next_id(self) -> str:
+        ms = int(time.time() * 1000)
+        if ms <= self._last_ms:
+            ms = self._last_ms
+        else:
+            self._sequence = itertools.count()
+            self._last_ms = ms
+        return f"{ms}-{next(self._sequence)}"
+
+    def publish(self, messages):
+        size = _get_setting('PUSH_BACKLOG_SIZE', 500)
+        for user_ids, event_name, data in messages:
+            for user_id in user_ids:
+                with self._lock:
+                    event = {'id': self._next_id(), 'event': event_name, 'data': data}
+                    stream = self._streams.get(str(user_id))
+                    if stream is None or stream.maxlen != size:
+                        stream = self._streams[str(user_id)] = deque(stream or (), maxlen=size)
+                    stream.append(event)
+                self.dispatch(user_id, event)
+
+    async def backlog(self, user_id, cursor):
+        with self._lock:
+            events = list(self._streams.get(str(user_id), ()))
+        position = parse_cursor(cursor)
+        for index, event in enumerate(events):
+            if parse_cursor(event['id']) == position:
+                return events[index + 1:]
+        return None
+
+
+class RedisPushBroker(BasePushBroker):
+    """Courtier Redis : flux par utilisateur et une connexion pub/sub par processus"""
+
+    def __init__(self, url: str):
+        super().__init__()
+        import redis
+
+        self.url = url
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.script = self.client.register_script(PUBLISH_SCRIPT)
+        self._listeners = {}
+        self._async_client = None
+
+    def publish(self, messages):
+        size = _get_setting('PUSH_BACKLOG_SIZE', 500)
+        ttl = _get_setting('PUSH_BACKLOG_TTL', 86400)
+        pipe = self.client.pipeline(transaction=False)
+        for user_ids, event_name, data in messages:
+            for user_id in user_ids:
+                self.script(
+                    keys=[stream_key(user_id), user_channel(user_id)],
+                    args=[size, event_name, data, ttl],
+                    client=pipe,
+                )
+        pipe.execute()
+
+    def _get_async_client(self):
+        if self._async_client is None:
+            import redis.asyncio
+
+            self._async_client = redis.asyncio.Redis.from_url(self.url, decode_responses=True)
+        return self._async_client
+
+    async def subscribe(self, user_id):
+        subscription = await super().subscribe(user_id)
+        loop = subscription.loop
+        listener = self._listeners.get(loop)
+        if listener is None or listener.done():
+            self._listeners[loop] = loop.create_task(self._listen())
+        return subscription
+
+    async def _listen(self):
+        """Recevoir les diffusions de tous les utilisateurs pour ce processus"""
+        delay = 1
+        while True:
+            pubsub = self._get_async_client().pubsub()
+            try:
+                await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                delay = 1
+                async for message in pubsub.listen():
+                    if message.get('type') != 'pmessage':
+                        continue
+                    user_id = message['channel'][len(CHANNEL_PREFIX):]
+                    event_id, event_name, data = message['data'].split('\n', 2)
+                    self.dispatch(user_id, {'id': event_id, 'event': event_name, 'data': data})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Abonnement aux notifications interrompu: {e}")
+                # Événements possiblement manqués : les clients reprennent par leur curseur
+                with self._lock:
+                    subscriptions = [s for group in self._subscriptions.values() for s in group]
+                for subscription in subscriptions:
+                    subscription.loop.call_soon_threadsafe(subscription.close_overflowed)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+
+    async def backlog(self, user_id, cursor):
+        if parse_cursor(cursor) is None:
+            return None
+        entries = await self._get_async_client().xrange(stream_key(user_id), min=cursor, max='+')
+        # Le curseur doit encore figurer dans le flux : sinon des événements ont été tronqués
+        if not entries or parse_cursor(entries[0][0]) != parse_cursor(cursor):
+            return None
+        return [
+            {'id': entry_id, 'event': fields.get('event'), 'data': fields.get('data')}
+            for entry_id, fields in entries[1:]
+        ]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker() -> BasePushBroker:
+    """Courtier du processus, selon `PUSH_REDIS_URL`"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                url = _get_setting('PUSH_REDIS_URL', None)
+                _broker = RedisPushBroker(url) if url else LocalPushBroker()
+    return _broker
+
+
+def format_event(event: Dict) -> str:
+    """Trame SSE d'un événement"""
+    lines = []
+    if event.get('id'):
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['event']}")
+    lines.extend(f"data: {line}" for line in (event.get('data') or '{}').split('\n'))
+    return '\n'.join(lines) + '\n\n'
+
+
+async def event_stream(user_id, cursor: Optional[str] = None, broker: BasePushBroker = None):
+    """
+    Flux SSE d'un utilisateur : événements manqués depuis `cursor`, puis en direct
+
+    L'abonnement précède la lecture du flux : un événement publié entre les
+    deux est reçu deux fois et ignoré la seconde.
+    """
+    broker = broker or get_broker()
+    heartbeat = _get_setting('PUSH_HEARTBEAT_INTERVAL', 15)
+    yield f"retry: {_get_setting('PUSH_RETRY_MS', 3000)}\n\n"
+
+    subscription = await broker.subscribe(user_id)
+    try:
+        last = None
+        if cursor:
+            events = await broker.backlog(user_id, cursor)
+            if events is None:
+                yield format_event({'event': 'reset', 'data': '{}'})
+            else:
+                last = parse_cursor(cursor)
+                for event in events:
+                    yield format_event(event)
+                    last = parse_cursor(event['id'])
+
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+
+            if event is OVERFLOW:
+                yield format_event({'event': 'overflow', 'data': '{}'})
+                return
+            position = parse_cursor(event['id'])
+            if last is not None and position is not None and position <= last:
+                continue
+            last = position
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def _send(messages):
+    try:
+        get_broker().publish(messages)
+    except Exception as e:
+        logger.error(f"Erreur de publication des notifications: {e}")
+
+
+def publish_events(messages: Iterable[Tuple[Iterable, str, Dict]]):
+    """
+    Publier des événements après validation de la transaction en cours
+
+    Args:
+        messages: [(identifiants des destinataires, nom de l'événement, données)]
+    """
+    payloads = []
+    for user_ids, event_name, data in messages:
+        recipients = sorted({user_id for user_id in user_ids if user_id})
+        if recipients:
+            payloads.append((recipients, event_name, json.dumps(data, cls=DjangoJSONEncoder)))
+    if payloads:
+        transaction.on_commit(lambda: _send(payloads))
+
+
+def publish_event(user_ids: Iterable, event_name: str, data: Dict):
+    """Publier un événement pour les destinataires donnés"""
+    publish_events([(user_ids, event_name, data)])
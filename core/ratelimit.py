@@ -0,0 +1,193 @@
+"""
+Limitation de débit par fenêtre glissante (connexion, réinitialisation de
+mot de passe, vérification du téléphone).
+
+Chaque limite est un compteur à fenêtre glissante pondérée : le compteur de
+la fenêtre courante est ajouté à celui de la fenêtre précédente, pondéré
+par la part de celle-ci encore couverte par la fenêtre glissante. Les
+compteurs sont stockés dans le cache partagé (Redis en production,
+incréments atomiques) ; si le cache est indisponible, un stockage en
+mémoire propre au processus prend le relais. Aucune décision de blocage ne
+lit la base de données.
+
+Les limites sont définies par portée (`RATE_LIMITS`, surchargeables dans
+les settings) et par dimension : l'identifiant visé (email, utilisateur) et
+l'adresse IP sont comptés séparément.
+"""
+
+import hashlib
+import logging
+import math
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# (nombre maximal, fenêtre en secondes) par portée et par dimension
+RATE_LIMITS = {
+    'login': {'identifier': (5, 900), 'ip': (30, 900)},
+    'password_reset': {'identifier': (3, 3600), 'ip': (20, 3600)},
+    'password_reset_confirm': {'identifier': (5, 900), 'ip': (30, 900)},
+    'phone_verification': {'identifier': (5, 900), 'ip': (30, 900)},
+}
+
+
+class LocalCounterStore:
+    """Compteurs en mémoire du processus (repli si le cache est indisponible)"""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, int]:
+        now = time.monotonic()
+        with self._lock:
+            result = {}
+            for key in keys:
+                entry = self._values.get(key)
+                if entry and entry[1] > now:
+                    result[key] = entry[0]
+            return result
+
+    def incr(self, key: str, timeout: int) -> int:
+        now = time.monotonic()
+        with self._lock:
+            value, expires = self._values.get(key, (0, 0))
+            if expires <= now:
+                value, expires = 0, now + timeout
+            self._values[key] = (value + 1, expires)
+            if len(self._values) > 10000:
+                self._purge(now)
+            return value + 1
+
+    def delete_many(self, keys: Iterable[str]):
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+
+    def _purge(self, now):
+        for key in [key for key, (_, expires) in self._values.items() if expires <= now]:
+            del self._values[key]
+
+
+class CacheCounterStore:
+    """Compteurs dans le cache partagé"""
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, int]:
+        return cache.get_many(list(keys))
+
+    def incr(self, key: str, timeout: int) -> int:
+        cache.add(key, 0, timeout)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Clé expirée entre add et incr
+            cache.set(key, 1, timeout)
+            return 1
+
+    def delete_many(self, keys: Iterable[str]):
+        cache.delete_many(list(keys))
+
+
+_shared_store = CacheCounterStore()
+_local_store = LocalCounterStore()
+
+
+def _call(method: str, *args):
+    """Appeler le cache partagé, ou le stockage local en cas d'erreur"""
+    try:
+        return getattr(_shared_store, method)(*args)
+    except Exception as e:
+        logger.warning(f"Cache indisponible pour la limitation de débit: {e}")
+        return getattr(_local_store, method)(*args)
+
+
+def get_limit(scope: str, dimension: str) -> Tuple[int, int]:
+    limits = dict(RATE_LIMITS.get(scope, {}))
+    limits.update(getattr(settings, 'RATE_LIMITS', {}).get(scope, {}))
+    return limits[dimension]
+
+
+def _bucket_key(scope: str, dimension: str, value: str, bucket: int) -> str:
+    digest = hashlib.sha256(str(value).lower().encode('utf-8')).hexdigest()[:32]
+    return f"ratelimit:{scope}:{dimension}:{digest}:{bucket}"
+
+
+class RateLimiter:
+    """Limiteur à fenêtre glissante d'une portée donnée"""
+
+    def __init__(self, scope: str):
+        self.scope = scope
+
+    def _keys(self, dimension: str, value: str, now: float):
+        window = get_limit(self.scope, dimension)[1]
+        bucket = int(now // window)
+        return (
+            _bucket_key(self.scope, dimension, value, bucket),
+            _bucket_key(self.scope, dimension, value, bucket - 1),
+            window,
+        )
+
+    def _weighted_counts(self, keys: Dict[str, Tuple[str, str, int]], now: float):
+        values = _call('get_many', [k for current, previous, _ in keys.values() for k in (current, previous)])
+        counts = {}
+        for dimension, (current, previous, window) in keys.items():
+            elapsed = (now % window) / window
+            counts[dimension] = values.get(current, 0) + values.get(previous, 0) * (1 - elapsed)
+        return counts
+
+    def retry_after(self, **values) -> Optional[int]:
+        """
+        Vérifier les limites pour les valeurs données (ex. identifier=..., ip=...)
+
+        Returns:
+            None si la requête est autorisée, sinon le délai d'attente en secondes
+        """
+        now = time.time()
+        values = {dimension: value for dimension, value in values.items() if value}
+        keys = {dimension: self._keys(dimension, value, now) for dimension, value in values.items()}
+        counts = self._weighted_counts(keys, now)
+
+        wait = 0
+        for dimension, count in counts.items():
+            limit, window = get_limit(self.scope, dimension)
+            if count >= limit:
+                # Délai approximatif jusqu'à ce que la fenêtre glisse sous la limite
+                wait = max(wait, math.ceil(window - now % window))
+        return wait or None
+
+    def hit(self, **values):
+        """Comptabiliser une tentative pour chaque dimension"""
+        now = time.time()
+        for dimension, value in values.items():
+            if value:
+                current, _, window = self._keys(dimension, value, now)
+                _call('incr', current, window * 2)
+
+    def reset(self, **values):
+        """Remettre à zéro les compteurs (ex. après une connexion réussie)"""
+        now = time.time()
+        keys = []
+        for dimension, value in values.items():
+            if value:
+                current, previous, _ = self._keys(dimension, value, now)
+                keys.extend([current, previous])
+        _call('delete_many', keys)
+
+
+def throttled_response(retry_after: int):
+    """Réponse 429 avec l'en-tête Retry-After"""
+    from rest_framework import status
+    from rest_framework.response import Response
+    from .utils import create_api_response
+
+    response = Response(
+        create_api_response(False, "Trop de tentatives. Veuillez réessayer plus tard."),
+        status=status.HTTP_429_TOO_MANY_REQUESTS
+    )
+    response['Retry-After'] = str(retry_after)
+    return response
@@ -0,0 +1,264 @@
+"""
+Recherche plein texte sur les transactions, messages et litiges.
+
+Chaque index (`SEARCH_INDEXES`) couvre des colonnes texte d'une table :
+
+- PostgreSQL : colonne `search_document` (tsvector pondéré, configs
+  `french` et `english`) tenue à jour par trigger, et index GIN ; la
+  requête utilise `websearch_to_tsquery` dans les deux langues et le
+  classement `ts_rank_cd`. La colonne est ajoutée nullable (sans réécriture
+  de la table ni verrou prolongé), remplie par lots de
+  `SEARCH_BACKFILL_BATCH_SIZE` lignes validés séparément, puis indexée
+  avec CREATE INDEX CONCURRENTLY hors transaction ;
+- SQLite (tests) : table virtuelle FTS5 `<table>_fts` tenue à jour par
+  triggers, classement `bm25` ;
+- autres bases : repli sur `icontains`, sans classement.
+
+Les colonnes sont créées par migration (`install_search_index`) et non
+déclarées sur les modèles : les requêtes ORM ne les lisent jamais.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+DOCUMENT_COLUMN = 'search_document'
+LANGUAGES = ('french', 'english')
+
+
+@dataclass(frozen=True)
+class SearchIndex:
+    model: str
+    # (colonne, poids PostgreSQL A-D)
+    fields: Tuple[Tuple[str, str], ...]
+    # Colonnes renvoyées par l'API de recherche
+    result_fields: Tuple[str, ...]
+
+    def get_model(self):
+        return apps.get_model(self.model)
+
+
+SEARCH_INDEXES = {
+    'transactions': SearchIndex(
+        'escrow.EscrowTransaction', (('title', 'A'), ('description', 'B')),
+        ('id', 'transaction_id', 'title', 'status', 'created_at'),
+    ),
+    'messages': SearchIndex(
+        'escrow.TransactionMessage', (('message', 'A'),),
+        ('id', 'transaction_id', 'sender_id', 'message', 'created_at'),
+    ),
+    'disputes': SearchIndex(
+        'disputes.Dispute', (('title', 'A'), ('description', 'B')),
+        ('id', 'dispute_id', 'title', 'status', 'created_at'),
+    ),
+}
+
+
+def fts_table(table: str) -> str:
+    return f"{table}_fts"
+
+
+def _document_expression(fields, prefix: str = '') -> str:
+    return ' || '.join(
+        f"setweight(to_tsvector('{language}', coalesce({prefix}{column}, '')), '{weight}')"
+        for column, weight in fields for language in LANGUAGES
+    )
+
+
+def _postgres_install(table, fields):
+    columns = ', '.join(column for column, _ in fields)
+    function = f"{table}_search_document"
+    return [
+        # Colonne générée d'une installation précédente : remplacée par la colonne tenue par trigger
+        f"DO $$ BEGIN IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = '{table}' "
+        f"AND column_name = '{DOCUMENT_COLUMN}' AND is_generated = 'ALWAYS') THEN "
+        f"ALTER TABLE {table} DROP COLUMN {DOCUMENT_COLUMN}; END IF; END $$",
+        # Nullable, sans défaut : modification du catalogue seulement
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {DOCUMENT_COLUMN} tsvector",
+        f"CREATE OR REPLACE FUNCTION {function}() RETURNS trigger AS $$ BEGIN "
+        f"NEW.{DOCUMENT_COLUMN} := {_document_expression(fields, 'NEW.')}; RETURN NEW; END $$ LANGUAGE plpgsql",
+        f"DROP TRIGGER IF EXISTS {function} ON {table}",
+        f"CREATE TRIGGER {function} BEFORE INSERT OR UPDATE OF {columns} ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION {function}()",
+    ]
+
+
+def _postgres_backfill(connection, table, fields):
+    """Remplir la colonne des lignes existantes par plages d'identifiants"""
+    batch_size = getattr(settings, 'SEARCH_BACKFILL_BATCH_SIZE', 5000)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT max(id) FROM {table}")
+        last_id = cursor.fetchone()[0] or 0
+    start = 0
+    while start < last_id:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET {DOCUMENT_COLUMN} = {_document_expression(fields)} "
+                f"WHERE id > %s AND id <= %s AND {DOCUMENT_COLUMN} IS NULL",
+                [start, start + batch_size]
+            )
+        start += batch_size
+
+
+def _sqlite_install(table, fields):
+    fts = fts_table(table)
+    columns = ', '.join(column for column, _ in fields)
+    new_values = ', '.join(f"new.{column}" for column, _ in fields)
+    old_values = ', '.join(f"old.{column}" for column, _ in fields)
+    delete = f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    insert = f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({columns}, content='{table}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN {delete} {insert} END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def _sqlite_uninstall(table):
+    fts = fts_table(table)
+    return [f"DROP TRIGGER IF EXISTS {fts}_{suffix}" for suffix in ('ai', 'ad', 'au')] + [
+        f"DROP TABLE IF EXISTS {fts}",
+    ]
+
+
+def install_search_index(schema_editor, table: str, fields):
+    """Créer (ou réinstaller) l'index plein texte d'une table"""
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        for statement in _postgres_install(table, fields):
+            schema_editor.execute(statement)
+        _postgres_backfill(connection, table, fields)
+        # CONCURRENTLY n'est possible qu'hors transaction (migration non atomique)
+        concurrently = '' if connection.in_atomic_block else 'CONCURRENTLY '
+        schema_editor.execute(
+            f"CREATE INDEX {concurrently}IF NOT EXISTS {table}_search_gin ON {table} USING gin ({DOCUMENT_COLUMN})"
+        )
+    elif connection.vendor == 'sqlite':
+        for statement in _sqlite_install(table, fields):
+            schema_editor.execute(statement)
+
+
+def remove_search_index(schema_editor, table: str):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        function = f"{table}_search_document"
+        statements = [
+            f"DROP INDEX IF EXISTS {table}_search_gin",
+            f"DROP TRIGGER IF EXISTS {function} ON {table}",
+            f"DROP FUNCTION IF EXISTS {function}()",
+            f"ALTER TABLE {table} DROP COLUMN IF EXISTS {DOCUMENT_COLUMN}",
+        ]
+    elif vendor == 'sqlite':
+        statements = _sqlite_uninstall(table)
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def fts5_query(text: str) -> Optional[str]:
+    """Requête FTS5 : tous les mots, en préfixe, sans opérateurs utilisateur"""
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _expressions(index: SearchIndex, text: str):
+    """(condition, score) de la recherche pour la base courante"""
+    table = connection.ops.quote_name(index.get_model()._meta.db_table)
+    if connection.vendor == 'postgresql':
+        query = ' || '.join(f"websearch_to_tsquery('{language}', %s)" for language in LANGUAGES)
+        params = [text] * len(LANGUAGES)
+        return (
+            RawSQL(f"{table}.{DOCUMENT_COLUMN} @@ ({query})", params, output_field=BooleanField()),
+            RawSQL(f"ts_rank_cd({table}.{DOCUMENT_COLUMN}, {query})", params, output_field=FloatField()),
+        )
+
+    if connection.vendor == 'sqlite':
+        match = fts5_query(text)
+        if match is None:
+            return None
+        fts = connection.ops.quote_name(fts_table(index.get_model()._meta.db_table))
+        return (
+            RawSQL(f"{table}.id IN (SELECT rowid FROM {fts} WHERE {fts} MATCH %s)", [match],
+                   output_field=BooleanField()),
+            # bm25 est négatif, d'autant plus que le document est pertinent
+            RawSQL(f"(SELECT -bm25({fts}) FROM {fts} WHERE {fts} MATCH %s AND rowid = {table}.id)",
+                   [match], output_field=FloatField()),
+        )
+
+    condition = Q()
+    for column, _ in index.fields:
+        condition |= Q(**{f"{column}__icontains": text})
+    return condition, Value(0.0, output_field=FloatField())
+
+
+def filter_queryset(queryset, index_name: str, text: str):
+    """Restreindre un queryset aux lignes correspondant à la recherche"""
+    expressions = _expressions(SEARCH_INDEXES[index_name], text.strip())
+    if expressions is None:
+        return queryset.none()
+    return queryset.filter(expressions[0])
+
+
+def search(queryset, index_name: str, text: str, limit: int = 20):
+    """
+    Lignes du queryset correspondant à la recherche, les plus pertinentes d'abord
+
+    Returns:
+        Les colonnes `result_fields` de l'index et `rank`
+    """
+    index = SEARCH_INDEXES[index_name]
+    expressions = _expressions(index, text.strip())
+    if expressions is None:
+        return []
+    condition, rank = expressions
+    return list(
+        queryset.filter(condition).annotate(rank=rank)
+        .order_by('-rank', '-id').values(*index.result_fields, 'rank')[:limit]
+    )
+
+
+class FullTextSearchAdminMixin:
+    """
+    Recherche du changelist par l'index plein texte
+
+    `search_exact_fields` : identifiants comparés à l'égalité (index B-tree)
+    en plus de l'index plein texte, à la place des `icontains` de
+    `search_fields`.
+    `search_prefix_fields` : colonnes comparées en préfixe (`startswith`,
+    index `varchar_pattern_ops`) au terme normalisé par `get_prefix_term`.
+    """
+    search_index = None
+    search_exact_fields = ()
+    search_prefix_fields = ()
+
+    def get_prefix_term(self, term: str) -> str:
+        """Terme comparé aux colonnes en préfixe, normalisé comme elles"""
+        return term
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+
+        extra = Q()
+        for field in self.search_exact_fields:
+            extra |= Q(**{field: term})
+        prefix = self.get_prefix_term(term)
+        for field in self.search_prefix_fields:
+            extra |= Q(**{f"{field}__startswith": prefix})
+        results = filter_queryset(queryset, self.search_index, term)
+        if extra:
+            results = results | queryset.filter(extra)
+        return results, False
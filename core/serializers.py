@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import AuditLog, GlobalSettings
+from .models import AuditLog, GlobalSettings, UploadSession
 
 
 class AuditLogSerializer(serializers.ModelSerializer):
@@ -22,3 +22,49 @@ class GlobalSettingsSerializer(serializers.ModelSerializer):
         model = GlobalSettings
         fields = ['id', 'key', 'value', 'description', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
+
+
+class StreamedFileSerializerMixin(serializers.Serializer):
+    """
+    Validation commune des fichiers uploadés
+
+    Le fichier est fourni soit directement (`file`), soit par une session
+    d'upload reprenable terminée (`upload_id`). Les sous-classes définissent
+    `upload_policy` et ajoutent 'upload_id' à Meta.fields.
+    """
+    upload_policy = None
+    upload_file_required = False
+    upload_id = serializers.UUIDField(
+        write_only=True, required=False,
+        help_text="Identifiant d'une session d'upload reprenable terminée"
+    )
+    
+    def validate_file(self, value):
+        from .uploads import validate_upload
+        
+        if value:
+            value.content_type = validate_upload(value, self.upload_policy)
+        return value
+    
+    def validate(self, attrs):
+        from .uploads import open_completed_upload, validate_upload
+        
+        attrs = super().validate(attrs)
+        upload_id = attrs.pop('upload_id', None)
+        if upload_id:
+            request = self.context.get('request')
+            file_obj = open_completed_upload(upload_id, request.user, self.upload_policy)
+            validate_upload(file_obj, self.upload_policy)
+            attrs['file'] = file_obj
+        
+        if self.upload_file_required and not attrs.get('file') and not self.partial:
+            raise serializers.ValidationError({'file': "Un fichier ou un upload_id est requis."})
+        return attrs
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ['upload_id', 'purpose', 'filename', 'content_type', 'total_size',
+                 'received_size', 'status', 'expires_at']
+        read_only_fields = ['upload_id', 'received_size', 'status', 'expires_at']
@@ -0,0 +1,34 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+
+from .blobs import BLOB_REFERENCE_MODELS, add_reference, release_reference
+
+
+def _capture_previous_hash(sender, instance, update_fields=None, **kwargs):
+    """Mémoriser l'empreinte avant modification"""
+    if update_fields is not None and 'file_hash' not in update_fields:
+        instance._previous_file_hash = instance.file_hash
+        return
+    
+    previous = None
+    if instance.pk:
+        previous = sender.objects.filter(pk=instance.pk).values_list('file_hash', flat=True).first()
+    instance._previous_file_hash = previous or ''
+
+
+def _update_references(sender, instance, **kwargs):
+    """Mettre à jour les compteurs de références lorsque le fichier change"""
+    previous = getattr(instance, '_previous_file_hash', '')
+    if instance.file_hash != previous:
+        add_reference(instance.file_hash)
+        release_reference(previous)
+    instance._previous_file_hash = instance.file_hash
+
+
+def _release_on_delete(sender, instance, **kwargs):
+    release_reference(instance.file_hash)
+
+
+for model in BLOB_REFERENCE_MODELS:
+    pre_save.connect(_capture_previous_hash, sender=model, dispatch_uid=f'blob-pre-save-{model}')
+    post_save.connect(_update_references, sender=model, dispatch_uid=f'blob-post-save-{model}')
+    post_delete.connect(_release_on_delete, sender=model, dispatch_uid=f'blob-post-delete-{model}')
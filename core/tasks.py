@@ -0,0 +1,33 @@
+from celery import shared_task
+from django.utils import timezone
+import logging
+
+from .models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def purge_expired_idempotency_keys():
+    """Supprimer les clés d'idempotence expirées"""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    logger.info(f"{deleted} clés d'idempotence expirées supprimées")
+    return deleted
+
+
+@shared_task
+def purge_upload_sessions():
+    """Supprimer les sessions d'upload expirées ou déjà utilisées"""
+    from .uploads import purge_upload_sessions as purge
+    
+    deleted = purge()
+    logger.info(f"{deleted} sessions d'upload supprimées")
+    return deleted
+
+
+@shared_task
+def collect_unreferenced_blobs():
+    """Supprimer les fichiers dédupliqués qui ne sont plus référencés"""
+    from .blobs import collect_garbage
+    
+    return collect_garbage()
@@ -0,0 +1,284 @@
+"""
+Chaîne de traitement commune des fichiers uploadés (KYC, preuves, litiges).
+
+- la taille annoncée (Content-Length) est vérifiée avant l'analyse du corps ;
+- le type réel est déterminé par les premiers octets du fichier, pas par
+  l'en-tête fourni par le client ;
+- l'empreinte SHA-256 est calculée bloc par bloc via `chunks()` ;
+- le fichier est transmis au stockage par blocs, jamais lu en entier en
+  mémoire, et n'est écrit qu'une fois par contenu (voir `core.blobs`).
+
+Les uploads reprenables écrivent les parties reçues dans un fichier local
+(`UPLOAD_SESSION_DIR`, à placer sur un volume partagé si plusieurs
+serveurs), puis le fichier complet suit la même chaîne.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from datetime import timedelta
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UploadSession
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+HASH_CHUNK_SIZE = 64 * 1024
+
+# Marge pour les en-têtes multipart et les champs texte
+MULTIPART_OVERHEAD = 64 * 1024
+
+UPLOAD_POLICIES = {
+    'kyc': {
+        'max_size': 10 * MB,
+        'content_types': ['image/jpeg', 'image/png', 'application/pdf'],
+    },
+    'proof': {
+        'max_size': 20 * MB,
+        'content_types': ['image/jpeg', 'image/png', 'image/webp', 'application/pdf', 'video/mp4'],
+    },
+    'evidence': {
+        'max_size': 50 * MB,
+        'content_types': [
+            'image/jpeg', 'image/png', 'image/webp', 'application/pdf',
+            'video/mp4', 'audio/mpeg', 'audio/ogg',
+        ],
+    },
+}
+
+# (signature, position, type MIME)
+MAGIC_SIGNATURES = [
+    (b'\xff\xd8\xff', 0, 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 0, 'image/png'),
+    (b'%PDF-', 0, 'application/pdf'),
+    (b'WEBP', 8, 'image/webp'),
+    (b'ftyp', 4, 'video/mp4'),
+    (b'ID3', 0, 'audio/mpeg'),
+    (b'\xff\xfb', 0, 'audio/mpeg'),
+    (b'OggS', 0, 'audio/ogg'),
+]
+
+
+def get_upload_policy(name: str) -> dict:
+    """Politique d'upload, surchargeable via `UPLOAD_POLICIES` dans les settings"""
+    policy = dict(UPLOAD_POLICIES[name])
+    policy.update(getattr(settings, 'UPLOAD_POLICIES', {}).get(name, {}))
+    return policy
+
+
+def check_content_length(request, policy_name: str) -> bool:
+    """
+    Vérifier la taille annoncée de la requête avant d'analyser le corps
+
+    Returns:
+        False si la requête dépasse la taille autorisée
+    """
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return False
+    return content_length <= get_upload_policy(policy_name)['max_size'] + MULTIPART_OVERHEAD
+
+
+def sniff_content_type(file_obj) -> Optional[str]:
+    """Déterminer le type réel du fichier d'après ses premiers octets"""
+    file_obj.seek(0)
+    head = file_obj.read(16)
+    file_obj.seek(0)
+
+    for signature, offset, content_type in MAGIC_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return content_type
+    return None
+
+
+def validate_upload(file_obj, policy_name: str) -> str:
+    """
+    Valider la taille et le type d'un fichier
+
+    Returns:
+        Le type MIME détecté
+    """
+    policy = get_upload_policy(policy_name)
+
+    if file_obj.size > policy['max_size']:
+        raise ValidationError(
+            f"Le fichier ne doit pas dépasser {policy['max_size'] // MB}MB."
+        )
+
+    content_type = sniff_content_type(file_obj)
+    if content_type not in policy['content_types']:
+        raise ValidationError("Format de fichier non supporté.")
+
+    return content_type
+
+
+def hash_file(file_obj, chunk_size: int = HASH_CHUNK_SIZE) -> Tuple[str, int]:
+    """
+    Calculer l'empreinte SHA-256 et la taille d'un fichier bloc par bloc
+
+    Returns:
+        (empreinte hexadécimale, taille en octets)
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    file_obj.seek(0)
+    for chunk in file_obj.chunks(chunk_size):
+        hasher.update(chunk)
+        size += len(chunk)
+    file_obj.seek(0)
+    return hasher.hexdigest(), size
+
+
+def store_upload(file_obj):
+    """
+    Stocker un fichier validé dans le stockage dédupliqué
+
+    Returns:
+        Le StoredBlob correspondant ; son chemin est affecté au champ
+        `file` du modèle référent, avec `file_hash` et `file_size`.
+    """
+    from .blobs import store_blob
+
+    file_hash, size = hash_file(file_obj)
+    return store_blob(file_obj, file_hash, size, getattr(file_obj, 'content_type', '') or '')
+
+
+# ===== Uploads reprenables ===== #
+
+def get_session_dir() -> str:
+    path = getattr(settings, 'UPLOAD_SESSION_DIR', None) or os.path.join(
+        tempfile.gettempdir(), 'kimi_upload_sessions'
+    )
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def session_path(session: UploadSession) -> str:
+    return os.path.join(get_session_dir(), f"{session.upload_id}.part")
+
+
+def create_upload_session(user, purpose: str, filename: str, content_type: str,
+                          total_size: int) -> UploadSession:
+    """Ouvrir une session d'upload après validation de la taille et du type annoncés"""
+    if purpose not in UPLOAD_POLICIES:
+        raise ValidationError("Type d'upload inconnu.")
+
+    policy = get_upload_policy(purpose)
+    if total_size <= 0 or total_size > policy['max_size']:
+        raise ValidationError(
+            f"Le fichier ne doit pas dépasser {policy['max_size'] // MB}MB."
+        )
+    if content_type not in policy['content_types']:
+        raise ValidationError("Format de fichier non supporté.")
+
+    ttl = getattr(settings, 'UPLOAD_SESSION_TTL', 86400)
+    session = UploadSession.objects.create(
+        user=user,
+        purpose=purpose,
+        filename=os.path.basename(filename)[:255],
+        content_type=content_type,
+        total_size=total_size,
+        expires_at=timezone.now() + timedelta(seconds=ttl),
+    )
+    open(session_path(session), 'wb').close()
+    return session
+
+
+def append_upload_chunk(session: UploadSession, offset: int, stream, length: int) -> UploadSession:
+    """
+    Ajouter une partie à une session, lue en flux depuis `stream`
+
+    La partie doit commencer exactement à la position déjà reçue ; une
+    partie rejouée après une coupure est ainsi refusée sans corrompre le
+    fichier, et le client reprend à la position renvoyée.
+
+    Les erreurs portent un code : `offset_mismatch` (position inattendue),
+    `too_large` (partie trop grande) ou `closed` (session fermée ou expirée).
+    """
+    max_chunk = getattr(settings, 'UPLOAD_SESSION_MAX_CHUNK_SIZE', 5 * MB)
+    if length <= 0 or length > max_chunk:
+        raise ValidationError(f"Une partie ne doit pas dépasser {max_chunk // MB}MB.", code='too_large')
+
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.status != 'IN_PROGRESS' or session.expires_at <= timezone.now():
+            raise ValidationError("Session d'upload fermée ou expirée.", code='closed')
+        if offset != session.received_size:
+            raise ValidationError(f"Position attendue: {session.received_size}", code='offset_mismatch')
+        if offset + length > session.total_size:
+            raise ValidationError("La partie dépasse la taille annoncée.", code='too_large')
+
+        written = 0
+        with open(session_path(session), 'r+b') as target:
+            target.seek(offset)
+            while written < length:
+                data = stream.read(min(HASH_CHUNK_SIZE, length - written))
+                if not data:
+                    break
+                target.write(data)
+                written += len(data)
+            target.truncate(offset + written)
+
+        session.received_size = offset + written
+        if session.received_size == session.total_size:
+            session.status = 'COMPLETED'
+        session.save(update_fields=['received_size', 'status', 'updated_at'])
+
+    return session
+
+
+def open_completed_upload(upload_id, user, purpose: str) -> File:
+    """Ouvrir le fichier d'une session terminée pour la chaîne de traitement"""
+    try:
+        session = UploadSession.objects.get(upload_id=upload_id, user=user, purpose=purpose)
+    except UploadSession.DoesNotExist:
+        raise ValidationError("Session d'upload introuvable.")
+
+    if session.status != 'COMPLETED':
+        raise ValidationError("L'upload n'est pas terminé.")
+
+    file_obj = File(open(session_path(session), 'rb'), name=session.filename)
+    file_obj.content_type = session.content_type
+    file_obj.upload_session = session
+    return file_obj
+
+
+def release_upload(file_obj):
+    """Supprimer les données d'une session une fois le fichier stocké"""
+    session = getattr(file_obj, 'upload_session', None)
+    if session is None:
+        return
+
+    file_obj.close()
+    try:
+        os.remove(session_path(session))
+    except FileNotFoundError:
+        pass
+    UploadSession.objects.filter(pk=session.pk).update(status='CONSUMED', updated_at=timezone.now())
+
+
+def purge_upload_sessions() -> int:
+    """Supprimer les sessions expirées ou déjà utilisées"""
+    from django.db.models import Q
+
+    sessions = UploadSession.objects.filter(
+        Q(expires_at__lte=timezone.now()) | Q(status='CONSUMED')
+    )
+    count = 0
+    for session in sessions.iterator():
+        try:
+            os.remove(session_path(session))
+        except FileNotFoundError:
+            pass
+        count += 1
+    sessions.delete()
+    return count
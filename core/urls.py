@@ -5,4 +5,8 @@ urlpatterns = [
     path('settings/', views.GlobalSettingsListView.as_view(), name='global-settings'),
     path('audit-logs/', views.AuditLogListView.as_view(), name='audit-logs'),
     path('health/', views.HealthCheckView.as_view(), name='health-check'),
+    path('uploads/', views.UploadSessionCreateView.as_view(), name='upload-session-create'),
+    path('uploads/<uuid:upload_id>/', views.UploadSessionDetailView.as_view(), name='upload-session-detail'),
+    path('search/', views.SearchView.as_view(), name='search'),
+    path('stream/', views.EventStreamView.as_view(), name='event-stream'),
 ]
\ No newline at end of file
@@ -124,13 +124,37 @@ def mask_sensitive_data(data: str, visible_chars: int = 4) -> str:
 
 
 def get_client_ip(request) -> str:
-    """Obtenir l'adresse IP du client"""
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
+    """
+    Obtenir l'adresse IP du client
+
+    Les entrées de gauche de X-Forwarded-For sont fournies par le client :
+    derrière `TRUSTED_PROXY_COUNT` mandataires (nginx), l'adresse retenue
+    est celle ajoutée par le mandataire le plus éloigné de l'application.
+    Sans mandataire déclaré, REMOTE_ADDR.
+    """
+    proxies = getattr(settings, 'TRUSTED_PROXY_COUNT', 0)
+    if proxies:
+        forwarded = [
+            ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()
+        ]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR')
+
+
+def enqueue_task(task, *args) -> bool:
+    """
+    Planifier une tâche Celery sans faire échouer la requête en cours
+
+    Returns:
+        False si le courtier a refusé la tâche
+    """
+    try:
+        task.delay(*args)
+        return True
+    except Exception as e:
+        logger.error(f"Erreur de planification de la tâche {task.name}: {e}")
+        return False
 
 
 def create_api_response(success: bool = True, message: str = "", data: Any = None, 
@@ -3,11 +3,13 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.db import connection
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
 from django.core.cache import cache
-from .models import AuditLog, GlobalSettings
-from .serializers import AuditLogSerializer, GlobalSettingsSerializer
+from .models import AuditLog, GlobalSettings, UploadSession
+from .serializers import AuditLogSerializer, GlobalSettingsSerializer, UploadSessionSerializer
 from .permissions import IsAdmin
-from .utils import APIResponseMixin
+from .utils import APIResponseMixin, create_api_response
 
 
 class HealthCheckView(APIView):
@@ -96,3 +98,183 @@ class AuditLogListView(generics.ListAPIView, APIResponseMixin):
             queryset = queryset.filter(timestamp__lte=end_date)
         
         return queryset
+
+
+class UploadSessionCreateView(APIView, APIResponseMixin):
+    """
+    Ouvrir une session d'upload reprenable
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        from django.core.exceptions import ValidationError
+        from .uploads import create_upload_session
+        
+        serializer = UploadSessionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return self.error_response("Données invalides", errors=serializer.errors)
+        
+        try:
+            session = create_upload_session(request.user, **serializer.validated_data)
+        except ValidationError as e:
+            return self.error_response(e.messages[0])
+        
+        return self.success_response(UploadSessionSerializer(session).data, status_code=201)
+
+
+class UploadSessionDetailView(APIView, APIResponseMixin):
+    """
+    État d'une session (GET) et envoi d'une partie (PATCH)
+    
+    Le corps du PATCH contient les octets bruts de la partie et l'en-tête
+    Upload-Offset la position de départ. Après une coupure, le client lit
+    `received_size` puis reprend à cette position.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    # Seule une position inattendue est un conflit : le client reprend à `received_size`
+    ERROR_STATUS = {
+        'offset_mismatch': status.HTTP_409_CONFLICT,
+        'too_large': status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+    }
+    
+    def get_session(self, upload_id):
+        return UploadSession.objects.filter(upload_id=upload_id, user=self.request.user).first()
+    
+    def get(self, request, upload_id):
+        session = self.get_session(upload_id)
+        if not session:
+            return self.error_response("Session d'upload introuvable", status_code=404)
+        return self.success_response(UploadSessionSerializer(session).data)
+    
+    def patch(self, request, upload_id):
+        from django.core.exceptions import ValidationError
+        from .uploads import append_upload_chunk
+        
+        session = self.get_session(upload_id)
+        if not session:
+            return self.error_response("Session d'upload introuvable", status_code=404)
+        
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return self.error_response("En-tête Upload-Offset invalide")
+        
+        try:
+            # Lecture en flux du corps brut, sans passer par request.data
+            session = append_upload_chunk(session, offset, request.stream, length)
+        except ValidationError as e:
+            session.refresh_from_db()
+            return self.error_response(
+                e.messages[0],
+                errors={'received_size': session.received_size},
+                status_code=self.ERROR_STATUS.get(e.code, status.HTTP_400_BAD_REQUEST)
+            )
+        
+        return self.success_response(UploadSessionSerializer(session).data)
+
+
+class EventStreamView(View):
+    """
+    Flux des notifications en temps réel de l'utilisateur (Server-Sent Events)
+    
+    Servi uniquement par le serveur ASGI. Le jeton d'accès est lu dans
+    l'en-tête Authorization, ou dans le paramètre `access_token` (EventSource
+    ne permet pas d'en-têtes). Le client reprend après une coupure avec
+    l'en-tête Last-Event-ID (ou le paramètre `last_event_id`).
+    """
+    
+    def authenticate(self, request):
+        from rest_framework.exceptions import AuthenticationFailed
+        from users.authentication import ClaimsJWTAuthentication
+        
+        authentication = ClaimsJWTAuthentication()
+        try:
+            token = request.GET.get('access_token')
+            if token:
+                return authentication.get_user(authentication.get_validated_token(token))
+            result = authentication.authenticate(request)
+        except AuthenticationFailed:
+            return None
+        if result is not None:
+            return result[0]
+        user = getattr(request, 'user', None)
+        return user if user is not None and user.is_authenticated else None
+    
+    async def get(self, request):
+        from asgiref.sync import sync_to_async
+        from django.core.handlers.asgi import ASGIRequest
+        from .push import event_stream
+        
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse(
+                create_api_response(False, "Flux disponible uniquement via le serveur ASGI"),
+                status=status.HTTP_501_NOT_IMPLEMENTED
+            )
+        
+        user = await sync_to_async(self.authenticate)(request)
+        if user is None:
+            return JsonResponse(
+                create_api_response(False, "Authentification requise"),
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+        
+        cursor = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        response = StreamingHttpResponse(
+            event_stream(user.pk, cursor), content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class SearchView(APIView, APIResponseMixin):
+    """
+    Recherche plein texte classée dans les transactions, messages et litiges
+    
+    Paramètres : `q` (texte), `type` (transactions, messages ou disputes ;
+    tous par défaut), `limit`. Les résultats sont limités aux transactions et
+    litiges visibles par l'utilisateur.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get_querysets(self, user):
+        from django.db.models import Q
+        from disputes.models import Dispute
+        from escrow.models import EscrowTransaction, TransactionMessage
+        
+        transactions = EscrowTransaction.objects.all()
+        messages = TransactionMessage.objects.all()
+        if user.role != 'ADMIN':
+            transactions = transactions.filter(Q(buyer_id=user.pk) | Q(seller_id=user.pk))
+            messages = messages.filter(Q(transaction__buyer_id=user.pk) | Q(transaction__seller_id=user.pk))
+        return {
+            'transactions': transactions,
+            'messages': messages,
+            'disputes': Dispute.objects.for_role(user),
+        }
+    
+    def get(self, request):
+        from django.conf import settings
+        from .search import search
+        
+        text = request.query_params.get('q', '').strip()
+        if len(text) < 2:
+            return self.error_response("La recherche doit contenir au moins 2 caractères")
+        
+        querysets = self.get_querysets(request.user)
+        kind = request.query_params.get('type')
+        if kind:
+            if kind not in querysets:
+                return self.error_response(f"Type de recherche invalide: {kind}")
+            querysets = {kind: querysets[kind]}
+        
+        max_limit = getattr(settings, 'SEARCH_MAX_LIMIT', 50)
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), max_limit)
+        except ValueError:
+            return self.error_response("Paramètre limit invalide")
+        
+        results = {name: search(queryset, name, text, max(limit, 1)) for name, queryset in querysets.items()}
+        return self.success_response(results)
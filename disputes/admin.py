@@ -1,3 +1,36 @@
 from django.contrib import admin
+from core.changelist import LargeTableAdminMixin
+from core.search import FullTextSearchAdminMixin
+from .models import Dispute, DisputeComment
 
-# Register your models here.
+
+@admin.register(Dispute)
+class DisputeAdmin(FullTextSearchAdminMixin, LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('dispute_id', 'title', 'transaction', 'complainant', 'respondent', 'arbitre',
+                   'category', 'priority', 'status', 'created_at')
+    list_filter = ('status', 'priority', 'category', 'verdict')
+    list_select_related = ('transaction', 'complainant', 'respondent', 'arbitre')
+    # Titre et description par l'index plein texte, identifiants à l'égalité
+    search_fields = ('title', 'description')
+    search_index = 'disputes'
+    search_exact_fields = ('dispute_id', 'transaction__transaction_id')
+    raw_id_fields = ('transaction',)
+    autocomplete_fields = ('complainant', 'respondent', 'arbitre')
+    readonly_fields = ('dispute_id', 'assigned_at', 'review_started_at', 'resolved_at',
+                      'created_at', 'updated_at')
+    ordering = ('-created_at', '-id')
+
+
+@admin.register(DisputeComment)
+class DisputeCommentAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('dispute', 'author', 'comment_preview', 'is_internal', 'created_at')
+    list_filter = ('is_internal',)
+    list_select_related = ('dispute', 'author')
+    search_fields = ('=dispute__dispute_id',)
+    raw_id_fields = ('dispute',)
+    autocomplete_fields = ('author',)
+    readonly_fields = ('created_at', 'updated_at')
+    
+    def comment_preview(self, obj):
+        return obj.comment[:50] + "..." if len(obj.comment) > 50 else obj.comment
+    comment_preview.short_description = "Aperçu du commentaire"
@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class DisputesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'disputes'
-    verbose_name = 'Litiges et Arbitrage'
\ No newline at end of file
+    verbose_name = 'Litiges et Arbitrage'
+    
+    def ready(self):
+        import disputes.signals
\ No newline at end of file
@@ -0,0 +1,226 @@
+"""
+Assignation automatique des litiges aux arbitres.
+
+Les litiges OPEN sans arbitre sont traités par lots, par ordre de priorité
+puis d'ancienneté : une requête par niveau de priorité (index
+`status, priority`), sans parcourir l'ensemble des litiges. Chaque litige
+est confié à l'arbitre éligible le moins chargé (file de priorité en
+mémoire sur les compteurs `ArbitreWorkload`), en respectant les règles de
+`Dispute.can_be_assigned_to` et la charge maximale
+`DISPUTE_ARBITRE_MAX_OPEN`.
+
+Les compteurs sont modifiés par des UPDATE relatifs (F) à chaque
+assignation ou résolution, et recalculés par `rebuild_workloads`.
+"""
+
+import heapq
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from core.push import publish_events
+
+from .models import ArbitreWorkload, Dispute
+from .stats import record_transitions
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+SCHEDULE_KEY = 'disputes:assignment:scheduled'
+LOCK_KEY = 'disputes:assignment:lock'
+
+
+def get_max_open() -> int:
+    return getattr(settings, 'DISPUTE_ARBITRE_MAX_OPEN', 25)
+
+
+def adjust_workload(arbitre_id: int, delta: int):
+    """Modifier la charge d'un arbitre (sans descendre sous zéro)"""
+    if not arbitre_id or not delta:
+        return
+    updated = ArbitreWorkload.objects.filter(arbitre_id=arbitre_id).update(
+        open_disputes=Greatest(F('open_disputes') + delta, Value(0)),
+        updated_at=timezone.now(),
+    )
+    if not updated and delta > 0:
+        ArbitreWorkload.objects.bulk_create(
+            [ArbitreWorkload(arbitre_id=arbitre_id, open_disputes=delta)],
+            ignore_conflicts=True,
+        )
+
+
+def move_workload(from_arbitre_id: Optional[int], to_arbitre_id: Optional[int]):
+    """Reporter un litige actif d'un arbitre à un autre (ou le retirer)"""
+    if from_arbitre_id == to_arbitre_id:
+        return
+    adjust_workload(from_arbitre_id, -1)
+    adjust_workload(to_arbitre_id, 1)
+
+
+def eligible_arbitres() -> Dict[int, int]:
+    """
+    Arbitres pouvant recevoir des litiges, avec leur charge courante
+
+    Returns:
+        {identifiant de l'arbitre: nombre de litiges actifs}
+    """
+    arbitre_ids = list(
+        User.objects.filter(role='ARBITRE', kyc_status='VERIFIED', is_active=True)
+        .values_list('id', flat=True)
+    )
+    loads = dict(
+        ArbitreWorkload.objects.filter(arbitre_id__in=arbitre_ids)
+        .values_list('arbitre_id', 'open_disputes')
+    )
+    missing = [arbitre_id for arbitre_id in arbitre_ids if arbitre_id not in loads]
+    if missing:
+        ArbitreWorkload.objects.bulk_create(
+            [ArbitreWorkload(arbitre_id=arbitre_id) for arbitre_id in missing],
+            ignore_conflicts=True,
+        )
+    return {arbitre_id: loads.get(arbitre_id, 0) for arbitre_id in arbitre_ids}
+
+
+def pending_disputes(limit: int) -> List[Dispute]:
+    """Prochains litiges à assigner, verrouillés, par priorité puis ancienneté"""
+    disputes = []
+    for priority in Dispute.PRIORITY_ORDER:
+        remaining = limit - len(disputes)
+        if remaining <= 0:
+            break
+        disputes.extend(
+            Dispute.objects.filter(status='OPEN', arbitre__isnull=True, priority=priority)
+            .order_by('created_at', 'id')
+            .select_for_update(skip_locked=True)
+            .only('id', 'dispute_id', 'complainant_id', 'respondent_id', 'status', 'category',
+                  'priority', 'arbitre_id', 'created_at')[:remaining]
+        )
+    return disputes
+
+
+def plan_assignments(disputes: Iterable[Dispute], loads: Dict[int, int],
+                     max_open: int) -> Dict[int, List[int]]:
+    """
+    Choisir l'arbitre le moins chargé pour chaque litige
+
+    Returns:
+        {identifiant de l'arbitre: [identifiants des litiges]}
+    """
+    heap = [(load, arbitre_id) for arbitre_id, load in loads.items() if load < max_open]
+    heapq.heapify(heap)
+
+    plan = defaultdict(list)
+    for dispute in disputes:
+        skipped = []
+        chosen = None
+        while heap:
+            load, arbitre_id = heapq.heappop(heap)
+            # Un arbitre ne peut pas juger un litige dont il est partie
+            if arbitre_id in (dispute.complainant_id, dispute.respondent_id):
+                skipped.append((load, arbitre_id))
+                continue
+            chosen = (load, arbitre_id)
+            break
+
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+        if chosen is None:
+            continue
+
+        load, arbitre_id = chosen
+        plan[arbitre_id].append(dispute.pk)
+        if load + 1 < max_open:
+            heapq.heappush(heap, (load + 1, arbitre_id))
+
+    return plan
+
+
+def assign_open_disputes(batch_size: int = None) -> int:
+    """
+    Assigner un lot de litiges OPEN aux arbitres les moins chargés
+
+    Returns:
+        Le nombre de litiges assignés
+    """
+    batch_size = batch_size or getattr(settings, 'DISPUTE_ASSIGNMENT_BATCH_SIZE', 100)
+
+    # Une seule exécution à la fois : les charges lues restent exactes
+    if not cache.add(LOCK_KEY, 1, 300):
+        logger.info("Assignation des litiges déjà en cours")
+        return 0
+
+    try:
+        with transaction.atomic():
+            disputes = pending_disputes(batch_size)
+            if not disputes:
+                return 0
+
+            plan = plan_assignments(disputes, eligible_arbitres(), get_max_open())
+            now = timezone.now()
+            assigned = 0
+            for arbitre_id, dispute_ids in plan.items():
+                count = Dispute.objects.filter(
+                    pk__in=dispute_ids, status='OPEN', arbitre__isnull=True
+                ).update(arbitre_id=arbitre_id, status='ASSIGNED', assigned_at=now, updated_at=now)
+                adjust_workload(arbitre_id, count)
+                assigned += count
+
+            # Les UPDATE groupés ne déclenchent pas de signaux : statistiques
+            # et notifications à reporter
+            by_id = {dispute.pk: dispute for dispute in disputes}
+            changes, events = [], []
+            for arbitre_id, dispute_ids in plan.items():
+                for dispute_id in dispute_ids:
+                    dispute = by_id[dispute_id]
+                    old_key = dispute.stats_key()
+                    dispute.status, dispute.arbitre_id = 'ASSIGNED', arbitre_id
+                    changes.append((old_key, dispute.stats_key()))
+                    events.append(dispute.status_event('OPEN'))
+            record_transitions(changes)
+            publish_events(events)
+    finally:
+        cache.delete(LOCK_KEY)
+
+    unassigned = len(disputes) - assigned
+    logger.info(f"{assigned} litige(s) assigné(s) automatiquement, {unassigned} en attente")
+    return assigned
+
+
+def schedule_assignment():
+    """Planifier un lot d'assignation (un seul lot pour une rafale de litiges)"""
+    if not getattr(settings, 'DISPUTE_AUTO_ASSIGNMENT', True):
+        return
+
+    delay = getattr(settings, 'DISPUTE_ASSIGNMENT_DELAY', 30)
+    if cache.add(SCHEDULE_KEY, 1, delay):
+        from .tasks import assign_open_disputes_task
+        transaction.on_commit(lambda: assign_open_disputes_task.apply_async(countdown=delay))
+
+
+def rebuild_workloads() -> Dict[int, int]:
+    """Recalculer les charges de tous les arbitres depuis les litiges"""
+    counts = dict(
+        Dispute.objects.filter(status__in=Dispute.ACTIVE_STATUSES, arbitre__isnull=False)
+        .values('arbitre').annotate(count=Count('id')).values_list('arbitre', 'count')
+    )
+    arbitre_ids = set(User.objects.filter(role='ARBITRE').values_list('id', flat=True)) | set(counts)
+    now = timezone.now()
+
+    with transaction.atomic():
+        ArbitreWorkload.objects.exclude(arbitre_id__in=arbitre_ids).delete()
+        ArbitreWorkload.objects.bulk_create(
+            [ArbitreWorkload(arbitre_id=arbitre_id, open_disputes=counts.get(arbitre_id, 0), updated_at=now)
+             for arbitre_id in arbitre_ids],
+            update_conflicts=True,
+            unique_fields=['arbitre'],
+            update_fields=['open_disputes', 'updated_at'],
+        )
+    return counts
@@ -0,0 +1,332 @@
+"""
+Dossier complet d'un litige, sous forme d'archive zip.
+
+Le dossier regroupe les preuves du litige, les pièces jointes des
+commentaires, les preuves et pièces jointes des messages de la
+transaction, la transcription des échanges (HTML) et un récapitulatif
+JSON (litige, transaction, évaluations).
+
+L'archive est écrite par une tâche de fond dans un fichier temporaire :
+chaque fichier est recopié du stockage vers l'archive par blocs
+(`COPY_BUFFER_SIZE`) et les messages sont lus par lots, la mémoire reste
+donc constante quelle que soit la taille des vidéos. Les formats déjà
+compressés (images, vidéos, PDF...) sont stockés sans recompression.
+
+Chaque dossier est identifié par l'empreinte de son manifeste, calculée
+depuis les métadonnées en base (empreintes SHA-256 des fichiers, dates
+de modification des enregistrements) sans lire les fichiers : un dossier
+déjà construit pour le même contenu est servi immédiatement.
+"""
+
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import shutil
+import tempfile
+import zipfile
+from typing import Dict, Tuple
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.html import escape
+from django.utils.text import slugify
+
+from core.models import StoredBlob
+from escrow.models import Proof, TransactionMessage, TransactionRating
+
+from .models import CaseBundle, Dispute, DisputeComment, DisputeEvidence
+
+logger = logging.getLogger(__name__)
+
+# Incrémenter lorsque le contenu de l'archive change pour des entrées identiques
+BUNDLE_VERSION = 1
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Extensions déjà compressées : stockées telles quelles dans l'archive
+STORED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic',
+    '.mp4', '.mov', '.avi', '.mkv', '.webm', '.3gp',
+    '.mp3', '.m4a', '.aac', '.ogg', '.opus',
+    '.pdf', '.zip', '.gz', '.docx', '.xlsx', '.pptx',
+}
+
+
+def _extension(name: str, sha256: str, content_types: Dict[str, str]) -> str:
+    """Extension du fichier, déduite du type de contenu pour les fichiers dédupliqués"""
+    extension = os.path.splitext(name)[1]
+    if not extension and sha256 in content_types:
+        extension = mimetypes.guess_extension(content_types[sha256]) or ''
+    return extension.lower()
+
+
+def _fingerprint(name: str, sha256: str, updated_at) -> str:
+    return sha256 or f"{name}:{updated_at.isoformat()}"
+
+
+def bundle_manifest(dispute: Dispute) -> Dict:
+    """
+    Inventaire du dossier, construit uniquement depuis la base
+
+    Returns:
+        {'version', 'dispute', 'files': [{'name', 'path', 'fingerprint'}], 'records'}
+    """
+    rows = []
+    for pk, title, name, sha256, updated_at in (
+        DisputeEvidence.objects.filter(dispute=dispute).exclude(file='').exclude(file__isnull=True)
+        .order_by('id').values_list('id', 'title', 'file', 'file_hash', 'updated_at')
+    ):
+        rows.append(('preuves_litige', pk, title, name, sha256, updated_at))
+    for pk, title, name, sha256, updated_at in (
+        Proof.objects.filter(transaction_id=dispute.transaction_id).exclude(file='').exclude(file__isnull=True)
+        .order_by('id').values_list('id', 'title', 'file', 'file_hash', 'updated_at')
+    ):
+        rows.append(('preuves_transaction', pk, title, name, sha256, updated_at))
+    for pk, name, updated_at in (
+        DisputeComment.objects.filter(dispute=dispute).exclude(attachment='').exclude(attachment__isnull=True)
+        .order_by('id').values_list('id', 'attachment', 'updated_at')
+    ):
+        rows.append(('commentaires', pk, os.path.basename(name), name, '', updated_at))
+    for pk, name, updated_at in (
+        TransactionMessage.objects.filter(transaction_id=dispute.transaction_id)
+        .exclude(attachment='').exclude(attachment__isnull=True)
+        .order_by('id').values_list('id', 'attachment', 'updated_at')
+    ):
+        rows.append(('messages', pk, os.path.basename(name), name, '', updated_at))
+
+    hashes = [sha256 for *_, sha256, _ in rows if sha256]
+    content_types = dict(
+        StoredBlob.objects.filter(sha256__in=hashes).values_list('sha256', 'content_type')
+    ) if hashes else {}
+
+    files = []
+    for folder, pk, title, name, sha256, updated_at in rows:
+        extension = _extension(name, sha256, content_types)
+        label = slugify(os.path.splitext(title)[0])[:60] or 'fichier'
+        files.append({
+            'name': f"{folder}/{pk}-{label}{extension}",
+            'path': name,
+            'fingerprint': _fingerprint(name, sha256, updated_at),
+        })
+
+    def stamps(queryset):
+        return [[pk, updated_at.isoformat()] for pk, updated_at in queryset.order_by('id').values_list('id', 'updated_at')]
+
+    return {
+        'version': BUNDLE_VERSION,
+        'dispute': [dispute.pk, dispute.updated_at.isoformat(), dispute.transaction.updated_at.isoformat()],
+        'files': files,
+        'records': {
+            'messages': stamps(TransactionMessage.objects.filter(transaction_id=dispute.transaction_id)),
+            'comments': stamps(DisputeComment.objects.filter(dispute=dispute)),
+            'ratings': stamps(TransactionRating.objects.filter(transaction_id=dispute.transaction_id)),
+        },
+    }
+
+
+def manifest_hash(manifest: Dict) -> str:
+    payload = json.dumps(manifest, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _zip_info(name: str, compress_type: int) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(name, date_time=timezone.localtime().timetuple()[:6])
+    info.compress_type = compress_type
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def _summary(dispute: Dispute) -> Dict:
+    transaction_obj = dispute.transaction
+    return {
+        'litige': {
+            'dispute_id': dispute.dispute_id,
+            'titre': dispute.title,
+            'categorie': dispute.category,
+            'statut': dispute.status,
+            'priorite': dispute.priority,
+            'description': dispute.description,
+            'plaignant': dispute.complainant.get_full_name(),
+            'defendeur': dispute.respondent.get_full_name(),
+            'arbitre': dispute.arbitre.get_full_name() if dispute.arbitre else None,
+            'verdict': dispute.verdict,
+            'notes_resolution': dispute.resolution_notes,
+            'montant_rembourse': dispute.refund_amount,
+            'cree_le': dispute.created_at,
+            'resolu_le': dispute.resolved_at,
+        },
+        'transaction': {
+            'transaction_id': transaction_obj.transaction_id,
+            'titre': transaction_obj.title,
+            'statut': transaction_obj.status,
+            'montant': transaction_obj.amount,
+            'devise': transaction_obj.currency,
+            'acheteur': transaction_obj.buyer.get_full_name(),
+            'vendeur': transaction_obj.seller.get_full_name(),
+            'creee_le': transaction_obj.created_at,
+            'livree_le': transaction_obj.delivered_at,
+        },
+        'evaluations': [
+            {
+                'evaluateur': rating.rater.get_full_name(),
+                'evalue': rating.rated_user.get_full_name(),
+                'note': rating.rating,
+                'commentaire': rating.comment,
+                'communication': rating.communication_rating,
+                'livraison': rating.delivery_rating,
+                'qualite': rating.quality_rating,
+                'recommande': rating.would_recommend,
+                'date': rating.created_at,
+            }
+            for rating in TransactionRating.objects.filter(transaction=transaction_obj)
+            .select_related('rater', 'rated_user').order_by('created_at')
+        ],
+    }
+
+
+def _write_transcript(dispute: Dispute, stream):
+    """Transcription HTML des messages et commentaires, écrite ligne à ligne"""
+    def write(text):
+        stream.write(text.encode('utf-8'))
+
+    def row(author, moment, text, note=''):
+        write(
+            f'<div class="entry"><p class="meta">{escape(author)} &middot; '
+            f'{timezone.localtime(moment):%d/%m/%Y %H:%M}{escape(note)}</p>'
+            f'<p>{escape(text)}</p></div>\n'
+        )
+
+    write(
+        '<!DOCTYPE html>\n<html lang="fr"><head><meta charset="utf-8">'
+        f'<title>Dossier {escape(dispute.dispute_id)}</title>'
+        '<style>body{font-family:sans-serif;max-width:50em;margin:auto}'
+        '.meta{color:#666;font-size:.85em;margin-bottom:0}.entry{border-bottom:1px solid #eee}</style>'
+        f'</head><body>\n<h1>Litige {escape(dispute.dispute_id)} &mdash; {escape(dispute.title)}</h1>\n'
+        '<h2>Messages de la transaction</h2>\n'
+    )
+    messages = (
+        TransactionMessage.objects.filter(transaction_id=dispute.transaction_id)
+        .select_related('sender').order_by('created_at', 'id')
+    )
+    for message in messages.iterator(chunk_size=500):
+        note = ' (système)' if message.is_system_message else ''
+        row(message.sender.get_full_name(), message.created_at, message.message, note)
+
+    write('<h2>Commentaires du litige</h2>\n')
+    comments = DisputeComment.objects.filter(dispute=dispute).select_related('author').order_by('created_at', 'id')
+    for comment in comments.iterator(chunk_size=500):
+        note = ' (interne)' if comment.is_internal else ''
+        row(comment.author.get_full_name(), comment.created_at, comment.comment, note)
+    write('</body></html>\n')
+
+
+def write_bundle(dispute: Dispute, manifest: Dict, fileobj) -> int:
+    """
+    Écrire l'archive du dossier dans `fileobj` (fichier binaire inscriptible)
+
+    Returns:
+        Le nombre d'entrées de l'archive
+    """
+    count = 0
+    missing = []
+    with zipfile.ZipFile(fileobj, 'w', allowZip64=True) as archive:
+        summary = json.dumps(_summary(dispute), cls=DjangoJSONEncoder, ensure_ascii=False, indent=2)
+        archive.writestr(_zip_info('dossier.json', zipfile.ZIP_DEFLATED), summary)
+        with archive.open(_zip_info('transcription.html', zipfile.ZIP_DEFLATED), 'w') as stream:
+            _write_transcript(dispute, stream)
+        count += 2
+
+        for entry in manifest['files']:
+            extension = os.path.splitext(entry['name'])[1]
+            compress_type = zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+            try:
+                source = default_storage.open(entry['path'], 'rb')
+            except (FileNotFoundError, OSError) as e:
+                logger.warning(f"Fichier absent du dossier {dispute.dispute_id}: {entry['path']} ({e})")
+                missing.append(entry['name'])
+                continue
+            with source, archive.open(_zip_info(entry['name'], compress_type), 'w', force_zip64=True) as target:
+                shutil.copyfileobj(source, target, COPY_BUFFER_SIZE)
+            count += 1
+
+        if missing:
+            archive.writestr(
+                _zip_info('fichiers_manquants.txt', zipfile.ZIP_DEFLATED), '\n'.join(missing) + '\n'
+            )
+            count += 1
+    return count
+
+
+def request_bundle(dispute: Dispute, user) -> Tuple[CaseBundle, bool]:
+    """
+    Obtenir le dossier correspondant au contenu actuel du litige
+
+    Returns:
+        (dossier, True si sa construction vient d'être planifiée)
+    """
+    content_hash = manifest_hash(bundle_manifest(dispute))
+    bundle, created = CaseBundle.objects.get_or_create(
+        content_hash=content_hash,
+        defaults={'dispute': dispute, 'requested_by': user},
+    )
+
+    queued = created
+    if not created and bundle.status == 'FAILED':
+        queued = bool(CaseBundle.objects.filter(pk=bundle.pk, status='FAILED').update(
+            status='PENDING', error_message='', updated_at=timezone.now()
+        ))
+        bundle.status = 'PENDING'
+
+    if queued:
+        from .tasks import build_case_bundle
+        transaction.on_commit(lambda: build_case_bundle.delay(bundle.pk))
+    return bundle, queued
+
+
+def build_bundle(bundle: CaseBundle) -> CaseBundle:
+    """Construire l'archive d'un dossier et l'écrire dans le stockage"""
+    dispute = (
+        Dispute.objects.select_related(
+            'transaction__buyer', 'transaction__seller', 'complainant', 'respondent', 'arbitre'
+        ).get(pk=bundle.dispute_id)
+    )
+    manifest = bundle_manifest(dispute)
+
+    # Fichier temporaire sur disque : la mémoire reste constante
+    with tempfile.TemporaryFile() as buffer:
+        bundle.entry_count = write_bundle(dispute, manifest, buffer)
+        bundle.file_size = buffer.tell()
+        buffer.seek(0)
+        bundle.file.save(f"{dispute.dispute_id}-{bundle.content_hash[:12]}.zip", File(buffer), save=False)
+
+    # Le contenu a pu changer depuis la demande : le dossier porte l'empreinte construite
+    built_hash = manifest_hash(manifest)
+    update_fields = ['status', 'file', 'file_size', 'entry_count', 'completed_at', 'updated_at']
+    if built_hash != bundle.content_hash and not CaseBundle.objects.filter(content_hash=built_hash).exists():
+        bundle.content_hash = built_hash
+        update_fields.append('content_hash')
+
+    bundle.status = 'COMPLETED'
+    bundle.completed_at = timezone.now()
+    bundle.save(update_fields=update_fields)
+
+    purge_superseded(bundle)
+    return bundle
+
+
+def purge_superseded(bundle: CaseBundle) -> int:
+    """Supprimer les dossiers précédents du même litige (contenu périmé)"""
+    superseded = list(
+        CaseBundle.objects.filter(dispute_id=bundle.dispute_id, created_at__lt=bundle.created_at)
+        .exclude(status__in=['PENDING', 'RUNNING']).exclude(pk=bundle.pk)
+    )
+    for old in superseded:
+        if old.file:
+            old.file.delete(save=False)
+    CaseBundle.objects.filter(pk__in=[old.pk for old in superseded]).delete()
+    return len(superseded)
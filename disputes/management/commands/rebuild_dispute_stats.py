@@ -0,0 +1,30 @@
+"""
+Recalcul des agrégats statistiques des litiges depuis la table des litiges.
+
+    python manage.py rebuild_dispute_stats
+"""
+
+from django.core.management.base import BaseCommand
+
+from disputes.assignment import rebuild_workloads
+from disputes.stats import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recalcule les agrégats statistiques des litiges (et les charges des arbitres)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--skip-workloads', action='store_true',
+            help="Ne pas recalculer les charges des arbitres",
+        )
+
+    def handle(self, *args, **options):
+        stats, resolutions = rebuild_rollups()
+        self.stdout.write(f"{stats} case(s) de statut, {resolutions} tranche(s) de résolution")
+
+        if not options['skip_workloads']:
+            workloads = rebuild_workloads()
+            self.stdout.write(f"{len(workloads)} arbitre(s) avec des litiges actifs")
+
+        self.stdout.write(self.style.SUCCESS("Agrégats des litiges recalculés"))
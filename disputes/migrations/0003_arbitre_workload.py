@@ -0,0 +1,48 @@
+# Generated by Django 5.0.8 on 2026-10-19 03:57
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def build_arbitre_workloads(apps, schema_editor):
+    """Calculer la charge des arbitres à partir des litiges existants"""
+    CustomUser = apps.get_model('users', 'CustomUser')
+    Dispute = apps.get_model('disputes', 'Dispute')
+    ArbitreWorkload = apps.get_model('disputes', 'ArbitreWorkload')
+    
+    counts = dict(
+        Dispute.objects.filter(status__in=['ASSIGNED', 'IN_REVIEW', 'ESCALATED'], arbitre__isnull=False)
+        .values('arbitre').annotate(count=Count('id')).values_list('arbitre', 'count')
+    )
+    arbitre_ids = set(CustomUser.objects.filter(role='ARBITRE').values_list('id', flat=True)) | set(counts)
+    ArbitreWorkload.objects.bulk_create([
+        ArbitreWorkload(arbitre_id=arbitre_id, open_disputes=counts.get(arbitre_id, 0))
+        for arbitre_id in arbitre_ids
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disputes', '0002_initial'),
+        ('users', '0010_token_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArbitreWorkload',
+            fields=[
+                ('arbitre', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='dispute_workload', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('open_disputes', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': "Charge d'arbitre",
+                'verbose_name_plural': "Charges d'arbitres",
+            },
+        ),
+        migrations.RunPython(build_arbitre_workloads, migrations.RunPython.noop),
+    ]
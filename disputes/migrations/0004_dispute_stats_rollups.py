@@ -0,0 +1,100 @@
+# Generated by Django 5.0.8 on 2026-10-19 04:00
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+DURATION_BUCKETS_HOURS = [1, 6, 12, 24, 48, 72, 120, 168, 336, 720, 1440]
+
+
+def build_dispute_stats(apps, schema_editor):
+    """Calculer les agrégats à partir des litiges existants"""
+    import bisect
+    
+    Dispute = apps.get_model('disputes', 'Dispute')
+    DisputeStatsBucket = apps.get_model('disputes', 'DisputeStatsBucket')
+    DisputeResolutionBucket = apps.get_model('disputes', 'DisputeResolutionBucket')
+    
+    rows = (
+        Dispute.objects.annotate(day=TruncDate('created_at'))
+        .values('day', 'status', 'category', 'priority', 'arbitre_id')
+        .annotate(total=Count('id')).order_by()
+    )
+    DisputeStatsBucket.objects.bulk_create([
+        DisputeStatsBucket(
+            day=row['day'], status=row['status'], category=row['category'],
+            priority=row['priority'], arbitre_id=row['arbitre_id'] or 0, count=row['total'],
+        )
+        for row in rows
+    ], batch_size=1000)
+    
+    resolutions = {}
+    resolved = Dispute.objects.filter(resolved_at__isnull=False).values_list(
+        'created_at', 'resolved_at', 'category', 'priority', 'arbitre_id'
+    )
+    for created_at, resolved_at, category, priority, arbitre_id in resolved.iterator():
+        seconds = max((resolved_at - created_at).total_seconds(), 0)
+        bucket = bisect.bisect_left(DURATION_BUCKETS_HOURS, seconds / 3600)
+        key = (timezone.localdate(resolved_at), category, priority, arbitre_id or 0, bucket)
+        count, total = resolutions.get(key, (0, 0))
+        resolutions[key] = (count + 1, total + int(seconds))
+    DisputeResolutionBucket.objects.bulk_create([
+        DisputeResolutionBucket(
+            day=day, category=category, priority=priority, arbitre_id=arbitre_id,
+            duration_bucket=bucket, count=count, total_seconds=total,
+        )
+        for (day, category, priority, arbitre_id, bucket), (count, total) in resolutions.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disputes', '0003_arbitre_workload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DisputeResolutionBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category', models.CharField(max_length=20)),
+                ('priority', models.CharField(max_length=10)),
+                ('arbitre_id', models.PositiveIntegerField(default=0)),
+                ('duration_bucket', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('total_seconds', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Durées de résolution de litiges',
+                'verbose_name_plural': 'Durées de résolution de litiges',
+            },
+        ),
+        migrations.CreateModel(
+            name='DisputeStatsBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('category', models.CharField(max_length=20)),
+                ('priority', models.CharField(max_length=10)),
+                ('arbitre_id', models.PositiveIntegerField(default=0)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Statistique journalière de litiges',
+                'verbose_name_plural': 'Statistiques journalières de litiges',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='disputeresolutionbucket',
+            constraint=models.UniqueConstraint(fields=('day', 'category', 'priority', 'arbitre_id', 'duration_bucket'), name='disputes_resolution_bucket_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='disputestatsbucket',
+            constraint=models.UniqueConstraint(fields=('day', 'status', 'category', 'priority', 'arbitre_id'), name='disputes_stats_bucket_unique'),
+        ),
+        migrations.RunPython(build_dispute_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.8 on 2026-10-19 04:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disputes', '0004_dispute_stats_rollups'),
+        ('escrow', '0005_proof_file_hash_proof_file_size'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dispute',
+            index=models.Index(fields=['created_at', 'id'], name='disputes_di_created_12a7b7_idx'),
+        ),
+    ]
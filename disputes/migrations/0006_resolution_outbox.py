@@ -0,0 +1,42 @@
+# Generated by Django 5.0.8 on 2026-10-19 04:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disputes', '0005_dispute_listing_index'),
+        ('escrow', '0005_proof_file_hash_proof_file_size'),
+        ('payments', '0005_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResolutionOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('release', 'Libération au vendeur'), ('refund', "Remboursement à l'acheteur")], max_length=10)),
+                ('status', models.CharField(choices=[('PENDING', 'À transmettre'), ('DISPATCHED', 'Transmis')], default='PENDING', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('dispatched_at', models.DateTimeField(blank=True, null=True)),
+                ('dispute', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='settlements', to='disputes.dispute')),
+                ('payment', models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, related_name='dispute_settlement', to='payments.payment')),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dispute_settlements', to='escrow.escrowtransaction')),
+            ],
+            options={
+                'verbose_name': 'Mouvement de résolution',
+                'verbose_name_plural': 'Mouvements de résolution',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='disputes_re_status_eb70d4_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='resolutionoutbox',
+            constraint=models.UniqueConstraint(fields=('dispute', 'action'), name='disputes_settlement_unique_action'),
+        ),
+    ]
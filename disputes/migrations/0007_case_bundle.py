@@ -0,0 +1,39 @@
+# Generated by Django 5.0.8 on 2026-10-19 04:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disputes', '0006_resolution_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CaseBundle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('status', models.CharField(choices=[('PENDING', 'En attente'), ('RUNNING', 'En cours'), ('COMPLETED', 'Terminé'), ('FAILED', 'Échoué')], default='PENDING', max_length=20)),
+                ('file', models.FileField(blank=True, null=True, upload_to='case_bundles/%Y/%m/%d/')),
+                ('file_size', models.PositiveBigIntegerField(default=0)),
+                ('entry_count', models.PositiveIntegerField(default=0)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('error_message', models.TextField(blank=True)),
+                ('dispute', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bundles', to='disputes.dispute')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='case_bundles', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Dossier de litige',
+                'verbose_name_plural': 'Dossiers de litige',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['dispute', '-created_at'], name='disputes_ca_dispute_84f96e_idx')],
+            },
+        ),
+    ]
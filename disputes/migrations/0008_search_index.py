@@ -0,0 +1,28 @@
+# Generated by Django 5.0.8 on 2026-10-19 09:00
+
+from django.db import migrations
+
+from core.search import install_search_index, remove_search_index
+
+FIELDS = (('title', 'A'), ('description', 'B'))
+
+
+def install(apps, schema_editor):
+    install_search_index(schema_editor, 'disputes_dispute', FIELDS)
+
+
+def remove(apps, schema_editor):
+    remove_search_index(schema_editor, 'disputes_dispute')
+
+
+class Migration(migrations.Migration):
+    # Remplissage par lots validés séparément et CREATE INDEX CONCURRENTLY (PostgreSQL)
+    atomic = False
+
+    dependencies = [
+        ('disputes', '0007_case_bundle'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, remove),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.8 on 2026-10-19 04:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disputes', '0008_search_index'),
+        ('escrow', '0008_listing_index'),
+        ('payments', '0007_exportjob_private_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resolutionoutbox',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='resolutionoutbox',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='resolutionoutbox',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'À transmettre'), ('DISPATCHED', 'Transmis'), ('COMPLETED', 'Exécuté'), ('FAILED', 'Échec définitif')], default='PENDING', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='resolutionoutbox',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='disputes_re_status_c4ab1c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resolutionoutbox',
+            index=models.Index(fields=['status', 'dispatched_at'], name='disputes_re_status_ee3317_idx'),
+        ),
+    ]
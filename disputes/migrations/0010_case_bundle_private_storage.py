@@ -0,0 +1,20 @@
+# Generated by Django 5.0.8 on 2026-10-19 04:57
+
+import disputes.models
+import payments.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disputes', '0009_resolution_outbox_retries'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='casebundle',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=payments.models.export_storage, upload_to=disputes.models.case_bundle_upload_to),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.0.8 on 2026-10-19 04:58
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def fill_totals(apps, schema_editor):
+    """Totaux initiaux depuis les cases journalières existantes"""
+    DisputeStatsBucket = apps.get_model('disputes', 'DisputeStatsBucket')
+    DisputeResolutionBucket = apps.get_model('disputes', 'DisputeResolutionBucket')
+    DisputeStatsTotal = apps.get_model('disputes', 'DisputeStatsTotal')
+    DisputeResolutionTotal = apps.get_model('disputes', 'DisputeResolutionTotal')
+
+    DisputeStatsTotal.objects.bulk_create([
+        DisputeStatsTotal(status=row['status'], category=row['category'], count=row['total'])
+        for row in DisputeStatsBucket.objects.values('status', 'category').annotate(total=Sum('count')).order_by()
+    ])
+    DisputeResolutionTotal.objects.bulk_create([
+        DisputeResolutionTotal(duration_bucket=row['duration_bucket'], count=row['total'],
+                               total_seconds=row['seconds'])
+        for row in DisputeResolutionBucket.objects.values('duration_bucket').annotate(
+            total=Sum('count'), seconds=Sum('total_seconds')
+        ).order_by()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disputes', '0010_case_bundle_private_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DisputeResolutionTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('duration_bucket', models.PositiveSmallIntegerField(unique=True)),
+                ('count', models.IntegerField(default=0)),
+                ('total_seconds', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Total des durées de résolution',
+                'verbose_name_plural': 'Totaux des durées de résolution',
+            },
+        ),
+        migrations.CreateModel(
+            name='DisputeStatsTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=20)),
+                ('category', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Total de litiges',
+                'verbose_name_plural': 'Totaux de litiges',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='disputestatstotal',
+            constraint=models.UniqueConstraint(fields=('status', 'category'), name='disputes_stats_total_unique'),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,49 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from core.models import TimeStampedModel
 from core.utils import generate_dispute_id
 from escrow.models import EscrowTransaction
+from payments.models import export_storage
 
 User = get_user_model()
 
 
+class DisputeQuerySet(models.QuerySet):
+    """
+    Sélections de litiges par rôle
+    
+    Les conditions OU portant sur des colonnes différentes sont écrites en
+    UNION d'identifiants : chaque branche utilise son propre index.
+    """
+    
+    def _union(self, *branches):
+        ids = [self.model.objects.filter(branch).order_by().values('pk') for branch in branches]
+        return self.filter(pk__in=ids[0].union(*ids[1:]))
+    
+    def involving(self, user):
+        """Litiges dont l'utilisateur est plaignant ou défendeur"""
+        return self._union(models.Q(complainant=user), models.Q(respondent=user))
+    
+    def arbitre_queue(self, user):
+        """Litiges assignés à l'arbitre et litiges ouverts"""
+        return self._union(models.Q(arbitre=user), models.Q(status='OPEN'))
+    
+    def for_role(self, user):
+        """Litiges listés pour l'utilisateur selon son rôle"""
+        if user.role == 'ADMIN':
+            return self.all()
+        if user.role == 'ARBITRE':
+            return self.arbitre_queue(user)
+        return self.involving(user)
+    
+    def with_parties(self):
+        """Charger la transaction et les parties avec le litige (DisputeSerializer)"""
+        return self.select_related('transaction', 'complainant', 'respondent', 'arbitre')
+
+
 class Dispute(TimeStampedModel):
     """Modèle pour les litiges"""
     STATUS_CHOICES = [
@@ -35,6 +71,12 @@ class Dispute(TimeStampedModel):
         ('NO_FAULT', 'Aucune faute'),
     ]
     
+    # Statuts comptés dans la charge de l'arbitre assigné
+    ACTIVE_STATUSES = ('ASSIGNED', 'IN_REVIEW', 'ESCALATED')
+    
+    # Ordre de traitement de la file d'assignation
+    PRIORITY_ORDER = ('URGENT', 'HIGH', 'MEDIUM', 'LOW')
+    
     # Identifiants
     dispute_id = models.CharField(max_length=20, unique=True, default=generate_dispute_id)
     
@@ -69,6 +111,8 @@ class Dispute(TimeStampedModel):
         ('URGENT', 'Urgente'),
     ], default='MEDIUM')
     
+    objects = DisputeQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Litige"
         verbose_name_plural = "Litiges"
@@ -79,17 +123,56 @@ class Dispute(TimeStampedModel):
             models.Index(fields=['arbitre', 'status']),
             models.Index(fields=['complainant']),
             models.Index(fields=['respondent']),
+            models.Index(fields=['created_at', 'id']),
         ]
     
     def __str__(self):
         return f"{self.dispute_id} - {self.title}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot_stats_key()
+        return instance
+    
+    def stats_key(self):
+        """Case des statistiques journalières du litige (disputes.stats)"""
+        if self.created_at is None:
+            return None
+        return (
+            timezone.localdate(self.created_at), self.status,
+            self.category, self.priority, self.arbitre_id or 0,
+        )
+    
+    def snapshot_stats_key(self):
+        """Mémoriser la case enregistrée en base"""
+        fields = ('created_at', 'status', 'category', 'priority', 'arbitre_id')
+        loaded = all(field in self.__dict__ for field in fields)
+        self._stats_key = self.stats_key() if loaded else None
+    
+    def status_event(self, previous_status):
+        """Notification temps réel d'un changement de statut (core.push.publish_events)"""
+        return (
+            [self.complainant_id, self.respondent_id, self.arbitre_id],
+            'dispute_status',
+            {
+                'id': self.pk,
+                'dispute_id': self.dispute_id,
+                'previous_status': previous_status,
+                'status': self.status,
+            },
+        )
+    
     def assign_arbitre(self, arbitre):
         """Assigner un arbitre au litige"""
+        from .assignment import move_workload
+        
+        previous = self.arbitre_id if self.status in self.ACTIVE_STATUSES else None
         self.arbitre = arbitre
         self.status = 'ASSIGNED'
         self.assigned_at = timezone.now()
         self.save(update_fields=['arbitre', 'status', 'assigned_at'])
+        move_workload(previous, arbitre.pk)
     
     def start_review(self):
         """Commencer l'examen du litige"""
@@ -100,12 +183,16 @@ class Dispute(TimeStampedModel):
     
     def resolve(self, verdict, resolution_notes, refund_amount=None):
         """Résoudre le litige"""
+        from .assignment import move_workload
+        
+        previous = self.arbitre_id if self.status in self.ACTIVE_STATUSES else None
         self.verdict = verdict
         self.resolution_notes = resolution_notes
         self.refund_amount = refund_amount
         self.status = 'RESOLVED'
         self.resolved_at = timezone.now()
         self.save(update_fields=['verdict', 'resolution_notes', 'refund_amount', 'status', 'resolved_at'])
+        move_workload(previous, None)
     
     def can_be_assigned_to(self, arbitre):
         """Vérifier si le litige peut être assigné à cet arbitre"""
@@ -115,6 +202,118 @@ class Dispute(TimeStampedModel):
                 arbitre != self.respondent)
 
 
+class ArbitreWorkload(models.Model):
+    """
+    Charge courante d'un arbitre : litiges assignés non résolus
+
+    Tenue à jour à chaque assignation et résolution (disputes.assignment),
+    recalculée périodiquement par `rebuild_arbitre_workloads`.
+    """
+    arbitre = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='dispute_workload'
+    )
+    open_disputes = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        verbose_name = "Charge d'arbitre"
+        verbose_name_plural = "Charges d'arbitres"
+    
+    def __str__(self):
+        return f"{self.arbitre} - {self.open_disputes} litige(s)"
+
+
+class DisputeStatsBucket(models.Model):
+    """
+    Nombre de litiges par jour de création et par statut, catégorie,
+    priorité et arbitre courants (0 : aucun arbitre)
+
+    Tenu à jour à chaque transition (disputes.stats).
+    """
+    day = models.DateField()
+    status = models.CharField(max_length=20)
+    category = models.CharField(max_length=20)
+    priority = models.CharField(max_length=10)
+    arbitre_id = models.PositiveIntegerField(default=0)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "Statistique journalière de litiges"
+        verbose_name_plural = "Statistiques journalières de litiges"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'status', 'category', 'priority', 'arbitre_id'],
+                name='disputes_stats_bucket_unique',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.day} {self.status} {self.category}: {self.count}"
+
+
+class DisputeResolutionBucket(models.Model):
+    """
+    Histogramme des durées de résolution par jour de résolution, catégorie,
+    priorité et arbitre (voir disputes.stats.DURATION_BUCKETS_HOURS)
+    """
+    day = models.DateField()
+    category = models.CharField(max_length=20)
+    priority = models.CharField(max_length=10)
+    arbitre_id = models.PositiveIntegerField(default=0)
+    duration_bucket = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+    total_seconds = models.BigIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "Durées de résolution de litiges"
+        verbose_name_plural = "Durées de résolution de litiges"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'category', 'priority', 'arbitre_id', 'duration_bucket'],
+                name='disputes_resolution_bucket_unique',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.day} {self.category} #{self.duration_bucket}: {self.count}"
+
+
+class DisputeStatsTotal(models.Model):
+    """
+    Nombre total de litiges par statut et catégorie courants
+
+    Tenu à jour avec DisputeStatsBucket (disputes.stats) ; sa taille ne
+    dépend que des choix de statut et de catégorie.
+    """
+    status = models.CharField(max_length=20)
+    category = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "Total de litiges"
+        verbose_name_plural = "Totaux de litiges"
+        constraints = [
+            models.UniqueConstraint(fields=['status', 'category'], name='disputes_stats_total_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.status} {self.category}: {self.count}"
+
+
+class DisputeResolutionTotal(models.Model):
+    """Histogramme de toutes les durées de résolution, par tranche"""
+    duration_bucket = models.PositiveSmallIntegerField(unique=True)
+    count = models.IntegerField(default=0)
+    total_seconds = models.BigIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "Total des durées de résolution"
+        verbose_name_plural = "Totaux des durées de résolution"
+    
+    def __str__(self):
+        return f"#{self.duration_bucket}: {self.count}"
+
+
 class DisputeEvidence(TimeStampedModel):
     """Preuves soumises dans un litige"""
     EVIDENCE_TYPE_CHOICES = [
@@ -196,4 +395,100 @@ class DisputeResolution(TimeStampedModel):
         verbose_name_plural = "Résolutions de Litige"
     
     def __str__(self):
-        return f"Résolution {self.dispute.dispute_id}"
\ No newline at end of file
+        return f"Résolution {self.dispute.dispute_id}"
+
+class ResolutionOutbox(models.Model):
+    """
+    Mouvement de fonds à exécuter suite à la résolution d'un litige
+
+    Écrit dans la même transaction que la clôture du litige et le paiement
+    associé, puis transmis à `process_escrow_payment` par
+    `dispatch_resolution_outbox` (disputes.resolution) : un mouvement n'est
+    jamais perdu si l'envoi de la tâche échoue. Il reste ouvert jusqu'au
+    succès du paiement (COMPLETED) ; un paiement échoué est réessayé après
+    `next_attempt_at`, un paiement transmis resté sans résultat est repris.
+    """
+    ACTION_CHOICES = [
+        ('release', 'Libération au vendeur'),
+        ('refund', 'Remboursement à l\'acheteur'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('PENDING', 'À transmettre'),
+        ('DISPATCHED', 'Transmis'),
+        ('COMPLETED', 'Exécuté'),
+        ('FAILED', 'Échec définitif'),
+    ]
+    
+    dispute = models.ForeignKey(Dispute, on_delete=models.CASCADE, related_name='settlements')
+    transaction = models.ForeignKey(EscrowTransaction, on_delete=models.CASCADE, related_name='dispute_settlements')
+    payment = models.OneToOneField('payments.Payment', on_delete=models.PROTECT, related_name='dispute_settlement')
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Mouvement de résolution"
+        verbose_name_plural = "Mouvements de résolution"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['status', 'dispatched_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['dispute', 'action'], name='disputes_settlement_unique_action'),
+        ]
+    
+    def __str__(self):
+        return f"{self.dispute.dispute_id} - {self.action} ({self.status})"
+
+
+def case_bundle_upload_to(instance, filename):
+    """Chemin aléatoire dans le stockage privé : le nom d'un dossier ne se devine pas"""
+    return f"case_bundles/{uuid.uuid4().hex}/{filename}"
+
+
+class CaseBundle(TimeStampedModel):
+    """
+    Dossier complet d'un litige (archive zip) construit en tâche de fond
+
+    Identifié par l'empreinte de son contenu (disputes.bundles) : tant que
+    les pièces du dossier ne changent pas, l'archive existante est servie.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'En attente'),
+        ('RUNNING', 'En cours'),
+        ('COMPLETED', 'Terminé'),
+        ('FAILED', 'Échoué'),
+    ]
+    
+    dispute = models.ForeignKey(Dispute, on_delete=models.CASCADE, related_name='bundles')
+    content_hash = models.CharField(max_length=64, unique=True)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='case_bundles')
+    
+    # Traitement
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    # Pièces, preuves et échanges : stockage privé, servi par CaseBundleDownloadView seulement
+    file = models.FileField(upload_to=case_bundle_upload_to, storage=export_storage, null=True, blank=True)
+    file_size = models.PositiveBigIntegerField(default=0)
+    entry_count = models.PositiveIntegerField(default=0)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    error_message = models.TextField(blank=True)
+    
+    class Meta:
+        verbose_name = "Dossier de litige"
+        verbose_name_plural = "Dossiers de litige"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['dispute', '-created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Dossier {self.dispute.dispute_id} ({self.status})"
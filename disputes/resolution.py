@@ -0,0 +1,349 @@
+"""
+Exécution des verdicts : mouvements de fonds et clôture des litiges.
+
+Un litige RESOLVED est exécuté selon son verdict :
+
+- BUYER_FAVOR : remboursement intégral de l'acheteur (REFUNDED) ;
+- SELLER_FAVOR : libération des fonds au vendeur (RELEASED) ;
+- PARTIAL_REFUND : remboursement de `refund_amount` à l'acheteur et
+  libération du reste au vendeur (RELEASED, ou REFUNDED si le
+  remboursement couvre tout le montant).
+
+NO_FAULT ne détermine pas de bénéficiaire : le litige reste RESOLVED pour
+un traitement manuel.
+
+Pour un lot de litiges, une seule transaction SQL crée les `Payment`
+(REFUND / DISBURSEMENT, moyen de paiement de la collecte), les entrées de
+`ResolutionOutbox`, place les transactions escrow en DISPUTE le temps des
+paiements et clôt les litiges (CLOSED), par requêtes groupées. Les entrées
+de l'outbox ne sont transmises à `process_escrow_payment` qu'après
+validation.
+
+Une entrée reste ouverte jusqu'au succès de son paiement. La tâche
+périodique transmet les entrées en attente, réessaie les paiements échoués
+avec un délai croissant (`RESOLUTION_RETRY_DELAY`, doublé à chaque
+tentative) et reprend ceux restés sans résultat après
+`RESOLUTION_PROCESSING_TIMEOUT`. La transaction escrow ne prend son statut
+final (RELEASED / REFUNDED, journalisé dans `TransactionEvent`) qu'une fois
+tous les paiements du litige exécutés.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.push import publish_events
+from escrow.events import record_status_changes
+from escrow.models import EscrowTransaction
+from payments.models import Payment
+
+from .models import Dispute, ResolutionOutbox
+from .stats import record_transitions
+
+logger = logging.getLogger(__name__)
+
+EXECUTABLE_VERDICTS = ('BUYER_FAVOR', 'SELLER_FAVOR', 'PARTIAL_REFUND')
+
+# Statuts escrow dans lesquels les fonds sont encore en séquestre
+SETTLEABLE_STATUSES = ('FUNDS_HELD', 'DELIVERED', 'DISPUTE')
+
+
+class ResolutionError(Exception):
+    """Verdict impossible à exécuter"""
+
+
+def settlement_plan(dispute: Dispute, transaction_obj: EscrowTransaction) -> List[Tuple[str, Decimal]]:
+    """
+    Mouvements de fonds correspondant au verdict
+
+    Returns:
+        [(action, montant)] avec action 'refund' (acheteur) ou 'release' (vendeur)
+    """
+    amount = transaction_obj.amount
+    if dispute.verdict == 'BUYER_FAVOR':
+        return [('refund', amount)]
+    if dispute.verdict == 'SELLER_FAVOR':
+        return [('release', amount)]
+    if dispute.verdict == 'PARTIAL_REFUND':
+        if dispute.refund_amount is None or dispute.refund_amount <= 0:
+            raise ResolutionError("Montant du remboursement partiel manquant")
+        refund = min(dispute.refund_amount, amount)
+        plan = [('refund', refund)]
+        if amount - refund > 0:
+            plan.append(('release', amount - refund))
+        return plan
+    raise ResolutionError(f"Verdict non exécutable: {dispute.verdict}")
+
+
+def _collection_payments(transaction_ids) -> Dict[int, Payment]:
+    """Dernier paiement de collecte de chaque transaction (moyen de paiement à réutiliser)"""
+    payments = {}
+    rows = Payment.objects.filter(
+        transaction_id__in=transaction_ids, payment_type='COLLECTION'
+    ).order_by('transaction_id', '-created_at').only('transaction_id', 'payment_method_id', 'phone_number')
+    for payment in rows:
+        payments.setdefault(payment.transaction_id, payment)
+    return payments
+
+
+def execute_resolutions(dispute_ids: Iterable[int]) -> Dict:
+    """
+    Exécuter les verdicts d'un lot de litiges RESOLVED et les clore
+
+    Returns:
+        {'closed': [identifiants], 'skipped': {identifiant: raison}}
+    """
+    dispute_ids = list(dispute_ids)
+    closed, skipped = [], {}
+    if not dispute_ids:
+        return {'closed': closed, 'skipped': skipped}
+
+    with transaction.atomic():
+        disputes = list(
+            Dispute.objects.filter(pk__in=dispute_ids, status='RESOLVED')
+            .select_related('transaction', 'transaction__seller')
+            .select_for_update(skip_locked=True, of=('self', 'transaction'))
+        )
+        collections = _collection_payments([dispute.transaction_id for dispute in disputes])
+
+        now = timezone.now()
+        payments, entries = [], []
+        in_dispute = []
+        changes, events, transitions = [], [], []
+        for dispute in disputes:
+            transaction_obj = dispute.transaction
+            try:
+                if transaction_obj.status not in SETTLEABLE_STATUSES:
+                    raise ResolutionError(f"Transaction au statut {transaction_obj.status}")
+                collection = collections.get(transaction_obj.pk)
+                if collection is None:
+                    raise ResolutionError("Aucun paiement de collecte pour cette transaction")
+                plan = settlement_plan(dispute, transaction_obj)
+            except ResolutionError as e:
+                skipped[dispute.pk] = str(e)
+                continue
+
+            for action, amount in plan:
+                refund = action == 'refund'
+                payment = Payment(
+                    user_id=transaction_obj.buyer_id if refund else transaction_obj.seller_id,
+                    transaction=transaction_obj,
+                    payment_method_id=collection.payment_method_id,
+                    payment_type='REFUND' if refund else 'DISBURSEMENT',
+                    amount=amount,
+                    total_amount=amount,
+                    currency=transaction_obj.currency,
+                    phone_number=(
+                        collection.phone_number if refund
+                        else transaction_obj.seller.phone_number or ''
+                    ),
+                    description=f"Exécution du litige {dispute.dispute_id} ({dispute.verdict})",
+                    metadata={'dispute_id': dispute.pk, 'verdict': dispute.verdict},
+                )
+                payments.append(payment)
+                entries.append(ResolutionOutbox(
+                    dispute=dispute, transaction=transaction_obj, payment=payment,
+                    action=action, created_at=now,
+                ))
+
+            old_key = dispute.stats_key()
+            dispute.status = 'CLOSED'
+            changes.append((old_key, dispute.stats_key()))
+            events.append(dispute.status_event('RESOLVED'))
+            # Fonds bloqués jusqu'à l'exécution des paiements (statut final ensuite)
+            if transaction_obj.status != 'DISPUTE':
+                transitions.append((transaction_obj, transaction_obj.status))
+                transaction_obj.status = 'DISPUTE'
+                in_dispute.append(transaction_obj.pk)
+            closed.append(dispute.pk)
+
+        if closed:
+            Payment.objects.bulk_create(payments)
+            for entry in entries:
+                entry.payment_id = entry.payment.pk
+            ResolutionOutbox.objects.bulk_create(entries)
+
+            EscrowTransaction.objects.filter(pk__in=in_dispute).update(status='DISPUTE', updated_at=now)
+            Dispute.objects.filter(pk__in=closed).update(status='CLOSED', updated_at=now)
+            record_transitions(changes)
+            record_status_changes(transitions)
+            publish_events(events)
+
+            from .tasks import dispatch_resolution_outbox
+            transaction.on_commit(lambda: dispatch_resolution_outbox.delay())
+
+    for dispute_id, reason in skipped.items():
+        logger.warning(f"Litige {dispute_id} non exécuté: {reason}")
+    logger.info(f"{len(closed)} litige(s) exécuté(s) et clos, {len(skipped)} ignoré(s)")
+    return {'closed': closed, 'skipped': skipped}
+
+
+def close_resolved_disputes(batch_size: int = None) -> int:
+    """
+    Exécuter, par lots, tous les litiges RESOLVED dont le verdict est exécutable
+
+    Returns:
+        Le nombre de litiges clos
+    """
+    batch_size = batch_size or getattr(settings, 'DISPUTE_CLOSURE_BATCH_SIZE', 200)
+    closed = 0
+    last_id = 0
+    while True:
+        batch = list(
+            Dispute.objects.filter(
+                status='RESOLVED', verdict__in=EXECUTABLE_VERDICTS,
+                transaction__status__in=SETTLEABLE_STATUSES, pk__gt=last_id,
+            ).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            return closed
+        closed += len(execute_resolutions(batch)['closed'])
+        last_id = batch[-1]
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Délai avant la tentative suivante, doublé à chaque échec"""
+    base = getattr(settings, 'RESOLUTION_RETRY_DELAY', 60)
+    cap = getattr(settings, 'RESOLUTION_RETRY_MAX_DELAY', 3600)
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), cap))
+
+
+def finalize_settlements(dispute_ids: Iterable[int]) -> int:
+    """
+    Statut final des transactions dont tous les mouvements sont exécutés
+
+    Returns:
+        Le nombre de transactions passées en RELEASED ou REFUNDED
+    """
+    entries = defaultdict(list)
+    rows = ResolutionOutbox.objects.filter(dispute_id__in=list(dispute_ids)).values_list(
+        'transaction_id', 'action', 'status'
+    )
+    for transaction_id, action, status in rows:
+        entries[transaction_id].append((action, status))
+
+    final_statuses = {}
+    for transaction_id, movements in entries.items():
+        if all(status == 'COMPLETED' for _, status in movements):
+            released = any(action == 'release' for action, _ in movements)
+            final_statuses[transaction_id] = 'RELEASED' if released else 'REFUNDED'
+    if not final_statuses:
+        return 0
+
+    now = timezone.now()
+    with transaction.atomic():
+        transactions = list(
+            EscrowTransaction.objects.filter(pk__in=final_statuses, status__in=SETTLEABLE_STATUSES)
+            .select_for_update()
+        )
+        transitions = []
+        for transaction_obj in transactions:
+            transitions.append((transaction_obj, transaction_obj.status))
+            transaction_obj.status = final_statuses[transaction_obj.pk]
+
+        released = [obj.pk for obj in transactions if obj.status == 'RELEASED']
+        refunded = [obj.pk for obj in transactions if obj.status == 'REFUNDED']
+        EscrowTransaction.objects.filter(pk__in=released).update(
+            status='RELEASED', released_at=now, updated_at=now
+        )
+        EscrowTransaction.objects.filter(pk__in=refunded).update(status='REFUNDED', updated_at=now)
+        record_status_changes(transitions)
+    return len(transitions)
+
+
+def record_settlement_result(payment: Payment):
+    """
+    Reporter le résultat d'un paiement sur son mouvement de résolution
+
+    Succès : le mouvement est exécuté, puis la transaction prend son statut
+    final si c'était le dernier. Échec : le mouvement est remis en attente
+    avec un délai croissant, ou laissé en échec définitif au-delà de
+    `RESOLUTION_MAX_ATTEMPTS` tentatives.
+    """
+    entry = ResolutionOutbox.objects.filter(payment_id=payment.pk).only('id', 'dispute_id', 'attempts').first()
+    if entry is None:
+        return
+
+    now = timezone.now()
+    if payment.status == 'SUCCESS':
+        if ResolutionOutbox.objects.filter(pk=entry.pk).exclude(status='COMPLETED').update(
+            status='COMPLETED', completed_at=now
+        ):
+            finalize_settlements([entry.dispute_id])
+        return
+
+    pending = ResolutionOutbox.objects.filter(pk=entry.pk, status__in=('PENDING', 'DISPATCHED'))
+    if entry.attempts >= getattr(settings, 'RESOLUTION_MAX_ATTEMPTS', 8):
+        pending.update(status='FAILED', last_error=payment.failure_reason)
+        logger.error(f"Mouvement {entry.pk} abandonné après {entry.attempts} tentatives: {payment.failure_reason}")
+    else:
+        pending.update(
+            status='PENDING', next_attempt_at=now + retry_delay(entry.attempts),
+            last_error=payment.failure_reason
+        )
+
+
+def dispatch_outbox(batch_size: int = None) -> int:
+    """
+    Transmettre les mouvements à exécuter au pipeline de paiement
+
+    Sont transmis les mouvements en attente arrivés à échéance et les
+    mouvements transmis restés sans résultat après
+    `RESOLUTION_PROCESSING_TIMEOUT`. Un mouvement dont le paiement a abouti
+    entre-temps est seulement marqué exécuté.
+
+    Returns:
+        Le nombre de mouvements transmis
+    """
+    from escrow.tasks import process_escrow_payment
+
+    batch_size = batch_size or getattr(settings, 'RESOLUTION_OUTBOX_BATCH_SIZE', 100)
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=getattr(settings, 'RESOLUTION_PROCESSING_TIMEOUT', 900))
+    with transaction.atomic():
+        entries = list(
+            ResolutionOutbox.objects.filter(
+                Q(status='PENDING', next_attempt_at__lte=now)
+                | Q(status='DISPATCHED', dispatched_at__lte=stale_before)
+            ).order_by('id')
+            .select_for_update(skip_locked=True)
+            .only('id', 'dispute_id', 'transaction_id', 'payment_id', 'action', 'attempts')[:batch_size]
+        )
+        succeeded = set(
+            Payment.objects.filter(pk__in=[entry.payment_id for entry in entries], status='SUCCESS')
+            .values_list('pk', flat=True)
+        )
+
+        completed = [entry for entry in entries if entry.payment_id in succeeded]
+        to_send = [entry for entry in entries if entry.payment_id not in succeeded]
+        # Marquées avant l'envoi : le résultat d'une exécution immédiate n'est pas écrasé
+        ResolutionOutbox.objects.filter(pk__in=[entry.pk for entry in to_send]).update(
+            status='DISPATCHED', dispatched_at=now, attempts=F('attempts') + 1
+        )
+        if completed:
+            ResolutionOutbox.objects.filter(pk__in=[entry.pk for entry in completed]).update(
+                status='COMPLETED', completed_at=now
+            )
+            finalize_settlements({entry.dispute_id for entry in completed})
+
+        dispatched = []
+        for entry in to_send:
+            try:
+                process_escrow_payment.delay(entry.transaction_id, entry.action, entry.payment_id)
+            except Exception as e:
+                # Remise en attente : réessayée au prochain passage
+                ResolutionOutbox.objects.filter(pk=entry.pk).update(
+                    status='PENDING', last_error=str(e),
+                    next_attempt_at=now + retry_delay(entry.attempts + 1),
+                )
+                logger.error(f"Erreur transmission du mouvement {entry.pk}: {e}")
+                continue
+            dispatched.append(entry.pk)
+    return len(dispatched)
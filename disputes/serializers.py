@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Dispute, DisputeEvidence, DisputeComment, DisputeResolution
+from .models import CaseBundle, Dispute, DisputeEvidence, DisputeComment, DisputeResolution
+from core.serializers import StreamedFileSerializerMixin
 
 User = get_user_model()
 
@@ -33,15 +34,16 @@ class DisputeSerializer(serializers.ModelSerializer):
         ]
 
 
-class DisputeEvidenceSerializer(serializers.ModelSerializer):
+class DisputeEvidenceSerializer(StreamedFileSerializerMixin, serializers.ModelSerializer):
     """Serializer pour les preuves de litige"""
+    upload_policy = 'evidence'
     submitted_by_name = serializers.CharField(source='submitted_by.get_full_name', read_only=True)
     file_url = serializers.SerializerMethodField()
     
     class Meta:
         model = DisputeEvidence
         fields = [
-            'id', 'evidence_type', 'title', 'description', 'file', 'file_url',
+            'id', 'evidence_type', 'title', 'description', 'file', 'upload_id', 'file_url',
             'file_size', 'submitted_by', 'submitted_by_name', 'created_at'
         ]
         read_only_fields = [
@@ -90,3 +92,24 @@ class DisputeResolutionSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at']
 
+
+class CaseBundleSerializer(serializers.ModelSerializer):
+    """Serializer pour les dossiers de litige"""
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    download_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = CaseBundle
+        fields = [
+            'id', 'content_hash', 'status', 'status_display', 'download_url',
+            'file_size', 'entry_count', 'error_message', 'completed_at', 'created_at'
+        ]
+        read_only_fields = fields
+    
+    def get_download_url(self, obj):
+        if obj.status != 'COMPLETED' or not obj.file:
+            return None
+        from django.urls import reverse
+        url = reverse('dispute-bundle-download', args=[obj.dispute_id, obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
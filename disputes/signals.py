@@ -0,0 +1,88 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+import logging
+
+from core.push import publish_event, publish_events
+
+from .models import Dispute, DisputeComment
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Dispute)
+def push_dispute_status(sender, instance, created, **kwargs):
+    """
+    Notifier en temps réel les parties d'un changement de statut
+
+    Enregistré avant `update_dispute_stats`, qui renouvelle `_stats_key`.
+    """
+    old_key = getattr(instance, '_stats_key', None)
+    if created or old_key is None or old_key[1] == instance.status:
+        return
+    try:
+        publish_events([instance.status_event(old_key[1])])
+    except Exception as e:
+        logger.error(f"Erreur de notification du statut du litige: {e}")
+
+
+@receiver(post_save, sender=DisputeComment)
+def push_dispute_comment(sender, instance, created, **kwargs):
+    """Notifier en temps réel un nouveau commentaire (interne : arbitre seulement)"""
+    if not created:
+        return
+    try:
+        dispute = instance.dispute
+        recipients = [dispute.arbitre_id]
+        if not instance.is_internal:
+            recipients += [dispute.complainant_id, dispute.respondent_id]
+        publish_event(
+            recipients,
+            'dispute_comment',
+            {
+                'id': dispute.pk,
+                'dispute_id': dispute.dispute_id,
+                'comment_id': instance.pk,
+                'author_id': instance.author_id,
+                'comment': instance.comment,
+                'is_internal': instance.is_internal,
+                'created_at': instance.created_at,
+            }
+        )
+    except Exception as e:
+        logger.error(f"Erreur de notification du commentaire: {e}")
+
+
+@receiver(post_save, sender=Dispute)
+def update_dispute_stats(sender, instance, created, **kwargs):
+    """
+    Reporter la transition du litige dans les agrégats statistiques
+    """
+    try:
+        from .stats import record_resolution, record_transitions
+        
+        old_key = None if created else getattr(instance, '_stats_key', None)
+        if not created and old_key is None:
+            # Case d'origine inconnue (instance partielle) : corrigée au recalcul
+            return
+        
+        new_key = instance.stats_key()
+        record_transitions([(old_key, new_key)])
+        
+        was_resolved = old_key is not None and old_key[1] == 'RESOLVED'
+        if instance.status == 'RESOLVED' and not was_resolved:
+            record_resolution(instance)
+        
+    except Exception as e:
+        logger.error(f"Erreur mise à jour des statistiques de litiges: {e}")
+    finally:
+        instance.snapshot_stats_key()
+
+
+@receiver(post_delete, sender=Dispute)
+def remove_dispute_stats(sender, instance, **kwargs):
+    """Retirer le litige supprimé des agrégats"""
+    try:
+        from .stats import record_transitions
+        record_transitions([(getattr(instance, '_stats_key', None), None)])
+    except Exception as e:
+        logger.error(f"Erreur mise à jour des statistiques de litiges: {e}")
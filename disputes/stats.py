@@ -0,0 +1,216 @@
+"""
+Statistiques des litiges, servies depuis des tables d'agrégats.
+
+`DisputeStatsBucket` compte les litiges par jour de création et par
+statut, catégorie, priorité et arbitre courants : chaque transition
+décrémente l'ancienne case et incrémente la nouvelle. Les durées de
+résolution (`resolved_at - created_at`) alimentent l'histogramme
+`DisputeResolutionBucket`, d'où sont tirés la moyenne (exacte) et les
+percentiles (interpolés dans la tranche).
+
+Les mêmes changements alimentent des totaux toutes périodes confondues,
+par statut et catégorie (`DisputeStatsTotal`) et par tranche de durée
+(`DisputeResolutionTotal`), dont la taille ne dépend que des choix
+possibles. Les statistiques lisent ces totaux et les cases journalières
+des `days` derniers jours seulement : leur coût ne croît pas avec
+l'historique. `rebuild_rollups` (commande `rebuild_dispute_stats`)
+recalcule tous les agrégats depuis la table des litiges.
+"""
+
+import bisect
+from collections import Counter
+from datetime import timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    Dispute, DisputeResolutionBucket, DisputeResolutionTotal, DisputeStatsBucket, DisputeStatsTotal,
+)
+
+# Bornes supérieures des tranches de durée de résolution (heures)
+DURATION_BUCKETS_HOURS = [1, 6, 12, 24, 48, 72, 120, 168, 336, 720, 1440]
+
+PERCENTILES = (50, 90, 95)
+
+STATS_KEY_FIELDS = ('day', 'status', 'category', 'priority', 'arbitre_id')
+RESOLUTION_KEY_FIELDS = ('day', 'category', 'priority', 'arbitre_id', 'duration_bucket')
+TOTAL_KEY_FIELDS = ('status', 'category')
+
+StatsKey = Tuple  # (jour, statut, catégorie, priorité, arbitre)
+
+
+def duration_bucket(seconds: float) -> int:
+    """Indice de la tranche d'une durée de résolution"""
+    return bisect.bisect_left(DURATION_BUCKETS_HOURS, seconds / 3600)
+
+
+def _apply(model, key_fields, deltas: Dict[Tuple, Dict[str, int]]):
+    """Ajouter des valeurs aux cases d'un agrégat (créées au besoin)"""
+    # Cases à incrémenter : créées à zéro en une requête si elles manquent
+    missing = [model(**dict(zip(key_fields, key))) for key, values in deltas.items()
+               if any(value > 0 for value in values.values())]
+    if missing:
+        model.objects.bulk_create(missing, ignore_conflicts=True)
+    for key, values in deltas.items():
+        model.objects.filter(**dict(zip(key_fields, key))).update(
+            **{field: F(field) + value for field, value in values.items()}
+        )
+
+
+def record_transitions(changes: Iterable[Tuple[Optional[StatsKey], Optional[StatsKey]]]):
+    """Reporter des changements de case (ancienne, nouvelle) ; None : aucune"""
+    counts = Counter()
+    totals = Counter()
+    for old_key, new_key in changes:
+        if old_key == new_key:
+            continue
+        if old_key is not None:
+            counts[old_key] -= 1
+            totals[old_key[1:3]] -= 1
+        if new_key is not None:
+            counts[new_key] += 1
+            totals[new_key[1:3]] += 1
+    _apply(DisputeStatsBucket, STATS_KEY_FIELDS, {
+        key: {'count': delta} for key, delta in counts.items() if delta
+    })
+    _apply(DisputeStatsTotal, TOTAL_KEY_FIELDS, {
+        key: {'count': delta} for key, delta in totals.items() if delta
+    })
+
+
+def record_resolution(dispute: Dispute):
+    """Ajouter la durée de résolution d'un litige à l'histogramme"""
+    if not dispute.resolved_at or not dispute.created_at:
+        return
+    seconds = max((dispute.resolved_at - dispute.created_at).total_seconds(), 0)
+    key = (
+        timezone.localdate(dispute.resolved_at), dispute.category, dispute.priority,
+        dispute.arbitre_id or 0, duration_bucket(seconds),
+    )
+    values = {'count': 1, 'total_seconds': int(seconds)}
+    _apply(DisputeResolutionBucket, RESOLUTION_KEY_FIELDS, {key: values})
+    _apply(DisputeResolutionTotal, ('duration_bucket',), {(key[-1],): values})
+
+
+def _percentile(histogram: Dict[int, int], total: int, percentile: int) -> float:
+    """Percentile (en heures) interpolé dans la tranche qui le contient"""
+    target = total * percentile / 100
+    cumulative = 0
+    for index in sorted(histogram):
+        count = histogram[index]
+        if cumulative + count >= target:
+            lower = DURATION_BUCKETS_HOURS[index - 1] if index > 0 else 0
+            if index < len(DURATION_BUCKETS_HOURS):
+                upper = DURATION_BUCKETS_HOURS[index]
+            else:
+                # Dernière tranche ouverte : borne inférieure
+                return lower
+            return lower + (upper - lower) * (target - cumulative) / count
+        cumulative += count
+    return 0
+
+
+def resolution_time_stats() -> Dict:
+    """Durée moyenne et percentiles de résolution, en jours"""
+    rows = list(DisputeResolutionTotal.objects.filter(count__gt=0).values(
+        'duration_bucket', 'count', 'total_seconds'
+    ))
+    histogram = {row['duration_bucket']: row['count'] for row in rows}
+    total = sum(histogram.values())
+    if not total:
+        return {'average_days': 0, 'percentiles_days': {f'p{p}': 0 for p in PERCENTILES}}
+
+    total_seconds = sum(row['total_seconds'] for row in rows)
+    return {
+        'average_days': round(total_seconds / total / 86400, 2),
+        'percentiles_days': {
+            f'p{p}': round(_percentile(histogram, total, p) / 24, 2) for p in PERCENTILES
+        },
+    }
+
+
+def dispute_statistics(days: int = 30) -> Dict:
+    """Statistiques des litiges calculées depuis les agrégats"""
+    since = timezone.localdate() - timedelta(days=days)
+
+    by_status = Counter()
+    by_category = Counter()
+    for row in DisputeStatsTotal.objects.filter(count__gt=0).values('status', 'category', 'count'):
+        by_status[row['status']] += row['count']
+        by_category[row['category']] += row['count']
+    recent = DisputeStatsBucket.objects.filter(day__gte=since).aggregate(total=Sum('count'))['total'] or 0
+
+    resolution = resolution_time_stats()
+    return {
+        'total_disputes': sum(by_status.values()),
+        'open_disputes': by_status.get('OPEN', 0),
+        'resolved_disputes': by_status.get('RESOLVED', 0),
+        'disputes_this_month': recent,
+        'disputes_by_category': dict(by_category),
+        'disputes_by_status': dict(by_status),
+        'average_resolution_time_days': resolution['average_days'],
+        'resolution_time_percentiles_days': resolution['percentiles_days'],
+    }
+
+
+def rebuild_rollups() -> Tuple[int, int]:
+    """
+    Recalculer les agrégats depuis la table des litiges
+
+    Returns:
+        (nombre de cases de statut, nombre de tranches de résolution)
+    """
+    stats_rows = (
+        Dispute.objects.annotate(day=TruncDate('created_at'))
+        .values('day', 'status', 'category', 'priority', 'arbitre_id')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    stats = [
+        DisputeStatsBucket(
+            day=row['day'], status=row['status'], category=row['category'],
+            priority=row['priority'], arbitre_id=row['arbitre_id'] or 0, count=row['total'],
+        )
+        for row in stats_rows
+    ]
+
+    resolutions = {}
+    resolved = Dispute.objects.filter(resolved_at__isnull=False).values_list(
+        'created_at', 'resolved_at', 'category', 'priority', 'arbitre_id'
+    ).iterator()
+    for created_at, resolved_at, category, priority, arbitre_id in resolved:
+        seconds = max((resolved_at - created_at).total_seconds(), 0)
+        key = (timezone.localdate(resolved_at), category, priority, arbitre_id or 0, duration_bucket(seconds))
+        count, total = resolutions.get(key, (0, 0))
+        resolutions[key] = (count + 1, total + int(seconds))
+
+    totals = Counter()
+    for bucket in stats:
+        totals[(bucket.status, bucket.category)] += bucket.count
+    resolution_totals = {}
+    for key, (count, total) in resolutions.items():
+        previous_count, previous_total = resolution_totals.get(key[-1], (0, 0))
+        resolution_totals[key[-1]] = (previous_count + count, previous_total + total)
+
+    with transaction.atomic():
+        for model in (DisputeStatsBucket, DisputeResolutionBucket, DisputeStatsTotal, DisputeResolutionTotal):
+            model.objects.all().delete()
+        DisputeStatsBucket.objects.bulk_create(stats, batch_size=1000)
+        DisputeResolutionBucket.objects.bulk_create([
+            DisputeResolutionBucket(**dict(zip(RESOLUTION_KEY_FIELDS, key)), count=count, total_seconds=total)
+            for key, (count, total) in resolutions.items()
+        ], batch_size=1000)
+        DisputeStatsTotal.objects.bulk_create([
+            DisputeStatsTotal(status=status, category=category, count=count)
+            for (status, category), count in totals.items()
+        ])
+        DisputeResolutionTotal.objects.bulk_create([
+            DisputeResolutionTotal(duration_bucket=bucket, count=count, total_seconds=total)
+            for bucket, (count, total) in resolution_totals.items()
+        ])
+
+    return len(stats), len(resolutions)
@@ -0,0 +1,75 @@
+from celery import shared_task
+from django.core.cache import cache
+import logging
+
+from .assignment import SCHEDULE_KEY, assign_open_disputes, rebuild_workloads
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def assign_open_disputes_task(batch_size: int = None):
+    """Assigner les litiges ouverts aux arbitres les moins chargés (par lots)"""
+    cache.delete(SCHEDULE_KEY)
+    try:
+        return assign_open_disputes(batch_size)
+    except Exception as e:
+        logger.error(f"Erreur assignation automatique des litiges: {e}")
+        return 0
+
+
+@shared_task
+def rebuild_arbitre_workloads():
+    """Recalculer les compteurs de charge des arbitres"""
+    try:
+        counts = rebuild_workloads()
+        logger.info(f"Charges recalculées: {len(counts)} arbitre(s) avec des litiges actifs")
+    except Exception as e:
+        logger.error(f"Erreur recalcul des charges des arbitres: {e}")
+
+
+@shared_task
+def dispatch_resolution_outbox(batch_size: int = None):
+    """Transmettre au pipeline de paiement les mouvements de résolution en attente"""
+    from .resolution import dispatch_outbox
+    try:
+        return dispatch_outbox(batch_size)
+    except Exception as e:
+        logger.error(f"Erreur transmission des mouvements de résolution: {e}")
+        return 0
+
+
+@shared_task
+def close_resolved_disputes_task(batch_size: int = None):
+    """Exécuter les verdicts des litiges résolus et les clore (par lots)"""
+    from .resolution import close_resolved_disputes
+    try:
+        return close_resolved_disputes(batch_size)
+    except Exception as e:
+        logger.error(f"Erreur clôture des litiges résolus: {e}")
+        return 0
+
+
+@shared_task(bind=True, max_retries=0)
+def build_case_bundle(self, bundle_id: int):
+    """Construire l'archive zip d'un dossier de litige"""
+    from django.utils import timezone
+    from .bundles import build_bundle
+    from .models import CaseBundle
+    
+    claimed = CaseBundle.objects.filter(pk=bundle_id, status='PENDING').update(
+        status='RUNNING', updated_at=timezone.now()
+    )
+    if not claimed:
+        # Déjà construit ou en cours de construction
+        return
+    
+    bundle = CaseBundle.objects.get(pk=bundle_id)
+    try:
+        build_bundle(bundle)
+        logger.info(f"Dossier {bundle.id} construit ({bundle.entry_count} entrées, {bundle.file_size} octets)")
+    except Exception as e:
+        logger.error(f"Erreur construction du dossier {bundle_id}: {e}")
+        CaseBundle.objects.filter(pk=bundle_id).update(
+            status='FAILED', error_message=str(e), updated_at=timezone.now()
+        )
@@ -1,8 +1,11 @@
 import json
+from datetime import timedelta
 from io import BytesIO
 from PIL import Image
-from django.test import TestCase
+from django.conf import settings
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.test import APITestCase, APIClient
@@ -89,3 +92,656 @@ class DisputeTestCase(APITestCase):
         self.assertEqual(dispute.reason, 'PRODUCT_NOT_AS_DESCRIBED')
         self.assertEqual(dispute.status, 'OPEN')
         self.assertEqual(dispute.amount_disputed, 50000)
+
+
+class DisputeAssignmentTestCase(APITestCase):
+    """Tests pour l'assignation automatique des litiges"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        
+        self.buyer = User.objects.create_user(
+            email='buyer@example.com', password='TestPassword123!',
+            first_name='John', last_name='Buyer', kyc_status='VERIFIED'
+        )
+        self.seller = User.objects.create_user(
+            email='seller@example.com', password='TestPassword123!',
+            first_name='Jane', last_name='Seller', kyc_status='VERIFIED'
+        )
+        self.arbitre_a = User.objects.create_user(
+            email='arbitre-a@example.com', password='TestPassword123!',
+            first_name='Alice', last_name='Arbitre', role='ARBITRE', kyc_status='VERIFIED'
+        )
+        self.arbitre_b = User.objects.create_user(
+            email='arbitre-b@example.com', password='TestPassword123!',
+            first_name='Bob', last_name='Arbitre', role='ARBITRE', kyc_status='VERIFIED'
+        )
+    
+    def _dispute(self, priority='MEDIUM', buyer=None):
+        transaction = EscrowTransaction.objects.create(
+            buyer=buyer or self.buyer,
+            seller=self.seller,
+            title='Transaction litigieuse',
+            description='Transaction avec problème',
+            category='GOODS',
+            amount=100000,
+            delivery_address='Douala',
+            payment_deadline=timezone.now() + timedelta(days=1),
+            delivery_deadline=timezone.now() + timedelta(days=7),
+            status='DELIVERED'
+        )
+        return Dispute.objects.create(
+            transaction=transaction,
+            complainant=transaction.buyer,
+            respondent=self.seller,
+            category='DELIVERY_ISSUE',
+            title='Colis non reçu',
+            description='Le colis n\'est jamais arrivé',
+            priority=priority
+        )
+    
+    def _load(self, arbitre):
+        from .models import ArbitreWorkload
+        return ArbitreWorkload.objects.get(arbitre=arbitre).open_disputes
+    
+    def test_priority_order_and_least_loaded_arbitre(self):
+        """Les litiges urgents passent en premier, vers l'arbitre le moins chargé"""
+        from .assignment import assign_open_disputes
+        
+        self._dispute().assign_arbitre(self.arbitre_a)
+        low = self._dispute('LOW')
+        urgent = self._dispute('URGENT')
+        
+        self.assertEqual(assign_open_disputes(batch_size=1), 1)
+        urgent.refresh_from_db()
+        low.refresh_from_db()
+        self.assertEqual(urgent.status, 'ASSIGNED')
+        self.assertEqual(urgent.arbitre, self.arbitre_b)
+        self.assertEqual(low.status, 'OPEN')
+        
+        assign_open_disputes()
+        self.assertEqual(self._load(self.arbitre_a), 2)
+        self.assertEqual(self._load(self.arbitre_b), 1)
+    
+    def test_party_is_never_assigned(self):
+        """Un arbitre partie au litige n'en est jamais chargé"""
+        from .assignment import assign_open_disputes
+        
+        dispute = self._dispute(buyer=self.arbitre_b)
+        self._dispute().assign_arbitre(self.arbitre_a)
+        self._dispute().assign_arbitre(self.arbitre_a)
+        
+        assign_open_disputes()
+        dispute.refresh_from_db()
+        self.assertEqual(dispute.arbitre, self.arbitre_a)
+    
+    @override_settings(DISPUTE_ARBITRE_MAX_OPEN=1)
+    def test_capacity_is_respected(self):
+        """Les litiges restent ouverts quand tous les arbitres sont à pleine charge"""
+        from .assignment import assign_open_disputes
+        
+        for _ in range(3):
+            self._dispute()
+        
+        self.assertEqual(assign_open_disputes(), 2)
+        self.assertEqual(Dispute.objects.filter(status='OPEN').count(), 1)
+    
+    def test_batch_queries_do_not_grow_with_disputes(self):
+        """Le nombre de requêtes d'un lot ne dépend pas du nombre de litiges"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .assignment import assign_open_disputes, rebuild_workloads
+        
+        rebuild_workloads()
+        
+        def run(count):
+            for _ in range(count):
+                self._dispute()
+            with CaptureQueriesContext(connection) as context:
+                assign_open_disputes()
+            return [q for q in context.captured_queries if 'SAVEPOINT' not in q['sql']]
+        
+        self.assertEqual(len(run(2)), len(run(8)))
+    
+    def test_resolution_releases_workload(self):
+        """La résolution libère la charge de l'arbitre ; le recalcul concorde"""
+        from .assignment import assign_open_disputes, rebuild_workloads
+        
+        dispute = self._dispute()
+        assign_open_disputes()
+        dispute.refresh_from_db()
+        arbitre = dispute.arbitre
+        self.assertEqual(self._load(arbitre), 1)
+        
+        dispute.resolve('BUYER_FAVOR', 'Colis non livré')
+        self.assertEqual(self._load(arbitre), 0)
+        
+        rebuild_workloads()
+        self.assertEqual(self._load(arbitre), 0)
+    
+    def test_disputes_created_in_burst_share_one_batch(self):
+        """Une rafale de litiges ne planifie qu'un lot d'assignation"""
+        self.client.force_authenticate(user=self.buyer)
+        transactions = [self._dispute().transaction for _ in range(2)]
+        Dispute.objects.all().delete()
+        
+        with patch('disputes.tasks.assign_open_disputes_task.apply_async') as apply_async, \
+                self.captureOnCommitCallbacks(execute=True):
+            for transaction in transactions:
+                response = self.client.post(reverse('dispute-list-create'), {
+                    'transaction': transaction.pk,
+                    'category': 'DELIVERY_ISSUE',
+                    'title': 'Colis non reçu',
+                    'description': 'Le colis n\'est jamais arrivé',
+                }, format='json')
+                self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        apply_async.assert_called_once()
+        self.assertEqual(Dispute.objects.filter(respondent=self.seller).count(), 2)
+
+
+class DisputeStatsTestCase(APITestCase):
+    """Tests pour les agrégats statistiques des litiges"""
+    
+    setUp = DisputeAssignmentTestCase.setUp
+    _dispute = DisputeAssignmentTestCase._dispute
+    
+    def _rollups(self):
+        from .models import (
+            DisputeResolutionBucket, DisputeResolutionTotal, DisputeStatsBucket, DisputeStatsTotal,
+        )
+        stats = set(
+            DisputeStatsBucket.objects.filter(count__gt=0)
+            .values_list('day', 'status', 'category', 'priority', 'arbitre_id', 'count')
+        )
+        resolutions = set(
+            DisputeResolutionBucket.objects.filter(count__gt=0)
+            .values_list('day', 'category', 'priority', 'arbitre_id', 'duration_bucket', 'count', 'total_seconds')
+        )
+        totals = set(DisputeStatsTotal.objects.filter(count__gt=0).values_list('status', 'category', 'count'))
+        resolution_totals = set(
+            DisputeResolutionTotal.objects.filter(count__gt=0)
+            .values_list('duration_bucket', 'count', 'total_seconds')
+        )
+        return stats, resolutions, totals, resolution_totals
+    
+    def test_rollups_follow_transitions(self):
+        """Les agrégats tenus à jour concordent avec un recalcul complet"""
+        from .assignment import assign_open_disputes
+        from .stats import rebuild_rollups
+        
+        disputes = [self._dispute(priority) for priority in ('HIGH', 'LOW', 'MEDIUM')]
+        Dispute.objects.filter(pk=disputes[0].pk).update(created_at=timezone.now() - timedelta(days=3))
+        rebuild_rollups()
+        
+        assign_open_disputes()
+        self._dispute('URGENT').assign_arbitre(self.arbitre_b)
+        
+        for dispute in Dispute.objects.filter(pk__in=[disputes[0].pk, disputes[1].pk]):
+            dispute.resolve('BUYER_FAVOR', 'Colis non livré')
+        Dispute.objects.get(pk=disputes[2].pk).delete()
+        
+        maintained = self._rollups()
+        rebuild_rollups()
+        self.assertEqual(maintained, self._rollups())
+    
+    def test_statistics_endpoint(self):
+        """Les statistiques sont lues dans les agrégats, en nombre de requêtes constant"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .stats import rebuild_rollups
+        
+        resolved = self._dispute()
+        Dispute.objects.filter(pk=resolved.pk).update(created_at=timezone.now() - timedelta(days=2))
+        rebuild_rollups()
+        Dispute.objects.get(pk=resolved.pk).resolve('SELLER_FAVOR', 'Colis livré')
+        self._dispute()
+        
+        self.client.force_authenticate(user=self.arbitre_a)
+        
+        def fetch():
+            # last_activity est écrit par une tâche distincte (users.activity)
+            with patch('users.tasks.record_user_activity.delay'), CaptureQueriesContext(connection) as context:
+                response = self.client.get(reverse('dispute-statistics'))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return response.data['data'], len(context.captured_queries)
+        
+        data, queries = fetch()
+        self.assertEqual(data['total_disputes'], 2)
+        self.assertEqual(data['open_disputes'], 1)
+        self.assertEqual(data['resolved_disputes'], 1)
+        self.assertEqual(data['disputes_this_month'], 2)
+        self.assertAlmostEqual(data['average_resolution_time_days'], 2, places=1)
+        self.assertGreater(data['resolution_time_percentiles_days']['p50'], 0)
+        
+        for _ in range(5):
+            self._dispute()
+        data, more_queries = fetch()
+        self.assertEqual(data['total_disputes'], 7)
+        self.assertEqual(queries, more_queries)
+        
+        # Les litiges anciens ne comptent que dans les totaux
+        Dispute.objects.update(created_at=timezone.now() - timedelta(days=90))
+        rebuild_rollups()
+        data, _ = fetch()
+        self.assertEqual(data['total_disputes'], 7)
+        self.assertEqual(data['disputes_this_month'], 0)
+    
+    def test_rebuild_command(self):
+        """La commande recalcule les agrégats"""
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import DisputeStatsBucket
+        
+        self._dispute()
+        DisputeStatsBucket.objects.all().delete()
+        
+        out = StringIO()
+        call_command('rebuild_dispute_stats', stdout=out)
+        self.assertIn('recalculés', out.getvalue())
+        self.assertEqual(DisputeStatsBucket.objects.get().count, 1)
+
+
+class DisputeListQueryTestCase(APITestCase):
+    """Tests pour les listes de litiges par rôle"""
+    
+    setUp = DisputeAssignmentTestCase.setUp
+    _dispute = DisputeAssignmentTestCase._dispute
+    
+    def _ids(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {item['id'] for item in response.data['results']}
+    
+    def test_lists_scoped_by_role(self):
+        """Chaque rôle voit sa sélection de litiges"""
+        other_buyer = User.objects.create_user(
+            email='other@example.com', password='TestPassword123!',
+            first_name='Other', last_name='Buyer', kyc_status='VERIFIED'
+        )
+        mine = self._dispute()
+        mine.assign_arbitre(self.arbitre_a)
+        theirs = self._dispute(buyer=other_buyer)
+        theirs.assign_arbitre(self.arbitre_b)
+        open_dispute = self._dispute(buyer=other_buyer)
+        
+        url = reverse('dispute-list-create')
+        self.client.force_authenticate(user=self.arbitre_a)
+        self.assertEqual(self._ids(self.client.get(url)), {mine.pk, open_dispute.pk})
+        
+        self.client.force_authenticate(user=self.buyer)
+        self.assertEqual(self._ids(self.client.get(url)), {mine.pk})
+        
+        self.client.force_authenticate(user=self.seller)
+        self.assertEqual(self._ids(self.client.get(url)), {mine.pk, theirs.pk, open_dispute.pk})
+        
+        response = self.client.get(reverse('dispute-detail', args=[theirs.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(user=self.buyer)
+        response = self.client.get(reverse('dispute-detail', args=[theirs.pk]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_arbitre_queue_queries_do_not_grow(self):
+        """La file de l'arbitre est servie en un nombre constant de requêtes"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        self.client.force_authenticate(user=self.arbitre_a)
+        
+        def fetch(count):
+            for _ in range(count):
+                self._dispute().assign_arbitre(self.arbitre_a)
+                self._dispute()
+            with patch('users.tasks.record_user_activity.delay'), CaptureQueriesContext(connection) as context:
+                response = self.client.get(reverse('dispute-list-create'))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [q for q in context.captured_queries if 'SAVEPOINT' not in q['sql']]
+        
+        self.assertEqual(len(fetch(1)), len(fetch(5)))
+    
+    def test_keyset_pages(self):
+        """Les pages se suivent sans doublon ni COUNT"""
+        disputes = [self._dispute() for _ in range(5)]
+        self.client.force_authenticate(user=self.buyer)
+        
+        response = self.client.get(reverse('dispute-list-create'), {'page_size': 2})
+        seen = [item['id'] for item in response.data['results']]
+        self.assertNotIn('count', response.data)
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen.extend(item['id'] for item in response.data['results'])
+        
+        self.assertEqual(seen, [dispute.pk for dispute in reversed(disputes)])
+
+
+class DisputeResolutionTestCase(APITestCase):
+    """Tests pour l'exécution des verdicts"""
+    
+    _dispute = DisputeAssignmentTestCase._dispute
+    
+    def setUp(self):
+        from payments.models import PaymentMethod
+        DisputeAssignmentTestCase.setUp(self)
+        self.method = PaymentMethod.objects.create(name='MTN MoMo', provider='MTN_MOMO')
+    
+    def _resolved(self, verdict, refund_amount=None):
+        from payments.models import Payment
+        dispute = self._dispute()
+        EscrowTransaction.objects.filter(pk=dispute.transaction_id).update(status='DISPUTE')
+        Payment.objects.create(
+            user=self.buyer, transaction=dispute.transaction, payment_method=self.method,
+            payment_type='COLLECTION', amount=100000, phone_number='+237670000001', status='SUCCESS'
+        )
+        dispute.assign_arbitre(self.arbitre_a)
+        dispute.resolve(verdict, 'Décision', refund_amount)
+        return dispute
+    
+    def _settle(self, dispute, success=True):
+        """Exécuter les paiements du litige avec le résultat donné du prestataire"""
+        from escrow.tasks import process_escrow_payment
+        from .models import ResolutionOutbox
+        
+        result = {'success': True, 'transaction_id': 'PAY_1'} if success else {'success': False, 'error': 'Refusé'}
+        with patch('escrow.tasks._release_funds', return_value=result), \
+                patch('escrow.tasks._refund_funds', return_value=result), \
+                patch('escrow.tasks.send_transaction_notification.delay'):
+            for entry in ResolutionOutbox.objects.filter(dispute=dispute):
+                process_escrow_payment(entry.transaction_id, entry.action, entry.payment_id)
+    
+    def _payments(self, dispute):
+        return sorted(
+            (payment.payment_type, payment.user_id, payment.amount)
+            for payment in dispute.transaction.payments.exclude(payment_type='COLLECTION')
+        )
+    
+    def test_verdicts_map_to_escrow_movements(self):
+        """Chaque verdict produit les paiements et le statut escrow attendus"""
+        from .resolution import execute_resolutions
+        
+        buyer_favor = self._resolved('BUYER_FAVOR')
+        seller_favor = self._resolved('SELLER_FAVOR')
+        partial = self._resolved('PARTIAL_REFUND', 30000)
+        no_fault = self._resolved('NO_FAULT')
+        
+        result = execute_resolutions([buyer_favor.pk, seller_favor.pk, partial.pk, no_fault.pk])
+        self.assertCountEqual(result['closed'], [buyer_favor.pk, seller_favor.pk, partial.pk])
+        self.assertIn(no_fault.pk, result['skipped'])
+        
+        self.assertEqual(self._payments(buyer_favor), [('REFUND', self.buyer.pk, 100000)])
+        self.assertEqual(self._payments(seller_favor), [('DISBURSEMENT', self.seller.pk, 100000)])
+        self.assertEqual(self._payments(partial), [
+            ('DISBURSEMENT', self.seller.pk, 70000), ('REFUND', self.buyer.pk, 30000),
+        ])
+        
+        # Fonds en séquestre jusqu'à l'exécution des paiements
+        statuses = dict(EscrowTransaction.objects.values_list('pk', 'status'))
+        self.assertEqual(set(statuses.values()), {'DISPUTE'})
+        
+        for dispute in (buyer_favor, seller_favor, partial):
+            self._settle(dispute)
+        statuses = dict(EscrowTransaction.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[buyer_favor.transaction_id], 'REFUNDED')
+        self.assertEqual(statuses[seller_favor.transaction_id], 'RELEASED')
+        self.assertEqual(statuses[partial.transaction_id], 'RELEASED')
+        self.assertEqual(statuses[no_fault.transaction_id], 'DISPUTE')
+        self.assertEqual(Dispute.objects.get(pk=partial.pk).status, 'CLOSED')
+        self.assertEqual(Dispute.objects.get(pk=no_fault.pk).status, 'RESOLVED')
+        
+        # Une seconde exécution ne crée aucun paiement supplémentaire
+        self.assertEqual(execute_resolutions([buyer_favor.pk])['closed'], [])
+        self.assertEqual(len(self._payments(buyer_favor)), 1)
+    
+    def test_outbox_dispatched_after_commit_and_retried(self):
+        """L'outbox n'est transmise qu'après validation et réessayée en cas d'échec"""
+        from .models import ResolutionOutbox
+        from .resolution import dispatch_outbox, execute_resolutions
+        
+        dispute = self._resolved('PARTIAL_REFUND', 30000)
+        
+        with patch('escrow.tasks.process_escrow_payment.delay', side_effect=ConnectionError('broker')), \
+                self.captureOnCommitCallbacks(execute=True):
+            execute_resolutions([dispute.pk])
+        entries = ResolutionOutbox.objects.filter(dispute=dispute)
+        self.assertEqual({entry.status for entry in entries}, {'PENDING'})
+        self.assertEqual({entry.attempts for entry in entries}, {1})
+        
+        # Nouvel envoi à l'échéance du délai
+        with patch('escrow.tasks.process_escrow_payment.delay') as delay:
+            self.assertEqual(dispatch_outbox(), 0)
+            entries.update(next_attempt_at=timezone.now())
+            self.assertEqual(dispatch_outbox(), 2)
+        self.assertCountEqual(
+            [call.args for call in delay.call_args_list],
+            [(dispute.transaction_id, entry.action, entry.payment_id) for entry in entries],
+        )
+        self.assertEqual({entry.status for entry in entries.all()}, {'DISPATCHED'})
+    
+    def test_payment_processed_once(self):
+        """Un mouvement transmis deux fois n'est exécuté qu'une fois"""
+        from escrow.tasks import process_escrow_payment
+        from payments.models import Payment
+        from .resolution import execute_resolutions
+        
+        dispute = self._resolved('BUYER_FAVOR')
+        execute_resolutions([dispute.pk])
+        payment = Payment.objects.get(transaction=dispute.transaction, payment_type='REFUND')
+        
+        with patch('escrow.tasks._refund_funds', return_value={'success': True, 'transaction_id': 'REF_1'}) as refund, \
+                patch('escrow.tasks.send_transaction_notification.delay'):
+            process_escrow_payment(dispute.transaction_id, 'refund', payment.pk)
+            process_escrow_payment(dispute.transaction_id, 'refund', payment.pk)
+        
+        refund.assert_called_once()
+        self.assertEqual(refund.call_args.args[1], payment)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'SUCCESS')
+        self.assertEqual(payment.external_reference, 'REF_1')
+        self.assertEqual(EscrowTransaction.objects.get(pk=dispute.transaction_id).status, 'REFUNDED')
+        self.assertEqual(payment.dispute_settlement.status, 'COMPLETED')
+    
+    def test_failed_payment_retried_with_backoff(self):
+        """Un paiement échoué garde le mouvement ouvert et est réessayé après un délai"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import ResolutionOutbox
+        from .resolution import dispatch_outbox, execute_resolutions
+        
+        dispute = self._resolved('PARTIAL_REFUND', 30000)
+        execute_resolutions([dispute.pk])
+        ResolutionOutbox.objects.filter(dispute=dispute).update(status='DISPATCHED', attempts=1)
+        self._settle(dispute, success=False)
+        
+        entries = ResolutionOutbox.objects.filter(dispute=dispute)
+        self.assertEqual({entry.status for entry in entries}, {'PENDING'})
+        self.assertTrue(all(entry.next_attempt_at > timezone.now() for entry in entries))
+        self.assertEqual(EscrowTransaction.objects.get(pk=dispute.transaction_id).status, 'DISPUTE')
+        
+        # Pas de nouvelle tentative avant l'échéance
+        with patch('escrow.tasks.process_escrow_payment.delay') as delay:
+            self.assertEqual(dispatch_outbox(), 0)
+        delay.assert_not_called()
+        
+        entries.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        with patch('escrow.tasks._release_funds', return_value={'success': True, 'transaction_id': 'REL_2'}), \
+                patch('escrow.tasks._refund_funds', return_value={'success': True, 'transaction_id': 'REF_2'}), \
+                patch('escrow.tasks.send_transaction_notification.delay'):
+            self.assertEqual(dispatch_outbox(), 2)
+        
+        self.assertEqual({entry.status for entry in entries.all()}, {'COMPLETED'})
+        self.assertEqual({entry.attempts for entry in entries.all()}, {2})
+        self.assertEqual(EscrowTransaction.objects.get(pk=dispute.transaction_id).status, 'RELEASED')
+    
+    def test_stale_processing_payment_is_reclaimed(self):
+        """Un paiement resté en cours sans résultat est repris après le délai"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from payments.models import Payment
+        from .models import ResolutionOutbox
+        from .resolution import dispatch_outbox, execute_resolutions
+        
+        dispute = self._resolved('BUYER_FAVOR')
+        execute_resolutions([dispute.pk])
+        past = timezone.now() - timedelta(hours=1)
+        entry = ResolutionOutbox.objects.get(dispute=dispute)
+        ResolutionOutbox.objects.filter(pk=entry.pk).update(status='DISPATCHED', dispatched_at=past, attempts=1)
+        Payment.objects.filter(pk=entry.payment_id).update(status='PROCESSING', updated_at=past)
+        
+        with patch('escrow.tasks._refund_funds', return_value={'success': True, 'transaction_id': 'REF_3'}), \
+                patch('escrow.tasks.send_transaction_notification.delay'):
+            self.assertEqual(dispatch_outbox(), 1)
+        
+        self.assertEqual(Payment.objects.get(pk=entry.payment_id).status, 'SUCCESS')
+        self.assertEqual(EscrowTransaction.objects.get(pk=dispute.transaction_id).status, 'REFUNDED')
+    
+    def test_bulk_closure_queries_do_not_grow(self):
+        """La clôture par lot ne fait pas de requêtes par litige"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .resolution import close_resolved_disputes
+        
+        def run(count):
+            for _ in range(count):
+                self._resolved('SELLER_FAVOR')
+            with CaptureQueriesContext(connection) as context:
+                self.assertEqual(close_resolved_disputes(), count)
+            return [q for q in context.captured_queries if 'SAVEPOINT' not in q['sql']]
+        
+        self.assertEqual(len(run(2)), len(run(6)))
+        self.assertFalse(Dispute.objects.filter(status='RESOLVED').exists())
+    
+    def test_resolve_endpoint_executes_verdict(self):
+        """La résolution par l'arbitre exécute immédiatement le verdict"""
+        from payments.models import Payment
+        
+        dispute = self._dispute()
+        EscrowTransaction.objects.filter(pk=dispute.transaction_id).update(status='DISPUTE')
+        Payment.objects.create(
+            user=self.buyer, transaction=dispute.transaction, payment_method=self.method,
+            payment_type='COLLECTION', amount=100000, phone_number='+237670000001', status='SUCCESS'
+        )
+        dispute.assign_arbitre(self.arbitre_a)
+        
+        self.client.force_authenticate(user=self.arbitre_a)
+        url = reverse('resolve-dispute', args=[dispute.pk])
+        response = self.client.post(url, {'verdict': 'PARTIAL_REFUND', 'resolution_notes': 'Partiel'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        response = self.client.post(url, {'verdict': 'SELLER_FAVOR', 'resolution_notes': 'Livré'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['data']['executed'])
+        self.assertEqual(response.data['data']['dispute']['status'], 'CLOSED')
+
+
+class CaseBundleTestCase(APITestCase):
+    """Tests pour les dossiers de litige (archives zip)"""
+    
+    _dispute = DisputeAssignmentTestCase._dispute
+    
+    def setUp(self):
+        import shutil
+        import tempfile
+        
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        
+        DisputeAssignmentTestCase.setUp(self)
+        self.dispute = self._dispute()
+        self.dispute.assign_arbitre(self.arbitre_a)
+        self.video = bytes(range(256)) * 2048  # 512 Ko
+        self.addCleanup(self._delete_bundles)
+    
+    def _delete_bundles(self):
+        # Les archives sont écrites dans le stockage privé, hors MEDIA_ROOT
+        from .models import CaseBundle
+        for bundle in CaseBundle.objects.exclude(file=''):
+            bundle.file.delete(save=False)
+    
+    def _add_files(self):
+        from core.uploads import store_upload
+        from escrow.models import TransactionMessage, TransactionRating
+        
+        blob = store_upload(SimpleUploadedFile('video.mp4', self.video, content_type='video/mp4'))
+        DisputeEvidence.objects.create(
+            dispute=self.dispute, submitted_by=self.buyer, evidence_type='VIDEO',
+            title='Vidéo du colis', description='Déballage',
+            file=blob.file.name, file_hash=blob.sha256, file_size=blob.size
+        )
+        TransactionMessage.objects.create(
+            transaction=self.dispute.transaction, sender=self.buyer,
+            message='Où est mon colis <b>?</b>',
+            attachment=SimpleUploadedFile('recu.txt', b'Recu de paiement')
+        )
+        TransactionRating.objects.create(
+            transaction=self.dispute.transaction, rater=self.buyer, rated_user=self.seller, rating=2
+        )
+    
+    def _request(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('dispute-bundle', args=[self.dispute.pk]))
+    
+    def test_bundle_contents(self):
+        """L'archive contient les pièces, la transcription et le récapitulatif"""
+        import zipfile
+        from io import BytesIO
+        
+        self._add_files()
+        self.client.force_authenticate(user=self.arbitre_a)
+        
+        with patch('disputes.bundles.COPY_BUFFER_SIZE', 64 * 1024):
+            response = self._request()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        
+        response = self.client.get(reverse('dispute-bundle', args=[self.dispute.pk]))
+        self.assertEqual(response.data['data']['status'], 'COMPLETED')
+        bundle = self.dispute.bundles.get()
+        self.assertNotIn(str(settings.MEDIA_ROOT), bundle.file.path)
+        self.assertTrue(bundle.file.path.startswith(str(settings.PRIVATE_STORAGE_ROOT)))
+        
+        download = self.client.get(response.data['data']['download_url'])
+        self.assertEqual(download.status_code, status.HTTP_200_OK)
+        archive = zipfile.ZipFile(BytesIO(b''.join(download.streaming_content)))
+        names = archive.namelist()
+        
+        self.assertIn('dossier.json', names)
+        video_name = next(name for name in names if name.startswith('preuves_litige/'))
+        self.assertTrue(video_name.endswith('.mp4'))
+        self.assertEqual(archive.getinfo(video_name).compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(archive.read(video_name), self.video)
+        self.assertTrue(any(name.startswith('messages/') for name in names))
+        
+        transcript = archive.read('transcription.html').decode('utf-8')
+        self.assertIn('Où est mon colis &lt;b&gt;?&lt;/b&gt;', transcript)
+        summary = json.loads(archive.read('dossier.json'))
+        self.assertEqual(summary['evaluations'][0]['note'], 2)
+    
+    def test_bundle_cached_by_content(self):
+        """Un contenu inchangé réutilise l'archive ; une nouvelle pièce en produit une autre"""
+        from .models import CaseBundle
+        
+        self._add_files()
+        self.client.force_authenticate(user=self.arbitre_a)
+        first = self._request().data['data']
+        
+        with patch('disputes.tasks.build_case_bundle.delay') as delay:
+            response = self._request()
+        delay.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['id'], first['id'])
+        
+        DisputeComment.objects.create(dispute=self.dispute, author=self.arbitre_a, comment='Nouvelle pièce')
+        second = self._request().data['data']
+        self.assertNotEqual(second['content_hash'], first['content_hash'])
+        
+        # L'archive périmée est supprimée
+        self.assertEqual(list(CaseBundle.objects.values_list('id', flat=True)), [second['id']])
+    
+    def test_bundle_restricted_to_assigned_arbitre(self):
+        """Seuls les administrateurs et l'arbitre du litige accèdent au dossier"""
+        self.client.force_authenticate(user=self.arbitre_b)
+        self.assertEqual(self._request().status_code, status.HTTP_404_NOT_FOUND)
+        
+        self.client.force_authenticate(user=self.buyer)
+        self.assertEqual(self._request().status_code, status.HTTP_403_FORBIDDEN)
@@ -14,7 +14,13 @@ urlpatterns = [
     # Commentaires
     path('<int:dispute_id>/comments/', views.DisputeCommentListCreateView.as_view(), name='dispute-comments'),
     
+    # Dossier complet
+    path('<int:pk>/bundle/', views.CaseBundleView.as_view(), name='dispute-bundle'),
+    path('<int:pk>/bundle/<int:bundle_id>/download/', views.CaseBundleDownloadView.as_view(), name='dispute-bundle-download'),
+    
     # Administration
     path('admin/statistics/', views.dispute_statistics, name='dispute-statistics'),
+    path('admin/auto-assign/', views.AutoAssignDisputesView.as_view(), name='dispute-auto-assign'),
+    path('admin/close-resolved/', views.CloseResolvedDisputesView.as_view(), name='dispute-close-resolved'),
 ]
 
@@ -3,14 +3,23 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.contrib.auth import get_user_model
+from django.db import transaction as db_transaction
+from django.http import FileResponse
 from django.utils import timezone
-from django.db.models import Q, Count
 import logging
 
+from . import stats as dispute_stats
+from .assignment import assign_open_disputes, schedule_assignment
+from .bundles import request_bundle
+from .resolution import close_resolved_disputes, execute_resolutions
 from .models import Dispute, DisputeEvidence, DisputeComment
-from .serializers import DisputeSerializer, DisputeEvidenceSerializer, DisputeCommentSerializer
+from .serializers import (
+    CaseBundleSerializer, DisputeSerializer, DisputeEvidenceSerializer, DisputeCommentSerializer
+)
 from core.permissions import IsAdmin, IsArbitre, IsAdminOrArbitre, IsTransactionParticipant
+from core.pagination import KeysetPagination
 from core.utils import APIResponseMixin
+from core.uploads import check_content_length, release_upload, store_upload
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -20,40 +29,31 @@ class DisputeListCreateView(generics.ListCreateAPIView, APIResponseMixin):
     """Liste et création de litiges"""
     serializer_class = DisputeSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         user = self.request.user
         
         # Gestion du swagger fake view
-        if getattr(self, 'swagger_fake_view', False):
+        if getattr(self, 'swagger_fake_view', False) or not user.is_authenticated:
             return Dispute.objects.none()
         
-        # Vérifier si l'utilisateur est authentifié et a un profil
-        if not user.is_authenticated or not hasattr(user, 'profile'):
-            return Dispute.objects.none()
-        
-        if user.profile.role == 'ADMIN':
-            return Dispute.objects.all()
-        elif user.profile.role == 'ARBITRE':
-            return Dispute.objects.filter(
-                Q(arbitre=user) | Q(status='OPEN')
-            )
-        else:
-            return Dispute.objects.filter(
-                Q(complainant=user) | Q(respondent=user)
-            )
+        # Rôle lu sur l'utilisateur (claims du jeton), sans requête supplémentaire
+        return Dispute.objects.for_role(user).with_parties()
     
     def perform_create(self, serializer):
-        # L'utilisateur devient automatiquement le plaignant
-        dispute = serializer.save(complainant=self.request.user)
-        
-        # Déterminer le défendeur
-        transaction = dispute.transaction
+        # Déterminer le défendeur (requis dès l'insertion)
+        transaction = serializer.validated_data['transaction']
         if self.request.user == transaction.buyer:
-            dispute.respondent = transaction.seller
+            respondent = transaction.seller
         else:
-            dispute.respondent = transaction.buyer
-        dispute.save()
+            respondent = transaction.buyer
+        
+        # L'utilisateur devient automatiquement le plaignant
+        serializer.save(complainant=self.request.user, respondent=respondent)
+        
+        # Assignation automatique, par lot, des litiges ouverts
+        schedule_assignment()
 
 
 class DisputeDetailView(generics.RetrieveUpdateAPIView, APIResponseMixin):
@@ -65,19 +65,12 @@ class DisputeDetailView(generics.RetrieveUpdateAPIView, APIResponseMixin):
         user = self.request.user
         
         # Gestion du swagger fake view
-        if getattr(self, 'swagger_fake_view', False):
+        if getattr(self, 'swagger_fake_view', False) or not user.is_authenticated:
             return Dispute.objects.none()
         
-        # Vérifier si l'utilisateur est authentifié et a un profil
-        if not user.is_authenticated or not hasattr(user, 'profile'):
-            return Dispute.objects.none()
-        
-        if user.profile.role in ['ADMIN', 'ARBITRE']:
-            return Dispute.objects.all()
-        else:
-            return Dispute.objects.filter(
-                Q(complainant=user) | Q(respondent=user)
-            )
+        if user.role in ['ADMIN', 'ARBITRE']:
+            return Dispute.objects.with_parties()
+        return Dispute.objects.involving(user).with_parties()
 
 
 class AssignArbitreView(APIView, APIResponseMixin):
@@ -110,6 +103,33 @@ class AssignArbitreView(APIView, APIResponseMixin):
         })
 
 
+class AutoAssignDisputesView(APIView, APIResponseMixin):
+    """Lancer immédiatement un lot d'assignation automatique (admin uniquement)"""
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    
+    def post(self, request):
+        assigned = assign_open_disputes()
+        
+        return self.success_response({
+            'message': f'{assigned} litige(s) assigné(s)',
+            'assigned': assigned,
+            'remaining': Dispute.objects.filter(status='OPEN', arbitre__isnull=True).count(),
+        })
+
+
+class CloseResolvedDisputesView(APIView, APIResponseMixin):
+    """Exécuter les verdicts de tous les litiges résolus (admin uniquement)"""
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    
+    def post(self, request):
+        closed = close_resolved_disputes()
+        
+        return self.success_response({
+            'message': f'{closed} litige(s) exécuté(s) et clos',
+            'closed': closed,
+        })
+
+
 class ResolveDisputeView(APIView, APIResponseMixin):
     """Résoudre un litige"""
     permission_classes = [permissions.IsAuthenticated, IsArbitre]
@@ -127,11 +147,23 @@ class ResolveDisputeView(APIView, APIResponseMixin):
         if not verdict or not resolution_notes:
             return self.error_response("Verdict et notes de résolution requis")
         
-        dispute.resolve(verdict, resolution_notes, refund_amount)
+        if verdict not in dict(Dispute.VERDICT_CHOICES):
+            return self.error_response("Verdict invalide")
+        
+        if verdict == 'PARTIAL_REFUND' and not refund_amount:
+            return self.error_response("Montant du remboursement requis pour un remboursement partiel")
         
+        # Verdict et mouvements de fonds validés ensemble
+        with db_transaction.atomic():
+            dispute.resolve(verdict, resolution_notes, refund_amount)
+            execution = execute_resolutions([dispute.pk])
+        
+        dispute.refresh_from_db()
         return self.success_response({
             'message': 'Litige résolu avec succès',
-            'dispute': DisputeSerializer(dispute).data
+            'dispute': DisputeSerializer(dispute).data,
+            'executed': dispute.pk in execution['closed'],
+            'execution_error': execution['skipped'].get(dispute.pk),
         })
 
 
@@ -140,15 +172,31 @@ class DisputeEvidenceCreateView(generics.CreateAPIView, APIResponseMixin):
     serializer_class = DisputeEvidenceSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    def create(self, request, *args, **kwargs):
+        # Refuser les fichiers trop volumineux avant d'analyser le corps
+        if not check_content_length(request, 'evidence'):
+            return self.error_response(
+                "Le fichier est trop volumineux",
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        return super().create(request, *args, **kwargs)
+    
     def perform_create(self, serializer):
         dispute_id = self.kwargs['dispute_id']
         dispute = Dispute.objects.get(id=dispute_id)
         
         # Vérifier que l'utilisateur peut soumettre des preuves
-        if self.request.user not in [dispute.complainant, dispute.respondent, dispute.arbitre]:
+        if self.request.user.pk not in [dispute.complainant_id, dispute.respondent_id, dispute.arbitre_id]:
             raise permissions.PermissionDenied("Vous ne pouvez pas soumettre de preuves pour ce litige")
         
-        serializer.save(dispute=dispute, submitted_by=self.request.user)
+        file_obj = serializer.validated_data.get('file')
+        extra = {}
+        if file_obj:
+            blob = store_upload(file_obj)
+            extra = {'file': blob.file.name, 'file_hash': blob.sha256, 'file_size': blob.size}
+        
+        serializer.save(dispute=dispute, submitted_by=self.request.user, **extra)
+        release_upload(file_obj)
 
 
 class DisputeCommentListCreateView(generics.ListCreateAPIView, APIResponseMixin):
@@ -158,11 +206,10 @@ class DisputeCommentListCreateView(generics.ListCreateAPIView, APIResponseMixin)
     
     def get_queryset(self):
         dispute_id = self.kwargs['dispute_id']
-        queryset = DisputeComment.objects.filter(dispute_id=dispute_id)
+        queryset = DisputeComment.objects.filter(dispute_id=dispute_id).select_related('author')
         
         # Les commentaires internes ne sont visibles que par les arbitres et admins
-        if (hasattr(self.request.user, 'profile') and 
-            self.request.user.profile.role not in ['ADMIN', 'ARBITRE']):
+        if self.request.user.role not in ['ADMIN', 'ARBITRE']:
             queryset = queryset.filter(is_internal=False)
         
         return queryset.order_by('created_at')
@@ -172,44 +219,82 @@ class DisputeCommentListCreateView(generics.ListCreateAPIView, APIResponseMixin)
         dispute = Dispute.objects.get(id=dispute_id)
         
         # Vérifier que l'utilisateur peut commenter
-        allowed_users = [dispute.complainant, dispute.respondent]
-        if dispute.arbitre:
-            allowed_users.append(dispute.arbitre)
+        allowed_users = [dispute.complainant_id, dispute.respondent_id]
+        if dispute.arbitre_id:
+            allowed_users.append(dispute.arbitre_id)
         
-        if (self.request.user not in allowed_users and 
-            (not hasattr(self.request.user, 'profile') or 
-             self.request.user.profile.role != 'ADMIN')):
+        if self.request.user.pk not in allowed_users and self.request.user.role != 'ADMIN':
             raise permissions.PermissionDenied("Vous ne pouvez pas commenter ce litige")
         
         serializer.save(dispute=dispute, author=self.request.user)
 
 
+class CaseBundleMixin:
+    """Accès aux dossiers : administrateurs et arbitre du litige"""
+    
+    def get_dispute(self, request, pk):
+        dispute = Dispute.objects.with_parties().filter(pk=pk).first()
+        if dispute is None:
+            return None
+        if request.user.role != 'ADMIN' and dispute.arbitre_id != request.user.pk:
+            return None
+        return dispute
+
+
+class CaseBundleView(CaseBundleMixin, APIView, APIResponseMixin):
+    """Dossier complet d'un litige (archive zip construite en tâche de fond)"""
+    permission_classes = [permissions.IsAuthenticated, IsAdminOrArbitre]
+    
+    def get(self, request, pk):
+        dispute = self.get_dispute(request, pk)
+        if dispute is None:
+            return self.error_response("Litige non trouvé ou non assigné à vous", status_code=404)
+        
+        bundle = dispute.bundles.order_by('-created_at').first()
+        if bundle is None:
+            return self.error_response("Aucun dossier demandé pour ce litige", status_code=404)
+        return self.success_response(CaseBundleSerializer(bundle, context={'request': request}).data)
+    
+    def post(self, request, pk):
+        dispute = self.get_dispute(request, pk)
+        if dispute is None:
+            return self.error_response("Litige non trouvé ou non assigné à vous", status_code=404)
+        
+        bundle, queued = request_bundle(dispute, request.user)
+        ready = bundle.status == 'COMPLETED'
+        return self.success_response(
+            CaseBundleSerializer(bundle, context={'request': request}).data,
+            message="Dossier disponible" if ready else "Dossier en cours de préparation",
+            status_code=status.HTTP_200_OK if ready else status.HTTP_202_ACCEPTED
+        )
+
+
+class CaseBundleDownloadView(CaseBundleMixin, APIView, APIResponseMixin):
+    """Téléchargement en flux d'un dossier de litige"""
+    permission_classes = [permissions.IsAuthenticated, IsAdminOrArbitre]
+    
+    def get(self, request, pk, bundle_id):
+        dispute = self.get_dispute(request, pk)
+        bundle = dispute and dispute.bundles.filter(pk=bundle_id, status='COMPLETED').first()
+        if not bundle or not bundle.file:
+            return self.error_response("Dossier non trouvé", status_code=404)
+        
+        return FileResponse(
+            bundle.file.open('rb'),
+            as_attachment=True,
+            filename=f"dossier-{dispute.dispute_id}.zip",
+            content_type='application/zip'
+        )
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated, IsAdminOrArbitre])
 def dispute_statistics(request):
-    """Statistiques des litiges"""
-    from django.db.models import Avg
-    from datetime import timedelta
-    
-    now = timezone.now()
-    last_month = now - timedelta(days=30)
-    
-    stats = {
-        'total_disputes': Dispute.objects.count(),
-        'open_disputes': Dispute.objects.filter(status='OPEN').count(),
-        'resolved_disputes': Dispute.objects.filter(status='RESOLVED').count(),
-        'disputes_this_month': Dispute.objects.filter(created_at__gte=last_month).count(),
-        'disputes_by_category': dict(
-            Dispute.objects.values('category').annotate(count=Count('category')).values_list('category', 'count')
-        ),
-        'disputes_by_status': dict(
-            Dispute.objects.values('status').annotate(count=Count('status')).values_list('status', 'count')
-        ),
-        'average_resolution_time_days': 0,  # À calculer
-    }
+    """Statistiques des litiges (lues dans les agrégats)"""
+    stats = dispute_stats.dispute_statistics()
     
     return Response({
         'success': True,
         'data': stats,
-        'timestamp': now.isoformat()
+        'timestamp': timezone.now().isoformat()
     })
\ No newline at end of file
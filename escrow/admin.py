@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import EscrowTransaction, Milestone, Proof, TransactionMessage, TransactionRating
+from core.changelist import LargeTableAdminMixin
+from core.search import FullTextSearchAdminMixin
+from .models import EscrowTransaction, ExchangeRate, Milestone, Proof, TransactionMessage, TransactionRating
 
 
 class MilestoneInline(admin.TabularInline):
@@ -19,14 +21,21 @@ class ProofInline(admin.TabularInline):
 
 
 @admin.register(EscrowTransaction)
-class EscrowTransactionAdmin(admin.ModelAdmin):
+class EscrowTransactionAdmin(FullTextSearchAdminMixin, LargeTableAdminMixin, admin.ModelAdmin):
     inlines = (MilestoneInline, ProofInline)
     
     list_display = ('transaction_id', 'title', 'buyer', 'seller', 'amount', 'status', 
                    'created_at', 'delivery_deadline')
+    list_select_related = ('buyer', 'seller')
+    autocomplete_fields = ('buyer', 'seller')
+    ordering = ('-created_at', '-id')
     list_filter = ('status', 'category', 'auto_release_enabled', 'created_at')
-    search_fields = ('transaction_id', 'title', 'buyer__phone_number', 'seller__phone_number',
-                    'buyer__first_name', 'buyer__last_name', 'seller__first_name', 'seller__last_name')
+    # Titre et description par l'index plein texte, identifiants à l'égalité, noms en préfixe
+    search_fields = ('title', 'description')
+    search_index = 'transactions'
+    search_exact_fields = ('transaction_id', 'buyer__phone_number', 'seller__phone_number')
+    search_prefix_fields = ('buyer__first_name', 'buyer__last_name',
+                            'seller__first_name', 'seller__last_name')
     readonly_fields = ('transaction_id', 'commission', 'total_amount', 'funds_received_at',
                       'delivered_at', 'released_at', 'cancelled_at', 'created_at', 'updated_at')
     
@@ -71,10 +80,16 @@ class EscrowTransactionAdmin(admin.ModelAdmin):
         
         return readonly_fields
 
+    def get_prefix_term(self, term):
+        # Noms enregistrés en casse de titre (signal pre_save des utilisateurs)
+        return term.title()
+
 
 @admin.register(Milestone)
-class MilestoneAdmin(admin.ModelAdmin):
+class MilestoneAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('transaction', 'order', 'title', 'percentage', 'status', 'due_date')
+    list_select_related = ('transaction',)
+    raw_id_fields = ('transaction',)
     list_filter = ('status', 'created_at')
     search_fields = ('transaction__transaction_id', 'title')
     readonly_fields = ('completed_at', 'approved_at', 'completed_by', 'approved_by', 
@@ -106,8 +121,10 @@ class MilestoneAdmin(admin.ModelAdmin):
 
 
 @admin.register(Proof)
-class ProofAdmin(admin.ModelAdmin):
+class ProofAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('transaction', 'proof_type', 'title', 'submitted_by', 'is_verified', 'created_at')
+    list_select_related = ('transaction', 'submitted_by')
+    raw_id_fields = ('transaction', 'milestone')
     list_filter = ('proof_type', 'is_verified', 'created_at')
     search_fields = ('transaction__transaction_id', 'title', 'submitted_by__phone_number')
     readonly_fields = ('submitted_by', 'verified_at', 'verified_by', 'created_at', 'updated_at')
@@ -134,10 +151,15 @@ class ProofAdmin(admin.ModelAdmin):
 
 
 @admin.register(TransactionMessage)
-class TransactionMessageAdmin(admin.ModelAdmin):
+class TransactionMessageAdmin(FullTextSearchAdminMixin, LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('transaction', 'sender', 'message_preview', 'is_system_message', 'is_read', 'created_at')
+    list_select_related = ('transaction', 'sender')
+    raw_id_fields = ('transaction',)
+    ordering = ('-created_at', '-id')
     list_filter = ('is_system_message', 'is_read', 'created_at')
-    search_fields = ('transaction__transaction_id', 'sender__phone_number', 'message')
+    search_fields = ('message',)
+    search_index = 'messages'
+    search_exact_fields = ('transaction__transaction_id', 'sender__phone_number')
     readonly_fields = ('sender', 'created_at', 'read_at')
     
     def message_preview(self, obj):
@@ -146,8 +168,10 @@ class TransactionMessageAdmin(admin.ModelAdmin):
 
 
 @admin.register(TransactionRating)
-class TransactionRatingAdmin(admin.ModelAdmin):
+class TransactionRatingAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('transaction', 'rater', 'rated_user', 'rating', 'would_recommend', 'created_at')
+    list_select_related = ('transaction', 'rater', 'rated_user')
+    raw_id_fields = ('transaction',)
     list_filter = ('rating', 'would_recommend', 'created_at')
     search_fields = ('transaction__transaction_id', 'rater__phone_number', 'rated_user__phone_number')
     readonly_fields = ('rater', 'rated_user', 'created_at')
@@ -166,4 +190,16 @@ class TransactionRatingAdmin(admin.ModelAdmin):
             'fields': ('created_at',),
             'classes': ('collapse',)
         }),
-    )
\ No newline at end of file
+    )
+
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ('currency', 'rate', 'source', 'effective_at')
+    list_filter = ('currency', 'source')
+    readonly_fields = ('currency', 'rate', 'source', 'effective_at', 'created_at')
+    date_hierarchy = 'effective_at'
+    ordering = ('-effective_at',)
+    
+    def has_add_permission(self, request):
+        return False
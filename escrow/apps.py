@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class EscrowConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'escrow'
-    verbose_name = 'Transactions Escrow'
\ No newline at end of file
+    verbose_name = 'Transactions Escrow'
+    
+    def ready(self):
+        import escrow.signals
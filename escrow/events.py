@@ -0,0 +1,108 @@
+"""
+Journal des changements de statut des transactions escrow.
+
+Chaque transition (création, changement de statut) ajoute une ligne à
+`TransactionEvent` dans la même transaction SQL que le changement, puis est
+poussée en temps réel aux participants (`core.push`, événement
+`transaction_status` portant `event_id`).
+
+Les clients synchronisent les écarts par `/api/escrow/events/?since=<curseur>` :
+deux lectures bornées par index (acheteur, id) et (vendeur, id), sans
+recharger le détail des transactions.
+
+Les identifiants sont attribués à l'insertion, pas à la validation : une
+transaction SQL plus lente peut valider un identifiant inférieur au
+curseur déjà renvoyé. Le flux ne sert donc que les événements plus anciens
+que `ESCROW_EVENTS_COMMIT_LAG` secondes (durée maximale d'une transaction
+SQL) et s'arrête au premier événement plus récent ; le temps réel reste
+assuré par `core.push`.
+"""
+
+import heapq
+from datetime import timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.push import publish_events
+
+from .models import EscrowTransaction, TransactionEvent
+
+
+def record_status_changes(changes: Iterable[Tuple[EscrowTransaction, Optional[str]]]) -> List[TransactionEvent]:
+    """
+    Journaliser les transitions de transactions et les notifier
+
+    Args:
+        changes: [(transaction au nouveau statut, statut précédent ou None si créée)]
+    """
+    events = []
+    for transaction_obj, previous in changes:
+        event = TransactionEvent(
+            transaction_id=transaction_obj.pk,
+            buyer_id=transaction_obj.buyer_id,
+            seller_id=transaction_obj.seller_id,
+            event_type='CREATED' if previous is None else 'STATUS_CHANGED',
+            from_status=previous or '',
+            to_status=transaction_obj.status,
+            data={'transaction_id': transaction_obj.transaction_id},
+        )
+        events.append(event)
+    if not events:
+        return events
+
+    TransactionEvent.objects.bulk_create(events)
+    publish_events([
+        (
+            [event.buyer_id, event.seller_id],
+            'transaction_status',
+            {
+                'event_id': event.pk,
+                'transaction_id': event.data['transaction_id'],
+                'previous_status': event.from_status or None,
+                'status': event.to_status,
+            },
+        )
+        for event in events
+    ])
+    return events
+
+
+def get_feed_limit(limit=None) -> int:
+    maximum = getattr(settings, 'ESCROW_EVENTS_MAX_LIMIT', 500)
+    try:
+        limit = int(limit) if limit is not None else getattr(settings, 'ESCROW_EVENTS_PAGE_SIZE', 100)
+    except (TypeError, ValueError):
+        raise ValueError("Paramètre limit invalide")
+    return max(1, min(limit, maximum))
+
+
+def events_since(user, since: int = 0, limit: int = None) -> Tuple[List[TransactionEvent], bool]:
+    """
+    Événements des transactions de l'utilisateur postérieurs au curseur
+
+    Les événements des `ESCROW_EVENTS_COMMIT_LAG` dernières secondes ne sont
+    pas encore servis : le curseur ne dépasse jamais un identifiant dont la
+    transaction SQL pourrait ne pas être validée.
+
+    Returns:
+        (événements par identifiant croissant, d'autres événements suivent)
+    """
+    limit = get_feed_limit(limit)
+    visible_before = timezone.now() - timedelta(seconds=getattr(settings, 'ESCROW_EVENTS_COMMIT_LAG', 10))
+    branches = [
+        TransactionEvent.objects.filter(**{participant: user.pk, 'id__gt': since})
+        .order_by('id')[:limit + 1]
+        for participant in ('buyer_id', 'seller_id')
+    ]
+    events = []
+    for event in heapq.merge(*branches, key=lambda event: event.pk):
+        if events and events[-1].pk == event.pk:
+            continue
+        if event.created_at > visible_before:
+            break
+        events.append(event)
+        if len(events) > limit:
+            break
+    return events[:limit], len(events) > limit
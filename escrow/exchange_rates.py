@@ -0,0 +1,250 @@
+"""
+Taux de change des transactions internationales.
+
+Les taux (montant en XAF pour une unité de devise) sont chargés
+périodiquement depuis une source configurable (`EXCHANGE_RATE_SOURCE`) par
+la tâche `update_exchange_rates`, historisés dans `ExchangeRate`, puis
+publiés sous forme de table dans le cache partagé (Redis en production)
+et dans un cache local au processus. Les requêtes HTTP ne consultent que
+cette table : aucune source externe ni requête par conversion.
+"""
+
+import csv
+import json
+import logging
+import time
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+
+from .models import EscrowTransaction, ExchangeRate
+
+logger = logging.getLogger(__name__)
+
+BASE_CURRENCY = 'XAF'
+SUPPORTED_CURRENCIES = [code for code, _ in EscrowTransaction.CURRENCY_CHOICES]
+RATE_PRECISION = Decimal('0.000001')
+AMOUNT_PRECISION = Decimal('0.01')
+
+CACHE_KEY = 'exchange_rates:current'
+
+# Table courante conservée dans le processus
+_local_table = {'table': None, 'expires': 0.0}
+
+
+class RateTable:
+    """Table immuable des taux courants, exprimés en XAF par unité"""
+
+    def __init__(self, rates: Dict[str, Decimal], effective_at):
+        self.rates = {code: Decimal(str(rate)) for code, rate in rates.items()}
+        self.rates[BASE_CURRENCY] = Decimal('1')
+        self.effective_at = effective_at
+
+    def rate(self, from_currency: str, to_currency: str) -> Decimal:
+        """Taux pour convertir une unité de `from_currency` en `to_currency`"""
+        try:
+            return (self.rates[from_currency] / self.rates[to_currency]).quantize(RATE_PRECISION)
+        except KeyError as e:
+            raise ValueError(f"Devise non supportée: {e.args[0]}")
+
+    def convert(self, amount, from_currency: str, to_currency: str) -> Decimal:
+        """Convertir un montant"""
+        if from_currency == to_currency:
+            return Decimal(str(amount))
+        factor = self.rates[from_currency] / self.rates[to_currency]
+        return (Decimal(str(amount)) * factor).quantize(AMOUNT_PRECISION)
+
+    def convert_many(self, amounts: Iterable, currencies: Iterable[str], to_currency: str) -> List[Decimal]:
+        """
+        Convertir une série de montants en une seule passe
+
+        Le facteur de chaque devise est calculé une seule fois, puis appliqué
+        à tous les montants de cette devise.
+        """
+        amounts = list(amounts)
+        currencies = list(currencies)
+        if len(amounts) != len(currencies):
+            raise ValueError("Les montants et les devises doivent avoir la même longueur")
+
+        try:
+            factors = {
+                code: self.rates[code] / self.rates[to_currency]
+                for code in set(currencies)
+            }
+        except KeyError as e:
+            raise ValueError(f"Devise non supportée: {e.args[0]}")
+
+        return [
+            (Decimal(str(amount)) * factors[code]).quantize(AMOUNT_PRECISION)
+            for amount, code in zip(amounts, currencies)
+        ]
+
+    def to_dict(self) -> Dict:
+        return {
+            'rates': {code: str(rate) for code, rate in self.rates.items()},
+            'effective_at': self.effective_at.isoformat(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'RateTable':
+        return cls(data['rates'], parse_datetime(data['effective_at']))
+
+
+class ExchangeRateSource:
+    """Source de taux de change (montant en XAF pour une unité de devise)"""
+    name = 'base'
+
+    def fetch(self) -> Dict[str, Decimal]:
+        raise NotImplementedError
+
+
+class StubExchangeRateSource(ExchangeRateSource):
+    """Source locale à taux fixes (développement et tests)"""
+    name = 'stub'
+
+    RATES = {
+        'EUR': Decimal('655.957'),  # Parité fixe du franc CFA
+        'USD': Decimal('605.000'),
+        'GBP': Decimal('765.000'),
+    }
+
+    def fetch(self) -> Dict[str, Decimal]:
+        return dict(self.RATES)
+
+
+class FileExchangeRateSource(ExchangeRateSource):
+    """
+    Source lisant un fichier JSON ({"USD": "605.0", ...}) ou CSV
+    (colonnes currency,rate), chemin défini par `EXCHANGE_RATE_FILE`
+    """
+    name = 'file'
+
+    def __init__(self, path: str = None):
+        self.path = path or getattr(settings, 'EXCHANGE_RATE_FILE', None)
+
+    def fetch(self) -> Dict[str, Decimal]:
+        if not self.path:
+            raise ValueError("EXCHANGE_RATE_FILE n'est pas configuré")
+
+        with open(self.path, encoding='utf-8') as stream:
+            if self.path.endswith('.csv'):
+                return {row['currency']: row['rate'] for row in csv.DictReader(stream)}
+            return json.load(stream)
+
+
+def get_exchange_rate_source() -> ExchangeRateSource:
+    """Instancier la source configurée"""
+    path = getattr(settings, 'EXCHANGE_RATE_SOURCE', 'escrow.exchange_rates.StubExchangeRateSource')
+    return import_string(path)()
+
+
+def _validate_rates(raw_rates: Dict) -> Dict[str, Decimal]:
+    rates = {}
+    for code, value in raw_rates.items():
+        code = str(code).strip().upper()
+        if code == BASE_CURRENCY or code not in SUPPORTED_CURRENCIES:
+            continue
+        try:
+            rate = Decimal(str(value)).quantize(RATE_PRECISION)
+        except InvalidOperation:
+            raise ValueError(f"Taux invalide pour {code}: {value}")
+        if rate <= 0:
+            raise ValueError(f"Taux invalide pour {code}: {value}")
+        rates[code] = rate
+
+    missing = set(SUPPORTED_CURRENCIES) - set(rates) - {BASE_CURRENCY}
+    if missing:
+        raise ValueError(f"Taux manquants: {', '.join(sorted(missing))}")
+    return rates
+
+
+def _publish(table: RateTable):
+    """Publier la table dans le cache partagé et le cache local"""
+    cache.set(CACHE_KEY, table.to_dict(), getattr(settings, 'EXCHANGE_RATE_CACHE_TIMEOUT', 7200))
+    _local_table['table'] = table
+    _local_table['expires'] = time.monotonic() + getattr(settings, 'EXCHANGE_RATE_LOCAL_TTL', 60)
+
+
+def update_rates(source: ExchangeRateSource = None) -> RateTable:
+    """Charger les taux depuis la source, les historiser et publier la table"""
+    source = source or get_exchange_rate_source()
+    rates = _validate_rates(source.fetch())
+    effective_at = timezone.now()
+
+    ExchangeRate.objects.bulk_create([
+        ExchangeRate(currency=code, rate=rate, source=source.name, effective_at=effective_at)
+        for code, rate in rates.items()
+    ])
+
+    table = RateTable(rates, effective_at)
+    _publish(table)
+    return table
+
+
+def load_latest_rates() -> Optional[RateTable]:
+    """Reconstruire la table courante depuis l'historique"""
+    latest = ExchangeRate.objects.aggregate(latest=Max('effective_at'))['latest']
+    if latest is None:
+        return None
+
+    rates = dict(
+        ExchangeRate.objects.filter(effective_at=latest).values_list('currency', 'rate')
+    )
+    return RateTable(rates, latest)
+
+
+def get_rate_table() -> Optional[RateTable]:
+    """
+    Table courante : cache local, puis cache partagé, puis base
+
+    Returns:
+        None si aucun taux n'a encore été chargé
+    """
+    table = _local_table['table']
+    if table is not None and time.monotonic() < _local_table['expires']:
+        return table
+
+    data = cache.get(CACHE_KEY)
+    if data is not None:
+        table = RateTable.from_dict(data)
+        _local_table['table'] = table
+        _local_table['expires'] = time.monotonic() + getattr(settings, 'EXCHANGE_RATE_LOCAL_TTL', 60)
+        return table
+
+    table = load_latest_rates()
+    if table is not None:
+        _publish(table)
+    return table
+
+
+def clear_local_cache():
+    """Vider le cache local du processus"""
+    _local_table['table'] = None
+    _local_table['expires'] = 0.0
+
+
+def convert_totals(queryset, to_currency: str = BASE_CURRENCY, amount_field: str = 'amount',
+                   currency_field: str = 'currency', table: RateTable = None) -> Decimal:
+    """
+    Total d'un queryset converti dans une devise
+
+    Les montants sont agrégés par devise en SQL, puis chaque sous-total est
+    converti une seule fois.
+    """
+    table = table or get_rate_table()
+    if table is None:
+        raise ValueError("Aucun taux de change disponible")
+
+    rows = queryset.values(currency_field).annotate(total=Sum(amount_field)).order_by()
+    subtotals = [(row['total'] or Decimal('0'), row[currency_field]) for row in rows]
+    if not subtotals:
+        return Decimal('0.00')
+
+    amounts, currencies = zip(*subtotals)
+    return sum(table.convert_many(amounts, currencies, to_currency), Decimal('0.00'))
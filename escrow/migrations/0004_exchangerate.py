@@ -0,0 +1,30 @@
+# Generated by Django 5.0.8 on 2026-10-19 03:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escrow', '0003_facetofacedetails_internationaldetails_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(choices=[('XAF', 'Franc CFA'), ('USD', 'Dollar US'), ('EUR', 'Euro'), ('GBP', 'Livre Sterling')], max_length=3)),
+                ('rate', models.DecimalField(decimal_places=6, max_digits=18)),
+                ('source', models.CharField(max_length=50)),
+                ('effective_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Taux de change',
+                'verbose_name_plural': 'Taux de change',
+                'ordering': ['-effective_at'],
+                'indexes': [models.Index(fields=['currency', '-effective_at'], name='escrow_exch_currenc_240d1d_idx')],
+            },
+        ),
+    ]
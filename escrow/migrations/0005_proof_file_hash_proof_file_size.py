@@ -0,0 +1,23 @@
+# Generated by Django 5.0.8 on 2026-10-19 03:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escrow', '0004_exchangerate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proof',
+            name='file_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='proof',
+            name='file_size',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
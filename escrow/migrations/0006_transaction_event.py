@@ -0,0 +1,37 @@
+# Generated by Django 5.0.8 on 2026-10-19 04:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escrow', '0005_proof_file_hash_proof_file_size'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('event_type', models.CharField(choices=[('CREATED', 'Transaction créée'), ('STATUS_CHANGED', 'Changement de statut')], max_length=20)),
+                ('from_status', models.CharField(blank=True, max_length=20)),
+                ('to_status', models.CharField(choices=[('PENDING_FUNDS', 'En attente de fonds'), ('FUNDS_HELD', 'Fonds en séquestre'), ('DELIVERED', 'Livré'), ('RELEASED', 'Fonds libérés'), ('DISPUTE', 'En litige'), ('REFUNDED', 'Remboursé'), ('CANCELLED', 'Annulé')], max_length=20)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('buyer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='escrow.escrowtransaction')),
+            ],
+            options={
+                'verbose_name': 'Événement de transaction',
+                'verbose_name_plural': 'Événements de transaction',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['buyer', 'id'], name='escrow_tran_buyer_i_0b43b4_idx'), models.Index(fields=['seller', 'id'], name='escrow_tran_seller__cd3a68_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.8 on 2026-10-19 09:00
+
+from django.db import migrations
+
+from core.search import install_search_index, remove_search_index
+
+SEARCH_TABLES = {
+    'escrow_escrowtransaction': (('title', 'A'), ('description', 'B')),
+    'escrow_transactionmessage': (('message', 'A'),),
+}
+
+
+def install(apps, schema_editor):
+    for table, fields in SEARCH_TABLES.items():
+        install_search_index(schema_editor, table, fields)
+
+
+def remove(apps, schema_editor):
+    for table in SEARCH_TABLES:
+        remove_search_index(schema_editor, table)
+
+
+class Migration(migrations.Migration):
+    # Remplissage par lots validés séparément et CREATE INDEX CONCURRENTLY (PostgreSQL)
+    atomic = False
+
+    dependencies = [
+        ('escrow', '0006_transaction_event'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, remove),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.8 on 2026-10-19 04:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escrow', '0007_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='escrowtransaction',
+            index=models.Index(fields=['created_at', 'id'], name='escrow_escr_created_53642f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionmessage',
+            index=models.Index(fields=['created_at', 'id'], name='escrow_tran_created_3163a3_idx'),
+        ),
+    ]
@@ -108,11 +108,19 @@ class EscrowTransaction(TimeStampedModel):
             models.Index(fields=['auto_release_date']),
             models.Index(fields=['transaction_type']),
             models.Index(fields=['currency']),
+            models.Index(fields=['created_at', 'id']),
         ]
     
     def __str__(self):
         return f"{self.transaction_id} - {self.title} ({self.get_status_display()})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Statut enregistré en base, pour notifier ses changements (escrow.signals)
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+    
     def save(self, *args, **kwargs):
         if not self.commission:
             self.commission = calculate_commission(self.amount)
@@ -270,6 +278,9 @@ class TransactionMessage(TimeStampedModel):
         verbose_name = "Message de Transaction"
         verbose_name_plural = "Messages de Transaction"
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+        ]
     
     def __str__(self):
         return f"{self.transaction.transaction_id} - Message de {self.sender.get_full_name()}"
@@ -446,6 +457,8 @@ class Proof(TimeStampedModel):
     
     # Fichier et contenu
     file = models.FileField(upload_to='proofs/%Y/%m/%d/', null=True, blank=True)
+    file_size = models.PositiveIntegerField(null=True, blank=True)
+    file_hash = models.CharField(max_length=64, blank=True)  # SHA-256
     text_content = models.TextField(blank=True)
     
     # Géolocalisation
@@ -485,4 +498,65 @@ class Proof(TimeStampedModel):
         """Obtenir l'affichage de la localisation"""
         if self.has_location():
             return f"{self.latitude}, {self.longitude}"
-        return self.location_address or "Localisation non disponible"
\ No newline at end of file
+        return self.location_address or "Localisation non disponible"
+
+class ExchangeRate(models.Model):
+    """Historique des taux de change (montant en XAF pour une unité de devise)"""
+    currency = models.CharField(max_length=3, choices=EscrowTransaction.CURRENCY_CHOICES)
+    rate = models.DecimalField(max_digits=18, decimal_places=6)
+    source = models.CharField(max_length=50)
+    effective_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Taux de change"
+        verbose_name_plural = "Taux de change"
+        ordering = ['-effective_at']
+        indexes = [
+            models.Index(fields=['currency', '-effective_at']),
+        ]
+    
+    def __str__(self):
+        return f"1 {self.currency} = {self.rate} XAF ({self.effective_at:%d/%m/%Y %H:%M})"
+
+
+class TransactionEvent(models.Model):
+    """
+    Journal des changements de statut des transactions (flux de synchronisation)
+    
+    Chaque ligne est écrite une seule fois par `escrow.events` ; son
+    identifiant sert de curseur au flux `/api/escrow/events/`.
+    """
+    EVENT_TYPE_CHOICES = [
+        ('CREATED', 'Transaction créée'),
+        ('STATUS_CHANGED', 'Changement de statut'),
+    ]
+    
+    id = models.BigAutoField(primary_key=True)
+    transaction = models.ForeignKey(EscrowTransaction, on_delete=models.CASCADE, related_name='events')
+    # Participants copiés depuis la transaction : lecture du flux par index (participant, id)
+    buyer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPE_CHOICES)
+    from_status = models.CharField(max_length=20, blank=True)
+    to_status = models.CharField(max_length=20, choices=EscrowTransaction.STATUS_CHOICES)
+    data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        verbose_name = "Événement de transaction"
+        verbose_name_plural = "Événements de transaction"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['buyer', 'id']),
+            models.Index(fields=['seller', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.transaction_id} - {self.from_status or '∅'} → {self.to_status}"
+    
+    def save(self, *args, **kwargs):
+        if self.pk is not None and not self._state.adding:
+            raise ValueError("Le journal des transactions n'accepte pas de modification")
+        super().save(*args, **kwargs)
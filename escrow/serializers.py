@@ -3,9 +3,10 @@ from django.contrib.auth import get_user_model
 from django.utils import timezone
 from .models import (
     EscrowTransaction, Milestone, Proof, TransactionMessage, TransactionRating,
-    FaceToFaceDetails, InternationalDetails
+    FaceToFaceDetails, InternationalDetails, TransactionEvent
 )
 from core.utils import is_amount_valid
+from core.serializers import StreamedFileSerializerMixin
 
 User = get_user_model()
 
@@ -113,8 +114,9 @@ class InternationalDetailsSerializer(serializers.ModelSerializer):
         return None
 
 
-class ProofSerializer(serializers.ModelSerializer):
+class ProofSerializer(StreamedFileSerializerMixin, serializers.ModelSerializer):
     """Serializer pour les preuves avec géolocalisation"""
+    upload_policy = 'proof'
     submitted_by_name = serializers.CharField(source='submitted_by.get_full_name', read_only=True)
     verified_by_name = serializers.CharField(source='verified_by.get_full_name', read_only=True)
     file_url = serializers.SerializerMethodField()
@@ -124,7 +126,7 @@ class ProofSerializer(serializers.ModelSerializer):
     class Meta:
         model = Proof
         fields = [
-            'id', 'proof_type', 'title', 'description', 'file', 'file_url',
+            'id', 'proof_type', 'title', 'description', 'file', 'upload_id', 'file_url',
             'text_content', 'latitude', 'longitude', 'location_address', 'location_accuracy',
             'location_display', 'has_location', 'metadata', 'submitted_by', 'submitted_by_name',
             'is_verified', 'verified_at', 'verified_by', 'verified_by_name',
@@ -168,6 +170,19 @@ class TransactionMessageSerializer(serializers.ModelSerializer):
         return None
 
 
+class TransactionEventSerializer(serializers.ModelSerializer):
+    """Serializer pour le flux des changements de statut"""
+    transaction_reference = serializers.CharField(source='data.transaction_id', read_only=True)
+    
+    class Meta:
+        model = TransactionEvent
+        fields = [
+            'id', 'transaction', 'transaction_reference', 'event_type',
+            'from_status', 'to_status', 'created_at'
+        ]
+        read_only_fields = fields
+
+
 class TransactionRatingSerializer(serializers.ModelSerializer):
     """Serializer pour les évaluations"""
     rater_name = serializers.CharField(source='rater.get_full_name', read_only=True)
@@ -401,6 +416,12 @@ class EscrowTransactionCreateSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     {"international_data": "La devise du vendeur est obligatoire pour les transactions internationales."}
                 )
+            supported = [code for code, _ in EscrowTransaction.CURRENCY_CHOICES]
+            for field in ('buyer_currency', 'seller_currency'):
+                if international_data[field] not in supported:
+                    raise serializers.ValidationError(
+                        {"international_data": f"Devise non supportée: {international_data[field]}"}
+                    )
         
         elif transaction_type == 'MILESTONE':
             milestones_data = attrs.get('milestones_data', [])
@@ -446,6 +467,17 @@ class EscrowTransactionCreateSerializer(serializers.ModelSerializer):
             )
         
         elif transaction.transaction_type == 'INTERNATIONAL':
+            if not international_data.get('exchange_rate'):
+                # Table des taux en cache : pas de consultation de la source ici
+                from .exchange_rates import get_rate_table
+                rate_table = get_rate_table()
+                if rate_table is not None:
+                    international_data['exchange_rate'] = rate_table.rate(
+                        international_data['buyer_currency'],
+                        international_data['seller_currency']
+                    )
+                    international_data['exchange_rate_date'] = rate_table.effective_at
+            
             InternationalDetails.objects.create(
                 transaction=transaction,
                 **international_data
@@ -0,0 +1,43 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+import logging
+
+from core.push import publish_event
+
+from .events import record_status_changes
+from .models import EscrowTransaction, TransactionMessage
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=TransactionMessage)
+def push_transaction_message(sender, instance, created, **kwargs):
+    """Notifier en temps réel les participants d'un nouveau message"""
+    if not created:
+        return
+    try:
+        transaction_obj = instance.transaction
+        publish_event(
+            [transaction_obj.buyer_id, transaction_obj.seller_id],
+            'message',
+            {
+                'transaction_id': transaction_obj.transaction_id,
+                'message_id': instance.pk,
+                'sender_id': instance.sender_id,
+                'message': instance.message,
+                'is_system_message': instance.is_system_message,
+                'created_at': instance.created_at,
+            }
+        )
+    except Exception as e:
+        logger.error(f"Erreur de notification du message: {e}")
+
+
+@receiver(post_save, sender=EscrowTransaction)
+def record_transaction_status(sender, instance, created, **kwargs):
+    """Journaliser (et notifier) la création ou le changement de statut"""
+    previous = getattr(instance, '_loaded_status', None)
+    instance._loaded_status = instance.status
+    if not created and (previous is None or previous == instance.status):
+        return
+    record_status_changes([(instance, None if created else previous)])
@@ -31,7 +31,7 @@ def send_transaction_notification(transaction_id, event_type, message, user_id=N
                 send_notification_email(user.email, subject, message)
             
             # SMS notification si activé
-            if hasattr(user, 'profile') and user.profile.sms_notifications:
+            if user.get_profile().sms_notifications:
                 sms_message = f"Kimi Escrow: {message[:140]}"  # Limiter à 140 caractères
                 sms_service.send_notification_sms(user.phone_number, sms_message)
         
@@ -63,11 +63,26 @@ def send_milestone_notification(milestone_id, event_type, message):
 
 
 @shared_task
-def process_escrow_payment(transaction_id, action):
-    """Traiter un paiement escrow (collecte ou libération)"""
+def process_escrow_payment(transaction_id, action, payment_id=None):
+    """
+    Traiter un paiement escrow (collecte, libération ou remboursement)
+    
+    Avec `payment_id` (exécution d'un litige), le `Payment` correspondant
+    fixe le montant et le bénéficiaire et porte le résultat ; il n'est
+    exécuté qu'une fois avec succès, même si la tâche est transmise
+    plusieurs fois. Le statut final de la transaction est fixé par
+    `disputes.resolution` une fois tous les paiements du litige exécutés.
+    """
     try:
         transaction_obj = EscrowTransaction.objects.get(id=transaction_id)
         
+        payment = None
+        if payment_id:
+            payment = _claim_payment(payment_id)
+            if payment is None:
+                logger.info(f"Paiement {payment_id} déjà traité, ignoré")
+                return
+        
         if action == 'collect':
             # Collecter les fonds depuis le mobile money
             result = _collect_funds(transaction_obj)
@@ -91,7 +106,9 @@ def process_escrow_payment(transaction_id, action):
         
         elif action == 'release':
             # Libérer les fonds vers le vendeur
-            result = _release_funds(transaction_obj)
+            result = _release_funds(transaction_obj, payment)
+            if payment:
+                _record_payment_result(transaction_obj, payment, result)
             
             if result['success']:
                 send_transaction_notification.delay(
@@ -108,11 +125,15 @@ def process_escrow_payment(transaction_id, action):
         
         elif action == 'refund':
             # Rembourser les fonds à l'acheteur
-            result = _refund_funds(transaction_obj)
+            result = _refund_funds(transaction_obj, payment)
+            if payment:
+                _record_payment_result(transaction_obj, payment, result)
             
             if result['success']:
-                transaction_obj.status = 'REFUNDED'
-                transaction_obj.save()
+                # Statut déjà fixé par l'exécution d'un litige
+                if payment is None:
+                    transaction_obj.status = 'REFUNDED'
+                    transaction_obj.save()
                 
                 send_transaction_notification.delay(
                     transaction_id,
@@ -243,6 +264,62 @@ def send_delivery_reminders():
         logger.error(f"Erreur envoi rappels de livraison: {e}")
 
 
+@shared_task
+def update_exchange_rates():
+    """Charger les taux de change depuis la source configurée et publier la table"""
+    from .exchange_rates import update_rates
+    
+    try:
+        table = update_rates()
+        logger.info(f"Taux de change mis à jour: {table.rates}")
+        return {code: str(rate) for code, rate in table.rates.items()}
+    except Exception as e:
+        logger.error(f"Erreur mise à jour des taux de change: {e}")
+        raise
+
+def _claim_payment(payment_id):
+    """
+    Passer un paiement en PROCESSING (None s'il est en cours ou déjà exécuté)
+
+    Un paiement PENDING ou FAILED (nouvelle tentative), ou PROCESSING depuis
+    plus de `RESOLUTION_PROCESSING_TIMEOUT` (exécution interrompue), peut
+    être pris.
+    """
+    from django.conf import settings
+    from django.db.models import Q
+    from payments.models import Payment
+    
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=getattr(settings, 'RESOLUTION_PROCESSING_TIMEOUT', 900))
+    claimable = Q(status__in=('PENDING', 'FAILED')) | Q(status='PROCESSING', updated_at__lte=stale_before)
+    if not Payment.objects.filter(claimable, pk=payment_id).update(status='PROCESSING', updated_at=now):
+        return None
+    return Payment.objects.get(pk=payment_id)
+
+
+def _record_payment_result(transaction, payment, result):
+    """Enregistrer le résultat du prestataire et débiter le compte séquestre"""
+    payment.processed_at = timezone.now()
+    payment.provider_response = result
+    if result['success']:
+        payment.status = 'SUCCESS'
+        payment.external_reference = result.get('transaction_id', '')
+    else:
+        payment.status = 'FAILED'
+        payment.failure_reason = result.get('error', '')
+    payment.save(update_fields=[
+        'status', 'external_reference', 'failure_reason', 'provider_response', 'processed_at', 'updated_at'
+    ])
+    
+    account = getattr(transaction, 'escrow_account', None) if result['success'] else None
+    if account is not None and not account.debit(payment.amount, payment=payment, description=payment.description):
+        logger.error(f"Solde séquestre insuffisant pour le paiement {payment.reference}")
+    
+    # Mouvement de résolution d'un litige : réessai ou statut final de la transaction
+    from disputes.resolution import record_settlement_result
+    record_settlement_result(payment)
+
+
 def _collect_funds(transaction):
     """Collecter les fonds depuis le mobile money"""
     try:
@@ -262,8 +339,10 @@ def _collect_funds(transaction):
         return {'success': False, 'error': str(e)}
 
 
-def _release_funds(transaction):
-    """Libérer les fonds vers le vendeur"""
+def _release_funds(transaction, payment=None):
+    """Libérer les fonds vers le vendeur (montant et numéro du paiement s'il est fourni)"""
+    amount = payment.amount if payment else transaction.amount
+    phone_number = payment.phone_number if payment else transaction.seller.phone_number
     try:
         # Intégration avec l'API bancaire/mobile money
         # Cette fonction sera implémentée avec l'API réelle
@@ -273,7 +352,12 @@ def _release_funds(transaction):
         success = random.choice([True, True, True, True, False])  # 80% de succès
         
         if success:
-            return {'success': True, 'transaction_id': f"REL_{transaction.id}_{timezone.now().timestamp()}"}
+            return {
+                'success': True,
+                'transaction_id': f"REL_{transaction.id}_{timezone.now().timestamp()}",
+                'amount': str(amount),
+                'phone_number': phone_number,
+            }
         else:
             return {'success': False, 'error': 'Erreur de traitement bancaire'}
         
@@ -281,8 +365,10 @@ def _release_funds(transaction):
         return {'success': False, 'error': str(e)}
 
 
-def _refund_funds(transaction):
-    """Rembourser les fonds à l'acheteur"""
+def _refund_funds(transaction, payment=None):
+    """Rembourser les fonds à l'acheteur (montant et numéro du paiement s'il est fourni)"""
+    amount = payment.amount if payment else transaction.amount
+    phone_number = payment.phone_number if payment else transaction.buyer.phone_number
     try:
         # Intégration avec l'API bancaire/mobile money
         # Cette fonction sera implémentée avec l'API réelle
@@ -292,7 +378,12 @@ def _refund_funds(transaction):
         success = random.choice([True, True, True, True, False])  # 80% de succès
         
         if success:
-            return {'success': True, 'transaction_id': f"REF_{transaction.id}_{timezone.now().timestamp()}"}
+            return {
+                'success': True,
+                'transaction_id': f"REF_{transaction.id}_{timezone.now().timestamp()}",
+                'amount': str(amount),
+                'phone_number': phone_number,
+            }
         else:
             return {'success': False, 'error': 'Erreur de traitement bancaire'}
         
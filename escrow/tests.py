@@ -1,7 +1,7 @@
 import json
 from decimal import Decimal
 from datetime import datetime, timedelta
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
@@ -9,7 +9,7 @@ from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 from unittest.mock import patch, Mock
-from .models import EscrowTransaction, TransactionMessage, TransactionAction
+from .models import EscrowTransaction, TransactionMessage
 from users.models import UserProfile
 from payments.models import Payment
 
@@ -93,3 +93,274 @@ class EscrowTransactionTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertFalse(response.data['success'])
         self.assertIn('seller_phone', response.data['errors'])
+
+
+class ExchangeRateTestCase(TestCase):
+    """Tests pour le service de taux de change"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        from .exchange_rates import clear_local_cache
+        
+        cache.clear()
+        clear_local_cache()
+        self.addCleanup(clear_local_cache)
+    
+    def test_update_rates_stores_history_and_publishes_table(self):
+        """La mise à jour historise les taux et publie la table courante"""
+        from .models import ExchangeRate
+        from .tasks import update_exchange_rates
+        from .exchange_rates import get_rate_table
+        
+        update_exchange_rates()
+        update_exchange_rates()
+        
+        self.assertEqual(ExchangeRate.objects.count(), 6)
+        table = get_rate_table()
+        self.assertEqual(table.rate('EUR', 'XAF'), Decimal('655.957000'))
+        self.assertEqual(table.convert(Decimal('100'), 'EUR', 'XAF'), Decimal('65595.70'))
+    
+    def test_rate_table_served_from_cache(self):
+        """La table est servie sans requête une fois en cache"""
+        from .exchange_rates import clear_local_cache, get_rate_table, update_rates
+        
+        update_rates()
+        with self.assertNumQueries(0):
+            get_rate_table()
+            clear_local_cache()
+            get_rate_table()
+    
+    def test_rate_table_rebuilt_from_history(self):
+        """La table est reconstruite depuis l'historique si le cache est vide"""
+        from django.core.cache import cache
+        from .exchange_rates import clear_local_cache, get_rate_table, update_rates
+        
+        update_rates()
+        cache.clear()
+        clear_local_cache()
+        
+        with self.assertNumQueries(2):
+            table = get_rate_table()
+        self.assertEqual(table.rate('XAF', 'XAF'), Decimal('1.000000'))
+    
+    def test_file_source(self):
+        """La source fichier lit les taux au format JSON"""
+        import os
+        import tempfile
+        from .exchange_rates import FileExchangeRateSource, update_rates
+        
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as stream:
+            json.dump({'USD': '600', 'EUR': '655.957', 'GBP': '760'}, stream)
+        self.addCleanup(os.remove, stream.name)
+        
+        table = update_rates(FileExchangeRateSource(stream.name))
+        self.assertEqual(table.convert(Decimal('10'), 'USD', 'XAF'), Decimal('6000.00'))
+    
+    def test_missing_currency_is_rejected(self):
+        """Une source incomplète est refusée"""
+        from .exchange_rates import StubExchangeRateSource, update_rates
+        
+        class IncompleteSource(StubExchangeRateSource):
+            RATES = {'USD': Decimal('600')}
+        
+        with self.assertRaises(ValueError):
+            update_rates(IncompleteSource())
+    
+    def test_unsupported_currency_is_rejected_on_creation(self):
+        """Une devise non supportée est une erreur de validation, pas une erreur serveur"""
+        from .serializers import EscrowTransactionCreateSerializer
+        
+        User.objects.create_user(
+            email='fx-seller@example.com',
+            phone_number='+237612349101',
+            password='TestPassword123!',
+            first_name='Fx',
+            last_name='Seller',
+            kyc_status='VERIFIED',
+            is_phone_verified=True,
+        )
+        serializer = EscrowTransactionCreateSerializer(data={
+            'title': 'Vente internationale',
+            'description': 'Vente internationale',
+            'category': 'GOODS',
+            'amount': 450000,
+            'seller_phone': '+237612349101',
+            'payment_deadline': (timezone.now() + timedelta(days=3)).isoformat(),
+            'delivery_deadline': (timezone.now() + timedelta(days=7)).isoformat(),
+            'transaction_type': 'INTERNATIONAL',
+            'international_data': {'buyer_currency': 'JPY', 'seller_currency': 'XAF'},
+        })
+        
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('international_data', serializer.errors)
+    
+    def test_vectorized_conversion(self):
+        """La conversion en série applique un facteur par devise"""
+        from .exchange_rates import RateTable
+        
+        table = RateTable({'USD': Decimal('600'), 'EUR': Decimal('655.957'), 'GBP': Decimal('750')}, timezone.now())
+        converted = table.convert_many(
+            [Decimal('600'), Decimal('1'), Decimal('1500')],
+            ['XAF', 'USD', 'GBP'],
+            'USD'
+        )
+        self.assertEqual(converted, [Decimal('1.00'), Decimal('1.00'), Decimal('1875.00')])
+
+
+class TransactionEventFeedTestCase(APITestCase):
+    """Tests pour le journal et le flux des changements de statut"""
+    
+    def setUp(self):
+        self.buyer = User.objects.create_user(
+            email='feed-buyer@example.com',
+            phone_number='+237612349001',
+            password='TestPassword123!',
+            first_name='Feed',
+            last_name='Buyer',
+        )
+        self.seller = User.objects.create_user(
+            email='feed-seller@example.com',
+            phone_number='+237612349002',
+            password='TestPassword123!',
+            first_name='Feed',
+            last_name='Seller',
+        )
+        self.other = User.objects.create_user(
+            email='feed-other@example.com',
+            phone_number='+237612349003',
+            password='TestPassword123!',
+            first_name='Feed',
+            last_name='Other',
+        )
+        self.url = reverse('transaction-events')
+        self.client.force_authenticate(self.buyer)
+    
+    def _transaction(self, buyer=None, seller=None, status='PENDING_FUNDS'):
+        return EscrowTransaction.objects.create(
+            buyer=buyer or self.buyer,
+            seller=seller or self.seller,
+            title='Transaction suivie',
+            description='Transaction suivie',
+            amount=10000,
+            status=status,
+            payment_deadline=timezone.now() + timedelta(days=1),
+            delivery_deadline=timezone.now() + timedelta(days=7),
+        )
+    
+    def test_transitions_are_logged_once(self):
+        """Création et changements de statut sont journalisés, pas les autres sauvegardes"""
+        from .models import TransactionEvent
+        
+        transaction = self._transaction()
+        transaction = EscrowTransaction.objects.get(pk=transaction.pk)
+        transaction.status = 'FUNDS_HELD'
+        transaction.save()
+        transaction.notes = 'Sans changement de statut'
+        transaction.save()
+        
+        events = list(TransactionEvent.objects.filter(transaction=transaction))
+        self.assertEqual(
+            [(event.event_type, event.from_status, event.to_status) for event in events],
+            [('CREATED', '', 'PENDING_FUNDS'), ('STATUS_CHANGED', 'PENDING_FUNDS', 'FUNDS_HELD')]
+        )
+        with self.assertRaises(ValueError):
+            events[0].save()
+    
+    @override_settings(ESCROW_EVENTS_COMMIT_LAG=0)
+    def test_feed_returns_deltas_after_cursor(self):
+        """Le flux renvoie les événements postérieurs au curseur, par pages"""
+        first = self._transaction()
+        second = self._transaction(buyer=self.seller, seller=self.buyer)
+        self._transaction(buyer=self.other, seller=self.seller)
+        
+        response = self.client.get(self.url, {'limit': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data['data']
+        self.assertEqual([event['transaction'] for event in data['events']], [first.pk])
+        self.assertTrue(data['has_more'])
+        
+        response = self.client.get(self.url, {'since': data['next_cursor']})
+        data = response.data['data']
+        self.assertEqual([event['transaction'] for event in data['events']], [second.pk])
+        self.assertEqual(data['events'][0]['transaction_reference'], second.transaction_id)
+        self.assertFalse(data['has_more'])
+        
+        cursor = data['next_cursor']
+        second = EscrowTransaction.objects.get(pk=second.pk)
+        second.status = 'CANCELLED'
+        second.save()
+        data = self.client.get(self.url, {'since': cursor}).data['data']
+        self.assertEqual([event['to_status'] for event in data['events']], ['CANCELLED'])
+    
+    def test_out_of_order_commit_is_not_skipped(self):
+        """Un événement validé après un identifiant supérieur est tout de même servi"""
+        from .models import TransactionEvent
+        
+        transaction_obj = self._transaction()
+        TransactionEvent.objects.all().delete()
+        
+        def event(pk, seconds_ago):
+            TransactionEvent.objects.create(
+                id=pk, transaction=transaction_obj, buyer=self.buyer, seller=self.seller,
+                event_type='STATUS_CHANGED', from_status='PENDING_FUNDS', to_status='FUNDS_HELD',
+                created_at=timezone.now() - timedelta(seconds=seconds_ago),
+            )
+        
+        # L'identifiant 200 est validé alors que la transaction de l'identifiant 100 est en cours
+        event(200, 0)
+        with override_settings(ESCROW_EVENTS_COMMIT_LAG=5):
+            data = self.client.get(self.url).data['data']
+        self.assertEqual(data['events'], [])
+        # Le curseur ne dépasse pas l'événement retenu
+        self.assertEqual(data['next_cursor'], '0')
+        self.assertFalse(data['has_more'])
+        
+        event(100, 1)
+        TransactionEvent.objects.update(created_at=timezone.now() - timedelta(seconds=30))
+        with override_settings(ESCROW_EVENTS_COMMIT_LAG=5):
+            data = self.client.get(self.url, {'since': data['next_cursor']}).data['data']
+        self.assertEqual([event['id'] for event in data['events']], [100, 200])
+    
+    def test_recent_events_held_back_by_default(self):
+        """Sans réglage, les événements des dernières secondes ne sont pas encore servis"""
+        from .models import TransactionEvent
+        
+        self._transaction()
+        self.assertEqual(self.client.get(self.url).data['data']['events'], [])
+        
+        TransactionEvent.objects.update(created_at=timezone.now() - timedelta(seconds=60))
+        self.assertEqual(len(self.client.get(self.url).data['data']['events']), 1)
+    
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.url, {'since': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FaceToFaceProofTestCase(APITestCase):
+    """Tests pour les preuves de rencontre face-à-face"""
+    
+    def setUp(self):
+        self.buyer = User.objects.create_user(
+            email='meeting-buyer@example.com',
+            phone_number='+237612348001',
+            password='TestPassword123!',
+            first_name='Meeting',
+            last_name='Buyer',
+        )
+        self.client.force_authenticate(self.buyer)
+    
+    def test_oversized_proof_rejected_before_parsing(self):
+        """La taille annoncée est vérifiée avant l'analyse du corps"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from .models import Proof
+        
+        upload = SimpleUploadedFile('preuve.png', b'\x89PNG\r\n\x1a\n' + b'\0' * 200 * 1024, content_type='image/png')
+        with override_settings(UPLOAD_POLICIES={'proof': {'max_size': 64 * 1024}}):
+            response = self.client.post(
+                reverse('face-to-face-meeting', args=[1]),
+                {'action': 'submit_proof', 'proof_type': 'FACE_TO_FACE_INITIAL', 'file': upload},
+                format='multipart'
+            )
+        
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(Proof.objects.exists())
@@ -23,6 +23,9 @@ urlpatterns = [
     path('transactions/<int:transaction_id>/messages/', 
          views.TransactionMessageListCreateView.as_view(), name='transaction-messages'),
     
+    # Flux des changements de statut
+    path('events/', views.TransactionEventFeedView.as_view(), name='transaction-events'),
+    
     # Statistiques
     path('statistics/', views.transaction_statistics, name='transaction-statistics'),
     
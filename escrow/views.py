@@ -5,6 +5,7 @@ from rest_framework.views import APIView
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.db import transaction
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db.models import Q, Sum, Avg
 import logging
 
@@ -13,13 +14,17 @@ from .serializers import (
     EscrowTransactionListSerializer, EscrowTransactionDetailSerializer,
     EscrowTransactionCreateSerializer, TransactionActionSerializer,
     MilestoneSerializer, MilestoneActionSerializer, ProofSerializer,
-    TransactionMessageSerializer, TransactionRatingSerializer
+    TransactionMessageSerializer, TransactionRatingSerializer, TransactionEventSerializer
 )
 from core.permissions import (
     CanCreateEscrow, IsTransactionParticipant, IsKYCVerified,
     IsTransactionInCorrectState
 )
 from core.utils import APIResponseMixin
+from core.idempotency import idempotent
+from core.uploads import (
+    check_content_length, open_completed_upload, release_upload, store_upload, validate_upload,
+)
 from .tasks import (
     send_transaction_notification, process_escrow_payment,
     auto_release_funds, send_milestone_notification
@@ -61,6 +66,10 @@ class EscrowTransactionListCreateView(generics.ListCreateAPIView, APIResponseMix
         
         return queryset.order_by('-created_at')
     
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
+    
     def perform_create(self, serializer):
         if not self.request.user.can_create_escrow():
             raise permissions.PermissionDenied("Vous ne pouvez pas créer de transactions escrow.")
@@ -114,6 +123,7 @@ class TransactionActionView(APIView, APIResponseMixin):
         except EscrowTransaction.DoesNotExist:
             return None
     
+    @idempotent
     def post(self, request, pk):
         transaction_obj = self.get_transaction()
         if not transaction_obj:
@@ -263,6 +273,39 @@ class TransactionMessageListCreateView(generics.ListCreateAPIView, APIResponseMi
         )
 
 
+class TransactionEventFeedView(APIView, APIResponseMixin):
+    """
+    Flux des changements de statut des transactions de l'utilisateur
+    
+    `?since=<curseur>` renvoie les événements postérieurs au curseur (0 pour
+    tout l'historique) et le curseur suivant. Le flux temps réel
+    (`/api/core/stream/`) signale les nouveaux événements ; ce flux sert à
+    rattraper les écarts à l'ouverture de l'application ou après un `reset`.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        from .events import events_since
+        
+        try:
+            since = int(request.query_params.get('since') or 0)
+            if since < 0:
+                raise ValueError
+        except ValueError:
+            return self.error_response("Curseur invalide")
+        
+        try:
+            events, has_more = events_since(request.user, since, request.query_params.get('limit'))
+        except ValueError as e:
+            return self.error_response(str(e))
+        
+        return self.success_response({
+            'events': TransactionEventSerializer(events, many=True).data,
+            'next_cursor': str(events[-1].pk if events else since),
+            'has_more': has_more,
+        })
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def transaction_statistics(request):
@@ -333,6 +376,13 @@ class FaceToFaceMeetingView(APIView, APIResponseMixin):
     
     def post(self, request, pk):
         """Actions sur une rencontre face-à-face"""
+        # Refuser les fichiers trop volumineux avant d'analyser le corps
+        if not check_content_length(request, 'proof'):
+            return self.error_response(
+                "Le fichier est trop volumineux",
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        
         transaction_obj = self.get_transaction()
         if not transaction_obj:
             return self.error_response("Transaction face-à-face non trouvée", status_code=404)
@@ -409,16 +459,29 @@ class FaceToFaceMeetingView(APIView, APIResponseMixin):
             longitude = request.data.get('longitude')
             location_address = request.data.get('location_address', '')
             
+            # Fichier direct ou session d'upload reprenable terminée
+            file_obj = request.FILES.get('file')
+            upload_id = request.data.get('upload_id')
+            if upload_id:
+                file_obj = open_completed_upload(upload_id, request.user, 'proof')
+            file_fields = {}
+            if file_obj:
+                validate_upload(file_obj, 'proof')
+                blob = store_upload(file_obj)
+                file_fields = {'file': blob.file.name, 'file_hash': blob.sha256, 'file_size': blob.size}
+            
             proof = Proof.objects.create(
                 transaction=transaction_obj,
                 proof_type=proof_type,
                 title=title,
                 description=description,
+                **file_fields,
                 latitude=latitude,
                 longitude=longitude,
                 location_address=location_address,
                 submitted_by=request.user
             )
+            release_upload(file_obj)
             
             # Mettre à jour les détails face-à-face
             face_to_face = transaction_obj.face_to_face_details
@@ -432,6 +495,8 @@ class FaceToFaceMeetingView(APIView, APIResponseMixin):
                 'message': 'Preuve soumise avec succès',
                 'proof_id': proof.id
             })
+        except DjangoValidationError as e:
+            return self.error_response(e.messages[0])
         except Exception as e:
             logger.error(f"Erreur soumission preuve: {e}")
             return self.error_response("Erreur lors de la soumission de la preuve")
@@ -231,7 +231,7 @@ def profile_view(request):
     """Vue du profil utilisateur"""
     if request.method == 'POST':
         user_form = ProfileUpdateForm(request.POST, instance=request.user)
-        profile_form = ProfileDetailsForm(request.POST, instance=request.user.profile)
+        profile_form = ProfileDetailsForm(request.POST, instance=request.user.get_profile())
         
         if user_form.is_valid() and profile_form.is_valid():
             user_form.save()
@@ -240,7 +240,7 @@ def profile_view(request):
             return redirect('profile')
     else:
         user_form = ProfileUpdateForm(instance=request.user)
-        profile_form = ProfileDetailsForm(instance=request.user.profile)
+        profile_form = ProfileDetailsForm(instance=request.user.get_profile())
     
     context = {
         'user_form': user_form,
@@ -583,12 +583,24 @@ def admin_users(request):
 
 @login_required
 @role_required(['ADMIN'])
+@csrf_protect
 def admin_kyc_pending(request):
     """KYC en attente d'approbation"""
-    # Récupérer les KYC en attente
-    pending_kyc = KYCDocument.objects.filter(status='PENDING').select_related('user')
+    from users.kyc_review import claim_next, review_queue, with_documents
+    
+    # Réserver le dossier suivant de la file
+    if request.method == 'POST':
+        claimed = claim_next(request.user)
+        if claimed:
+            return redirect('admin_kyc_approve', user_id=claimed[0].id)
+        messages.info(request, 'Aucun dossier KYC disponible.')
+        return redirect('admin_kyc_pending')
     
-    return render(request, 'admin/kyc_pending.html', {'pending_kyc': pending_kyc})
+    # Dossiers en révision, du plus ancien au plus récent, documents préchargés
+    paginator = Paginator(with_documents(review_queue()), 20)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    
+    return render(request, 'admin/kyc_pending.html', {'pending_kyc': page_obj})
 
 
 @login_required
@@ -596,10 +608,15 @@ def admin_kyc_pending(request):
 @csrf_protect
 def admin_kyc_approve(request, user_id):
     """Approuver/rejeter un KYC"""
+    from users.kyc_review import is_claimed_by_other
+    
     user = get_object_or_404(User, id=user_id)
     
     if request.method == 'POST':
         form = AdminKYCApprovalForm(request.POST)
+        if is_claimed_by_other(user, request.user):
+            messages.error(request, 'Ce dossier est en cours de révision par un autre administrateur.')
+            return redirect('admin_kyc_pending')
         if form.is_valid():
             action = form.cleaned_data['action']
             notes = form.cleaned_data['notes']
@@ -611,6 +628,8 @@ def admin_kyc_approve(request, user_id):
                 user.kyc_status = 'REJECTED'
                 messages.info(request, f'KYC rejeté pour {user.get_full_name()}')
             
+            user.kyc_review_claimed_by = None
+            user.kyc_review_lease_expires_at = None
             user.save()
             return redirect('admin_kyc_pending')
     else:
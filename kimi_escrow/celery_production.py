@@ -105,10 +105,46 @@ app.conf.update(
             'task': 'escrow.tasks.update_exchange_rates',
             'schedule': 3600.0,  # Toutes les heures
         },
+        'snapshot-ledger-balances': {
+            'task': 'payments.tasks.snapshot_ledger_balances',
+            'schedule': 3600.0,  # Toutes les heures
+        },
         'sync-mobile-money-balances': {
             'task': 'payments.tasks.sync_mobile_money_balances',
             'schedule': 1800.0,  # Toutes les 30 minutes
         },
+        'purge-expired-idempotency-keys': {
+            'task': 'core.tasks.purge_expired_idempotency_keys',
+            'schedule': 3600.0,  # Toutes les heures
+        },
+        'purge-upload-sessions': {
+            'task': 'core.tasks.purge_upload_sessions',
+            'schedule': 3600.0,  # Toutes les heures
+        },
+        'collect-unreferenced-blobs': {
+            'task': 'core.tasks.collect_unreferenced_blobs',
+            'schedule': 86400.0,  # Tous les jours
+        },
+        'poll-pending-kyc-jobs': {
+            'task': 'users.tasks.poll_pending_kyc_jobs',
+            'schedule': 600.0,  # Toutes les 10 minutes
+        },
+        'assign-open-disputes': {
+            'task': 'disputes.tasks.assign_open_disputes_task',
+            'schedule': 300.0,  # Toutes les 5 minutes (en plus des lots déclenchés à la création)
+        },
+        'rebuild-arbitre-workloads': {
+            'task': 'disputes.tasks.rebuild_arbitre_workloads',
+            'schedule': 86400.0,  # Tous les jours
+        },
+        'dispatch-resolution-outbox': {
+            'task': 'disputes.tasks.dispatch_resolution_outbox',
+            'schedule': 60.0,  # Toutes les minutes (mouvements à transmettre, réessayer ou reprendre)
+        },
+        'close-resolved-disputes': {
+            'task': 'disputes.tasks.close_resolved_disputes_task',
+            'schedule': 900.0,  # Toutes les 15 minutes
+        },
         'process-webhook-retries': {
             'task': 'core.tasks.process_webhook_retries',
             'schedule': 300.0,  # Toutes les 5 minutes
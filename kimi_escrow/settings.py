@@ -3,6 +3,7 @@ Django settings for kimi_escrow project.
 """
 
 import os
+import sys
 from pathlib import Path
 from decouple import config
 from datetime import timedelta
@@ -54,6 +55,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'core.middleware.AuditMiddleware',
+    'users.middleware.ActivityMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -94,11 +96,34 @@ DATABASES = {
 AUTH_USER_MODEL = 'users.CustomUser'
 
 # Backends d'authentification personnalisés
+# (EmailBackend hérite de ModelBackend pour les permissions ; ModelBackend
+# seul en second relancerait une recherche et un hachage à chaque échec)
 AUTHENTICATION_BACKENDS = [
     'users.backends.EmailBackend',
-    'django.contrib.auth.backends.ModelBackend',
 ]
 
+# Hachage des mots de passe
+# 'default' : PBKDF2 (rehaché à la connexion si les paramètres changent)
+# 'fast' : MD5, réservé aux tests (jamais en production)
+PASSWORD_HASHER_PROFILES = {
+    'default': [
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+        'django.contrib.auth.hashers.ScryptPasswordHasher',
+    ],
+    'fast': [
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    ],
+}
+TESTING = 'test' in sys.argv[1:2] or 'pytest' in sys.modules
+PASSWORD_HASHER_PROFILE = config(
+    'PASSWORD_HASHER_PROFILE', default='fast' if TESTING else 'default'
+)
+PASSWORD_HASHERS = PASSWORD_HASHER_PROFILES[PASSWORD_HASHER_PROFILE]
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -132,13 +157,16 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Fichiers privés (exports) : hors MEDIA_ROOT, servis par des vues authentifiées
+PRIVATE_STORAGE_ROOT = os.path.join(BASE_DIR, 'private')
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -180,8 +208,13 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_EXP_CLAIM': 'refresh_exp',
     'SLIDING_TOKEN_LIFETIME': timedelta(minutes=5),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
+    # Les claims (rôle, statut KYC...) sont recalculés à chaque rafraîchissement
+    'TOKEN_REFRESH_SERIALIZER': 'users.tokens.ClaimsTokenRefreshSerializer',
 }
 
+# Durée de mise en cache de la version des jetons d'un utilisateur (secondes)
+JWT_USER_STATE_CACHE_TTL = 60
+
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -284,6 +317,62 @@ SMILE_ID_API_KEY = config('SMILE_ID_API_KEY', default='')
 SMILE_ID_SANDBOX = config('SMILE_ID_SANDBOX', default=True, cast=bool)
 SMILE_ID_BASE_URL = 'https://testapi.smileidentity.com/v1' if SMILE_ID_SANDBOX else 'https://api.smileidentity.com/v1'
 
+# Rendu des images KYC avant soumission à Smile ID
+KYC_IMAGE_MAX_DIMENSION = config('KYC_IMAGE_MAX_DIMENSION', default=1600, cast=int)
+KYC_IMAGE_QUALITY = config('KYC_IMAGE_QUALITY', default=85, cast=int)
+
+# Suivi des jobs Smile ID : webhook, puis interrogation groupée en secours
+SMILE_ID_POOL_SIZE = 10
+KYC_POLL_GRACE_PERIOD = 300  # Délai laissé au webhook avant interrogation
+KYC_POLL_BATCH_SIZE = 200
+KYC_JOB_TIMEOUT = 86400
+KYC_STATUS_CHECK_DELAY = 30  # Regroupement des évaluations du statut global
+
+# File de révision KYC
+KYC_REVIEW_LEASE_SECONDS = 900  # Durée de réservation d'un dossier
+KYC_REVIEW_NOTIFY_INTERVAL = 3600  # Un résumé de la file par heure au plus
+
+# Mandataires de confiance devant l'application (X-Forwarded-For)
+TRUSTED_PROXY_COUNT = config('TRUSTED_PROXY_COUNT', default=0, cast=int)
+
+# Suivi d'activité : last_activity écrit au plus une fois par intervalle (secondes)
+ACTIVITY_WRITE_INTERVAL = 300
+ACTIVITY_RETENTION_DAYS = 35
+
+# Assignation automatique des litiges aux arbitres
+DISPUTE_AUTO_ASSIGNMENT = True
+DISPUTE_ASSIGNMENT_BATCH_SIZE = 100
+DISPUTE_ASSIGNMENT_DELAY = 30  # secondes : regroupe les litiges créés en rafale
+DISPUTE_ARBITRE_MAX_OPEN = 25
+
+# Exécution des verdicts (remboursements et libérations)
+DISPUTE_CLOSURE_BATCH_SIZE = 200
+RESOLUTION_OUTBOX_BATCH_SIZE = 100
+RESOLUTION_RETRY_DELAY = 60  # Délai avant la 2e tentative d'un paiement échoué, doublé ensuite (secondes)
+RESOLUTION_RETRY_MAX_DELAY = 3600
+RESOLUTION_MAX_ATTEMPTS = 8  # Au-delà, le mouvement est laissé au traitement manuel
+RESOLUTION_PROCESSING_TIMEOUT = 900  # Paiement transmis sans résultat : repris après ce délai
+
+# Notifications temps réel (flux SSE servi par ASGI, core.push)
+PUSH_REDIS_URL = config('PUSH_REDIS_URL', default=None)
+PUSH_BACKLOG_SIZE = 500  # Événements conservés par utilisateur pour la reprise
+PUSH_BACKLOG_TTL = 86400
+PUSH_QUEUE_SIZE = 100  # Événements en attente par connexion avant fermeture
+PUSH_HEARTBEAT_INTERVAL = 15
+PUSH_RETRY_MS = 3000
+
+# Flux des changements de statut des transactions (/api/escrow/events/)
+ESCROW_EVENTS_PAGE_SIZE = 100
+ESCROW_EVENTS_MAX_LIMIT = 500
+ESCROW_EVENTS_COMMIT_LAG = 10  # Événements servis après ce délai (secondes) : validation des transactions lentes
+
+# Recherche plein texte (core.search)
+SEARCH_MAX_LIMIT = 50
+SEARCH_BACKFILL_BATCH_SIZE = 5000  # Lignes remplies par lot à l'installation d'un index (PostgreSQL)
+
+# Administration : nombre de lignes estimé au-delà de ce seuil (core.changelist)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+
 # Mobile Money Configuration
 MTN_MOMO_SUBSCRIPTION_KEY = config('MTN_MOMO_SUBSCRIPTION_KEY', default='')
 MTN_MOMO_API_USER = config('MTN_MOMO_API_USER', default='')
@@ -301,7 +390,7 @@ ESCROW_BANK_API_URL = config('ESCROW_BANK_API_URL', default='')
 ESCROW_BANK_API_KEY = config('ESCROW_BANK_API_KEY', default='')
 
 # File Upload Settings
-FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2 * 1024 * 1024  # Au-delà, les fichiers sont écrits sur disque
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 
 # Encryption Settings
@@ -313,6 +402,19 @@ MINIMUM_ESCROW_AMOUNT = 1000  # XAF
 MAXIMUM_ESCROW_AMOUNT = 10000000  # XAF
 DISPUTE_TIMEOUT_DAYS = 7
 AUTO_RELEASE_DAYS = 14
+RECONCILIATION_CHUNK_SIZE = 5000  # Lignes de relevé traitées par bloc
+EXPORT_CHUNK_SIZE = 2000  # Lignes lues par bloc lors des exports
+UPLOAD_SESSION_TTL = 86400  # Durée de vie des uploads reprenables (secondes)
+UPLOAD_SESSION_MAX_CHUNK_SIZE = 5 * 1024 * 1024  # Taille maximale d'une partie
+BLOB_GC_GRACE_PERIOD = 86400  # Délai avant suppression d'un fichier sans référence (secondes)
+IDEMPOTENCY_KEY_TTL = 86400  # Conservation des réponses idempotentes (secondes)
+IDEMPOTENCY_LOCK_TIMEOUT = 30  # Verrou des requêtes concurrentes (secondes)
+
+# Taux de change (montant en XAF pour une unité de devise)
+EXCHANGE_RATE_SOURCE = config('EXCHANGE_RATE_SOURCE', default='escrow.exchange_rates.StubExchangeRateSource')
+EXCHANGE_RATE_FILE = config('EXCHANGE_RATE_FILE', default='')
+EXCHANGE_RATE_CACHE_TIMEOUT = 7200  # Table partagée (Redis), en secondes
+EXCHANGE_RATE_LOCAL_TTL = 60  # Copie locale au processus, en secondes
 
 # Swagger Settings
 SWAGGER_SETTINGS = {
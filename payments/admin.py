@@ -1,3 +1,31 @@
 from django.contrib import admin
+from .models import ReconciliationReport, ReconciliationMismatch, ExportJob
 
-# Register your models here.
+
+@admin.register(ReconciliationReport)
+class ReconciliationReportAdmin(admin.ModelAdmin):
+    list_display = ('id', 'source', 'status', 'rows_processed', 'rows_matched', 'mismatch_count',
+                   'period_start', 'period_end', 'created_at')
+    list_filter = ('source', 'status', 'created_at')
+    readonly_fields = ('status', 'started_at', 'completed_at', 'error_message',
+                      'rows_processed', 'rows_matched', 'mismatch_count', 'created_at', 'updated_at')
+
+
+@admin.register(ReconciliationMismatch)
+class ReconciliationMismatchAdmin(admin.ModelAdmin):
+    list_display = ('report', 'mismatch_type', 'external_reference', 'statement_amount',
+                   'ledger_amount', 'statement_status', 'ledger_status')
+    list_filter = ('mismatch_type',)
+    search_fields = ('external_reference',)
+    raw_id_fields = ('report', 'payment')
+    list_select_related = ('report',)
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'dataset', 'export_format', 'compress', 'status', 'file_size', 'created_at')
+    list_filter = ('dataset', 'export_format', 'status')
+    search_fields = ('user__email',)
+    raw_id_fields = ('user',)
+    list_select_related = ('user',)
+    readonly_fields = ('status', 'file', 'file_size', 'completed_at', 'error_message', 'created_at', 'updated_at')
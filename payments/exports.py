@@ -0,0 +1,205 @@
+"""
+Export en flux de l'historique des paiements et des transactions escrow.
+
+Les lignes sont lues par blocs (`iterator(chunk_size=...)`, curseur côté
+serveur sous PostgreSQL) et sérialisées à la volée en CSV ou JSONL,
+éventuellement compressées en gzip. Rien n'est accumulé en mémoire : la
+même chaîne de générateurs alimente la réponse HTTP en flux et les
+exports asynchrones écrits dans le stockage.
+"""
+
+import csv
+import json
+import zlib
+from datetime import datetime, time, timedelta
+from typing import Iterable, Iterator, Optional
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from escrow.models import EscrowTransaction
+from .models import Payment
+
+EXPORT_FORMATS = {
+    'CSV': {'extension': 'csv', 'content_type': 'text/csv; charset=utf-8'},
+    'JSONL': {'extension': 'jsonl', 'content_type': 'application/x-ndjson; charset=utf-8'},
+}
+
+# Colonnes exportées : (nom de colonne, champ ORM)
+EXPORT_DATASETS = {
+    'payments': [
+        ('reference', 'reference'),
+        ('external_reference', 'external_reference'),
+        ('transaction_id', 'transaction__transaction_id'),
+        ('provider', 'payment_method__provider'),
+        ('payment_type', 'payment_type'),
+        ('status', 'status'),
+        ('amount', 'amount'),
+        ('fee', 'fee'),
+        ('total_amount', 'total_amount'),
+        ('currency', 'currency'),
+        ('phone_number', 'phone_number'),
+        ('created_at', 'created_at'),
+        ('processed_at', 'processed_at'),
+    ],
+    'transactions': [
+        ('transaction_id', 'transaction_id'),
+        ('title', 'title'),
+        ('category', 'category'),
+        ('transaction_type', 'transaction_type'),
+        ('status', 'status'),
+        ('amount', 'amount'),
+        ('commission', 'commission'),
+        ('total_amount', 'total_amount'),
+        ('currency', 'currency'),
+        ('buyer_email', 'buyer__email'),
+        ('seller_email', 'seller__email'),
+        ('created_at', 'created_at'),
+        ('funds_received_at', 'funds_received_at'),
+        ('released_at', 'released_at'),
+    ],
+}
+
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+BUFFER_SIZE = 64 * 1024
+
+
+def get_chunk_size() -> int:
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def parse_boundary(value: Optional[str], end: bool = False) -> Optional[datetime]:
+    """
+    Convertir un filtre de date (AAAA-MM-JJ ou ISO 8601) en datetime
+
+    Une date seule couvre toute la journée : en borne de fin, elle est
+    convertie en minuit du jour suivant (borne exclusive).
+    """
+    if not value:
+        return None
+
+    try:
+        day = parse_date(value)
+        moment = None if day else parse_datetime(value)
+    except ValueError:
+        day = moment = None
+
+    if day is not None:
+        if end:
+            day += timedelta(days=1)
+        moment = datetime.combine(day, time.min)
+    elif moment is None:
+        raise ValueError(f"Date invalide: {value}")
+
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def export_queryset(dataset: str, user, date_from: datetime = None, date_to: datetime = None):
+    """Lignes à exporter pour un utilisateur, triées par date de création"""
+    if dataset == 'payments':
+        queryset = Payment.objects.filter(user=user)
+    elif dataset == 'transactions':
+        queryset = EscrowTransaction.objects.filter(Q(buyer=user) | Q(seller=user))
+    else:
+        raise ValueError(f"Jeu de données inconnu: {dataset}")
+
+    if date_from:
+        queryset = queryset.filter(created_at__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(created_at__lt=date_to)
+
+    fields = [field for _, field in EXPORT_DATASETS[dataset]]
+    return queryset.order_by('created_at', 'id').values_list(*fields)
+
+
+def iter_rows(queryset, chunk_size: int = None) -> Iterator[tuple]:
+    """Parcourir le queryset par blocs"""
+    return queryset.iterator(chunk_size=chunk_size or get_chunk_size())
+
+
+class _Echo:
+    """Pseudo-fichier renvoyant ce qu'on y écrit (csv.writer sans tampon)"""
+
+    def write(self, value):
+        return value
+
+
+def _format_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(rows: Iterable[tuple], columns) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_format_value(value) for value in row])
+
+
+def iter_jsonl(rows: Iterable[tuple], columns) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def iter_bytes(lines: Iterable[str], buffer_size: int = BUFFER_SIZE) -> Iterator[bytes]:
+    """Regrouper les lignes en blocs d'environ `buffer_size` octets"""
+    buffer = []
+    size = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= buffer_size:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def iter_gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compresser un flux d'octets au format gzip"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, GZIP_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(dataset: str, user, export_format: str = 'CSV', compress: bool = False,
+                  date_from: datetime = None, date_to: datetime = None,
+                  chunk_size: int = None) -> Iterator[bytes]:
+    """Générer le contenu d'un export sous forme de blocs d'octets"""
+    export_format = export_format.upper()
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Format d'export non supporté: {export_format}")
+    if dataset not in EXPORT_DATASETS:
+        raise ValueError(f"Jeu de données inconnu: {dataset}")
+
+    columns = [name for name, _ in EXPORT_DATASETS[dataset]]
+    rows = iter_rows(export_queryset(dataset, user, date_from, date_to), chunk_size)
+    lines = iter_csv(rows, columns) if export_format == 'CSV' else iter_jsonl(rows, columns)
+
+    chunks = iter_bytes(lines)
+    if compress:
+        chunks = iter_gzip(chunks)
+    return chunks
+
+
+def export_filename(dataset: str, export_format: str, compress: bool) -> str:
+    extension = EXPORT_FORMATS[export_format.upper()]['extension']
+    name = f"{dataset}-{timezone.now():%Y%m%d-%H%M%S}.{extension}"
+    return f"{name}.gz" if compress else name
+
+
+def export_content_type(export_format: str, compress: bool) -> str:
+    if compress:
+        return 'application/gzip'
+    return EXPORT_FORMATS[export_format.upper()]['content_type']
@@ -0,0 +1,205 @@
+"""
+Grand livre des comptes séquestres.
+
+Les soldes de `EscrowAccount` sont modifiés uniquement par des UPDATE
+atomiques à base de `F()` protégés par une condition SQL (par exemple
+`balance - frozen_amount >= montant`), ce qui évite les courses du schéma
+lecture-vérification-écriture. Chaque mouvement accepté est journalisé en
+partie double dans `LedgerEntry`.
+"""
+
+import logging
+import uuid
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import EscrowAccount, LedgerEntry, LedgerSnapshot
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal('0.00')
+
+
+def _to_amount(amount) -> Decimal:
+    amount = Decimal(str(amount)).quantize(Decimal('0.01'))
+    if amount <= 0:
+        raise ValueError("Le montant doit être strictement positif")
+    return amount
+
+
+def _post(account, operation, amount, guard, changes, debit_book, credit_book,
+          payment=None, description='') -> bool:
+    """
+    Appliquer un mouvement atomique et écrire ses deux écritures
+
+    Returns:
+        True si la condition était satisfaite et le mouvement appliqué
+    """
+    amount = _to_amount(amount)
+
+    with transaction.atomic():
+        updated = EscrowAccount.objects.filter(guard(amount), pk=account.pk).update(
+            updated_at=timezone.now(),
+            **changes(amount)
+        )
+        if not updated:
+            return False
+
+        # La ligne est verrouillée par l'UPDATE jusqu'à la fin de la transaction
+        balance, frozen_amount = EscrowAccount.objects.filter(pk=account.pk).values_list(
+            'balance', 'frozen_amount'
+        ).get()
+
+        journal_id = uuid.uuid4()
+        LedgerEntry.objects.bulk_create([
+            LedgerEntry(
+                journal_id=journal_id,
+                account_id=account.pk,
+                payment=payment,
+                operation=operation,
+                book=book,
+                direction=direction,
+                amount=amount,
+                balance_after=balance,
+                frozen_after=frozen_amount,
+                description=description[:255],
+            )
+            for book, direction in ((debit_book, 'DEBIT'), (credit_book, 'CREDIT'))
+        ])
+
+    account.balance = balance
+    account.frozen_amount = frozen_amount
+    return True
+
+
+def post_credit(account, amount, payment=None, description='') -> bool:
+    """Créditer le compte (fonds reçus du fournisseur)"""
+    return _post(
+        account, 'DEPOSIT', amount,
+        guard=lambda a: Q(),
+        changes=lambda a: {'balance': F('balance') + a},
+        debit_book='EXTERNAL', credit_book='AVAILABLE',
+        payment=payment, description=description,
+    )
+
+
+def post_debit(account, amount, payment=None, description='') -> bool:
+    """Débiter le solde disponible d'un compte actif"""
+    return _post(
+        account, 'WITHDRAWAL', amount,
+        guard=lambda a: Q(status='ACTIVE', balance__gte=F('frozen_amount') + a),
+        changes=lambda a: {'balance': F('balance') - a},
+        debit_book='AVAILABLE', credit_book='EXTERNAL',
+        payment=payment, description=description,
+    )
+
+
+def post_freeze(account, amount, payment=None, description='') -> bool:
+    """Geler une partie du solde disponible"""
+    return _post(
+        account, 'FREEZE', amount,
+        guard=lambda a: Q(balance__gte=F('frozen_amount') + a),
+        changes=lambda a: {'frozen_amount': F('frozen_amount') + a},
+        debit_book='AVAILABLE', credit_book='FROZEN',
+        payment=payment, description=description,
+    )
+
+
+def post_unfreeze(account, amount, payment=None, description='') -> bool:
+    """Dégeler une partie du montant gelé"""
+    return _post(
+        account, 'UNFREEZE', amount,
+        guard=lambda a: Q(frozen_amount__gte=a),
+        changes=lambda a: {'frozen_amount': F('frozen_amount') - a},
+        debit_book='FROZEN', credit_book='AVAILABLE',
+        payment=payment, description=description,
+    )
+
+
+def _book_totals(entries) -> Dict[str, Decimal]:
+    """Solde net (crédits - débits) de chaque livre"""
+    totals = {}
+    rows = entries.values('book', 'direction').annotate(total=Sum('amount')).order_by()
+    for row in rows:
+        sign = 1 if row['direction'] == 'CREDIT' else -1
+        totals[row['book']] = totals.get(row['book'], ZERO) + sign * row['total']
+    return totals
+
+
+def compute_balances(account, upto_entry_id: Optional[int] = None) -> Tuple[Decimal, Decimal, int]:
+    """
+    Recalculer les soldes depuis le grand livre
+
+    Part de la dernière photographie et ne somme que les écritures
+    postérieures.
+
+    Returns:
+        (solde, montant gelé, id de la dernière écriture prise en compte)
+    """
+    snapshots = LedgerSnapshot.objects.filter(account_id=account.pk)
+    entries = LedgerEntry.objects.filter(account_id=account.pk)
+    if upto_entry_id is not None:
+        snapshots = snapshots.filter(last_entry_id__lte=upto_entry_id)
+        entries = entries.filter(id__lte=upto_entry_id)
+
+    snapshot = snapshots.order_by('-last_entry_id').first()
+    balance, frozen_amount, last_entry_id = ZERO, ZERO, 0
+    if snapshot:
+        balance, frozen_amount = snapshot.balance, snapshot.frozen_amount
+        last_entry_id = snapshot.last_entry_id
+        entries = entries.filter(id__gt=snapshot.last_entry_id)
+
+    totals = _book_totals(entries)
+    available = totals.get('AVAILABLE', ZERO)
+    frozen = totals.get('FROZEN', ZERO)
+
+    last_entry_id = entries.aggregate(last=Max('id'))['last'] or last_entry_id
+    return balance + available + frozen, frozen_amount + frozen, last_entry_id
+
+
+def take_snapshot(account) -> Optional[LedgerSnapshot]:
+    """Photographier les soldes d'un compte s'il a de nouvelles écritures"""
+    balance, frozen_amount, last_entry_id = compute_balances(account)
+    if not last_entry_id:
+        return None
+
+    latest = LedgerSnapshot.objects.filter(account_id=account.pk).order_by('-last_entry_id').first()
+    if latest and latest.last_entry_id >= last_entry_id:
+        return latest
+
+    return LedgerSnapshot.objects.create(
+        account_id=account.pk,
+        balance=balance,
+        frozen_amount=frozen_amount,
+        last_entry_id=last_entry_id,
+    )
+
+
+def accounts_needing_snapshot():
+    """Comptes ayant des écritures postérieures à leur dernière photographie"""
+    last_entry = LedgerEntry.objects.filter(account=OuterRef('pk')).order_by('-id').values('id')[:1]
+    last_snapshot = LedgerSnapshot.objects.filter(account=OuterRef('pk')).order_by(
+        '-last_entry_id'
+    ).values('last_entry_id')[:1]
+
+    return EscrowAccount.objects.annotate(
+        last_entry_id=Subquery(last_entry),
+        last_snapshot_entry_id=Coalesce(Subquery(last_snapshot), Value(0)),
+    ).filter(last_entry_id__gt=F('last_snapshot_entry_id'))
+
+
+def verify_account(account) -> Dict:
+    """Comparer les soldes courants du compte avec le grand livre"""
+    account.refresh_from_db(fields=['balance', 'frozen_amount'])
+    balance, frozen_amount, _ = compute_balances(account)
+    return {
+        'account_number': account.account_number,
+        'balance_drift': account.balance - balance,
+        'frozen_drift': account.frozen_amount - frozen_amount,
+        'consistent': account.balance == balance and account.frozen_amount == frozen_amount,
+    }
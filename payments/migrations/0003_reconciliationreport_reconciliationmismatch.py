@@ -0,0 +1,62 @@
+# Generated by Django 5.0.8 on 2026-10-19 03:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('source', models.CharField(choices=[('MTN_MOMO', 'MTN Mobile Money'), ('ORANGE_MONEY', 'Orange Money'), ('ESCROW_BANK', 'Banque Séquestre')], max_length=20)),
+                ('statement_file', models.FileField(upload_to='reconciliation/%Y/%m/%d/')),
+                ('statement_format', models.CharField(choices=[('CSV', 'CSV'), ('JSONL', 'JSON Lines')], default='CSV', max_length=10)),
+                ('period_start', models.DateTimeField(blank=True, null=True)),
+                ('period_end', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('PENDING', 'En attente'), ('RUNNING', 'En cours'), ('COMPLETED', 'Terminé'), ('FAILED', 'Échoué')], default='PENDING', max_length=20)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('error_message', models.TextField(blank=True)),
+                ('rows_processed', models.PositiveIntegerField(default=0)),
+                ('rows_matched', models.PositiveIntegerField(default=0)),
+                ('mismatch_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Rapprochement',
+                'verbose_name_plural': 'Rapprochements',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['source', 'status'], name='payments_re_source_92b012_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReconciliationMismatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mismatch_type', models.CharField(choices=[('MISSING_IN_LEDGER', 'Absent des paiements'), ('MISSING_IN_STATEMENT', 'Absent du relevé'), ('AMOUNT_DRIFT', 'Écart de montant'), ('STATUS_DRIFT', 'Écart de statut')], max_length=20)),
+                ('external_reference', models.CharField(blank=True, max_length=100)),
+                ('statement_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True)),
+                ('ledger_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True)),
+                ('statement_status', models.CharField(blank=True, max_length=50)),
+                ('ledger_status', models.CharField(blank=True, max_length=20)),
+                ('raw_data', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reconciliation_mismatches', to='payments.payment')),
+                ('report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mismatches', to='payments.reconciliationreport')),
+            ],
+            options={
+                'verbose_name': 'Écart de Rapprochement',
+                'verbose_name_plural': 'Écarts de Rapprochement',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['report', 'mismatch_type'], name='payments_re_report__c9ce2b_idx')],
+            },
+        ),
+    ]
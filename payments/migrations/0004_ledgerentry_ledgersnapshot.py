@@ -0,0 +1,54 @@
+# Generated by Django 5.0.8 on 2026-10-19 03:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_reconciliationreport_reconciliationmismatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('journal_id', models.UUIDField(db_index=True)),
+                ('operation', models.CharField(choices=[('DEPOSIT', 'Dépôt'), ('WITHDRAWAL', 'Retrait'), ('FREEZE', 'Gel'), ('UNFREEZE', 'Dégel')], max_length=20)),
+                ('book', models.CharField(choices=[('AVAILABLE', 'Disponible'), ('FROZEN', 'Gelé'), ('EXTERNAL', 'Contrepartie externe')], max_length=20)),
+                ('direction', models.CharField(choices=[('DEBIT', 'Débit'), ('CREDIT', 'Crédit')], max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('balance_after', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('frozen_after', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='payments.escrowaccount')),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to='payments.payment')),
+            ],
+            options={
+                'verbose_name': 'Écriture Comptable',
+                'verbose_name_plural': 'Écritures Comptables',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['account', 'id'], name='payments_le_account_10815d_idx'), models.Index(fields=['payment'], name='payments_le_payment_75665e_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('frozen_amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('last_entry_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_snapshots', to='payments.escrowaccount')),
+            ],
+            options={
+                'verbose_name': 'Photographie de Solde',
+                'verbose_name_plural': 'Photographies de Solde',
+                'ordering': ['-last_entry_id'],
+                'indexes': [models.Index(fields=['account', '-last_entry_id'], name='payments_le_account_ffba43_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.8 on 2026-10-19 03:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_ledgerentry_ledgersnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('dataset', models.CharField(choices=[('payments', 'Paiements'), ('transactions', 'Transactions escrow')], max_length=20)),
+                ('export_format', models.CharField(choices=[('CSV', 'CSV'), ('JSONL', 'JSON Lines')], default='CSV', max_length=10)),
+                ('compress', models.BooleanField(default=True)),
+                ('date_from', models.DateTimeField(blank=True, null=True)),
+                ('date_to', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('PENDING', 'En attente'), ('RUNNING', 'En cours'), ('COMPLETED', 'Terminé'), ('FAILED', 'Échoué')], default='PENDING', max_length=20)),
+                ('file', models.FileField(blank=True, null=True, upload_to='exports/%Y/%m/%d/')),
+                ('file_size', models.PositiveBigIntegerField(default=0)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('error_message', models.TextField(blank=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Export',
+                'verbose_name_plural': 'Exports',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', '-created_at'], name='payments_ex_user_id_664d72_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-19 04:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_exportjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reconciliationmismatch',
+            name='mismatch_type',
+            field=models.CharField(choices=[('MISSING_IN_LEDGER', 'Absent des paiements'), ('MISSING_IN_STATEMENT', 'Absent du relevé'), ('AMOUNT_DRIFT', 'Écart de montant'), ('STATUS_DRIFT', 'Écart de statut'), ('DUPLICATE_IN_STATEMENT', 'Référence répétée dans le relevé'), ('DUPLICATE_IN_LEDGER', 'Référence partagée par plusieurs paiements')], max_length=30),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.8 on 2026-10-19 04:32
+
+import payments.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_reconciliation_duplicates'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=payments.models.export_storage, upload_to=payments.models.export_upload_to),
+        ),
+    ]
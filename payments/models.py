@@ -1,3 +1,8 @@
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
@@ -257,19 +262,21 @@ class EscrowAccount(TimeStampedModel):
     def can_withdraw(self, amount):
         return self.available_balance() >= amount and self.status == 'ACTIVE'
     
-    def freeze_amount(self, amount):
-        if self.available_balance() >= amount:
-            self.frozen_amount += amount
-            self.save(update_fields=['frozen_amount'])
-            return True
-        return False
-    
-    def unfreeze_amount(self, amount):
-        if self.frozen_amount >= amount:
-            self.frozen_amount -= amount
-            self.save(update_fields=['frozen_amount'])
-            return True
-        return False
+    def credit(self, amount, payment=None, description=''):
+        from .ledger import post_credit
+        return post_credit(self, amount, payment=payment, description=description)
+    
+    def debit(self, amount, payment=None, description=''):
+        from .ledger import post_debit
+        return post_debit(self, amount, payment=payment, description=description)
+    
+    def freeze_amount(self, amount, payment=None, description=''):
+        from .ledger import post_freeze
+        return post_freeze(self, amount, payment=payment, description=description)
+    
+    def unfreeze_amount(self, amount, payment=None, description=''):
+        from .ledger import post_unfreeze
+        return post_unfreeze(self, amount, payment=payment, description=description)
 
 
 class PaymentAttempt(TimeStampedModel):
@@ -298,4 +305,235 @@ class PaymentAttempt(TimeStampedModel):
         unique_together = ['payment', 'attempt_number']
     
     def __str__(self):
-        return f"{self.payment.reference} - Tentative {self.attempt_number} ({self.status})"
\ No newline at end of file
+        return f"{self.payment.reference} - Tentative {self.attempt_number} ({self.status})"
+
+class ReconciliationReport(TimeStampedModel):
+    """
+    Rapprochement d'un relevé fournisseur avec les paiements enregistrés
+    """
+    SOURCE_CHOICES = [
+        ('MTN_MOMO', 'MTN Mobile Money'),
+        ('ORANGE_MONEY', 'Orange Money'),
+        ('ESCROW_BANK', 'Banque Séquestre'),
+    ]
+    
+    FORMAT_CHOICES = [
+        ('CSV', 'CSV'),
+        ('JSONL', 'JSON Lines'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('PENDING', 'En attente'),
+        ('RUNNING', 'En cours'),
+        ('COMPLETED', 'Terminé'),
+        ('FAILED', 'Échoué'),
+    ]
+    
+    # Relevé
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    statement_file = models.FileField(upload_to='reconciliation/%Y/%m/%d/')
+    statement_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='CSV')
+    period_start = models.DateTimeField(null=True, blank=True)
+    period_end = models.DateTimeField(null=True, blank=True)
+    
+    # Traitement
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    error_message = models.TextField(blank=True)
+    
+    # Compteurs
+    rows_processed = models.PositiveIntegerField(default=0)
+    rows_matched = models.PositiveIntegerField(default=0)
+    mismatch_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "Rapprochement"
+        verbose_name_plural = "Rapprochements"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['source', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"Rapprochement {self.source} #{self.pk} ({self.status})"
+
+
+class ReconciliationMismatch(models.Model):
+    """
+    Écart détecté lors d'un rapprochement
+    """
+    TYPE_CHOICES = [
+        ('MISSING_IN_LEDGER', 'Absent des paiements'),
+        ('MISSING_IN_STATEMENT', 'Absent du relevé'),
+        ('AMOUNT_DRIFT', 'Écart de montant'),
+        ('STATUS_DRIFT', 'Écart de statut'),
+        ('DUPLICATE_IN_STATEMENT', 'Référence répétée dans le relevé'),
+        ('DUPLICATE_IN_LEDGER', 'Référence partagée par plusieurs paiements'),
+    ]
+    
+    report = models.ForeignKey(ReconciliationReport, on_delete=models.CASCADE, related_name='mismatches')
+    payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, null=True, blank=True, related_name='reconciliation_mismatches')
+    
+    mismatch_type = models.CharField(max_length=30, choices=TYPE_CHOICES)
+    external_reference = models.CharField(max_length=100, blank=True)
+    
+    # Valeurs comparées
+    statement_amount = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    ledger_amount = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    statement_status = models.CharField(max_length=50, blank=True)
+    ledger_status = models.CharField(max_length=20, blank=True)
+    
+    raw_data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Écart de Rapprochement"
+        verbose_name_plural = "Écarts de Rapprochement"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['report', 'mismatch_type']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_mismatch_type_display()} - {self.external_reference}"
+
+
+
+class LedgerEntry(models.Model):
+    """
+    Écriture comptable (en partie double) sur un compte séquestre.
+    
+    Chaque mouvement produit deux écritures de même montant partageant un
+    `journal_id` : un débit et un crédit sur deux livres différents. La
+    table est en ajout seul ; les corrections passent par des contre-écritures.
+    """
+    DIRECTION_CHOICES = [
+        ('DEBIT', 'Débit'),
+        ('CREDIT', 'Crédit'),
+    ]
+    
+    BOOK_CHOICES = [
+        ('AVAILABLE', 'Disponible'),
+        ('FROZEN', 'Gelé'),
+        ('EXTERNAL', 'Contrepartie externe'),
+    ]
+    
+    OPERATION_CHOICES = [
+        ('DEPOSIT', 'Dépôt'),
+        ('WITHDRAWAL', 'Retrait'),
+        ('FREEZE', 'Gel'),
+        ('UNFREEZE', 'Dégel'),
+    ]
+    
+    journal_id = models.UUIDField(db_index=True)
+    account = models.ForeignKey(EscrowAccount, on_delete=models.PROTECT, related_name='ledger_entries')
+    payment = models.ForeignKey(Payment, on_delete=models.PROTECT, null=True, blank=True, related_name='ledger_entries')
+    
+    operation = models.CharField(max_length=20, choices=OPERATION_CHOICES)
+    book = models.CharField(max_length=20, choices=BOOK_CHOICES)
+    direction = models.CharField(max_length=10, choices=DIRECTION_CHOICES)
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    
+    # Soldes du compte après le mouvement
+    balance_after = models.DecimalField(max_digits=15, decimal_places=2)
+    frozen_after = models.DecimalField(max_digits=15, decimal_places=2)
+    
+    description = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Écriture Comptable"
+        verbose_name_plural = "Écritures Comptables"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['account', 'id']),
+            models.Index(fields=['payment']),
+        ]
+    
+    def __str__(self):
+        return f"{self.account.account_number} - {self.direction} {self.book} {self.amount}"
+
+
+class LedgerSnapshot(models.Model):
+    """
+    Photographie périodique des soldes d'un compte séquestre.
+    
+    Le solde d'un compte se recalcule à partir de la dernière photographie
+    et des seules écritures postérieures à `last_entry_id`.
+    """
+    account = models.ForeignKey(EscrowAccount, on_delete=models.CASCADE, related_name='ledger_snapshots')
+    balance = models.DecimalField(max_digits=15, decimal_places=2)
+    frozen_amount = models.DecimalField(max_digits=15, decimal_places=2)
+    last_entry_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Photographie de Solde"
+        verbose_name_plural = "Photographies de Solde"
+        ordering = ['-last_entry_id']
+        indexes = [
+            models.Index(fields=['account', '-last_entry_id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.account.account_number} @ {self.last_entry_id}: {self.balance}"
+
+
+def export_storage():
+    """Stockage privé des exports : hors MEDIA_ROOT, jamais servi directement"""
+    return FileSystemStorage(
+        location=getattr(settings, 'PRIVATE_STORAGE_ROOT', os.path.join(settings.BASE_DIR, 'private'))
+    )
+
+
+def export_upload_to(instance, filename):
+    """Chemin aléatoire : le nom d'un export ne se devine pas"""
+    return f"exports/{uuid.uuid4().hex}/{filename}"
+
+
+class ExportJob(TimeStampedModel):
+    """
+    Export asynchrone de l'historique écrit dans le stockage
+    """
+    DATASET_CHOICES = [
+        ('payments', 'Paiements'),
+        ('transactions', 'Transactions escrow'),
+    ]
+    
+    FORMAT_CHOICES = [
+        ('CSV', 'CSV'),
+        ('JSONL', 'JSON Lines'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('PENDING', 'En attente'),
+        ('RUNNING', 'En cours'),
+        ('COMPLETED', 'Terminé'),
+        ('FAILED', 'Échoué'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_jobs')
+    dataset = models.CharField(max_length=20, choices=DATASET_CHOICES)
+    export_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='CSV')
+    compress = models.BooleanField(default=True)
+    date_from = models.DateTimeField(null=True, blank=True)
+    date_to = models.DateTimeField(null=True, blank=True)
+    
+    # Traitement
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    file = models.FileField(upload_to=export_upload_to, storage=export_storage, null=True, blank=True)
+    file_size = models.PositiveBigIntegerField(default=0)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    error_message = models.TextField(blank=True)
+    
+    class Meta:
+        verbose_name = "Export"
+        verbose_name_plural = "Exports"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Export {self.dataset} {self.export_format} - {self.user} ({self.status})"
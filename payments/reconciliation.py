@@ -0,0 +1,339 @@
+"""
+Rapprochement des relevés fournisseurs avec les paiements enregistrés.
+
+Les relevés sont lus en flux et traités par blocs : chaque bloc est joint
+aux paiements par `external_reference` via une seule requête indexée, et
+les écarts sont insérés en masse dans `ReconciliationMismatch`. La mémoire
+utilisée dépend de la taille des blocs, pas de la taille du relevé.
+
+Une référence répétée dans le relevé (ligne en double, double règlement)
+ou partagée par plusieurs paiements est signalée comme écart : seule la
+première occurrence est rapprochée.
+"""
+
+import csv
+import io
+import json
+import logging
+from array import array
+from bisect import bisect_left
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Payment, ReconciliationMismatch, ReconciliationReport
+
+logger = logging.getLogger(__name__)
+
+
+# Colonnes du relevé selon le fournisseur
+PROVIDER_COLUMNS = {
+    'MTN_MOMO': {
+        'reference': 'financialTransactionId',
+        'amount': 'amount',
+        'status': 'status',
+    },
+    'ORANGE_MONEY': {
+        'reference': 'txnid',
+        'amount': 'amount',
+        'status': 'status',
+    },
+    'ESCROW_BANK': {
+        'reference': 'reference',
+        'amount': 'amount',
+        'status': 'status',
+    },
+}
+
+# Statuts fournisseur -> statuts Payment
+PROVIDER_STATUS_MAP = {
+    'SUCCESSFUL': 'SUCCESS',
+    'SUCCESS': 'SUCCESS',
+    'SUCCEEDED': 'SUCCESS',
+    'COMPLETED': 'SUCCESS',
+    'PENDING': 'PENDING',
+    'INITIATED': 'PENDING',
+    'PROCESSING': 'PROCESSING',
+    'FAILED': 'FAILED',
+    'REJECTED': 'FAILED',
+    'CANCELLED': 'CANCELLED',
+    'EXPIRED': 'TIMEOUT',
+    'TIMEOUT': 'TIMEOUT',
+}
+
+# Le fournisseur collecte le montant total (montant + frais)
+LEDGER_AMOUNT_FIELD = 'total_amount'
+
+
+def iter_statement_rows(stream, statement_format: str = 'CSV') -> Iterator[Dict]:
+    """
+    Lire un relevé ligne par ligne sans le charger en mémoire
+
+    Args:
+        stream: Fichier binaire ouvert
+        statement_format: 'CSV' ou 'JSONL'
+    """
+    text_stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+    if statement_format == 'CSV':
+        yield from csv.DictReader(text_stream)
+    elif statement_format == 'JSONL':
+        for line in text_stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    else:
+        raise ValueError(f"Format de relevé non supporté: {statement_format}")
+
+
+def chunked(rows: Iterable, size: int) -> Iterator[List]:
+    """Découper un itérable en listes de `size` éléments au plus"""
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_amount(value) -> Optional[Decimal]:
+    """Convertir un montant du relevé en Decimal"""
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(str(value).replace(' ', '').replace(',', '.')).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+
+
+def normalize_status(value) -> str:
+    """Convertir un statut fournisseur en statut Payment"""
+    status = str(value or '').strip().upper()
+    return PROVIDER_STATUS_MAP.get(status, status)
+
+
+class StatementReconciler:
+    """
+    Rapprochement en flux d'un relevé fournisseur avec la table Payment
+    """
+
+    def __init__(self, report: ReconciliationReport, chunk_size: int = None):
+        self.report = report
+        self.chunk_size = chunk_size or getattr(settings, 'RECONCILIATION_CHUNK_SIZE', 5000)
+        self.columns = PROVIDER_COLUMNS.get(report.source, PROVIDER_COLUMNS['ESCROW_BANK'])
+        # Identifiants des paiements rapprochés (8 octets par ligne)
+        self._matched_ids = array('q')
+        # Paiements partageant la référence d'un paiement rapproché (déjà signalés)
+        self._duplicate_ids = set()
+
+    def run(self) -> ReconciliationReport:
+        """Exécuter le rapprochement complet et mettre à jour le rapport"""
+        report = self.report
+        report.status = 'RUNNING'
+        report.started_at = timezone.now()
+        report.save(update_fields=['status', 'started_at'])
+
+        try:
+            with report.statement_file.open('rb') as stream:
+                rows = iter_statement_rows(stream, report.statement_format)
+                for chunk in chunked(rows, self.chunk_size):
+                    self.process_chunk(chunk)
+
+            self.detect_repeated_matches()
+            self.detect_missing_in_statement()
+
+            report.status = 'COMPLETED'
+            report.completed_at = timezone.now()
+            report.save(update_fields=['status', 'completed_at'])
+            logger.info(
+                f"Rapprochement {report.pk} terminé: {report.rows_processed} lignes, "
+                f"{report.mismatch_count} écarts"
+            )
+        except Exception as e:
+            logger.error(f"Erreur rapprochement {report.pk}: {e}")
+            report.status = 'FAILED'
+            report.error_message = str(e)
+            report.completed_at = timezone.now()
+            report.save(update_fields=['status', 'error_message', 'completed_at'])
+            raise
+
+        return report
+
+    def process_chunk(self, rows: List[Dict]):
+        """Joindre un bloc de lignes aux paiements et enregistrer les écarts"""
+        reference_column = self.columns['reference']
+
+        mismatches = []
+        
+        # Côté construction de la jointure : le bloc du relevé
+        statement = {}
+        for row in rows:
+            reference = str(row.get(reference_column) or '').strip()
+            if not reference:
+                continue
+            if reference in statement:
+                mismatches.append(self._statement_mismatch('DUPLICATE_IN_STATEMENT', reference, row))
+                continue
+            statement[reference] = row
+
+        # Côté sonde : une requête sur l'index external_reference
+        ledger = Payment.objects.filter(
+            external_reference__in=statement.keys()
+        ).values('id', 'external_reference', 'status', LEDGER_AMOUNT_FIELD).order_by('id').iterator()
+
+        matched = 0
+        matched_references = set()
+        for payment in ledger:
+            reference = payment['external_reference']
+            row = statement.pop(reference, None)
+            if row is None:
+                if reference in matched_references:
+                    self._duplicate_ids.add(payment['id'])
+                    mismatches.append(ReconciliationMismatch(
+                        report=self.report,
+                        payment_id=payment['id'],
+                        mismatch_type='DUPLICATE_IN_LEDGER',
+                        external_reference=reference,
+                        ledger_amount=payment[LEDGER_AMOUNT_FIELD],
+                        ledger_status=payment['status'],
+                    ))
+                continue
+            matched_references.add(reference)
+            matched += 1
+            self._matched_ids.append(payment['id'])
+            mismatches.extend(self.compare(payment, row))
+
+        # Les références restantes n'existent pas côté paiements
+        for reference, row in statement.items():
+            mismatches.append(self._statement_mismatch('MISSING_IN_LEDGER', reference, row))
+
+        self._flush(len(rows), matched, mismatches)
+
+    def _statement_mismatch(self, mismatch_type: str, reference: str, row: Dict) -> ReconciliationMismatch:
+        """Écart portant sur une ligne du relevé"""
+        return ReconciliationMismatch(
+            report=self.report,
+            mismatch_type=mismatch_type,
+            external_reference=reference,
+            statement_amount=parse_amount(row.get(self.columns['amount'])),
+            statement_status=str(row.get(self.columns['status']) or '')[:50],
+            raw_data=row,
+        )
+
+    def compare(self, payment: Dict, row: Dict) -> List[ReconciliationMismatch]:
+        """Comparer un paiement avec sa ligne de relevé"""
+        mismatches = []
+        statement_amount = parse_amount(row.get(self.columns['amount']))
+        ledger_amount = payment[LEDGER_AMOUNT_FIELD]
+        raw_status = row.get(self.columns['status'])
+        statement_status = normalize_status(raw_status)
+
+        if statement_amount is not None and statement_amount != ledger_amount:
+            mismatches.append(ReconciliationMismatch(
+                report=self.report,
+                payment_id=payment['id'],
+                mismatch_type='AMOUNT_DRIFT',
+                external_reference=payment['external_reference'],
+                statement_amount=statement_amount,
+                ledger_amount=ledger_amount,
+                raw_data=row,
+            ))
+
+        if statement_status and statement_status != payment['status']:
+            mismatches.append(ReconciliationMismatch(
+                report=self.report,
+                payment_id=payment['id'],
+                mismatch_type='STATUS_DRIFT',
+                external_reference=payment['external_reference'],
+                statement_status=str(raw_status)[:50],
+                ledger_status=payment['status'],
+                raw_data=row,
+            ))
+
+        return mismatches
+
+    def detect_repeated_matches(self):
+        """Signaler les paiements rapprochés par des lignes de blocs différents"""
+        self._matched_ids = array('q', sorted(self._matched_ids))
+        repeated = sorted({
+            payment_id for previous, payment_id in zip(self._matched_ids, self._matched_ids[1:])
+            if previous == payment_id
+        })
+        if not repeated:
+            return
+
+        mismatches = [
+            ReconciliationMismatch(
+                report=self.report,
+                payment_id=payment['id'],
+                mismatch_type='DUPLICATE_IN_STATEMENT',
+                external_reference=payment['external_reference'],
+                ledger_amount=payment[LEDGER_AMOUNT_FIELD],
+                ledger_status=payment['status'],
+            )
+            for payment in Payment.objects.filter(pk__in=repeated)
+            .values('id', 'external_reference', 'status', LEDGER_AMOUNT_FIELD).order_by('id')
+        ]
+        self._flush(0, 0, mismatches)
+
+    def detect_missing_in_statement(self):
+        """Signaler les paiements réussis de la période absents du relevé"""
+        report = self.report
+        if not (report.period_start and report.period_end):
+            return
+
+        matched_ids = sorted(self._matched_ids)
+        self._matched_ids = array('q')
+
+        ledger = Payment.objects.filter(
+            payment_method__provider=report.source,
+            status='SUCCESS',
+            created_at__gte=report.period_start,
+            created_at__lt=report.period_end,
+        ).values('id', 'external_reference', 'status', LEDGER_AMOUNT_FIELD).order_by('id')
+
+        mismatches = []
+        for payment in ledger.iterator(chunk_size=self.chunk_size):
+            position = bisect_left(matched_ids, payment['id'])
+            if position < len(matched_ids) and matched_ids[position] == payment['id']:
+                continue
+            if payment['id'] in self._duplicate_ids:
+                continue
+            mismatches.append(ReconciliationMismatch(
+                report=report,
+                payment_id=payment['id'],
+                mismatch_type='MISSING_IN_STATEMENT',
+                external_reference=payment['external_reference'],
+                ledger_amount=payment[LEDGER_AMOUNT_FIELD],
+                ledger_status=payment['status'],
+            ))
+            if len(mismatches) >= self.chunk_size:
+                self._flush(0, 0, mismatches)
+                mismatches = []
+
+        self._flush(0, 0, mismatches)
+
+    def _flush(self, processed: int, matched: int, mismatches: List[ReconciliationMismatch]):
+        """Écrire les écarts d'un bloc et incrémenter les compteurs du rapport"""
+        if mismatches:
+            ReconciliationMismatch.objects.bulk_create(mismatches, batch_size=self.chunk_size)
+
+        if processed or matched or mismatches:
+            ReconciliationReport.objects.filter(pk=self.report.pk).update(
+                rows_processed=F('rows_processed') + processed,
+                rows_matched=F('rows_matched') + matched,
+                mismatch_count=F('mismatch_count') + len(mismatches),
+            )
+            self.report.rows_processed += processed
+            self.report.rows_matched += matched
+            self.report.mismatch_count += len(mismatches)
+
+
+def reconcile_statement(report_id: int, chunk_size: int = None) -> ReconciliationReport:
+    """Rapprocher le relevé d'un rapport existant"""
+    report = ReconciliationReport.objects.get(id=report_id)
+    return StatementReconciler(report, chunk_size=chunk_size).run()
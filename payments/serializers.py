@@ -1,5 +1,6 @@
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Payment, PaymentMethod, Webhook, EscrowAccount
+from .models import Payment, PaymentMethod, Webhook, EscrowAccount, ExportJob
 
 
 class PaymentMethodSerializer(serializers.ModelSerializer):
@@ -59,3 +60,37 @@ class EscrowAccountSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = fields
 
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    """Serializer pour les exports asynchrones"""
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    file_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ExportJob
+        fields = [
+            'id', 'dataset', 'export_format', 'compress', 'date_from', 'date_to',
+            'status', 'status_display', 'file_url', 'file_size', 'error_message',
+            'completed_at', 'created_at'
+        ]
+        read_only_fields = [
+            'id', 'status', 'status_display', 'file_url', 'file_size',
+            'error_message', 'completed_at', 'created_at'
+        ]
+    
+    def get_file_url(self, obj):
+        if obj.status != 'COMPLETED' or not obj.file:
+            return None
+        url = reverse('export-job-download', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+    
+    def validate(self, attrs):
+        date_from = attrs.get('date_from')
+        date_to = attrs.get('date_to')
+        if date_from and date_to and date_to <= date_from:
+            raise serializers.ValidationError(
+                {"date_to": "La date de fin doit être après la date de début."}
+            )
+        return attrs
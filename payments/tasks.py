@@ -0,0 +1,88 @@
+from celery import shared_task
+import logging
+
+from .models import ReconciliationReport
+from .reconciliation import reconcile_statement
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, max_retries=0)
+def reconcile_provider_statement(self, report_id: int):
+    """
+    Rapprocher un relevé fournisseur avec les paiements enregistrés
+    """
+    try:
+        report = reconcile_statement(report_id)
+        return {
+            'report_id': report.id,
+            'rows_processed': report.rows_processed,
+            'mismatch_count': report.mismatch_count,
+        }
+    except ReconciliationReport.DoesNotExist:
+        logger.error(f"Rapport de rapprochement {report_id} non trouvé")
+        return "Rapport non trouvé"
+
+
+@shared_task
+def snapshot_ledger_balances():
+    """
+    Photographier les soldes des comptes séquestres ayant de nouvelles écritures
+    """
+    from .ledger import accounts_needing_snapshot, take_snapshot, verify_account
+    
+    count = 0
+    for account in accounts_needing_snapshot().iterator():
+        take_snapshot(account)
+        count += 1
+        
+        report = verify_account(account)
+        if not report['consistent']:
+            logger.error(f"Écart grand livre pour le compte {account.account_number}: {report}")
+    
+    logger.info(f"Photographies de solde créées pour {count} comptes")
+    return count
+
+
+@shared_task(bind=True, max_retries=0)
+def generate_export(self, job_id: int):
+    """Écrire un export d'historique dans le stockage"""
+    import tempfile
+    from django.core.files import File
+    from django.utils import timezone
+    from .exports import export_filename, stream_export
+    from .models import ExportJob
+    
+    job = ExportJob.objects.select_related('user').get(id=job_id)
+    job.status = 'RUNNING'
+    job.save(update_fields=['status', 'updated_at'])
+    
+    try:
+        chunks = stream_export(
+            job.dataset, job.user, job.export_format, job.compress,
+            date_from=job.date_from, date_to=job.date_to
+        )
+        # Fichier temporaire sur disque : la mémoire reste constante
+        with tempfile.TemporaryFile() as buffer:
+            for chunk in chunks:
+                buffer.write(chunk)
+            job.file_size = buffer.tell()
+            buffer.seek(0)
+            job.file.save(
+                export_filename(job.dataset, job.export_format, job.compress),
+                File(buffer),
+                save=False
+            )
+        
+        job.status = 'COMPLETED'
+        job.completed_at = timezone.now()
+        job.save(update_fields=['status', 'file', 'file_size', 'completed_at', 'updated_at'])
+        logger.info(f"Export {job.id} terminé ({job.file_size} octets)")
+        
+    except Exception as e:
+        logger.error(f"Erreur export {job_id}: {e}")
+        job.status = 'FAILED'
+        job.error_message = str(e)
+        job.completed_at = timezone.now()
+        job.save(update_fields=['status', 'error_message', 'completed_at', 'updated_at'])
+        raise
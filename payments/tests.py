@@ -1,7 +1,8 @@
 import json
 from decimal import Decimal
 from datetime import datetime, timedelta
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
+from django.conf import settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
@@ -95,3 +96,379 @@ class MobileMoneyPaymentTestCase(APITestCase):
         self.assertEqual(payment.provider, 'MTN_MOMO')
         self.assertEqual(payment.status, 'PENDING')
         self.assertEqual(payment.reference, 'MTN-12345-ABCDE')
+
+
+class StatementReconciliationTestCase(TestCase):
+    """Tests pour le rapprochement des relevés fournisseurs"""
+    
+    def setUp(self):
+        from datetime import timedelta
+        
+        self.buyer = User.objects.create_user(
+            email='buyer@example.com',
+            password='TestPassword123!',
+            first_name='John',
+            last_name='Buyer',
+            phone_number='+237612345678'
+        )
+        self.method = PaymentMethod.objects.create(name='MTN MoMo', provider='MTN_MOMO')
+        
+        def make_payment(external_reference, amount, status='SUCCESS'):
+            return Payment.objects.create(
+                user=self.buyer,
+                payment_method=self.method,
+                payment_type='COLLECTION',
+                amount=Decimal(amount),
+                phone_number='+237612345678',
+                external_reference=external_reference,
+                status=status
+            )
+        
+        self.ok = make_payment('MTN-1', '1000')
+        self.drift = make_payment('MTN-2', '2000')
+        self.status_drift = make_payment('MTN-3', '3000', status='PENDING')
+        self.unreported = make_payment('MTN-4', '4000')
+        
+        now = timezone.now()
+        self.period_start = now - timedelta(hours=1)
+        self.period_end = now + timedelta(hours=1)
+    
+    def _report(self, content, statement_format='CSV'):
+        from django.core.files.base import ContentFile
+        from .models import ReconciliationReport
+        
+        report = ReconciliationReport(
+            source='MTN_MOMO',
+            statement_format=statement_format,
+            period_start=self.period_start,
+            period_end=self.period_end
+        )
+        report.statement_file.save('statement.txt', ContentFile(content.encode('utf-8')), save=False)
+        report.save()
+        self.addCleanup(report.statement_file.delete, save=False)
+        return report
+    
+    def test_csv_statement_mismatches(self):
+        """Les écarts de montant, de statut et les absences sont détectés"""
+        from .reconciliation import reconcile_statement
+        
+        report = self._report(
+            "financialTransactionId,amount,status\n"
+            "MTN-1,1000,SUCCESSFUL\n"
+            "MTN-2,2500,SUCCESSFUL\n"
+            "MTN-3,3000,SUCCESSFUL\n"
+            "MTN-9,900,SUCCESSFUL\n"
+        )
+        
+        report = reconcile_statement(report.id, chunk_size=2)
+        
+        self.assertEqual(report.status, 'COMPLETED')
+        self.assertEqual(report.rows_processed, 4)
+        self.assertEqual(report.rows_matched, 3)
+        
+        found = set(report.mismatches.values_list('mismatch_type', 'external_reference'))
+        self.assertEqual(found, {
+            ('AMOUNT_DRIFT', 'MTN-2'),
+            ('STATUS_DRIFT', 'MTN-3'),
+            ('MISSING_IN_LEDGER', 'MTN-9'),
+            ('MISSING_IN_STATEMENT', 'MTN-4'),
+        })
+        self.assertEqual(report.mismatch_count, 4)
+    
+    def test_jsonl_statement(self):
+        """Les relevés JSON Lines sont lus ligne par ligne"""
+        from .reconciliation import reconcile_statement
+        
+        report = self._report(
+            '{"financialTransactionId": "MTN-1", "amount": "1000", "status": "SUCCESSFUL"}\n'
+            '{"financialTransactionId": "MTN-2", "amount": "2000", "status": "SUCCESSFUL"}\n'
+            '{"financialTransactionId": "MTN-4", "amount": "4000", "status": "SUCCESSFUL"}\n',
+            statement_format='JSONL'
+        )
+        
+        report = reconcile_statement(report.id)
+        
+        # MTN-3 est en attente : il n'est pas attendu dans le relevé
+        self.assertEqual(report.rows_matched, 3)
+        self.assertFalse(report.mismatches.exists())
+    
+    def test_repeated_references_are_reported(self):
+        """Les références répétées du relevé ou partagées côté paiements sont des écarts"""
+        from .reconciliation import reconcile_statement
+        
+        shared = Payment.objects.create(
+            user=self.buyer, payment_method=self.method, payment_type='COLLECTION',
+            amount=Decimal('2000'), phone_number='+237612345678',
+            external_reference='MTN-2', status='SUCCESS'
+        )
+        report = self._report(
+            "financialTransactionId,amount,status\n"
+            "MTN-1,1000,SUCCESSFUL\n"
+            "MTN-1,1000,SUCCESSFUL\n"
+            "MTN-2,2000,SUCCESSFUL\n"
+            "MTN-4,4000,SUCCESSFUL\n"
+            "MTN-2,2000,SUCCESSFUL\n"
+        )
+        
+        report = reconcile_statement(report.id, chunk_size=4)
+        
+        found = sorted(report.mismatches.values_list('mismatch_type', 'external_reference', 'payment_id'))
+        self.assertEqual(found, sorted([
+            ('DUPLICATE_IN_STATEMENT', 'MTN-1', None),
+            ('DUPLICATE_IN_LEDGER', 'MTN-2', shared.pk),
+            ('DUPLICATE_IN_STATEMENT', 'MTN-2', self.drift.pk),
+            ('DUPLICATE_IN_LEDGER', 'MTN-2', shared.pk),
+        ]))
+
+
+def create_escrow_account(balance=0):
+    """Créer un compte séquestre avec sa transaction pour les tests"""
+    from .models import EscrowAccount
+    
+    buyer = User.objects.create_user(
+        email=f'ledger-buyer-{User.objects.count()}@example.com',
+        password='TestPassword123!',
+        first_name='John',
+        last_name='Buyer'
+    )
+    seller = User.objects.create_user(
+        email=f'ledger-seller-{User.objects.count()}@example.com',
+        password='TestPassword123!',
+        first_name='Jane',
+        last_name='Seller'
+    )
+    transaction_obj = EscrowTransaction.objects.create(
+        buyer=buyer,
+        seller=seller,
+        title='Test Transaction',
+        description='Test description',
+        amount=Decimal('100000'),
+        payment_deadline=timezone.now() + timedelta(days=1),
+        delivery_deadline=timezone.now() + timedelta(days=7)
+    )
+    account = EscrowAccount.objects.create(
+        account_number=f'ESC-{transaction_obj.transaction_id}',
+        transaction=transaction_obj
+    )
+    if balance:
+        account.credit(balance, description='Dépôt initial')
+    return account
+
+
+class LedgerTestCase(TestCase):
+    """Tests pour le grand livre des comptes séquestres"""
+    
+    def setUp(self):
+        self.account = create_escrow_account(balance=Decimal('1000'))
+    
+    def test_movements_are_double_entry(self):
+        """Chaque mouvement produit un débit et un crédit de même montant"""
+        from .models import LedgerEntry
+        
+        self.assertTrue(self.account.freeze_amount(Decimal('300')))
+        self.assertTrue(self.account.unfreeze_amount(Decimal('100')))
+        self.assertTrue(self.account.debit(Decimal('500')))
+        
+        entries = LedgerEntry.objects.filter(account=self.account)
+        self.assertEqual(entries.count(), 8)
+        for journal_id in entries.values_list('journal_id', flat=True).distinct():
+            legs = entries.filter(journal_id=journal_id)
+            self.assertEqual(sorted(legs.values_list('direction', flat=True)), ['CREDIT', 'DEBIT'])
+            self.assertEqual(len(set(legs.values_list('amount', flat=True))), 1)
+        
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('500'))
+        self.assertEqual(self.account.frozen_amount, Decimal('200'))
+    
+    def test_guards_reject_overdraft(self):
+        """Les conditions SQL empêchent de dépasser le solde disponible"""
+        self.assertTrue(self.account.freeze_amount(Decimal('800')))
+        self.assertFalse(self.account.freeze_amount(Decimal('300')))
+        self.assertFalse(self.account.debit(Decimal('300')))
+        self.assertFalse(self.account.unfreeze_amount(Decimal('900')))
+        
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.available_balance(), Decimal('200'))
+    
+    def test_snapshot_and_verification(self):
+        """Les photographies reprennent le solde sans sommer tout l'historique"""
+        from .ledger import compute_balances, take_snapshot, verify_account
+        
+        self.account.freeze_amount(Decimal('250'))
+        snapshot = take_snapshot(self.account)
+        self.assertEqual(snapshot.balance, Decimal('1000'))
+        self.assertEqual(snapshot.frozen_amount, Decimal('250'))
+        
+        self.account.credit(Decimal('50'))
+        balance, frozen_amount, last_entry_id = compute_balances(self.account)
+        self.assertEqual((balance, frozen_amount), (Decimal('1050'), Decimal('250')))
+        self.assertGreater(last_entry_id, snapshot.last_entry_id)
+        self.assertTrue(verify_account(self.account)['consistent'])
+
+
+class LedgerConcurrencyTestCase(TransactionTestCase):
+    """Test de charge concurrente sur le gel des fonds"""
+    
+    THREADS = 16
+    
+    def test_concurrent_freezes_never_overdraw(self):
+        """Des gels concurrents ne dépassent jamais le solde disponible"""
+        import threading
+        import time
+        from django.db import connection, OperationalError
+        from .models import EscrowAccount, LedgerEntry
+        
+        account = create_escrow_account(balance=Decimal('500'))
+        results = []
+        dropped = []
+        barrier = threading.Barrier(self.THREADS)
+        
+        def worker():
+            try:
+                barrier.wait()
+                for attempt in range(50):
+                    try:
+                        local = EscrowAccount.objects.get(pk=account.pk)
+                        results.append(local.freeze_amount(Decimal('100')))
+                        break
+                    except OperationalError:
+                        # SQLite sérialise les écritures ("database is locked")
+                        time.sleep(0.01 * (attempt + 1))
+                else:
+                    dropped.append(threading.current_thread().name)
+            except Exception as e:
+                dropped.append(f"{threading.current_thread().name}: {e}")
+            finally:
+                connection.close()
+        
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        # Chaque gel lancé a abouti (accepté ou refusé) : aucun n'est perdu
+        self.assertEqual(dropped, [])
+        self.assertEqual(len(results), self.THREADS)
+        account.refresh_from_db()
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual(account.frozen_amount, Decimal('500'))
+        self.assertEqual(
+            LedgerEntry.objects.filter(account=account, operation='FREEZE').count(),
+            results.count(True) * 2
+        )
+
+
+class PaymentExportTestCase(APITestCase):
+    """Tests pour l'export en flux de l'historique"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='export@example.com',
+            password='TestPassword123!',
+            first_name='John',
+            last_name='Export'
+        )
+        other = User.objects.create_user(
+            email='other@example.com',
+            password='TestPassword123!',
+            first_name='Jane',
+            last_name='Other'
+        )
+        self.method = PaymentMethod.objects.create(name='MTN MoMo', provider='MTN_MOMO')
+        for index, owner in enumerate([self.user, self.user, self.user, other]):
+            Payment.objects.create(
+                user=owner,
+                payment_method=self.method,
+                payment_type='COLLECTION',
+                amount=Decimal('1000') * (index + 1),
+                phone_number='+237612345678',
+                external_reference=f'MTN-{index}',
+            )
+        old = Payment.objects.get(external_reference='MTN-0')
+        Payment.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=30))
+        
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('payment-export')
+    
+    def _content(self, response):
+        return b''.join(response.streaming_content)
+    
+    def test_csv_export_streams_user_payments(self):
+        """L'export CSV contient uniquement les paiements de l'utilisateur"""
+        import csv
+        import io
+        
+        response = self.client.get(self.url, {'export_format': 'csv'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(self._content(response).decode('utf-8'))))
+        self.assertEqual([row['external_reference'] for row in rows], ['MTN-0', 'MTN-1', 'MTN-2'])
+        self.assertEqual(rows[1]['provider'], 'MTN_MOMO')
+    
+    def test_jsonl_gzip_export_with_date_filter(self):
+        """L'export JSONL compressé respecte le filtre de dates"""
+        import gzip
+        
+        response = self.client.get(self.url, {
+            'export_format': 'jsonl',
+            'gzip': '1',
+            'date_from': (timezone.now() - timedelta(days=1)).date().isoformat(),
+            'date_to': timezone.now().date().isoformat(),
+        })
+        
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(self._content(response)).decode('utf-8').splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['external_reference'] for row in rows], ['MTN-1', 'MTN-2'])
+        self.assertEqual(rows[0]['amount'], '2000.00')
+    
+    def test_invalid_parameters(self):
+        """Les paramètres invalides sont refusés"""
+        self.assertEqual(self.client.get(self.url, {'dataset': 'users'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'export_format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'date_from': 'hier'}).status_code, 400)
+    
+    def test_async_export_job_writes_to_storage(self):
+        """Un export asynchrone est écrit dans le stockage"""
+        import gzip
+        from .models import ExportJob
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('export-job-list-create'), {
+                'dataset': 'payments',
+                'export_format': 'CSV',
+                'compress': True,
+            }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        job = ExportJob.objects.get(user=self.user)
+        self.addCleanup(job.file.delete, save=False)
+        self.assertEqual(job.status, 'COMPLETED')
+        self.assertEqual(job.file_size, job.file.size)
+        self.assertNotIn(str(settings.MEDIA_ROOT), job.file.path)
+        
+        detail = self.client.get(reverse('export-job-detail', args=[job.id]))
+        download_url = reverse('export-job-download', args=[job.id])
+        self.assertTrue(detail.data['file_url'].endswith(download_url))
+        
+        response = self.client.get(download_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 4)
+    
+    def test_export_download_is_restricted_to_owner(self):
+        """Un export n'est téléchargeable que par son auteur"""
+        from .models import ExportJob
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('export-job-list-create'), {'dataset': 'payments'}, format='json')
+        job = ExportJob.objects.get(user=self.user)
+        self.addCleanup(job.file.delete, save=False)
+        
+        self.client.force_authenticate(user=User.objects.get(email='other@example.com'))
+        response = self.client.get(reverse('export-job-download', args=[job.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
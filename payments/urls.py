@@ -13,4 +13,10 @@ urlpatterns = [
     # Gestion des paiements
     path('methods/', views.PaymentMethodListView.as_view(), name='payment-methods'),
     path('history/', views.PaymentHistoryView.as_view(), name='payment-history'),
+    
+    # Exports
+    path('export/', views.PaymentExportView.as_view(), name='payment-export'),
+    path('exports/', views.ExportJobListCreateView.as_view(), name='export-job-list-create'),
+    path('exports/<int:pk>/', views.ExportJobDetailView.as_view(), name='export-job-detail'),
+    path('exports/<int:pk>/download/', views.ExportJobDownloadView.as_view(), name='export-job-download'),
 ]
@@ -1,14 +1,23 @@
 from rest_framework import generics, status, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from django.db import transaction
+from django.http import FileResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.contrib.auth import get_user_model
 import logging
+import os
 
-from .models import Payment, PaymentMethod, Webhook
-from .serializers import PaymentSerializer, PaymentMethodSerializer
+from .models import Payment, PaymentMethod, Webhook, ExportJob
+from .serializers import PaymentSerializer, PaymentMethodSerializer, ExportJobSerializer
+from .exports import (
+    EXPORT_DATASETS, EXPORT_FORMATS, export_content_type, export_filename,
+    parse_boundary, stream_export
+)
+from .tasks import generate_export
 from core.utils import APIResponseMixin
+from core.idempotency import idempotent
 from core.permissions import IsKYCVerified
 
 User = get_user_model()
@@ -19,6 +28,7 @@ class MobileMoneyCollectionView(APIView, APIResponseMixin):
     """Initier une collecte Mobile Money"""
     permission_classes = [permissions.IsAuthenticated, IsKYCVerified]
     
+    @idempotent
     def post(self, request):
         # Logique de collecte Mobile Money
         return self.success_response({
@@ -61,6 +71,79 @@ class PaymentHistoryView(generics.ListAPIView):
         return Payment.objects.filter(user=self.request.user).order_by('-created_at')
 
 
+class PaymentExportView(APIView, APIResponseMixin):
+    """
+    Export en flux de l'historique (paiements ou transactions)
+    
+    Paramètres: dataset (payments|transactions), export_format (csv|jsonl),
+    gzip (0|1), date_from, date_to
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        dataset = request.query_params.get('dataset', 'payments')
+        export_format = request.query_params.get('export_format', 'csv').upper()
+        compress = request.query_params.get('gzip') in ('1', 'true')
+        
+        if dataset not in EXPORT_DATASETS:
+            return self.error_response("Jeu de données inconnu")
+        if export_format not in EXPORT_FORMATS:
+            return self.error_response("Format d'export non supporté")
+        
+        try:
+            date_from = parse_boundary(request.query_params.get('date_from'))
+            date_to = parse_boundary(request.query_params.get('date_to'), end=True)
+        except ValueError as e:
+            return self.error_response(str(e))
+        
+        response = StreamingHttpResponse(
+            stream_export(dataset, request.user, export_format, compress, date_from, date_to),
+            content_type=export_content_type(export_format, compress)
+        )
+        filename = export_filename(dataset, export_format, compress)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class ExportJobListCreateView(generics.ListCreateAPIView, APIResponseMixin):
+    """Exports asynchrones de l'historique, écrits dans le stockage"""
+    serializer_class = ExportJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return ExportJob.objects.filter(user=self.request.user).order_by('-created_at')
+    
+    def perform_create(self, serializer):
+        job = serializer.save(user=self.request.user)
+        transaction.on_commit(lambda: generate_export.delay(job.id))
+
+
+class ExportJobDetailView(generics.RetrieveAPIView):
+    """Statut et lien de téléchargement d'un export"""
+    serializer_class = ExportJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return ExportJob.objects.filter(user=self.request.user)
+
+
+class ExportJobDownloadView(APIView, APIResponseMixin):
+    """Téléchargement en flux d'un export, réservé à son auteur"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, pk):
+        job = ExportJob.objects.filter(pk=pk, user=request.user, status='COMPLETED').first()
+        if not job or not job.file:
+            return self.error_response("Export non trouvé", status_code=404)
+        
+        return FileResponse(
+            job.file.open('rb'),
+            as_attachment=True,
+            filename=os.path.basename(job.file.name),
+            content_type=export_content_type(job.export_format, job.compress)
+        )
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class MTNWebhookView(APIView):
     """Webhook MTN Mobile Money"""
@@ -0,0 +1,115 @@
+"""
+Suivi de l'activité des utilisateurs sans écriture en base à chaque requête.
+
+Chaque requête authentifiée marque l'utilisateur dans un bitmap journalier
+du cache partagé (`SETBIT activity:users:<jour> <id> 1` avec Redis) : le
+nombre d'utilisateurs actifs sur une période est un `BITOP OR` suivi d'un
+`BITCOUNT`, sans requête SQL.
+
+`last_activity` (utilisateur et sessions actives) n'est écrit qu'une fois
+par `ACTIVITY_WRITE_INTERVAL` secondes et par utilisateur : la requête qui
+obtient le créneau d'écriture transmet aussitôt l'horodatage à la tâche
+`record_user_activity`, sans attente dans la mémoire du processus.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from core.utils import enqueue_task
+
+logger = logging.getLogger(__name__)
+
+
+def _day_key(day) -> str:
+    return f"activity:users:{day:%Y%m%d}"
+
+
+def _retention() -> int:
+    return getattr(settings, 'ACTIVITY_RETENTION_DAYS', 35) * 86400
+
+
+class RedisActivityStore:
+    """Bitmaps journaliers dans Redis"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def mark(self, user_id: int, day):
+        key = cache.make_key(_day_key(day))
+        pipeline = self.client.pipeline()
+        pipeline.setbit(key, user_id, 1)
+        pipeline.expire(key, _retention())
+        pipeline.execute()
+
+    def count(self, days) -> int:
+        keys = [cache.make_key(_day_key(day)) for day in days]
+        if len(keys) == 1:
+            return self.client.bitcount(keys[0])
+
+        destination = cache.make_key(f"activity:union:{keys[0]}:{len(keys)}")
+        pipeline = self.client.pipeline()
+        pipeline.bitop('OR', destination, *keys)
+        pipeline.bitcount(destination)
+        pipeline.delete(destination)
+        return pipeline.execute()[1]
+
+
+class CacheActivityStore:
+    """Ensembles d'identifiants dans le cache Django (développement, tests)"""
+
+    def mark(self, user_id: int, day):
+        key = _day_key(day)
+        users = cache.get(key) or set()
+        if user_id not in users:
+            users.add(user_id)
+            cache.set(key, users, _retention())
+
+    def count(self, days) -> int:
+        active = set()
+        for users in cache.get_many([_day_key(day) for day in days]).values():
+            active |= users
+        return len(active)
+
+
+def get_store():
+    """Bitmaps Redis si le cache est Redis, sinon le cache Django"""
+    backend = getattr(cache, '_cache', None)
+    if hasattr(backend, 'get_client'):
+        return RedisActivityStore(backend.get_client(write=True))
+    return CacheActivityStore()
+
+
+def record_activity(user_id: int):
+    """Enregistrer l'activité d'un utilisateur (appelé à chaque requête authentifiée)"""
+    now = timezone.now()
+    try:
+        get_store().mark(user_id, timezone.localdate(now))
+
+        # Au plus une écriture de last_activity par intervalle et par utilisateur
+        key = f"activity:written:{user_id}"
+        interval = getattr(settings, 'ACTIVITY_WRITE_INTERVAL', 300)
+        if not cache.add(key, 1, interval):
+            return
+    except Exception as e:
+        logger.warning(f"Suivi d'activité indisponible: {e}")
+        return
+
+    from .tasks import record_user_activity
+    if not enqueue_task(record_user_activity, [(user_id, now.isoformat())]):
+        # Libérer le créneau : la requête suivante retentera l'écriture
+        cache.delete(key)
+
+
+def count_active_users(days: int = 1) -> int:
+    """Nombre d'utilisateurs distincts actifs sur les `days` derniers jours"""
+    today = timezone.localdate()
+    try:
+        return get_store().count([today - timedelta(days=offset) for offset in range(days)])
+    except Exception as e:
+        logger.warning(f"Comptage d'activité indisponible: {e}")
+        return 0
+
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
+from core.changelist import LargeTableAdminMixin
 from .models import CustomUser, KYCDocument, UserProfile, UserSession, LoginAttempt
 
 
@@ -18,14 +19,14 @@ class UserProfileInline(admin.StackedInline):
 
 
 @admin.register(CustomUser)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(LargeTableAdminMixin, UserAdmin):
     inlines = (UserProfileInline, KYCDocumentInline)
     
     # Champs à afficher dans la liste
     list_display = ('phone_number', 'first_name', 'last_name', 'role', 'kyc_status', 'is_phone_verified', 'is_active', 'created_at')
     list_filter = ('role', 'kyc_status', 'is_phone_verified', 'is_active', 'created_at')
     search_fields = ('phone_number', 'first_name', 'last_name', 'email')
-    ordering = ('-created_at',)
+    ordering = ('-created_at', '-id')
     
     # Champs dans le formulaire de détail
     fieldsets = (
@@ -80,8 +81,10 @@ class CustomUserAdmin(UserAdmin):
 
 
 @admin.register(KYCDocument)
-class KYCDocumentAdmin(admin.ModelAdmin):
+class KYCDocumentAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'document_type', 'status', 'confidence_score', 'created_at')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
     list_filter = ('document_type', 'status', 'created_at')
     search_fields = ('user__phone_number', 'user__first_name', 'user__last_name')
     readonly_fields = ('file_hash', 'file_size', 'smile_id_job_id', 'smile_id_result', 
@@ -119,8 +122,10 @@ class KYCDocumentAdmin(admin.ModelAdmin):
 
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'total_transactions', 'successful_transactions', 'rating_avg', 'email_verified')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
     list_filter = ('email_verified', 'bank_account_verified', 'email_notifications', 'sms_notifications')
     search_fields = ('user__phone_number', 'user__first_name', 'user__last_name', 'occupation', 'company_name')
     readonly_fields = ('total_transactions', 'successful_transactions', 'total_volume', 
@@ -155,8 +160,10 @@ class UserProfileAdmin(admin.ModelAdmin):
 
 
 @admin.register(UserSession)
-class UserSessionAdmin(admin.ModelAdmin):
+class UserSessionAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'device_info', 'ip_address', 'is_active', 'created_at', 'last_activity')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
     list_filter = ('is_active', 'created_at', 'last_activity')
     search_fields = ('user__phone_number', 'device_info', 'ip_address')
     readonly_fields = ('session_token', 'created_at', 'last_activity')
@@ -169,7 +176,7 @@ class UserSessionAdmin(admin.ModelAdmin):
 
 
 @admin.register(LoginAttempt)
-class LoginAttemptAdmin(admin.ModelAdmin):
+class LoginAttemptAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('phone_number', 'ip_address', 'success', 'failure_reason', 'attempted_at')
     list_filter = ('success', 'attempted_at')
     search_fields = ('phone_number', 'ip_address')
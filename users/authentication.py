@@ -0,0 +1,41 @@
+"""
+Authentification JWT sans chargement de l'utilisateur à chaque requête
+"""
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import ClaimsUser
+from .tokens import TOKEN_CLAIMS, VERSION_CLAIM, get_user_state
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Authentification JWT construisant l'utilisateur depuis les claims du jeton
+
+    Le jeton doit porter la version courante des jetons de l'utilisateur
+    (lue dans le cache) ; les jetons émis avant l'ajout des claims sont
+    traités comme par `JWTAuthentication`.
+    """
+
+    def get_user(self, validated_token):
+        if VERSION_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Le jeton ne contient pas d'identifiant utilisateur")
+
+        state = get_user_state(user_id)
+        if state is None:
+            raise AuthenticationFailed("Utilisateur introuvable", code='user_not_found')
+        if not state['is_active']:
+            raise AuthenticationFailed("Compte désactivé", code='user_inactive')
+        if state['token_version'] != validated_token[VERSION_CLAIM]:
+            raise InvalidToken("Le jeton n'est plus à jour, veuillez le rafraîchir")
+
+        claims = {field: validated_token.get(field) for field in TOKEN_CLAIMS}
+        claims['token_version'] = state['token_version']
+        return ClaimsUser.from_claims(user_id, claims)
@@ -4,35 +4,63 @@ Backends d'authentification personnalisés pour Kimi Escrow
 
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
+from django.db.models import Q
+
+from core.utils import sanitize_phone_number
+
+
+def normalize_identifier(username: str):
+    """
+    Normaliser l'identifiant de connexion
+
+    Returns:
+        (email, téléphone) ; l'un des deux est None
+    """
+    username = username.strip()
+    if '@' in username:
+        return username.lower(), None
+    return None, sanitize_phone_number(username)
 
 
 class EmailBackend(ModelBackend):
     """
     Backend d'authentification personnalisé qui utilise l'email comme identifiant
+
+    L'email ou le numéro de téléphone (normalisé, unique) est recherché en
+    une seule requête. Un hachage factice est calculé quand aucun compte ne
+    correspond, afin que la durée de la réponse ne révèle pas l'existence du
+    compte. Le mot de passe est rehaché à la connexion si l'algorithme ou le
+    nombre d'itérations a changé (`check_password`).
     """
-    
+
     def authenticate(self, request, username=None, password=None, **kwargs):
         UserModel = get_user_model()
-        
+
         if username is None:
             username = kwargs.get(UserModel.USERNAME_FIELD)
-        
+
         if username is None or password is None:
             return None
-        
-        try:
-            # Essayer de trouver l'utilisateur par email
-            user = UserModel.objects.get(email=username)
-        except UserModel.DoesNotExist:
-            # Essayer par numéro de téléphone (pour la compatibilité)
-            try:
-                user = UserModel.objects.get(phone_number=username)
-            except UserModel.DoesNotExist:
-                return None
-        
+
+        email, phone_number = normalize_identifier(username)
+        if email:
+            lookup = Q(email=email)
+        elif phone_number:
+            # Compatibilité : connexion par numéro de téléphone
+            lookup = Q(phone_number=phone_number)
+        else:
+            lookup = None
+
+        user = UserModel._default_manager.filter(lookup).first() if lookup else None
+
+        if user is None:
+            # Hachage factice : même coût que pour un compte existant
+            UserModel().set_password(password)
+            return None
+
         if user.check_password(password) and self.user_can_authenticate(user):
             return user
-    
+
     def get_user(self, user_id):
         UserModel = get_user_model()
         try:
@@ -0,0 +1,145 @@
+"""
+Préparation des images KYC avant leur envoi à Smile ID.
+
+Les photos prises au téléphone dépassent souvent 4000 px et plusieurs
+mégaoctets alors que la vérification n'en exploite qu'une fraction. Avant
+soumission, chaque image est :
+
+- redressée selon son orientation EXIF ;
+- réduite à `KYC_IMAGE_MAX_DIMENSION` pixels sur le plus grand côté
+  (décodage JPEG directement à échelle réduite quand c'est possible) ;
+- recompressée en JPEG (`KYC_IMAGE_QUALITY`).
+
+Le rendu est enregistré dans le stockage sous un nom dérivé de l'empreinte
+du fichier source et des paramètres : une nouvelle tentative ou une
+seconde soumission du même contenu réutilise le rendu existant. L'encodage
+base64 est fait bloc par bloc au moment de l'envoi (voir
+`users.services`), sans jamais charger l'image encodée en mémoire.
+"""
+
+import base64
+import hashlib
+import logging
+from io import BytesIO
+from typing import Iterator, Tuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+RENDITION_PREFIX = 'renditions/kyc'
+
+# Multiple de 3 : chaque bloc s'encode en base64 sans remplissage intermédiaire
+BASE64_CHUNK_SIZE = 3 * 16 * 1024
+
+# Types transmis tels quels (pas de rendu)
+PASSTHROUGH_FORMATS = ('PDF',)
+
+
+def get_rendition_options() -> Tuple[int, int]:
+    """(dimension maximale en pixels, qualité JPEG)"""
+    return (
+        getattr(settings, 'KYC_IMAGE_MAX_DIMENSION', 1600),
+        getattr(settings, 'KYC_IMAGE_QUALITY', 85),
+    )
+
+
+def rendition_name(sha256: str, max_dimension: int, quality: int) -> str:
+    return f"{RENDITION_PREFIX}/{sha256[:2]}/{sha256}-{max_dimension}-q{quality}.jpg"
+
+
+def render_image(source, max_dimension: int, quality: int) -> bytes:
+    """
+    Produire le rendu JPEG d'une image
+
+    Args:
+        source: fichier image ouvert en lecture binaire
+    """
+    with Image.open(source) as image:
+        if image.format == 'JPEG':
+            # Décoder directement à 1/2, 1/4 ou 1/8 de la taille si possible
+            image.draft('RGB', (max_dimension, max_dimension))
+
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+        output = BytesIO()
+        # Sans EXIF : l'orientation est déjà appliquée aux pixels
+        image.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+        return output.getvalue()
+
+
+def _source_hash(document) -> str:
+    if document.file_hash:
+        return document.file_hash
+
+    hasher = hashlib.sha256()
+    with document.file.open('rb') as source:
+        for chunk in source.chunks():
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _is_passthrough(document) -> bool:
+    with document.file.open('rb') as source:
+        head = source.read(5)
+    return head == b'%PDF-'
+
+
+def prepare_kyc_image(document) -> Tuple[str, int]:
+    """
+    Obtenir le fichier à soumettre pour un document KYC
+
+    Returns:
+        (nom dans le stockage, taille en octets) du rendu, ou du fichier
+        d'origine s'il ne s'agit pas d'une image
+    """
+    if _is_passthrough(document):
+        return document.file.name, document.file.size
+
+    max_dimension, quality = get_rendition_options()
+    name = rendition_name(_source_hash(document), max_dimension, quality)
+
+    if default_storage.exists(name):
+        return name, default_storage.size(name)
+
+    with document.file.open('rb') as source:
+        content = render_image(source, max_dimension, quality)
+
+    stored_name = default_storage.save(name, ContentFile(content))
+    if stored_name != name:
+        # Rendu concurrent du même contenu : garder un seul exemplaire
+        default_storage.delete(stored_name)
+
+    logger.info(
+        f"Rendu KYC {name}: {document.file.size} -> {len(content)} octets"
+    )
+    return name, len(content)
+
+
+def base64_length(size: int) -> int:
+    """Longueur de l'encodage base64 de `size` octets"""
+    return 4 * ((size + 2) // 3)
+
+
+def iter_base64(file_obj, chunk_size: int = BASE64_CHUNK_SIZE) -> Iterator[bytes]:
+    """Encoder un fichier en base64 bloc par bloc"""
+    if chunk_size % 3:
+        raise ValueError("La taille des blocs doit être un multiple de 3")
+
+    while True:
+        chunk = file_obj.read(chunk_size)
+        if not chunk:
+            break
+        # Un fichier peut renvoyer moins que demandé : compléter le bloc
+        while len(chunk) % 3:
+            more = file_obj.read(3 - len(chunk) % 3)
+            if not more:
+                break
+            chunk += more
+        yield base64.b64encode(chunk)
@@ -0,0 +1,99 @@
+"""
+File de révision manuelle des dossiers KYC.
+
+Les dossiers en attente sont les utilisateurs au statut UNDER_REVIEW, triés
+par date de soumission (index partiel `users_kyc_review_queue_idx`). Un
+administrateur réserve les dossiers suivants pour une durée limitée
+(`KYC_REVIEW_LEASE_SECONDS`) : la sélection utilise
+`select_for_update(skip_locked=True)`, de sorte que plusieurs
+administrateurs prennent des dossiers différents sans s'attendre. Une
+réservation expirée remet le dossier dans la file.
+"""
+
+import logging
+from datetime import timedelta
+from typing import List
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+
+from .models import KYCDocument
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+
+def get_lease_duration() -> timedelta:
+    return timedelta(seconds=getattr(settings, 'KYC_REVIEW_LEASE_SECONDS', 900))
+
+
+def review_queue():
+    """Dossiers KYC à réviser, du plus ancien au plus récent"""
+    return User.objects.filter(kyc_status='UNDER_REVIEW').order_by('kyc_submitted_at', 'id')
+
+
+def available_filter(reviewer=None) -> Q:
+    """Dossiers non réservés, à réservation expirée, ou réservés par `reviewer`"""
+    condition = Q(kyc_review_lease_expires_at__isnull=True) | Q(
+        kyc_review_lease_expires_at__lte=timezone.now()
+    )
+    if reviewer is not None:
+        condition |= Q(kyc_review_claimed_by=reviewer)
+    return condition
+
+
+def with_documents(queryset):
+    """Précharger les documents et le réviseur des dossiers"""
+    return queryset.select_related('kyc_review_claimed_by').prefetch_related(
+        Prefetch('kyc_documents', queryset=KYCDocument.objects.order_by('document_type'))
+    )
+
+
+def claim_next(reviewer, count: int = 1) -> List:
+    """
+    Réserver les prochains dossiers disponibles pour un administrateur
+
+    Returns:
+        Les utilisateurs réservés, documents préchargés
+    """
+    expires_at = timezone.now() + get_lease_duration()
+
+    with transaction.atomic():
+        ids = list(
+            review_queue().filter(available_filter())
+            .select_for_update(skip_locked=True)
+            .values_list('id', flat=True)[:count]
+        )
+        if ids:
+            User.objects.filter(pk__in=ids).update(
+                kyc_review_claimed_by=reviewer,
+                kyc_review_lease_expires_at=expires_at,
+            )
+
+    logger.info(f"{len(ids)} dossier(s) KYC réservé(s) par {reviewer.pk}")
+    return list(with_documents(review_queue().filter(pk__in=ids)))
+
+
+def is_claimed_by_other(user, reviewer) -> bool:
+    """Le dossier est-il réservé par un autre administrateur ?"""
+    return bool(
+        user.kyc_review_claimed_by_id
+        and user.kyc_review_claimed_by_id != reviewer.pk
+        and user.kyc_review_lease_expires_at
+        and user.kyc_review_lease_expires_at > timezone.now()
+    )
+
+
+def release_claim(user, reviewer=None) -> bool:
+    """Libérer la réservation d'un dossier (par son titulaire si précisé)"""
+    queryset = User.objects.filter(pk=user.pk)
+    if reviewer is not None:
+        queryset = queryset.filter(kyc_review_claimed_by=reviewer)
+
+    released = queryset.update(kyc_review_claimed_by=None, kyc_review_lease_expires_at=None)
+    user.kyc_review_claimed_by = None
+    user.kyc_review_lease_expires_at = None
+    return bool(released)
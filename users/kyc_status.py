@@ -0,0 +1,170 @@
+"""
+Agrégat KYC par utilisateur et transitions du statut KYC.
+
+Chaque type de document correspond à un bit. Les masques
+`kyc_uploaded_mask`, `kyc_verified_mask` et `kyc_rejected_mask` de
+l'utilisateur sont mis à jour par un seul UPDATE atomique à chaque
+changement de statut d'un document, sans relire les autres documents.
+
+Le statut KYC de l'utilisateur ne change que par `transition_kyc_status`,
+un UPDATE conditionné par le statut de départ : lorsque le signal et la
+tâche `check_overall_kyc_status` évaluent le même état, une seule
+transition aboutit et les notifications ne partent qu'une fois.
+"""
+
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.utils import send_notification_email
+
+from .models import KYCDocument
+from .tokens import invalidate_user_state
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+DOCUMENT_BITS = {
+    document_type: 1 << index
+    for index, (document_type, _) in enumerate(KYCDocument.DOCUMENT_TYPES)
+}
+ALL_DOCUMENTS_MASK = sum(DOCUMENT_BITS.values())
+
+REQUIRED_DOCUMENTS = ['ID_FRONT', 'ID_BACK', 'SELFIE', 'PROOF_OF_ADDRESS']
+REQUIRED_MASK = sum(DOCUMENT_BITS[document_type] for document_type in REQUIRED_DOCUMENTS)
+
+# Statuts depuis lesquels chaque transition automatique est permise
+TRANSITIONS = {
+    'UNDER_REVIEW': ('PENDING', 'SUBMITTED', 'REJECTED'),
+    'REJECTED': ('PENDING', 'SUBMITTED', 'UNDER_REVIEW'),
+}
+
+
+def mask_to_types(mask: int) -> List[str]:
+    """Types de documents présents dans un masque"""
+    return [document_type for document_type, bit in DOCUMENT_BITS.items() if mask & bit]
+
+
+def _set_bit(field: str, bit: int, enabled: bool):
+    expression = F(field).bitand(ALL_DOCUMENTS_MASK ^ bit)
+    return expression.bitor(bit) if enabled else expression
+
+
+def record_document_status(document: KYCDocument, deleted: bool = False) -> Dict[str, int]:
+    """
+    Reporter le statut d'un document dans l'agrégat de son utilisateur
+
+    Returns:
+        Les masques de l'utilisateur après mise à jour
+    """
+    bit = DOCUMENT_BITS[document.document_type]
+    status = None if deleted else document.status
+
+    with transaction.atomic():
+        User.objects.filter(pk=document.user_id).update(
+            kyc_uploaded_mask=_set_bit('kyc_uploaded_mask', bit, not deleted),
+            kyc_verified_mask=_set_bit('kyc_verified_mask', bit, status == 'VERIFIED'),
+            kyc_rejected_mask=_set_bit('kyc_rejected_mask', bit, status == 'REJECTED'),
+        )
+        return User.objects.filter(pk=document.user_id).values(
+            'kyc_status', 'kyc_uploaded_mask', 'kyc_verified_mask', 'kyc_rejected_mask'
+        ).get()
+
+
+def transition_kyc_status(user_id: int, to_status: str, from_statuses: Iterable[str],
+                          **fields) -> bool:
+    """
+    Changer le statut KYC si l'utilisateur est dans l'un des statuts attendus
+
+    Les effets (notifications) ne sont déclenchés que par l'appel qui a
+    effectivement appliqué la transition, après validation de la transaction.
+
+    Returns:
+        True si la transition a été appliquée par cet appel
+    """
+    updated = User.objects.filter(pk=user_id, kyc_status__in=list(from_statuses)).update(
+        kyc_status=to_status, updated_at=timezone.now(),
+        token_version=F('token_version') + 1, **fields
+    )
+    if not updated:
+        return False
+
+    invalidate_user_state(user_id)
+
+    logger.info(f"Statut KYC utilisateur {user_id} mis à jour: {to_status}")
+    transaction.on_commit(lambda: _on_status_changed(user_id, to_status))
+    return True
+
+
+def evaluate_kyc_status(user_id: int, aggregate: Dict[str, int] = None,
+                        document: Optional[KYCDocument] = None) -> Optional[str]:
+    """
+    Appliquer la transition découlant de l'agrégat KYC
+
+    Returns:
+        Le nouveau statut si une transition a été appliquée
+    """
+    if aggregate is None:
+        aggregate = User.objects.filter(pk=user_id).values(
+            'kyc_status', 'kyc_verified_mask', 'kyc_rejected_mask'
+        ).get()
+
+    if aggregate['kyc_rejected_mask'] & REQUIRED_MASK:
+        if document is not None and document.status == 'REJECTED':
+            reason = f"Document {document.get_document_type_display()} rejeté: {document.verification_notes}"
+        else:
+            rejected = ', '.join(mask_to_types(aggregate['kyc_rejected_mask'] & REQUIRED_MASK))
+            reason = f"Documents rejetés: {rejected}"
+        if transition_kyc_status(user_id, 'REJECTED', TRANSITIONS['REJECTED'],
+                                 kyc_rejection_reason=reason):
+            return 'REJECTED'
+
+    elif aggregate['kyc_verified_mask'] & REQUIRED_MASK == REQUIRED_MASK:
+        if transition_kyc_status(user_id, 'UNDER_REVIEW', TRANSITIONS['UNDER_REVIEW']):
+            return 'UNDER_REVIEW'
+
+    return None
+
+
+def _on_status_changed(user_id: int, status: str):
+    from .tasks import notify_admins_kyc_ready
+
+    user = User.objects.filter(pk=user_id).only('email').first()
+    if user is None:
+        return
+
+    if status == 'UNDER_REVIEW':
+        notify_admins_kyc_ready.delay(user_id)
+        if user.email:
+            send_notification_email(
+                user.email,
+                "Documents KYC vérifiés",
+                "Tous vos documents ont été vérifiés avec succès. Votre dossier est maintenant en cours de révision par notre équipe."
+            )
+
+    elif status == 'REJECTED' and user.email:
+        send_notification_email(
+            user.email,
+            "Documents KYC rejetés",
+            "Un ou plusieurs de vos documents ont été rejetés. Veuillez vous connecter à votre compte pour voir les détails et soumettre de nouveaux documents."
+        )
+
+
+def rebuild_aggregate(user_id: int) -> Dict[str, int]:
+    """Recalculer les masques d'un utilisateur depuis ses documents"""
+    masks = {'kyc_uploaded_mask': 0, 'kyc_verified_mask': 0, 'kyc_rejected_mask': 0}
+    rows = KYCDocument.objects.filter(user_id=user_id).values_list('document_type', 'status')
+    for document_type, status in rows:
+        bit = DOCUMENT_BITS.get(document_type, 0)
+        masks['kyc_uploaded_mask'] |= bit
+        if status == 'VERIFIED':
+            masks['kyc_verified_mask'] |= bit
+        elif status == 'REJECTED':
+            masks['kyc_rejected_mask'] |= bit
+
+    User.objects.filter(pk=user_id).update(**masks)
+    return masks
@@ -0,0 +1,179 @@
+"""
+Suivi des jobs de vérification KYC soumis à Smile ID.
+
+Le webhook Smile ID est la source principale des résultats. Les jobs pour
+lesquels aucun webhook n'est arrivé après `KYC_POLL_GRACE_PERIOD` sont
+interrogés par une tâche périodique unique (`poll_pending_kyc_jobs`), qui
+parcourt tous les jobs en attente en un seul passage sur la session HTTP
+partagée du service. Aucune tâche n'est reprogrammée par document.
+
+Quelle que soit l'origine du résultat, l'évaluation du statut global
+(`check_overall_kyc_status`) est planifiée une seule fois par utilisateur
+et par fenêtre de `KYC_STATUS_CHECK_DELAY` secondes : les quatre documents
+d'un dossier aboutissent à une seule évaluation.
+"""
+
+import logging
+from datetime import timedelta
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import KYCDocument
+from .services import smile_id_service
+
+logger = logging.getLogger(__name__)
+
+PENDING_STATUSES = ('UPLOADED', 'PROCESSING')
+
+
+def _get_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _status_check_key(user_id) -> str:
+    return f"kyc:status_check:{user_id}"
+
+
+def schedule_overall_check(user_ids: Iterable[int]):
+    """Planifier l'évaluation du statut global, au plus une fois par utilisateur"""
+    from .tasks import check_overall_kyc_status
+
+    delay = _get_setting('KYC_STATUS_CHECK_DELAY', 30)
+    for user_id in set(user_ids):
+        # La clé est supprimée au début de l'évaluation
+        if cache.add(_status_check_key(user_id), True, delay + 300):
+            check_overall_kyc_status.apply_async(args=[user_id], countdown=delay)
+
+
+def clear_overall_check(user_id):
+    cache.delete(_status_check_key(user_id))
+
+
+def _record_result(document: KYCDocument):
+    """
+    Reporter le nouveau statut du document dans l'agrégat de l'utilisateur
+
+    Les mises à jour conditionnelles (queryset) ne déclenchent pas le signal
+    post_save du document : l'agrégat et la transition sont appliqués ici.
+    """
+    from .kyc_status import evaluate_kyc_status, record_document_status
+
+    aggregate = record_document_status(document)
+    evaluate_kyc_status(document.user_id, aggregate, document=document)
+
+
+def apply_job_result(document: KYCDocument, result: Dict) -> bool:
+    """
+    Appliquer le résultat d'un job à son document
+
+    La mise à jour est conditionnelle : seul un document encore en attente
+    et toujours associé à ce job est modifié (webhook et interrogation
+    concurrents, document soumis à nouveau entre-temps).
+
+    Returns:
+        True si le document a changé de statut
+    """
+    if result.get('job_success'):
+        changes = {
+            'status': 'VERIFIED',
+            'confidence_score': result.get('confidence', 0),
+            'verification_notes': "Vérifié avec succès par Smile ID",
+        }
+    else:
+        changes = {
+            'status': 'REJECTED',
+            'verification_notes': f"Rejeté par Smile ID: {result.get('code', 'Raison inconnue')}",
+        }
+    changes.update(smile_id_result=result, updated_at=timezone.now())
+
+    updated = KYCDocument.objects.filter(
+        pk=document.pk,
+        smile_id_job_id=document.smile_id_job_id,
+        status__in=PENDING_STATUSES,
+    ).update(**changes)
+    if updated != 1:
+        return False
+
+    for field, value in changes.items():
+        setattr(document, field, value)
+    _record_result(document)
+    logger.info(f"Statut KYC mis à jour pour document {document.id}: {document.status}")
+    return True
+
+
+def handle_webhook_result(result: Dict) -> Optional[KYCDocument]:
+    """Traiter un résultat reçu par webhook"""
+    job_id = result.get('job_id')
+    if not job_id:
+        return None
+
+    document = KYCDocument.objects.filter(smile_id_job_id=job_id).first()
+    if document is None:
+        logger.error(f"Document non trouvé pour job_id: {job_id}")
+        return None
+
+    if apply_job_result(document, result):
+        schedule_overall_check([document.user_id])
+    return document
+
+
+def pending_jobs():
+    """Documents soumis sans résultat reçu après le délai de grâce du webhook"""
+    grace = _get_setting('KYC_POLL_GRACE_PERIOD', 300)
+    return KYCDocument.objects.filter(
+        status='PROCESSING',
+        updated_at__lte=timezone.now() - timedelta(seconds=grace),
+    ).exclude(smile_id_job_id='').order_by('updated_at')
+
+
+def poll_pending_jobs(limit: int = None) -> Dict[str, int]:
+    """
+    Interroger Smile ID pour les jobs en attente, en un seul passage
+
+    Les documents dont le job est en attente depuis plus de
+    `KYC_JOB_TIMEOUT` secondes (depuis sa soumission, `submitted_at`) sont
+    rejetés.
+
+    Returns:
+        Compteurs {'checked', 'completed', 'timed_out'}
+    """
+    limit = limit or _get_setting('KYC_POLL_BATCH_SIZE', 200)
+    timeout_before = timezone.now() - timedelta(seconds=_get_setting('KYC_JOB_TIMEOUT', 86400))
+
+    stats = {'checked': 0, 'completed': 0, 'timed_out': 0}
+    user_ids = []
+
+    for document in pending_jobs()[:limit]:
+        stats['checked'] += 1
+        result = smile_id_service.get_job_status(document.smile_id_job_id)
+
+        if result and result.get('job_complete'):
+            if apply_job_result(document, result):
+                stats['completed'] += 1
+                user_ids.append(document.user_id)
+        elif (document.submitted_at or document.created_at) <= timeout_before:
+            changes = {
+                'status': 'REJECTED',
+                'verification_notes': "Timeout lors de la vérification Smile ID",
+                'updated_at': timezone.now(),
+            }
+            timed_out = KYCDocument.objects.filter(
+                pk=document.pk,
+                smile_id_job_id=document.smile_id_job_id,
+                status__in=PENDING_STATUSES,
+            ).update(**changes)
+            if timed_out == 1:
+                for field, value in changes.items():
+                    setattr(document, field, value)
+                _record_result(document)
+                stats['timed_out'] += 1
+                user_ids.append(document.user_id)
+        else:
+            # Pas encore terminé : attendre le webhook ou le prochain passage
+            KYCDocument.objects.filter(pk=document.pk).update(updated_at=timezone.now())
+
+    schedule_overall_check(user_ids)
+    return stats
@@ -0,0 +1,28 @@
+"""
+Journal des tentatives de connexion, écrit hors du chemin de connexion.
+
+Chaque tentative est transmise à la tâche `record_login_attempts` dès sa
+réception : rien n'est retenu dans la mémoire du processus, une tentative
+n'est donc pas perdue si le worker s'arrête. `LoginAttempt` sert à
+l'analyse a posteriori ; les décisions de blocage reposent uniquement sur
+`core.ratelimit`.
+"""
+
+from django.utils import timezone
+
+from core.utils import enqueue_task, get_client_ip
+
+
+def record_login_attempt(request, identifier: str, success: bool, failure_reason: str = ''):
+    """Transmettre une tentative à la tâche d'écriture"""
+    from .tasks import record_login_attempts
+
+    attempt = {
+        'phone_number': (identifier or '')[:20],
+        'ip_address': get_client_ip(request) or '0.0.0.0',
+        'user_agent': request.META.get('HTTP_USER_AGENT', '')[:500],
+        'success': success,
+        'failure_reason': failure_reason[:100],
+        'attempted_at': timezone.now().isoformat(),
+    }
+    enqueue_task(record_login_attempts, [attempt])
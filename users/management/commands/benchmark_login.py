@@ -0,0 +1,132 @@
+"""
+Mesure du débit d'authentification (EmailBackend).
+
+Crée des utilisateurs temporaires dans une transaction annulée à la fin,
+puis chronomètre `authenticate` pour des connexions réussies, des mots de
+passe erronés et des comptes inexistants. L'écart entre ces deux derniers
+cas indique ce qu'un attaquant peut déduire de la durée de réponse.
+
+Compte aussi les écritures SQL par connexion (API et session).
+
+    python manage.py benchmark_login --users 200 --iterations 50
+"""
+
+import json
+import statistics
+import time
+
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import get_hasher
+from django.contrib.auth.models import update_last_login
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from users.models import UserProfile
+
+User = get_user_model()
+
+PASSWORD = 'BenchPassword123!'
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Mesurer le débit et l'uniformité des temps de connexion"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help="Nombre d'utilisateurs temporaires")
+        parser.add_argument('--iterations', type=int, default=30, help="Connexions mesurées par scénario")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Hacheur: {get_hasher().algorithm}")
+        try:
+            with transaction.atomic():
+                self._run(options['users'], options['iterations'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, user_count, iterations):
+        password_hash = User(email='bench@example.com')
+        password_hash.set_password(PASSWORD)
+
+        users = User.objects.bulk_create([
+            User(
+                email=f'bench{index}@benchmark.local',
+                phone_number=f'+2376{index:08d}',
+                first_name='Bench',
+                last_name='User',
+                password=password_hash.password,
+            )
+            for index in range(user_count)
+        ])
+        UserProfile.objects.bulk_create([UserProfile(user=user) for user in users])
+
+        scenarios = [
+            ('email, mot de passe valide', lambda i: (users[i % user_count].email, PASSWORD)),
+            ('téléphone, mot de passe valide', lambda i: (users[i % user_count].phone_number, PASSWORD)),
+            ('mot de passe erroné', lambda i: (users[i % user_count].email, 'wrong-password')),
+            ('compte inexistant', lambda i: (f'missing{i}@benchmark.local', PASSWORD)),
+        ]
+
+        results = {}
+        for label, credentials in scenarios:
+            durations = []
+            for index in range(iterations):
+                username, password = credentials(index)
+                start = time.perf_counter()
+                authenticate(username=username, password=password)
+                durations.append(time.perf_counter() - start)
+            results[label] = durations
+
+            median = statistics.median(durations)
+            self.stdout.write(
+                f"{label:32s} médiane {median * 1000:8.2f} ms  "
+                f"p95 {sorted(durations)[int(len(durations) * 0.95) - 1] * 1000:8.2f} ms  "
+                f"{1 / median:8.1f} connexions/s"
+            )
+
+        gap = abs(
+            statistics.median(results['mot de passe erroné'])
+            - statistics.median(results['compte inexistant'])
+        )
+        self.stdout.write(f"Écart médian compte existant / inexistant: {gap * 1000:.2f} ms")
+
+        self._measure_writes(users[:iterations])
+
+    def _count_writes(self, queries) -> int:
+        return sum(
+            1 for query in queries
+            if query['sql'].lstrip().split(None, 1)[0].upper() in WRITE_STATEMENTS
+        )
+
+    def _measure_writes(self, users):
+        from users.views import UserLoginView
+
+        view = UserLoginView.as_view()
+        factory = RequestFactory()
+
+        with CaptureQueriesContext(connection) as api_queries:
+            for user in users:
+                view(factory.post(
+                    '/api/auth/login/',
+                    data=json.dumps({'email': user.email, 'password': PASSWORD}),
+                    content_type='application/json',
+                ))
+
+        # Connexion par session : django.contrib.auth.login met à jour last_login
+        with CaptureQueriesContext(connection) as session_queries:
+            for user in users:
+                update_last_login(None, user)
+
+        for label, queries in (('API', api_queries), ('session', session_queries)):
+            self.stdout.write(
+                f"Connexion {label:8s} écritures SQL par connexion: "
+                f"{self._count_writes(queries) / len(users):.2f}  "
+                f"requêtes: {len(queries) / len(users):.2f}"
+            )
@@ -0,0 +1,26 @@
+"""
+Middleware de suivi de l'activité des utilisateurs
+"""
+
+from .activity import record_activity
+
+
+class ActivityMiddleware:
+    """
+    Enregistrer l'activité des utilisateurs authentifiés (session ou JWT)
+
+    L'utilisateur authentifié par DRF est reporté sur la requête Django : il
+    est donc visible ici, après la vue.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            record_activity(user.pk)
+
+        return response
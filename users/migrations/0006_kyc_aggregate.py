@@ -0,0 +1,63 @@
+# Generated by Django 5.0.8 on 2026-10-19 03:35
+
+from django.db import migrations, models
+
+
+# Bits des types de documents (ordre de KYCDocument.DOCUMENT_TYPES)
+DOCUMENT_BITS = {
+    'ID_FRONT': 1,
+    'ID_BACK': 2,
+    'SELFIE': 4,
+    'PROOF_OF_ADDRESS': 8,
+    'SIGNATURE': 16,
+}
+
+
+def build_kyc_aggregates(apps, schema_editor):
+    """Calculer les masques KYC des utilisateurs existants"""
+    CustomUser = apps.get_model('users', 'CustomUser')
+    KYCDocument = apps.get_model('users', 'KYCDocument')
+    
+    masks = {}
+    rows = KYCDocument.objects.values_list('user_id', 'document_type', 'status').iterator()
+    for user_id, document_type, status in rows:
+        bit = DOCUMENT_BITS.get(document_type, 0)
+        uploaded, verified, rejected = masks.get(user_id, (0, 0, 0))
+        masks[user_id] = (
+            uploaded | bit,
+            verified | (bit if status == 'VERIFIED' else 0),
+            rejected | (bit if status == 'REJECTED' else 0),
+        )
+    
+    for user_id, (uploaded, verified, rejected) in masks.items():
+        CustomUser.objects.filter(pk=user_id).update(
+            kyc_uploaded_mask=uploaded,
+            kyc_verified_mask=verified,
+            kyc_rejected_mask=rejected,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_fix_password_reset_token_null'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='kyc_rejected_mask',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='kyc_uploaded_mask',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='kyc_verified_mask',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(build_kyc_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.8 on 2026-10-19 03:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0006_kyc_aggregate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='kyc_review_claimed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='kyc_review_lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('kyc_status', 'UNDER_REVIEW')), fields=['kyc_submitted_at', 'id'], name='users_kyc_review_queue_idx'),
+        ),
+    ]
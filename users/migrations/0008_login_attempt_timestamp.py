@@ -0,0 +1,19 @@
+# Generated by Django 5.0.8 on 2026-10-19 03:39
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_kyc_review_queue'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='loginattempt',
+            name='attempted_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
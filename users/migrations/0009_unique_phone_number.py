@@ -0,0 +1,56 @@
+# Generated by Django 5.0.8 on 2026-10-19 03:44
+
+import logging
+
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_phone_numbers(apps, schema_editor):
+    """
+    Normaliser les numéros existants et lever les doublons
+
+    En cas de doublon, le numéro est conservé par le compte qui l'a vérifié
+    (sinon le plus ancien) et retiré des autres, qui devront le vérifier à
+    nouveau.
+    """
+    from core.utils import sanitize_phone_number
+    
+    CustomUser = apps.get_model('users', 'CustomUser')
+    
+    owners = {}
+    users = CustomUser.objects.exclude(phone_number__isnull=True).exclude(phone_number='')
+    for user in users.order_by('-is_phone_verified', 'id').iterator():
+        normalized = sanitize_phone_number(user.phone_number)
+        if normalized in owners:
+            logger.warning(
+                f"Numéro {normalized} déjà attribué à l'utilisateur {owners[normalized]}, "
+                f"retiré de l'utilisateur {user.pk}"
+            )
+            CustomUser.objects.filter(pk=user.pk).update(phone_number=None, is_phone_verified=False)
+            continue
+        
+        owners[normalized] = user.pk
+        if normalized != user.phone_number:
+            CustomUser.objects.filter(pk=user.pk).update(phone_number=normalized)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0008_login_attempt_timestamp'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_phone_numbers, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='customuser',
+            name='users_custo_phone_n_f2d675_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(condition=models.Q(('phone_number__isnull', False), models.Q(('phone_number', ''), _negated=True)), fields=('phone_number',), name='users_unique_phone_number'),
+        ),
+    ]
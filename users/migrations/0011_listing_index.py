@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-19 04:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0010_token_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['created_at', 'id'], name='users_custo_created_11192f_idx'),
+        ),
+    ]
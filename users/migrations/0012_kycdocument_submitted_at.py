@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-19 04:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_listing_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='kycdocument',
+            name='submitted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.8 on 2026-10-19 04:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0012_kycdocument_submitted_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['first_name'], name='users_first_name_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['last_name'], name='users_last_name_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, router
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from core.models import TimeStampedModel
 from core.utils import generate_secure_token
 from .managers import CustomUserManager
@@ -47,6 +48,21 @@ class CustomUser(AbstractUser):
     kyc_verified_at = models.DateTimeField(null=True, blank=True)
     kyc_rejection_reason = models.TextField(blank=True)
     
+    # Agrégat des documents KYC : un bit par type de document (voir users.kyc_status)
+    kyc_uploaded_mask = models.PositiveSmallIntegerField(default=0)
+    kyc_verified_mask = models.PositiveSmallIntegerField(default=0)
+    kyc_rejected_mask = models.PositiveSmallIntegerField(default=0)
+    
+    # File de révision KYC : réservation temporaire par un administrateur
+    kyc_review_claimed_by = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    kyc_review_lease_expires_at = models.DateTimeField(null=True, blank=True)
+    
+    # Version des jetons d'accès : incrémentée quand un champ repris dans les
+    # jetons change (voir users.tokens)
+    token_version = models.PositiveIntegerField(default=0)
+    
     # Informations d'identification
     id_card_number = models.CharField(max_length=50, blank=True)
     id_card_type = models.CharField(max_length=20, choices=[
@@ -83,20 +99,85 @@ class CustomUser(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name']
     
+    # Champs repris dans les jetons d'accès ou vérifiés à chaque requête
+    TOKEN_STATE_FIELDS = ('role', 'kyc_status', 'is_phone_verified', 'is_active')
+    # Champs normalisés avant sauvegarde (users.signals.user_pre_save)
+    NORMALIZED_FIELDS = ('phone_number', 'email', 'first_name', 'last_name')
+    
     objects = CustomUserManager()
     
     class Meta:
         verbose_name = 'Utilisateur'
         verbose_name_plural = 'Utilisateurs'
         indexes = [
-            models.Index(fields=['phone_number']),
             models.Index(fields=['role']),
             models.Index(fields=['kyc_status']),
+            models.Index(fields=['created_at', 'id']),
+            # File de révision : seuls les dossiers UNDER_REVIEW sont indexés
+            models.Index(
+                fields=['kyc_submitted_at', 'id'],
+                condition=models.Q(kyc_status='UNDER_REVIEW'),
+                name='users_kyc_review_queue_idx',
+            ),
+            # Recherche des noms en préfixe (LIKE 'x%') depuis l'administration
+            models.Index(fields=['first_name'], name='users_first_name_prefix_idx',
+                         opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['last_name'], name='users_last_name_prefix_idx',
+                         opclasses=['varchar_pattern_ops']),
+        ]
+        constraints = [
+            # Numéro normalisé (voir sanitize_phone_number), unique s'il est renseigné
+            models.UniqueConstraint(
+                fields=['phone_number'],
+                condition=models.Q(phone_number__isnull=False) & ~models.Q(phone_number=''),
+                name='users_unique_phone_number',
+            ),
         ]
     
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.phone_number})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot_loaded_values()
+        return instance
+    
+    def snapshot_loaded_values(self):
+        """Mémoriser les valeurs des champs suivis, telles qu'enregistrées en base"""
+        self._loaded_values = {
+            field: self.__dict__[field]
+            for field in self.TOKEN_STATE_FIELDS + self.NORMALIZED_FIELDS
+            if field in self.__dict__
+        }
+    
+    def changed_fields(self, fields, update_fields=None):
+        """
+        Champs parmi `fields` modifiés depuis le chargement
+
+        Tous les champs chargés sont considérés modifiés si l'instance n'a
+        pas été lue en base (création).
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        return [
+            field for field in fields
+            if (update_fields is None or field in update_fields)
+            and field in self.__dict__
+            and (loaded is None or loaded.get(field) != self.__dict__[field])
+        ]
+    
+    def token_state_changed(self, update_fields=None) -> bool:
+        """Un champ repris dans les jetons a-t-il changé depuis le chargement ?"""
+        return bool(self.changed_fields(self.TOKEN_STATE_FIELDS, update_fields))
+    
+    def get_profile(self):
+        """Profil de l'utilisateur, créé lors du premier accès"""
+        try:
+            return self.profile
+        except UserProfile.DoesNotExist:
+            self.profile, _ = UserProfile.objects.get_or_create(user=self)
+            return self.profile
+    
     def get_full_name(self):
         return f"{self.first_name} {self.last_name}".strip()
     
@@ -157,6 +238,36 @@ class CustomUser(AbstractUser):
                 timezone.now() <= self.password_reset_expires_at)
 
 
+class ClaimsUser(CustomUser):
+    """
+    Utilisateur reconstruit à partir des claims d'un jeton d'accès
+
+    Seuls l'identifiant et les champs repris dans le jeton sont renseignés,
+    sans requête. La première lecture d'un autre champ charge la ligne
+    complète en une requête.
+    """
+
+    class Meta:
+        proxy = True
+
+    @classmethod
+    def from_claims(cls, user_id, claims):
+        values = dict(claims, id=user_id, is_active=True)
+        fields = [
+            field.attname for field in cls._meta.concrete_fields
+            if field.attname in values
+        ]
+        return cls.from_db(
+            router.db_for_read(cls), fields, [values[field] for field in fields]
+        )
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = list(deferred)
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+
+
 class KYCDocument(TimeStampedModel):
     """
     Documents KYC uploadés par les utilisateurs
@@ -184,6 +295,7 @@ class KYCDocument(TimeStampedModel):
     # Résultats de la vérification Smile ID
     smile_id_job_id = models.CharField(max_length=100, blank=True)
     smile_id_result = models.JSONField(null=True, blank=True)
+    submitted_at = models.DateTimeField(null=True, blank=True)  # Soumission du job en cours
     confidence_score = models.FloatField(null=True, blank=True)
     verification_notes = models.TextField(blank=True)
     
@@ -288,7 +400,7 @@ class LoginAttempt(models.Model):
     user_agent = models.TextField(blank=True)
     success = models.BooleanField(default=False)
     failure_reason = models.CharField(max_length=100, blank=True)
-    attempted_at = models.DateTimeField(auto_now_add=True)
+    attempted_at = models.DateTimeField(default=timezone.now)
     
     class Meta:
         ordering = ['-attempted_at']
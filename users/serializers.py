@@ -1,9 +1,11 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
-from django.utils import timezone
-from .models import CustomUser, KYCDocument, UserProfile, LoginAttempt
+from .models import CustomUser, KYCDocument
+from .activity import record_activity
+from .login_attempts import record_login_attempt
 from core.utils import validate_cameroon_phone, sanitize_phone_number
+from core.serializers import StreamedFileSerializerMixin
 from django.core.validators import RegexValidator
 
 
@@ -89,18 +91,10 @@ class UserLoginSerializer(serializers.Serializer):
             )
             
             if not user:
-                # Enregistrer la tentative de connexion échouée
+                # Journaliser la tentative échouée (écriture différée par lots)
                 request = self.context.get('request')
                 if request:
-                    # Utiliser l'email comme phone_number temporairement
-                    phone_number = email if not user else (user.phone_number or email)
-                    LoginAttempt.objects.create(
-                        phone_number=phone_number,
-                        ip_address=request.META.get('REMOTE_ADDR', ''),
-                        user_agent=request.META.get('HTTP_USER_AGENT', ''),
-                        success=False,
-                        failure_reason='Invalid credentials'
-                    )
+                    record_login_attempt(request, email, success=False, failure_reason='Invalid credentials')
                 
                 raise serializers.ValidationError(
                     "Email ou mot de passe incorrect."
@@ -111,19 +105,13 @@ class UserLoginSerializer(serializers.Serializer):
                     "Ce compte a été désactivé."
                 )
             
-            # Enregistrer la connexion réussie
+            # Journaliser la connexion réussie
             request = self.context.get('request')
             if request:
-                LoginAttempt.objects.create(
-                    phone_number=user.phone_number or email,
-                    ip_address=request.META.get('REMOTE_ADDR', ''),
-                    user_agent=request.META.get('HTTP_USER_AGENT', ''),
-                    success=True
-                )
+                record_login_attempt(request, user.phone_number or email, success=True)
                 
-                # Mettre à jour la dernière activité
-                user.last_activity = timezone.now()
-                user.save(update_fields=['last_activity'])
+                # Dernière activité : écriture différée (users.activity)
+                record_activity(user.pk)
             
             attrs['user'] = user
             return attrs
@@ -188,35 +176,24 @@ class UserProfileUpdateSerializer(serializers.ModelSerializer):
         return value
 
 
-class KYCDocumentSerializer(serializers.ModelSerializer):
+class KYCDocumentSerializer(StreamedFileSerializerMixin, serializers.ModelSerializer):
     """
     Serializer pour les documents KYC
     """
+    upload_policy = 'kyc'
+    upload_file_required = True
+    
     class Meta:
         model = KYCDocument
         fields = [
-            'id', 'document_type', 'file', 'status', 'confidence_score',
+            'id', 'document_type', 'file', 'upload_id', 'status', 'confidence_score',
             'verification_notes', 'created_at', 'updated_at'
         ]
         read_only_fields = [
             'id', 'status', 'confidence_score', 'verification_notes',
             'created_at', 'updated_at'
         ]
-    
-    def validate_file(self, value):
-        """Valider le fichier uploadé"""
-        # Vérifier la taille du fichier (max 10MB)
-        if value.size > 10 * 1024 * 1024:
-            raise serializers.ValidationError("Le fichier ne doit pas dépasser 10MB.")
-        
-        # Vérifier le type de fichier
-        allowed_types = ['image/jpeg', 'image/jpg', 'image/png', 'application/pdf']
-        if value.content_type not in allowed_types:
-            raise serializers.ValidationError(
-                "Format de fichier non supporté. Utilisez JPEG, PNG ou PDF."
-            )
-        
-        return value
+        extra_kwargs = {'file': {'required': False}}
 
 
 class UserExtendedProfileSerializer(serializers.ModelSerializer):
@@ -239,22 +216,19 @@ class UserExtendedProfileSerializer(serializers.ModelSerializer):
     
     def get_profile(self, obj):
         """Obtenir les informations du profil étendu"""
-        try:
-            profile = obj.profile
-            return {
-                'avatar': profile.avatar.url if profile.avatar else None,
-                'occupation': profile.occupation,
-                'company_name': profile.company_name,
-                'total_transactions': profile.total_transactions,
-                'successful_transactions': profile.successful_transactions,
-                'total_volume': profile.total_volume,
-                'rating_avg': profile.rating_avg,
-                'rating_count': profile.rating_count,
-                'email_verified': profile.email_verified,
-                'bank_account_verified': profile.bank_account_verified,
-            }
-        except UserProfile.DoesNotExist:
-            return None
+        profile = obj.get_profile()
+        return {
+            'avatar': profile.avatar.url if profile.avatar else None,
+            'occupation': profile.occupation,
+            'company_name': profile.company_name,
+            'total_transactions': profile.total_transactions,
+            'successful_transactions': profile.successful_transactions,
+            'total_volume': profile.total_volume,
+            'rating_avg': profile.rating_avg,
+            'rating_count': profile.rating_count,
+            'email_verified': profile.email_verified,
+            'bank_account_verified': profile.bank_account_verified,
+        }
 
 
 class PasswordChangeSerializer(serializers.Serializer):
@@ -304,19 +278,33 @@ class AdminUserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'date_joined', 'last_login']
     
     def get_profile(self, obj):
-        try:
-            return {
-                'occupation': obj.profile.occupation,
-                'company_name': obj.profile.company_name,
-                'location': f"{obj.address_city}, {obj.address_region}" if obj.address_city else None,
-                'total_transactions': obj.profile.total_transactions,
-                'successful_transactions': obj.profile.successful_transactions,
-                'total_volume': str(obj.profile.total_volume),
-                'rating_avg': str(obj.profile.rating_avg) if obj.profile.rating_avg else None,
-                'rating_count': obj.profile.rating_count
-            }
-        except UserProfile.DoesNotExist:
-            return None
+        profile = obj.get_profile()
+        return {
+            'occupation': profile.occupation,
+            'company_name': profile.company_name,
+            'location': f"{obj.address_city}, {obj.address_region}" if obj.address_city else None,
+            'total_transactions': profile.total_transactions,
+            'successful_transactions': profile.successful_transactions,
+            'total_volume': str(profile.total_volume),
+            'rating_avg': str(profile.rating_avg) if profile.rating_avg else None,
+            'rating_count': profile.rating_count
+        }
+
+
+class AdminKYCReviewSerializer(serializers.ModelSerializer):
+    """
+    Serializer d'un dossier de la file de révision KYC (documents préchargés)
+    """
+    documents = KYCDocumentSerializer(source='kyc_documents', many=True, read_only=True)
+    claimed_by = serializers.EmailField(source='kyc_review_claimed_by.email', read_only=True, default=None)
+    
+    class Meta:
+        model = CustomUser
+        fields = [
+            'id', 'email', 'phone_number', 'first_name', 'last_name', 'kyc_status',
+            'kyc_submitted_at', 'claimed_by', 'kyc_review_lease_expires_at', 'documents'
+        ]
+        read_only_fields = fields
 
 
 class PasswordResetRequestSerializer(serializers.Serializer):
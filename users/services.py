@@ -3,11 +3,81 @@ import logging
 from django.conf import settings
 from typing import Dict, Any, Optional
 import json
-import base64
+import uuid
+from django.core.files.storage import default_storage
+
+from .image_processing import base64_length, iter_base64
 
 logger = logging.getLogger(__name__)
 
 
+class StoredImage:
+    """
+    Image du stockage à joindre à un job Smile ID
+
+    L'image n'est encodée en base64 qu'au moment de l'envoi, bloc par bloc.
+    """
+    
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+    
+    def encoded_length(self) -> int:
+        return base64_length(self.size)
+    
+    def iter_encoded(self):
+        with default_storage.open(self.name, 'rb') as image_file:
+            yield from iter_base64(image_file)
+
+
+class StreamingJSONBody:
+    """
+    Corps JSON d'une requête dont les images (`StoredImage`) sont encodées
+    en flux
+
+    La longueur totale est connue à l'avance : la requête est envoyée avec
+    un Content-Length, sans encodage chunked, et sans jamais construire la
+    chaîne base64 complète en mémoire.
+    """
+    
+    def __init__(self, payload: Dict):
+        images = []
+        
+        def replace(value):
+            if isinstance(value, StoredImage):
+                images.append(value)
+                return f"@@image:{len(images) - 1}:{uuid.uuid4().hex}@@"
+            if isinstance(value, dict):
+                return {key: replace(item) for key, item in value.items()}
+            if isinstance(value, list):
+                return [replace(item) for item in value]
+            return value
+        
+        text = json.dumps(replace(payload))
+        self.parts = []
+        for index, image in enumerate(images):
+            marker = f'"@@image:{index}:'
+            before, _, text = text.partition(marker)
+            text = text.split('@@"', 1)[1]
+            self.parts.append(before.encode('utf-8') + b'"')
+            self.parts.append(image)
+            text = '"' + text
+        self.parts.append(text.encode('utf-8'))
+    
+    def __len__(self):
+        return sum(
+            part.encoded_length() if isinstance(part, StoredImage) else len(part)
+            for part in self.parts
+        )
+    
+    def __iter__(self):
+        for part in self.parts:
+            if isinstance(part, StoredImage):
+                yield from part.iter_encoded()
+            else:
+                yield part
+
+
 class SmileIDService:
     """
     Service d'intégration avec l'API Smile ID pour la vérification KYC
@@ -18,6 +88,21 @@ class SmileIDService:
         self.api_key = settings.SMILE_ID_API_KEY
         self.base_url = settings.SMILE_ID_BASE_URL
         self.sandbox = settings.SMILE_ID_SANDBOX
+        self._session = None
+    
+    @property
+    def session(self) -> requests.Session:
+        """Session HTTP partagée (connexions réutilisées entre les appels)"""
+        if self._session is None:
+            pool_size = getattr(settings, 'SMILE_ID_POOL_SIZE', 10)
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=pool_size, pool_maxsize=pool_size
+            )
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._session = session
+        return self._session
     
     def _get_headers(self) -> Dict[str, str]:
         """Obtenir les headers pour les requêtes API"""
@@ -36,7 +121,7 @@ class SmileIDService:
             user_id: ID de l'utilisateur
             job_type: Type de vérification ('enhanced_kyc', 'document_verification', etc.)
             id_info: Informations d'identité
-            images: Images encodées en base64
+            images: Images encodées en base64 ou `StoredImage` (encodées en flux)
         
         Returns:
             Dict contenant la réponse de l'API ou None en cas d'erreur
@@ -59,11 +144,16 @@ class SmileIDService:
             payload["images"] = images
         
         try:
-            response = requests.post(
+            if any(isinstance(image.get("image"), StoredImage) for image in images or []):
+                body = {"data": StreamingJSONBody(payload)}
+            else:
+                body = {"json": payload}
+            
+            response = self.session.post(
                 url,
                 headers=self._get_headers(),
-                json=payload,
-                timeout=30
+                timeout=30,
+                **body
             )
             response.raise_for_status()
             
@@ -96,7 +186,7 @@ class SmileIDService:
         }
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 url,
                 headers=self._get_headers(),
                 json=payload,
@@ -123,8 +213,7 @@ class SmileIDService:
         """
         try:
             with open(image_path, 'rb') as image_file:
-                encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-                return encoded_string
+                return b''.join(iter_base64(image_file)).decode('ascii')
         except Exception as e:
             logger.error(f"Erreur encodage image: {e}")
             return None
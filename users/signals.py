@@ -1,103 +1,84 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .models import UserProfile, KYCDocument
+from .models import ClaimsUser, KYCDocument
 import logging
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
-
-@receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    """
-    Créer automatiquement un profil utilisateur lors de la création d'un utilisateur
-    """
-    if created:
-        try:
-            UserProfile.objects.create(user=instance)
-            logger.info(f"Profil créé pour l'utilisateur {instance.phone_number}")
-        except Exception as e:
-            logger.error(f"Erreur création profil pour {instance.phone_number}: {e}")
+# Un modèle proxy émet ses signaux sous son propre expéditeur : les récepteurs
+# de l'utilisateur sont aussi connectés à ClaimsUser (request.user authentifié
+# par ClaimsJWTAuthentication)
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+@receiver(post_save, sender=ClaimsUser)
+def revoke_tokens_on_claims_change(sender, instance, created, update_fields=None, **kwargs):
     """
-    Sauvegarder automatiquement le profil utilisateur
+    Invalider les jetons d'accès quand un champ repris dans les jetons change
     """
-    try:
-        if hasattr(instance, 'profile'):
-            instance.profile.save()
-    except UserProfile.DoesNotExist:
-        # Créer le profil s'il n'existe pas
-        UserProfile.objects.create(user=instance)
-        logger.info(f"Profil créé pour l'utilisateur existant {instance.phone_number}")
-    except Exception as e:
-        logger.error(f"Erreur sauvegarde profil pour {instance.phone_number}: {e}")
+    if not created and instance.token_state_changed(update_fields):
+        from .tokens import revoke_user_tokens
+        revoke_user_tokens(instance.pk)
+        instance.refresh_from_db(fields=['token_version'])
 
 
 @receiver(post_save, sender=KYCDocument)
-def update_kyc_status_on_document_change(sender, instance, created, **kwargs):
+def update_kyc_status_on_document_change(sender, instance, created, update_fields=None, **kwargs):
     """
-    Mettre à jour le statut KYC de l'utilisateur quand un document change
+    Reporter le statut du document dans l'agrégat KYC de l'utilisateur,
+    puis appliquer la transition de statut qui en découle
     """
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    
     try:
-        user = instance.user
+        from .kyc_status import evaluate_kyc_status, record_document_status
         
-        # Si un document est rejeté, mettre le statut utilisateur en REJECTED
-        if instance.status == 'REJECTED' and hasattr(user, 'kyc_status') and user.kyc_status != 'REJECTED':
-            user.kyc_status = 'REJECTED'
-            user.kyc_rejection_reason = f"Document {instance.get_document_type_display()} rejeté: {instance.verification_notes}"
-            user.save(update_fields=['kyc_status', 'kyc_rejection_reason'])
-            logger.info(f"Statut KYC utilisateur {user.phone_number} mis à jour: REJECTED")
-        
-        # Si tous les documents requis sont vérifiés, mettre en UNDER_REVIEW
-        elif instance.status == 'VERIFIED':
-            required_docs = ['ID_FRONT', 'ID_BACK', 'SELFIE', 'PROOF_OF_ADDRESS']
-            verified_docs = KYCDocument.objects.filter(
-                user=user,
-                document_type__in=required_docs,
-                status='VERIFIED'
-            ).values_list('document_type', flat=True)
-            
-            if (set(verified_docs) >= set(required_docs) and 
-                hasattr(user, 'kyc_status') and 
-                user.kyc_status not in ['VERIFIED', 'UNDER_REVIEW']):
-                user.kyc_status = 'UNDER_REVIEW'
-                user.save(update_fields=['kyc_status'])
-                logger.info(f"Statut KYC utilisateur {user.phone_number} mis à jour: UNDER_REVIEW")
-                
-                # Notifier les admins (tâche asynchrone)
-                try:
-                    from .tasks import notify_admins_kyc_ready
-                    notify_admins_kyc_ready.delay(user.id)
-                except ImportError:
-                    logger.warning("Module tasks non disponible pour notifier les admins")
+        aggregate = record_document_status(instance)
+        if instance.status in ('VERIFIED', 'REJECTED'):
+            evaluate_kyc_status(instance.user_id, aggregate, document=instance)
         
     except Exception as e:
         logger.error(f"Erreur mise à jour statut KYC: {e}")
 
 
+@receiver(post_delete, sender=KYCDocument)
+def update_kyc_aggregate_on_document_delete(sender, instance, **kwargs):
+    """Retirer le document supprimé de l'agrégat KYC"""
+    try:
+        from .kyc_status import record_document_status
+        record_document_status(instance, deleted=True)
+    except Exception as e:
+        logger.error(f"Erreur mise à jour agrégat KYC: {e}")
+
+
 @receiver(pre_save, sender=User)
-def user_pre_save(sender, instance, **kwargs):
+@receiver(pre_save, sender=ClaimsUser)
+def user_pre_save(sender, instance, update_fields=None, **kwargs):
     """
-    Actions avant la sauvegarde d'un utilisateur
+    Normaliser les champs d'identité modifiés avant la sauvegarde
     """
     try:
-        # Normaliser le numéro de téléphone
+        changed = instance.changed_fields(instance.NORMALIZED_FIELDS, update_fields)
+        if not changed:
+            return
+        
         from core.utils import sanitize_phone_number
-        if instance.phone_number:
+        
+        # Normaliser le numéro de téléphone
+        if 'phone_number' in changed and instance.phone_number:
             instance.phone_number = sanitize_phone_number(instance.phone_number)
         
         # Nettoyer l'email
-        if instance.email:
+        if 'email' in changed and instance.email:
             instance.email = instance.email.lower().strip()
         
         # Nettoyer les noms
-        if instance.first_name:
+        if 'first_name' in changed and instance.first_name:
             instance.first_name = instance.first_name.strip().title()
-        if instance.last_name:
+        if 'last_name' in changed and instance.last_name:
             instance.last_name = instance.last_name.strip().title()
             
     except Exception as e:
@@ -105,6 +86,7 @@ def user_pre_save(sender, instance, **kwargs):
 
 
 @receiver(post_save, sender=User)
+@receiver(post_save, sender=ClaimsUser)
 def log_user_status_changes(sender, instance, created, **kwargs):
     """
     Logger les changements de statut importants
@@ -135,3 +117,12 @@ def log_user_status_changes(sender, instance, created, **kwargs):
         
     except Exception as e:
         logger.error(f"Erreur log changement statut: {e}")
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=ClaimsUser)
+def snapshot_saved_values(sender, instance, **kwargs):
+    """
+    Mémoriser les valeurs enregistrées (détection des modifications suivantes)
+    """
+    instance.snapshot_loaded_values()
@@ -6,7 +6,8 @@ import logging
 import os
 
 from .models import KYCDocument
-from .services import smile_id_service
+from .image_processing import prepare_kyc_image
+from .services import StoredImage, smile_id_service
 from core.utils import send_notification_email
 
 User = get_user_model()
@@ -76,13 +77,9 @@ def process_kyc_document(self, document_id: int):
         document.status = 'PROCESSING'
         document.save(update_fields=['status'])
         
-        # Préparer les données pour Smile ID
-        file_path = document.file.path
-        
-        # Encoder l'image en base64
-        encoded_image = smile_id_service.encode_image_to_base64(file_path)
-        if not encoded_image:
-            raise Exception("Impossible d'encoder l'image")
+        # Image redressée et réduite (rendu réutilisé s'il existe déjà),
+        # encodée en base64 en flux lors de l'envoi
+        encoded_image = StoredImage(*prepare_kyc_image(document))
         
         # Préparer les informations d'identité
         id_info = {
@@ -121,16 +118,13 @@ def process_kyc_document(self, document_id: int):
             document.smile_id_job_id = result.get('job_id', '')
             document.smile_id_result = result
             document.status = 'PROCESSING'
-            document.save(update_fields=['smile_id_job_id', 'smile_id_result', 'status'])
+            document.submitted_at = timezone.now()
+            document.save(update_fields=['smile_id_job_id', 'smile_id_result', 'status', 'submitted_at'])
             
+            # Le résultat arrive par le webhook Smile ID ; à défaut, il est
+            # récupéré par poll_pending_kyc_jobs
             logger.info(f"Document KYC {document_id} soumis à Smile ID avec succès")
             
-            # Programmer une vérification du statut dans 30 secondes
-            check_kyc_job_status.apply_async(
-                args=[document.id],
-                countdown=30
-            )
-            
         else:
             document.status = 'REJECTED'
             document.verification_notes = "Erreur lors de la soumission à Smile ID"
@@ -147,62 +141,45 @@ def process_kyc_document(self, document_id: int):
         raise self.retry(countdown=60 * (2 ** self.request.retries))
 
 
-@shared_task(bind=True, max_retries=5)
-def check_kyc_job_status(self, document_id: int):
+@shared_task
+def check_kyc_job_status(document_id: int):
     """
-    Vérifier le statut d'un job KYC sur Smile ID
+    Vérifier le statut d'un job KYC sur Smile ID (une seule interrogation,
+    sans reprogrammation ; le suivi courant passe par poll_pending_kyc_jobs)
     """
+    from .kyc_tracking import apply_job_result, schedule_overall_check
+    
     try:
         document = KYCDocument.objects.get(id=document_id)
-        
-        if not document.smile_id_job_id:
-            logger.error(f"Pas de job ID Smile ID pour le document {document_id}")
-            return
-        
-        # Obtenir le statut du job
-        result = smile_id_service.get_job_status(document.smile_id_job_id)
-        
-        if result:
-            job_complete = result.get('job_complete', False)
-            job_success = result.get('job_success', False)
-            
-            if job_complete:
-                # Le job est terminé
-                if job_success:
-                    document.status = 'VERIFIED'
-                    document.confidence_score = result.get('confidence', 0)
-                    document.verification_notes = "Vérifié avec succès par Smile ID"
-                else:
-                    document.status = 'REJECTED'
-                    document.verification_notes = f"Rejeté par Smile ID: {result.get('code', 'Raison inconnue')}"
-                
-                document.smile_id_result = result
-                document.save(update_fields=['status', 'confidence_score', 'verification_notes', 'smile_id_result'])
-                
-                # Vérifier si tous les documents requis sont vérifiés
-                check_overall_kyc_status.delay(document.user.id)
-                
-                logger.info(f"Statut KYC mis à jour pour document {document_id}: {document.status}")
-                
-            else:
-                # Le job n'est pas encore terminé, reprogrammer une vérification
-                if self.request.retries < 5:
-                    raise self.retry(countdown=60)  # Retry dans 1 minute
-                else:
-                    # Trop de tentatives, marquer comme timeout
-                    document.status = 'REJECTED'
-                    document.verification_notes = "Timeout lors de la vérification Smile ID"
-                    document.save(update_fields=['status', 'verification_notes'])
-        else:
-            # Erreur API, retry
-            raise self.retry(countdown=120)
-            
     except KYCDocument.DoesNotExist:
         logger.error(f"Document KYC {document_id} non trouvé")
+        return
+    
+    if not document.smile_id_job_id:
+        logger.error(f"Pas de job ID Smile ID pour le document {document_id}")
+        return
+    
+    result = smile_id_service.get_job_status(document.smile_id_job_id)
+    if result and result.get('job_complete') and apply_job_result(document, result):
+        schedule_overall_check([document.user_id])
+
+
+@shared_task
+def poll_pending_kyc_jobs():
+    """
+    Récupérer en un passage les résultats des jobs KYC sans webhook reçu
+    """
+    from .kyc_tracking import poll_pending_jobs
+    
+    try:
+        stats = poll_pending_jobs()
+        logger.info(
+            f"Jobs KYC interrogés: {stats['checked']}, terminés: {stats['completed']}, "
+            f"expirés: {stats['timed_out']}"
+        )
+        return stats
     except Exception as e:
-        logger.error(f"Erreur vérification statut KYC {document_id}: {e}")
-        if self.request.retries < 5:
-            raise self.retry(countdown=60 * (2 ** self.request.retries))
+        logger.error(f"Erreur interrogation des jobs KYC en attente: {e}")
 
 
 @shared_task
@@ -210,51 +187,17 @@ def check_overall_kyc_status(user_id: int):
     """
     Vérifier le statut KYC global d'un utilisateur
     """
+    from .kyc_status import evaluate_kyc_status
+    from .kyc_tracking import clear_overall_check
+    
+    # Les résultats reçus à partir d'ici planifieront une nouvelle évaluation
+    clear_overall_check(user_id)
+    
     try:
-        user = User.objects.get(id=user_id)
-        
-        # Documents requis
-        required_docs = ['ID_FRONT', 'ID_BACK', 'SELFIE', 'PROOF_OF_ADDRESS']
-        
-        # Vérifier que tous les documents requis sont vérifiés
-        verified_docs = KYCDocument.objects.filter(
-            user=user,
-            document_type__in=required_docs,
-            status='VERIFIED'
-        ).values_list('document_type', flat=True)
-        
-        if set(verified_docs) >= set(required_docs):
-            # Tous les documents sont vérifiés
-            user.kyc_status = 'UNDER_REVIEW'  # En attente d'approbation manuelle
-            user.save(update_fields=['kyc_status'])
-            
-            # Notifier les admins
-            notify_admins_kyc_ready.delay(user_id)
-            
-            # Notifier l'utilisateur
-            if user.email:
-                send_notification_email(
-                    user.email,
-                    "Documents KYC vérifiés",
-                    "Tous vos documents ont été vérifiés avec succès. Votre dossier est maintenant en cours de révision par notre équipe."
-                )
-            
-            logger.info(f"Utilisateur {user_id} - Tous les documents KYC vérifiés")
-            
-        elif KYCDocument.objects.filter(user=user, status='REJECTED').exists():
-            # Au moins un document a été rejeté
-            user.kyc_status = 'REJECTED'
-            user.save(update_fields=['kyc_status'])
-            
-            # Notifier l'utilisateur
-            if user.email:
-                send_notification_email(
-                    user.email,
-                    "Documents KYC rejetés",
-                    "Un ou plusieurs de vos documents ont été rejetés. Veuillez vous connecter à votre compte pour voir les détails et soumettre de nouveaux documents."
-                )
-            
-            logger.info(f"Utilisateur {user_id} - Documents KYC rejetés")
+        # Lecture de l'agrégat ; sans effet si le signal a déjà appliqué la transition
+        status = evaluate_kyc_status(user_id)
+        if status:
+            logger.info(f"Utilisateur {user_id} - Statut KYC: {status}")
             
     except User.DoesNotExist:
         logger.error(f"Utilisateur {user_id} non trouvé pour vérification KYC")
@@ -266,32 +209,45 @@ def check_overall_kyc_status(user_id: int):
 def notify_admins_kyc_ready(user_id: int):
     """
     Notifier les admins qu'un KYC est prêt pour révision
+    
+    Un seul résumé de la file est envoyé par intervalle de
+    `KYC_REVIEW_NOTIFY_INTERVAL` secondes, quel que soit le nombre de
+    dossiers arrivés entre-temps.
     """
+    from django.conf import settings
+    from django.core.cache import cache
+    from .kyc_review import review_queue
+    
+    interval = getattr(settings, 'KYC_REVIEW_NOTIFY_INTERVAL', 3600)
+    if not cache.add('kyc:review_notified', True, interval):
+        logger.info(f"KYC utilisateur {user_id} ajouté à la file ; admins déjà notifiés")
+        return
+    
     try:
-        user = User.objects.get(id=user_id)
-        admins = User.objects.filter(role='ADMIN', is_active=True)
+        queue = review_queue()
+        pending_count = queue.count()
+        oldest = queue.values_list('kyc_submitted_at', flat=True).first()
         
-        subject = f"Nouveau KYC à réviser - {user.get_full_name()}"
+        subject = f"Dossiers KYC à réviser ({pending_count})"
         message = f"""
-        Un nouveau dossier KYC est prêt pour révision:
+        {pending_count} dossier(s) KYC en attente de révision.
         
-        Utilisateur: {user.get_full_name()}
-        Téléphone: {user.phone_number}
-        Email: {user.email or 'Non fourni'}
-        Date de soumission: {timezone.now().strftime('%d/%m/%Y %H:%M')}
+        Plus ancienne soumission: {oldest.strftime('%d/%m/%Y %H:%M') if oldest else 'inconnue'}
         
-        Veuillez vous connecter à l'interface d'administration pour réviser ce dossier.
+        Veuillez vous connecter à l'interface d'administration pour réserver et réviser les dossiers.
         """
         
-        for admin in admins:
-            if admin.email:
-                send_notification_email(admin.email, subject, message)
+        admin_emails = User.objects.filter(
+            role='ADMIN', is_active=True
+        ).exclude(email='').values_list('email', flat=True)
         
-        logger.info(f"Admins notifiés pour KYC utilisateur {user_id}")
+        for email in admin_emails:
+            send_notification_email(email, subject, message)
+        
+        logger.info(f"Admins notifiés de la file KYC ({pending_count} dossiers)")
         
-    except User.DoesNotExist:
-        logger.error(f"Utilisateur {user_id} non trouvé pour notification admin")
     except Exception as e:
+        cache.delete('kyc:review_notified')
         logger.error(f"Erreur notification admins KYC {user_id}: {e}")
 
 
@@ -331,6 +287,58 @@ def send_kyc_reminder():
         logger.error(f"Erreur envoi rappels KYC: {e}")
 
 
+@shared_task
+def record_login_attempts(attempts: list):
+    """
+    Enregistrer un lot de tentatives de connexion
+    """
+    from django.utils.dateparse import parse_datetime
+    from .models import LoginAttempt
+    
+    try:
+        LoginAttempt.objects.bulk_create([
+            LoginAttempt(**dict(attempt, attempted_at=parse_datetime(attempt['attempted_at'])))
+            for attempt in attempts
+        ])
+    except Exception as e:
+        logger.error(f"Erreur enregistrement des tentatives de connexion: {e}")
+
+
+@shared_task
+def record_user_activity(entries: list):
+    """
+    Écrire un lot d'horodatages d'activité (users.activity)
+
+    Un seul UPDATE par lot pour les utilisateurs, et un pour leurs sessions actives.
+    """
+    from django.db.models import Case, DateTimeField, Value, When
+    from django.utils.dateparse import parse_datetime
+    from .models import UserSession
+    
+    try:
+        latest = {}
+        for user_id, timestamp in entries:
+            timestamp = parse_datetime(timestamp)
+            if user_id not in latest or timestamp > latest[user_id]:
+                latest[user_id] = timestamp
+        
+        if not latest:
+            return
+        
+        def by_user(field):
+            return Case(
+                *[When(**{field: user_id}, then=Value(timestamp)) for user_id, timestamp in latest.items()],
+                output_field=DateTimeField()
+            )
+        
+        User.objects.filter(pk__in=latest).update(last_activity=by_user('pk'))
+        UserSession.objects.filter(user_id__in=latest, is_active=True).update(
+            last_activity=by_user('user_id')
+        )
+    except Exception as e:
+        logger.error(f"Erreur enregistrement de l'activité: {e}")
+
+
 @shared_task
 def cleanup_expired_verification_tokens():
     """
@@ -4,6 +4,7 @@ from io import BytesIO
 from PIL import Image
 from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase, APIClient
@@ -192,3 +193,1070 @@ class UserProfileTestCase(APITestCase):
         # Vérifier que le mot de passe a été changé
         self.test_user.refresh_from_db()
         self.assertTrue(self.test_user.check_password('NewPassword456!'))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), UPLOAD_SESSION_DIR=tempfile.mkdtemp())
+class KYCDocumentUploadTestCase(APITestCase):
+    """Tests pour l'upload en flux des documents KYC"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='kyc@example.com',
+            password='TestPassword123!',
+            first_name='John',
+            last_name='Doe'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('kyc-upload')
+        
+        image = BytesIO()
+        Image.new('RGB', (64, 64), color='red').save(image, format='PNG')
+        self.content = image.getvalue()
+        
+        patcher = patch('users.views.process_kyc_document')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_upload_computes_hash_in_chunks(self):
+        """L'empreinte et la taille sont calculées lors de l'upload"""
+        import hashlib
+        
+        upload = SimpleUploadedFile('id.png', self.content, content_type='image/png')
+        response = self.client.post(self.url, {'document_type': 'ID_FRONT', 'file': upload}, format='multipart')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        document = KYCDocument.objects.get(user=self.user, document_type='ID_FRONT')
+        self.assertEqual(document.file_hash, hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(document.file_size, len(self.content))
+        
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.kyc_status, 'SUBMITTED')
+    
+    def test_declared_content_type_is_not_trusted(self):
+        """Un fichier dont les octets ne correspondent pas au type déclaré est refusé"""
+        upload = SimpleUploadedFile('id.png', b'#!/bin/sh\necho hello\n', content_type='image/png')
+        response = self.client.post(self.url, {'document_type': 'ID_FRONT', 'file': upload}, format='multipart')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(KYCDocument.objects.filter(user=self.user).exists())
+    
+    def test_oversized_request_rejected_before_parsing(self):
+        """La taille annoncée est vérifiée avant l'analyse du corps"""
+        upload = SimpleUploadedFile('id.png', self.content + b'\0' * 200 * 1024, content_type='image/png')
+        
+        with override_settings(UPLOAD_POLICIES={'kyc': {'max_size': 64 * 1024}}):
+            response = self.client.post(self.url, {'document_type': 'ID_FRONT', 'file': upload}, format='multipart')
+        
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    
+    def test_resumable_upload(self):
+        """Un document peut être envoyé en plusieurs parties puis soumis"""
+        import hashlib
+        from core.models import UploadSession
+        
+        response = self.client.post(reverse('upload-session-create'), {
+            'purpose': 'kyc',
+            'filename': 'selfie.png',
+            'content_type': 'image/png',
+            'total_size': len(self.content),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        upload_id = response.data['data']['upload_id']
+        detail_url = reverse('upload-session-detail', args=[upload_id])
+        
+        middle = len(self.content) // 2
+        for offset, part in ((0, self.content[:middle]), (middle, self.content[middle:])):
+            response = self.client.generic(
+                'PATCH', detail_url, part,
+                content_type='application/offset+octet-stream',
+                HTTP_UPLOAD_OFFSET=str(offset)
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['status'], 'COMPLETED')
+        
+        response = self.client.post(self.url, {'document_type': 'SELFIE', 'upload_id': upload_id}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        document = KYCDocument.objects.get(user=self.user, document_type='SELFIE')
+        self.assertEqual(document.file_hash, hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(UploadSession.objects.get(upload_id=upload_id).status, 'CONSUMED')
+    
+    def test_resumable_upload_rejects_wrong_offset(self):
+        """Une partie envoyée à la mauvaise position est refusée avec la position attendue"""
+        response = self.client.post(reverse('upload-session-create'), {
+            'purpose': 'kyc',
+            'filename': 'selfie.png',
+            'content_type': 'image/png',
+            'total_size': len(self.content),
+        }, format='json')
+        detail_url = reverse('upload-session-detail', args=[response.data['data']['upload_id']])
+        
+        response = self.client.generic(
+            'PATCH', detail_url, self.content[:10],
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET='5'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['errors']['received_size'], 0)
+    
+    def test_resumable_upload_rejects_oversized_part(self):
+        """Une partie dépassant la taille annoncée est trop grande, pas un conflit"""
+        response = self.client.post(reverse('upload-session-create'), {
+            'purpose': 'kyc',
+            'filename': 'selfie.png',
+            'content_type': 'image/png',
+            'total_size': 10,
+        }, format='json')
+        detail_url = reverse('upload-session-detail', args=[response.data['data']['upload_id']])
+        
+        response = self.client.generic(
+            'PATCH', detail_url, self.content[:20],
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET='0'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(response.data['errors']['received_size'], 0)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), KYC_IMAGE_MAX_DIMENSION=100, KYC_IMAGE_QUALITY=80)
+class KYCImageProcessingTestCase(TestCase):
+    """Tests pour la préparation des images KYC avant Smile ID"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='render@example.com',
+            password='TestPassword123!',
+            first_name='John',
+            last_name='Doe'
+        )
+    
+    def _create_document(self, content, name='id.jpg'):
+        import hashlib
+        
+        return KYCDocument.objects.create(
+            user=self.user,
+            document_type='ID_FRONT',
+            file=SimpleUploadedFile(name, content),
+            file_hash=hashlib.sha256(content).hexdigest(),
+            file_size=len(content),
+        )
+    
+    def _jpeg(self, size, orientation=None):
+        image = Image.new('RGB', size, color='blue')
+        output = BytesIO()
+        if orientation:
+            exif = Image.Exif()
+            exif[0x0112] = orientation
+            image.save(output, format='JPEG', exif=exif)
+        else:
+            image.save(output, format='JPEG')
+        return output.getvalue()
+    
+    def test_rendition_is_rotated_and_downscaled(self):
+        """L'orientation EXIF est appliquée et l'image réduite"""
+        from django.core.files.storage import default_storage
+        from .image_processing import prepare_kyc_image
+        
+        # Orientation 6 : rotation de 90° à l'affichage
+        document = self._create_document(self._jpeg((400, 200), orientation=6))
+        name, size = prepare_kyc_image(document)
+        
+        with default_storage.open(name, 'rb') as rendition:
+            image = Image.open(rendition)
+            image.load()
+        self.assertEqual(image.size, (50, 100))
+        self.assertIsNone(image.getexif().get(0x0112))
+        self.assertEqual(size, default_storage.size(name))
+    
+    def test_rendition_is_cached(self):
+        """Le rendu d'un même contenu n'est calculé qu'une fois"""
+        from .image_processing import prepare_kyc_image
+        
+        document = self._create_document(self._jpeg((300, 300)))
+        first = prepare_kyc_image(document)
+        
+        with patch('users.image_processing.render_image') as render:
+            second = prepare_kyc_image(document)
+        
+        render.assert_not_called()
+        self.assertEqual(first, second)
+    
+    def test_pdf_is_passed_through(self):
+        """Les PDF sont transmis sans rendu"""
+        from .image_processing import prepare_kyc_image
+        
+        document = self._create_document(b'%PDF-1.4\n%test\n', name='address.pdf')
+        name, size = prepare_kyc_image(document)
+        
+        self.assertEqual(name, document.file.name)
+        self.assertEqual(size, document.file.size)
+    
+    def test_iter_base64_matches_standard_encoding(self):
+        """L'encodage par blocs équivaut à l'encodage en une fois"""
+        import base64
+        from .image_processing import base64_length, iter_base64
+        
+        for length in (0, 1, 2, 3, 1000, 10 ** 5 + 1):
+            data = bytes(i % 251 for i in range(length))
+            encoded = b''.join(iter_base64(BytesIO(data), chunk_size=3 * 1024))
+            self.assertEqual(encoded, base64.b64encode(data))
+            self.assertEqual(base64_length(length), len(encoded))
+    
+    def test_streaming_json_body(self):
+        """Le corps streamé est un JSON valide de longueur annoncée"""
+        import base64
+        from .services import StoredImage, StreamingJSONBody
+        
+        document = self._create_document(self._jpeg((60, 40)))
+        image = StoredImage(document.file.name, document.file.size)
+        body = StreamingJSONBody({
+            'user_id': '1',
+            'images': [{'image_type_id': 1, 'image': image}, {'image_type_id': 2, 'image': image}],
+        })
+        
+        raw = b''.join(body)
+        self.assertEqual(len(body), len(raw))
+        
+        payload = json.loads(raw)
+        self.assertEqual(payload['user_id'], '1')
+        with document.file.open('rb') as source:
+            content = source.read()
+        for item in payload['images']:
+            self.assertEqual(base64.b64decode(item['image']), content)
+
+
+class KYCJobTrackingTestCase(APITestCase):
+    """Tests pour le suivi des jobs Smile ID (webhook puis interrogation groupée)"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='tracking@example.com',
+            password='TestPassword123!',
+            first_name='John',
+            last_name='Doe'
+        )
+        self.documents = [
+            KYCDocument.objects.create(
+                user=self.user,
+                document_type=document_type,
+                file=f'kyc_documents/{document_type}.jpg',
+                status='PROCESSING',
+                smile_id_job_id=f'job-{document_type}',
+            )
+            for document_type in ('ID_FRONT', 'ID_BACK')
+        ]
+        
+        from django.core.cache import cache
+        cache.clear()
+        
+        patcher = patch('users.tasks.check_overall_kyc_status.apply_async')
+        self.overall_check = patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def _age_documents(self, seconds):
+        from datetime import timedelta
+        from django.utils import timezone
+        
+        past = timezone.now() - timedelta(seconds=seconds)
+        KYCDocument.objects.filter(user=self.user).update(updated_at=past, created_at=past, submitted_at=past)
+    
+    def test_webhook_is_idempotent_and_batches_status_check(self):
+        """Les résultats d'un même utilisateur donnent une seule évaluation globale"""
+        url = reverse('smile-id-webhook')
+        for job_id in ('job-ID_FRONT', 'job-ID_BACK', 'job-ID_FRONT'):
+            response = self.client.post(
+                url, json.dumps({'job_id': job_id, 'job_success': True, 'confidence': 99}),
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 200)
+        
+        statuses = set(KYCDocument.objects.filter(user=self.user).values_list('status', flat=True))
+        self.assertEqual(statuses, {'VERIFIED'})
+        self.overall_check.assert_called_once()
+        self.assertEqual(self.overall_check.call_args.kwargs['args'], [self.user.id])
+    
+    @patch('users.kyc_tracking.smile_id_service.get_job_status')
+    def test_poll_skips_jobs_within_webhook_grace_period(self, get_job_status):
+        """Les jobs récents sont laissés au webhook"""
+        from .kyc_tracking import poll_pending_jobs
+        
+        stats = poll_pending_jobs()
+        
+        self.assertEqual(stats['checked'], 0)
+        get_job_status.assert_not_called()
+    
+    @patch('users.kyc_tracking.smile_id_service.get_job_status')
+    def test_poll_completes_pending_jobs_in_one_pass(self, get_job_status):
+        """Un seul passage traite tous les jobs en attente"""
+        from .kyc_tracking import poll_pending_jobs
+        
+        self._age_documents(600)
+        get_job_status.side_effect = [
+            {'job_complete': True, 'job_success': True, 'confidence': 95},
+            {'job_complete': False},
+        ]
+        
+        stats = poll_pending_jobs()
+        
+        self.assertEqual(stats, {'checked': 2, 'completed': 1, 'timed_out': 0})
+        self.assertEqual(get_job_status.call_count, 2)
+        self.overall_check.assert_called_once()
+        
+        # Le job non terminé attend le webhook ou le passage suivant
+        pending = KYCDocument.objects.get(status='PROCESSING')
+        self.assertFalse(poll_pending_jobs()['checked'])
+        self.assertEqual(pending.smile_id_job_id, 'job-ID_BACK')
+    
+    @patch('users.kyc_tracking.smile_id_service.get_job_status', return_value=None)
+    def test_poll_times_out_stale_jobs(self, get_job_status):
+        """Les jobs sans résultat après le délai maximal sont rejetés"""
+        from .kyc_tracking import poll_pending_jobs
+        
+        self._age_documents(2 * 86400)
+        stats = poll_pending_jobs()
+        
+        self.assertEqual(stats['timed_out'], 2)
+        self.assertFalse(KYCDocument.objects.filter(status='PROCESSING').exists())
+    
+    @patch('users.kyc_tracking.smile_id_service.get_job_status', return_value=None)
+    def test_poll_timeout_counts_from_latest_submission(self, get_job_status):
+        """Un document soumis à nouveau n'hérite pas de l'ancienneté du premier envoi"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .kyc_tracking import poll_pending_jobs
+        
+        self._age_documents(2 * 86400)
+        KYCDocument.objects.filter(pk=self.documents[0].pk).update(
+            submitted_at=timezone.now() - timedelta(seconds=600)
+        )
+        
+        stats = poll_pending_jobs()
+        
+        self.assertEqual(stats['timed_out'], 1)
+        self.assertEqual(KYCDocument.objects.get(pk=self.documents[0].pk).status, 'PROCESSING')
+    
+    def test_stale_result_does_not_overwrite_new_submission(self):
+        """Le résultat d'un ancien job ne s'applique pas au document soumis à nouveau"""
+        from .kyc_tracking import apply_job_result
+        
+        stale = KYCDocument.objects.get(pk=self.documents[0].pk)
+        KYCDocument.objects.filter(pk=stale.pk).update(smile_id_job_id='job-new', status='UPLOADED')
+        
+        self.assertFalse(apply_job_result(stale, {'job_success': True, 'confidence': 99}))
+        self.assertEqual(KYCDocument.objects.get(pk=stale.pk).status, 'UPLOADED')
+    
+    def _post_results(self, failed_job=None):
+        """Compléter le dossier puis recevoir un résultat par webhook pour chaque document"""
+        for document_type in ('SELFIE', 'PROOF_OF_ADDRESS'):
+            KYCDocument.objects.create(
+                user=self.user, document_type=document_type, file=f'kyc_documents/{document_type}.jpg',
+                status='PROCESSING', smile_id_job_id=f'job-{document_type}',
+            )
+        for document_type in ('ID_FRONT', 'ID_BACK', 'SELFIE', 'PROOF_OF_ADDRESS'):
+            job_id = f'job-{document_type}'
+            response = self.client.post(
+                reverse('smile-id-webhook'),
+                json.dumps({'job_id': job_id, 'job_success': job_id != failed_job,
+                            'confidence': 99, 'code': '0812'}),
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+    
+    def test_webhook_results_move_user_to_review(self):
+        """Les résultats du webhook mettent à jour l'agrégat et le statut KYC"""
+        self._post_results()
+        
+        self.assertEqual(self.user.kyc_verified_mask & 0b1111, 0b1111)
+        self.assertEqual(self.user.kyc_status, 'UNDER_REVIEW')
+    
+    def test_webhook_rejection_rejects_user(self):
+        self._post_results(failed_job='job-SELFIE')
+        
+        self.assertTrue(self.user.kyc_rejected_mask)
+        self.assertEqual(self.user.kyc_status, 'REJECTED')
+        self.assertIn('0812', self.user.kyc_rejection_reason)
+
+
+class KYCAggregateTestCase(APITestCase):
+    """Tests pour l'agrégat KYC et les transitions de statut"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='aggregate@example.com',
+            password='TestPassword123!',
+            first_name='John',
+            last_name='Doe'
+        )
+        User.objects.filter(pk=self.user.pk).update(kyc_status='SUBMITTED')
+        self.documents = {
+            document_type: KYCDocument.objects.create(
+                user=self.user,
+                document_type=document_type,
+                file=f'kyc_documents/{document_type}.jpg',
+                status='PROCESSING',
+            )
+            for document_type in ('ID_FRONT', 'ID_BACK', 'SELFIE', 'PROOF_OF_ADDRESS')
+        }
+    
+    def _set_status(self, document_type, status):
+        document = self.documents[document_type]
+        document.status = status
+        document.save(update_fields=['status'])
+    
+    @patch('users.tasks.notify_admins_kyc_ready.delay')
+    def test_all_verified_triggers_single_transition(self, notify_admins):
+        """Le dossier passe en révision une seule fois, notification comprise"""
+        from .tasks import check_overall_kyc_status
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            for document_type in self.documents:
+                self._set_status(document_type, 'VERIFIED')
+            # Évaluation redondante par la tâche : sans effet
+            check_overall_kyc_status(self.user.id)
+        
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.kyc_status, 'UNDER_REVIEW')
+        self.assertEqual(self.user.kyc_verified_mask, 0b1111)
+        notify_admins.assert_called_once_with(self.user.id)
+    
+    def test_rejected_document_rejects_user(self):
+        """Un document rejeté rejette le dossier et en donne la raison"""
+        self.documents['SELFIE'].verification_notes = 'Visage illisible'
+        self._set_status('SELFIE', 'REJECTED')
+        
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.kyc_status, 'REJECTED')
+        self.assertIn('Visage illisible', self.user.kyc_rejection_reason)
+        self.assertEqual(self.user.kyc_rejected_mask, 0b100)
+        
+        # Nouvel envoi : le bit de rejet est effacé
+        self._set_status('SELFIE', 'UPLOADED')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.kyc_rejected_mask, 0)
+    
+    def test_document_save_uses_constant_queries(self):
+        """La mise à jour de l'agrégat ne relit pas les autres documents"""
+        document = self.documents['ID_FRONT']
+        document.status = 'VERIFIED'
+        
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as context:
+            document.save(update_fields=['status'])
+        
+        # UPDATE du document, UPDATE de l'agrégat, lecture des masques
+        queries = [q['sql'] for q in context.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(queries), 3)
+        self.assertFalse(any('users_kycdocument' in sql for sql in queries[1:]))
+    
+    def test_delete_clears_bits(self):
+        """La suppression d'un document le retire de l'agrégat"""
+        self.documents['ID_BACK'].delete()
+        
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.kyc_uploaded_mask, 0b1101)
+    
+    def test_status_view_reports_document_statuses(self):
+        """Le statut KYC liste les documents avec leur statut réel, en une requête"""
+        self._set_status('ID_FRONT', 'VERIFIED')
+        self._set_status('SELFIE', 'UPLOADED')
+        self.user.refresh_from_db()
+        self.client.force_authenticate(user=self.user)
+        
+        # last_activity est écrit par une tâche distincte (users.activity)
+        with patch('users.tasks.record_user_activity.delay'), self.assertNumQueries(1):
+            response = self.client.get(reverse('kyc-status'))
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data['data']
+        statuses = {document['document_type']: document['status'] for document in data['documents']}
+        self.assertEqual(statuses['ID_FRONT'], 'VERIFIED')
+        self.assertEqual(statuses['SELFIE'], 'UPLOADED')
+        self.assertEqual(statuses['ID_BACK'], 'PROCESSING')
+        self.assertEqual(data['missing_documents'], [])
+
+
+class AdminKYCReviewQueueTestCase(APITestCase):
+    """Tests pour la file de révision KYC"""
+    
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        
+        self.admin = User.objects.create_user(
+            email='admin1@example.com', password='TestPassword123!',
+            first_name='Ada', last_name='Admin', role='ADMIN'
+        )
+        self.other_admin = User.objects.create_user(
+            email='admin2@example.com', password='TestPassword123!',
+            first_name='Bob', last_name='Admin', role='ADMIN'
+        )
+        
+        now = timezone.now()
+        self.applicants = []
+        for index in range(3):
+            applicant = User.objects.create_user(
+                email=f'applicant{index}@example.com', password='TestPassword123!',
+                first_name='Jean', last_name='Client'
+            )
+            User.objects.filter(pk=applicant.pk).update(
+                kyc_status='UNDER_REVIEW',
+                kyc_submitted_at=now - timedelta(hours=3 - index),
+            )
+            KYCDocument.objects.create(
+                user=applicant, document_type='ID_FRONT',
+                file='kyc_documents/id.jpg', status='VERIFIED'
+            )
+            self.applicants.append(applicant)
+        
+        # Hors file
+        User.objects.create_user(
+            email='pending@example.com', password='TestPassword123!',
+            first_name='Paul', last_name='Client'
+        )
+        
+        from django.core.cache import cache
+        cache.clear()
+    
+    def test_queue_is_ordered_and_prefetched(self):
+        """La file est triée par date de soumission, documents préchargés"""
+        self.client.force_authenticate(user=self.admin)
+        
+        with patch('users.tasks.record_user_activity.delay'), \
+                self.assertNumQueries(3):  # comptage, dossiers, documents
+            response = self.client.get(reverse('admin-kyc-queue'))
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual([row['id'] for row in results], [user.id for user in self.applicants])
+        self.assertEqual(results[0]['documents'][0]['document_type'], 'ID_FRONT')
+    
+    def test_concurrent_reviewers_claim_distinct_applications(self):
+        """Deux administrateurs ne réservent jamais le même dossier"""
+        from .kyc_review import claim_next
+        
+        first = claim_next(self.admin, 2)
+        second = claim_next(self.other_admin, 2)
+        
+        self.assertEqual([user.id for user in first], [self.applicants[0].id, self.applicants[1].id])
+        self.assertEqual([user.id for user in second], [self.applicants[2].id])
+        self.assertEqual(claim_next(self.other_admin), [])
+    
+    def test_expired_lease_returns_to_queue(self):
+        """Une réservation expirée peut être reprise"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .kyc_review import claim_next
+        
+        claim_next(self.admin, 3)
+        User.objects.filter(pk=self.applicants[0].pk).update(
+            kyc_review_lease_expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        
+        claimed = claim_next(self.other_admin)
+        self.assertEqual([user.id for user in claimed], [self.applicants[0].id])
+    
+    @patch('users.views.send_notification_email')
+    def test_approval_respects_claim(self, send_email):
+        """Seul le titulaire de la réservation peut statuer"""
+        from .kyc_review import claim_next
+        
+        applicant = claim_next(self.admin)[0]
+        url = reverse('admin-kyc-approve', args=[applicant.id])
+        
+        self.client.force_authenticate(user=self.other_admin)
+        response = self.client.post(url, {'action': 'approve'})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(url, {'action': 'approve'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        applicant.refresh_from_db()
+        self.assertEqual(applicant.kyc_status, 'VERIFIED')
+        self.assertIsNone(applicant.kyc_review_claimed_by)
+    
+    @patch('users.tasks.send_notification_email')
+    def test_admin_notification_is_throttled(self, send_email):
+        """Les admins reçoivent un seul résumé par intervalle"""
+        from .tasks import notify_admins_kyc_ready
+        
+        for applicant in self.applicants:
+            notify_admins_kyc_ready(applicant.id)
+        
+        self.assertEqual(send_email.call_count, 2)
+        self.assertIn('(3)', send_email.call_args.args[1])
+
+
+class LoginRateLimitTestCase(APITestCase):
+    """Tests pour la limitation des tentatives de connexion"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='limited@example.com',
+            password='TestPassword123!',
+            first_name='John',
+            last_name='Doe'
+        )
+        self.url = reverse('user-login')
+    
+    def _login(self, password, email='limited@example.com'):
+        return self.client.post(self.url, {'email': email, 'password': password}, format='json')
+    
+    def test_lockout_after_failed_attempts(self):
+        """Après 5 échecs, même le bon mot de passe est refusé sans requête SQL"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        for _ in range(5):
+            self.assertEqual(self._login('wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+        
+        with CaptureQueriesContext(connection) as context:
+            response = self._login('TestPassword123!')
+        
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertTrue(int(response['Retry-After']) > 0)
+        self.assertEqual(len(context.captured_queries), 0, context.captured_queries)
+    
+    def test_success_resets_identifier_counter(self):
+        """Une connexion réussie remet le compteur de l'identifiant à zéro"""
+        for _ in range(4):
+            self._login('wrong')
+        self.assertEqual(self._login('TestPassword123!').status_code, status.HTTP_200_OK)
+        
+        for _ in range(4):
+            self.assertEqual(self._login('wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_ip_limit_applies_across_identifiers(self):
+        """L'adresse IP est limitée indépendamment de l'identifiant"""
+        with override_settings(RATE_LIMITS={'login': {'ip': (3, 900)}}):
+            for index in range(3):
+                self._login('wrong', email=f'other{index}@example.com')
+            response = self._login('TestPassword123!')
+        
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+    
+    def test_local_fallback_when_cache_unavailable(self):
+        """Le limiteur reste actif si le cache partagé est indisponible"""
+        import uuid
+        from core.ratelimit import RateLimiter
+        
+        limiter = RateLimiter('phone_verification')
+        identifier = uuid.uuid4().hex
+        with patch('core.ratelimit.cache') as broken_cache:
+            broken_cache.get_many.side_effect = ConnectionError('redis down')
+            broken_cache.add.side_effect = ConnectionError('redis down')
+            for _ in range(5):
+                self.assertIsNone(limiter.retry_after(identifier=identifier))
+                limiter.hit(identifier=identifier)
+            self.assertIsNotNone(limiter.retry_after(identifier=identifier))
+    
+    def test_login_attempts_recorded_by_task(self):
+        """Chaque tentative est transmise à la tâche d'écriture, sans attente en mémoire"""
+        from .models import LoginAttempt
+        
+        with patch('users.tasks.record_login_attempts.delay') as record:
+            self._login('wrong')
+        record.assert_called_once()
+        self.assertEqual(record.call_args.args[0][0]['success'], False)
+        
+        self._login('wrong')
+        self._login('TestPassword123!')
+        self.assertEqual(LoginAttempt.objects.count(), 2)
+        self.assertEqual(LoginAttempt.objects.filter(success=True).count(), 1)
+    
+    def test_login_succeeds_when_broker_unavailable(self):
+        """Une tentative non transmise ne fait pas échouer la connexion"""
+        with patch('users.tasks.record_login_attempts.delay', side_effect=ConnectionError('broker down')):
+            response = self._login('TestPassword123!')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    @override_settings(TRUSTED_PROXY_COUNT=1)
+    def test_client_ip_ignores_spoofed_forwarded_entries(self):
+        """Seule l'entrée ajoutée par le mandataire de confiance est retenue"""
+        from django.test import RequestFactory
+        from core.utils import get_client_ip
+        
+        request = RequestFactory().get(
+            '/', HTTP_X_FORWARDED_FOR='1.2.3.4, 203.0.113.7', REMOTE_ADDR='10.0.0.2'
+        )
+        self.assertEqual(get_client_ip(request), '203.0.113.7')
+        
+        with override_settings(TRUSTED_PROXY_COUNT=0):
+            self.assertEqual(get_client_ip(request), '10.0.0.2')
+    
+    def test_phone_verification_is_limited(self):
+        """Les codes de vérification ne peuvent pas être essayés indéfiniment"""
+        self.client.force_authenticate(user=self.user)
+        url = reverse('verify-phone')
+        
+        for _ in range(5):
+            self.client.post(url, {'verification_code': '000000'}, format='json')
+        response = self.client.post(url, {'verification_code': '000000'}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+class EmailBackendTestCase(TestCase):
+    """Tests pour le backend d'authentification"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='backend@example.com',
+            password='TestPassword123!',
+            first_name='John',
+            last_name='Doe',
+            phone_number='+237670000001'
+        )
+    
+    def _authenticate(self, username, password='TestPassword123!'):
+        from django.contrib.auth import authenticate
+        return authenticate(username=username, password=password)
+    
+    def test_login_by_email_or_phone(self):
+        """L'email (insensible à la casse) et le téléphone normalisé sont acceptés"""
+        self.assertEqual(self._authenticate('Backend@Example.com'), self.user)
+        self.assertEqual(self._authenticate('237670000001'), self.user)
+        self.assertIsNone(self._authenticate('backend@example.com', 'wrong'))
+    
+    def test_single_lookup_query(self):
+        """La recherche du compte se fait en une seule requête"""
+        with self.assertNumQueries(1):
+            self.assertIsNone(self._authenticate('backend@example.com', 'wrong'))
+    
+    def test_unknown_account_still_hashes(self):
+        """Un compte inexistant coûte un hachage, comme un compte existant"""
+        with patch('django.contrib.auth.base_user.make_password') as make_password:
+            self.assertIsNone(self._authenticate('missing@example.com'))
+        make_password.assert_called_once_with('TestPassword123!')
+    
+    def test_password_rehashed_on_login(self):
+        """Le mot de passe est rehaché quand le hacheur préféré change"""
+        with override_settings(PASSWORD_HASHERS=[
+            'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+            'django.contrib.auth.hashers.MD5PasswordHasher',
+        ]):
+            self.user.set_password('TestPassword123!')
+            self.user.save()
+        
+        with override_settings(PASSWORD_HASHERS=[
+            'django.contrib.auth.hashers.MD5PasswordHasher',
+            'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        ]):
+            self.assertEqual(self._authenticate('backend@example.com'), self.user)
+        
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('md5$'))
+    
+    def test_phone_number_is_unique(self):
+        """Un numéro de téléphone ne peut appartenir qu'à un seul compte"""
+        from django.db import IntegrityError
+        
+        with self.assertRaises(IntegrityError):
+            User.objects.create_user(
+                email='other@example.com',
+                password='TestPassword123!',
+                phone_number='+237670000001'
+            )
+
+
+class ClaimsTokenTestCase(APITestCase):
+    """Tests pour l'authentification JWT à partir des claims"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        
+        self.user = User.objects.create_user(
+            email='claims@example.com',
+            password='TestPassword123!',
+            first_name='John',
+            last_name='Doe',
+            kyc_status='UNDER_REVIEW'
+        )
+        self.admin = User.objects.create_user(
+            email='claims-admin@example.com',
+            password='TestPassword123!',
+            first_name='Admin',
+            last_name='User',
+            role='ADMIN'
+        )
+    
+    def _tokens(self, user):
+        from .tokens import ClaimsRefreshToken
+        refresh = ClaimsRefreshToken.for_user(user)
+        return str(refresh), str(refresh.access_token)
+    
+    def _authenticate(self, access):
+        from rest_framework.test import APIRequestFactory
+        from .authentication import ClaimsJWTAuthentication
+        
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        return ClaimsJWTAuthentication().authenticate(request)[0]
+    
+    def test_user_built_from_claims_without_query(self):
+        """Une fois l'état en cache, l'authentification ne lit pas la base"""
+        _, access = self._tokens(self.user)
+        self._authenticate(access)
+        
+        with self.assertNumQueries(0):
+            user = self._authenticate(access)
+            self.assertEqual(user, self.user)
+            self.assertEqual(user.role, 'USER')
+            self.assertEqual(user.kyc_status, 'UNDER_REVIEW')
+            self.assertFalse(user.is_phone_verified)
+        
+        # Les autres champs sont chargés ensemble, en une requête
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'claims@example.com')
+            self.assertEqual(user.first_name, 'John')
+    
+    def test_kyc_approval_revokes_access_token(self):
+        """Un changement de statut KYC invalide le jeton ; le rafraîchissement met les claims à jour"""
+        refresh, access = self._tokens(self.user)
+        self._authenticate(access)
+        
+        _, admin_access = self._tokens(self.admin)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {admin_access}')
+        response = self.client.post(
+            reverse('admin-kyc-approve', args=[self.user.pk]), {'action': 'approve'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        response = self.client.get(reverse('kyc-status'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        
+        self.client.credentials()
+        response = self.client.post(reverse('token-refresh'), {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        user = self._authenticate(response.data['access'])
+        self.assertEqual(user.kyc_status, 'VERIFIED')
+    
+    def test_automatic_kyc_transition_revokes_access_token(self):
+        """Les transitions appliquées par UPDATE incrémentent aussi la version"""
+        from rest_framework_simplejwt.exceptions import InvalidToken
+        from .kyc_status import transition_kyc_status
+        
+        _, access = self._tokens(self.user)
+        self._authenticate(access)
+        
+        self.assertTrue(transition_kyc_status(self.user.pk, 'REJECTED', ['UNDER_REVIEW']))
+        with self.assertRaises(InvalidToken):
+            self._authenticate(access)
+    
+    def test_phone_verification_through_claims_user_revokes_token(self):
+        """Une sauvegarde de l'utilisateur construit depuis le jeton déclenche les signaux"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from rest_framework_simplejwt.exceptions import InvalidToken
+        
+        User.objects.filter(pk=self.user.pk).update(
+            phone_verification_token='123456',
+            phone_verification_expires_at=timezone.now() + timedelta(minutes=5),
+        )
+        _, access = self._tokens(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        
+        response = self.client.post(reverse('verify-phone'), {'verification_code': '123456'}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertRaises(InvalidToken):
+            self._authenticate(access)
+    
+    def test_profile_update_through_claims_user_is_normalized(self):
+        """La normalisation pre_save s'applique à l'utilisateur construit depuis le jeton"""
+        _, access = self._tokens(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        
+        response = self.client.patch(reverse('user-profile'), {'first_name': '  jean  '}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Jean')
+    
+    def test_deactivated_user_rejected(self):
+        """Un compte désactivé ne peut plus utiliser ses jetons"""
+        from rest_framework_simplejwt.exceptions import AuthenticationFailed
+        
+        refresh, access = self._tokens(self.user)
+        self.user.is_active = False
+        self.user.save()
+        
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate(access)
+        
+        response = self.client.post(reverse('token-refresh'), {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_unrelated_change_keeps_token_valid(self):
+        """Modifier un champ absent du jeton ne l'invalide pas"""
+        _, access = self._tokens(self.user)
+        
+        self.user.address_city = 'Douala'
+        self.user.save()
+        
+        self.assertEqual(self._authenticate(access), self.user)
+    
+    def test_legacy_token_still_accepted(self):
+        """Les jetons émis sans claims restent acceptés (lecture de l'utilisateur)"""
+        access = str(RefreshToken.for_user(self.user).access_token)
+        
+        user = self._authenticate(access)
+        self.assertIsInstance(user, User)
+        self.assertEqual(user.email, 'claims@example.com')
+
+
+class ActivityTrackingTestCase(APITestCase):
+    """Tests pour le suivi d'activité à écriture différée"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        
+        cache.clear()
+        
+        self.user = User.objects.create_user(
+            email='active@example.com',
+            password='TestPassword123!',
+            first_name='John',
+            last_name='Doe'
+        )
+        self.other = User.objects.create_user(
+            email='active2@example.com',
+            password='TestPassword123!',
+            first_name='Jane',
+            last_name='Doe'
+        )
+    
+    def test_last_activity_written_once_per_interval(self):
+        """Seule la première requête de l'intervalle transmet son horodatage"""
+        from .activity import record_activity
+        
+        with patch('users.tasks.record_user_activity.delay') as delay:
+            for _ in range(5):
+                record_activity(self.user.pk)
+            record_activity(self.other.pk)
+        
+        self.assertEqual(delay.call_count, 2)
+        self.assertEqual(
+            [call.args[0][0][0] for call in delay.call_args_list], [self.user.pk, self.other.pk]
+        )
+    
+    def test_last_activity_written_without_further_requests(self):
+        """L'horodatage est écrit dès la requête, sans attendre d'autre activité"""
+        from .activity import record_activity
+        
+        with self.assertNumQueries(2):
+            record_activity(self.user.pk)
+        
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_activity)
+    
+    def test_write_slot_released_when_broker_unavailable(self):
+        """Une écriture non transmise est retentée à la requête suivante"""
+        from .activity import record_activity
+        
+        with patch('users.tasks.record_user_activity.delay', side_effect=ConnectionError('broker down')):
+            record_activity(self.user.pk)
+        with patch('users.tasks.record_user_activity.delay') as delay:
+            record_activity(self.user.pk)
+        
+        delay.assert_called_once()
+    
+    def test_active_user_counts_without_database(self):
+        """Le nombre d'utilisateurs actifs ne lit pas la base"""
+        from .activity import count_active_users
+        
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        with patch('users.tasks.record_user_activity.delay'):
+            self.client.get(reverse('kyc-status'))
+            self.client.get(reverse('kyc-status'))
+        
+        with self.assertNumQueries(0):
+            self.assertEqual(count_active_users(days=1), 1)
+            self.assertEqual(count_active_users(days=30), 1)
+    
+    def test_login_does_not_write_last_activity(self):
+        """La connexion ne met plus à jour last_activity de façon synchrone"""
+        with patch('users.tasks.record_user_activity.delay'), \
+                patch('users.tasks.record_login_attempts.delay'):
+            response = self.client.post(reverse('user-login'), {
+                'email': 'active@example.com',
+                'password': 'TestPassword123!'
+            }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_activity)
+
+
+class UserProfileProvisioningTestCase(APITestCase):
+    """Tests pour la création du profil au premier accès"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='Provision@Example.com ',
+            password='TestPassword123!',
+            first_name=' john ',
+            last_name='doe',
+            phone_number='670000002'
+        )
+    
+    def test_user_save_does_not_touch_profile(self):
+        """Sauvegarder l'utilisateur n'écrit que sa propre ligne"""
+        self.user.get_profile()
+        user = User.objects.get(pk=self.user.pk)
+        
+        with self.assertNumQueries(1):
+            user.last_login = timezone.now()
+            user.save(update_fields=['last_login'])
+    
+    def test_profile_created_on_first_access(self):
+        """Le profil est créé au premier accès, une seule fois"""
+        self.assertFalse(UserProfile.objects.filter(user=self.user).exists())
+        
+        profile = self.user.get_profile()
+        self.assertEqual(profile.user, self.user)
+        
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.get_profile(), profile)
+            user.get_profile()
+    
+    def test_profile_endpoint_provisions_profile(self):
+        """Le profil étendu est disponible même sans profil préexistant"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('user-profile'))
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(UserProfile.objects.filter(user=self.user).exists())
+    
+    def test_only_changed_fields_are_normalized(self):
+        """Les champs d'identité sont normalisés à la création et quand ils changent"""
+        self.assertEqual(self.user.email, 'provision@example.com')
+        self.assertEqual(self.user.first_name, 'John')
+        self.assertEqual(self.user.phone_number, '+237670000002')
+        
+        User.objects.filter(pk=self.user.pk).update(last_name='legacy')
+        user = User.objects.get(pk=self.user.pk)
+        
+        with patch('core.utils.sanitize_phone_number') as sanitize:
+            user.address_city = 'Douala'
+            user.save()
+        sanitize.assert_not_called()
+        self.assertEqual(user.last_name, 'legacy')
+        
+        user.last_name = ' smith '
+        user.save()
+        self.assertEqual(user.last_name, 'Smith')
@@ -0,0 +1,122 @@
+"""
+Jetons JWT portant le rôle, le statut KYC et la vérification du téléphone.
+
+Les jetons d'accès embarquent ces champs (`TOKEN_CLAIMS`) et la version
+des jetons de l'utilisateur (`token_version`). L'authentification
+(`users.authentication.ClaimsJWTAuthentication`) reconstruit l'utilisateur
+à partir des claims : seule la version courante et l'état actif du compte
+sont vérifiés, via le cache partagé (`JWT_USER_STATE_CACHE_TTL`).
+
+Toute modification de ces champs (ou la désactivation du compte) incrémente
+`token_version` : les jetons d'accès émis auparavant sont refusés et le
+client obtient, via le rafraîchissement, un jeton aux claims à jour.
+"""
+
+import logging
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from rest_framework import exceptions
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+TOKEN_CLAIMS = ('role', 'kyc_status', 'is_phone_verified')
+VERSION_CLAIM = 'ver'
+
+
+def _state_key(user_id) -> str:
+    return f"auth:user_state:{user_id}"
+
+
+def get_user_state(user_id) -> Optional[Dict]:
+    """
+    Version des jetons et état actif d'un utilisateur (mis en cache)
+
+    Returns:
+        {'token_version': ..., 'is_active': ...} ou None si l'utilisateur n'existe pas
+    """
+    key = _state_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        state = User.objects.filter(pk=user_id).values('token_version', 'is_active').first()
+        if state is None:
+            return None
+        cache.set(key, state, getattr(settings, 'JWT_USER_STATE_CACHE_TTL', 60))
+    return state
+
+
+def invalidate_user_state(user_id):
+    """Retirer l'état mis en cache, maintenant et après validation de la transaction"""
+    key = _state_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def revoke_user_tokens(user_id):
+    """Invalider les jetons d'accès émis pour un utilisateur"""
+    User.objects.filter(pk=user_id).update(token_version=F('token_version') + 1)
+    invalidate_user_state(user_id)
+    logger.info(f"Jetons d'accès révoqués pour l'utilisateur {user_id}")
+
+
+def set_user_claims(token, user):
+    """Reporter les champs de l'utilisateur dans les claims du jeton"""
+    for field in TOKEN_CLAIMS:
+        token[field] = getattr(user, field)
+    token[VERSION_CLAIM] = user.token_version
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Jeton de rafraîchissement dont les jetons d'accès portent les claims utilisateur"""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        set_user_claims(token, user)
+        return token
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Rafraîchissement recalculant les claims depuis la base
+
+    Les claims du jeton de rafraîchissement peuvent être périmés : ils sont
+    remplacés par les valeurs courantes de l'utilisateur.
+    """
+    token_class = ClaimsRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        user = User.objects.filter(
+            **{api_settings.USER_ID_FIELD: refresh.get(api_settings.USER_ID_CLAIM)}
+        ).first()
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed("Compte introuvable ou désactivé", code='user_inactive')
+
+        set_user_claims(refresh, user)
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    # Application token_blacklist non installée
+                    pass
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+
+            data['refresh'] = str(refresh)
+
+        return data
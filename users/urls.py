@@ -28,6 +28,8 @@ urlpatterns = [
     # Administration
     path('admin/users/', views.AdminUserListView.as_view(), name='admin-users'),
     path('admin/users/<int:pk>/', views.AdminUserDetailView.as_view(), name='admin-user-detail'),
+    path('admin/kyc/queue/', views.AdminKYCQueueView.as_view(), name='admin-kyc-queue'),
+    path('admin/kyc/claim/', views.AdminKYCClaimView.as_view(), name='admin-kyc-claim'),
     path('admin/kyc/<int:user_id>/approve/', views.AdminKYCApprovalView.as_view(), name='admin-kyc-approve'),
     path('admin/statistics/', views.user_statistics, name='admin-user-stats'),
     
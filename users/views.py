@@ -11,7 +11,6 @@ from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-import hashlib
 import logging
 import json
 
@@ -20,11 +19,16 @@ from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer, PhoneVerificationSerializer,
     UserProfileSerializer, UserProfileUpdateSerializer, KYCDocumentSerializer,
     UserExtendedProfileSerializer, PasswordChangeSerializer, AdminUserSerializer,
-    PasswordResetRequestSerializer, PasswordResetConfirmSerializer
+    PasswordResetRequestSerializer, PasswordResetConfirmSerializer, AdminKYCReviewSerializer
 )
 from core.permissions import IsAdmin
-from core.utils import APIResponseMixin, send_notification_email
+from core.ratelimit import RateLimiter, throttled_response
+from core.utils import APIResponseMixin, get_client_ip, send_notification_email
+from core.uploads import check_content_length, release_upload, store_upload
+from .activity import count_active_users
+from .kyc_review import available_filter, claim_next, is_claimed_by_other, review_queue, with_documents
 from .tasks import send_verification_sms, process_kyc_document
+from .tokens import ClaimsRefreshToken
 from .services import smile_id_service
 
 User = get_user_model()
@@ -104,7 +108,7 @@ class UserRegistrationView(APIView, APIResponseMixin):
                     send_verification_sms.delay(user.id, user.phone_verification_token)
                     
                     # Générer les tokens JWT
-                    refresh = RefreshToken.for_user(user)
+                    refresh = ClaimsRefreshToken.for_user(user)
                     
                     return self.success_response({
                         'user': UserProfileSerializer(user).data,
@@ -186,11 +190,20 @@ class UserLoginView(TokenObtainPairView, APIResponseMixin):
         tags=['Authentication']
     )
     def post(self, request, *args, **kwargs):
+        # Limitation par email et par IP, sans accès à la base
+        limiter = RateLimiter('login')
+        identifier = str(request.data.get('email', '')).lower().strip()
+        ip_address = get_client_ip(request)
+        retry_after = limiter.retry_after(identifier=identifier, ip=ip_address)
+        if retry_after:
+            return throttled_response(retry_after)
+        
         serializer = UserLoginSerializer(data=request.data, context={'request': request})
         
         if serializer.is_valid():
+            limiter.reset(identifier=identifier)
             user = serializer.validated_data['user']
-            refresh = RefreshToken.for_user(user)
+            refresh = ClaimsRefreshToken.for_user(user)
             
             return self.success_response({
                 'user': UserProfileSerializer(user).data,
@@ -201,6 +214,7 @@ class UserLoginView(TokenObtainPairView, APIResponseMixin):
                 'message': 'Connexion réussie'
             })
         
+        limiter.hit(identifier=identifier, ip=ip_address)
         return self.error_response(
             "Identifiants invalides",
             errors=serializer.errors,
@@ -216,6 +230,12 @@ class PhoneVerificationView(APIView, APIResponseMixin):
         if request.user.is_phone_verified:
             return self.error_response("Numéro déjà vérifié")
         
+        limiter = RateLimiter('phone_verification')
+        limit_keys = {'identifier': request.user.pk, 'ip': get_client_ip(request)}
+        retry_after = limiter.retry_after(**limit_keys)
+        if retry_after:
+            return throttled_response(retry_after)
+        
         serializer = PhoneVerificationSerializer(data=request.data)
         if serializer.is_valid():
             code = serializer.validated_data['verification_code']
@@ -225,6 +245,8 @@ class PhoneVerificationView(APIView, APIResponseMixin):
                 user.phone_verification_expires_at and
                 timezone.now() <= user.phone_verification_expires_at):
                 
+                limiter.reset(identifier=user.pk)
+                
                 user.is_phone_verified = True
                 user.phone_verification_token = ''
                 user.phone_verification_expires_at = None
@@ -236,8 +258,10 @@ class PhoneVerificationView(APIView, APIResponseMixin):
                 
                 return self.success_response({'message': 'Numéro de téléphone vérifié avec succès'})
             
+            limiter.hit(**limit_keys)
             return self.error_response("Code de vérification invalide ou expiré")
         
+        limiter.hit(**limit_keys)
         return self.error_response("Code de vérification invalide", errors=serializer.errors)
 
 
@@ -295,25 +319,34 @@ class KYCDocumentUploadView(APIView, APIResponseMixin):
         if request.user.kyc_status == 'VERIFIED':
             return self.error_response("KYC déjà vérifié")
         
-        serializer = KYCDocumentSerializer(data=request.data)
+        # Refuser les fichiers trop volumineux avant d'analyser le corps
+        if not check_content_length(request, 'kyc'):
+            return self.error_response(
+                "Le fichier est trop volumineux",
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        
+        serializer = KYCDocumentSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             try:
                 with transaction.atomic():
                     file_obj = serializer.validated_data['file']
-                    file_content = file_obj.read()
-                    file_hash = hashlib.sha256(file_content).hexdigest()
-                    file_obj.seek(0)
+                    blob = store_upload(file_obj)
                     
                     document, created = KYCDocument.objects.update_or_create(
                         user=request.user,
                         document_type=serializer.validated_data['document_type'],
                         defaults={
-                            'file': file_obj,
-                            'file_size': file_obj.size,
-                            'file_hash': file_hash,
-                            'status': 'UPLOADED'
+                            'file': blob.file.name,
+                            'file_size': blob.size,
+                            'file_hash': blob.sha256,
+                            'status': 'UPLOADED',
+                            # Nouveau job : le résultat de l'ancien ne s'applique plus
+                            'smile_id_job_id': '',
+                            'submitted_at': None,
                         }
                     )
+                    release_upload(file_obj)
                     
                     process_kyc_document.delay(document.id)
                     
@@ -348,8 +381,13 @@ class KYCStatusView(APIView, APIResponseMixin):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
+        from .kyc_status import DOCUMENT_BITS, REQUIRED_DOCUMENTS, mask_to_types
+        
         user = request.user
-        documents = KYCDocument.objects.filter(user=user)
+        
+        # Statut réel de chaque document (UPLOADED, PROCESSING...) : une requête
+        # sur l'index (user, document_type) ; les totaux viennent de l'agrégat
+        documents = KYCDocument.objects.filter(user=user).order_by('document_type')
         
         response_data = {
             'kyc_status': user.kyc_status,
@@ -357,8 +395,12 @@ class KYCStatusView(APIView, APIResponseMixin):
             'kyc_verified_at': user.kyc_verified_at,
             'kyc_rejection_reason': user.kyc_rejection_reason,
             'documents': KYCDocumentSerializer(documents, many=True).data,
-            'required_documents': ['ID_FRONT', 'ID_BACK', 'SELFIE', 'PROOF_OF_ADDRESS'],
-            'uploaded_documents': list(documents.values_list('document_type', flat=True))
+            'required_documents': REQUIRED_DOCUMENTS,
+            'uploaded_documents': mask_to_types(user.kyc_uploaded_mask),
+            'missing_documents': [
+                document_type for document_type in REQUIRED_DOCUMENTS
+                if not user.kyc_uploaded_mask & DOCUMENT_BITS[document_type]
+            ],
         }
         
         return self.success_response(response_data)
@@ -374,28 +416,9 @@ class SmileIDWebhookView(APIView, APIResponseMixin):
             data = json.loads(request.body)
             result = smile_id_service.parse_webhook_result(data)
             
-            # Traiter le résultat
-            if result.get('job_id'):
-                try:
-                    document = KYCDocument.objects.get(smile_id_job_id=result['job_id'])
-                    
-                    if result.get('job_success'):
-                        document.status = 'VERIFIED'
-                        document.confidence_score = result.get('confidence', 0)
-                        document.verification_notes = "Vérifié avec succès par Smile ID"
-                    else:
-                        document.status = 'REJECTED'
-                        document.verification_notes = f"Rejeté par Smile ID: {result.get('code', 'Raison inconnue')}"
-                    
-                    document.smile_id_result = result
-                    document.save()
-                    
-                    # Vérifier le statut KYC global
-                    from .tasks import check_overall_kyc_status
-                    check_overall_kyc_status.delay(document.user.id)
-                    
-                except KYCDocument.DoesNotExist:
-                    logger.error(f"Document non trouvé pour job_id: {result.get('job_id')}")
+            # Traiter le résultat (idempotent : les renvois du webhook sont ignorés)
+            from .kyc_tracking import handle_webhook_result
+            handle_webhook_result(result)
             
             return Response({'status': 'success'}, status=200)
             
@@ -439,6 +462,34 @@ class AdminUserDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
 
 
+class AdminKYCQueueView(generics.ListAPIView):
+    """File de révision KYC paginée (admin uniquement)"""
+    serializer_class = AdminKYCReviewSerializer
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    
+    def get_queryset(self):
+        queryset = review_queue()
+        if self.request.query_params.get('available') in ('1', 'true'):
+            queryset = queryset.filter(available_filter(self.request.user))
+        return with_documents(queryset)
+
+
+class AdminKYCClaimView(APIView, APIResponseMixin):
+    """Réserver les prochains dossiers KYC de la file (admin uniquement)"""
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    
+    def post(self, request):
+        try:
+            count = min(max(int(request.data.get('count', 1)), 1), 50)
+        except (TypeError, ValueError):
+            return self.error_response("Nombre de dossiers invalide")
+        
+        users = claim_next(request.user, count)
+        return self.success_response({
+            'claimed': AdminKYCReviewSerializer(users, many=True).data,
+        })
+
+
 class AdminKYCApprovalView(APIView, APIResponseMixin):
     """Endpoint d'approbation/rejet KYC (admin uniquement)"""
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
@@ -449,6 +500,12 @@ class AdminKYCApprovalView(APIView, APIResponseMixin):
         except CustomUser.DoesNotExist:
             return self.error_response("Utilisateur non trouvé", status_code=404)
         
+        if is_claimed_by_other(user, request.user):
+            return self.error_response(
+                "Ce dossier est en cours de révision par un autre administrateur",
+                status_code=status.HTTP_409_CONFLICT
+            )
+        
         action = request.data.get('action')
         reason = request.data.get('reason', '')
         
@@ -466,7 +523,13 @@ class AdminKYCApprovalView(APIView, APIResponseMixin):
         else:
             return self.error_response("Action invalide. Utilisez 'approve' ou 'reject'")
         
-        user.save(update_fields=['kyc_status', 'kyc_verified_at', 'kyc_rejection_reason'])
+        # Le dossier sort de la file : libérer la réservation
+        user.kyc_review_claimed_by = None
+        user.kyc_review_lease_expires_at = None
+        user.save(update_fields=[
+            'kyc_status', 'kyc_verified_at', 'kyc_rejection_reason',
+            'kyc_review_claimed_by', 'kyc_review_lease_expires_at'
+        ])
         
         if user.email:
             send_notification_email(
@@ -495,7 +558,9 @@ def user_statistics(request):
         'total_users': CustomUser.objects.count(),
         'new_users_this_month': CustomUser.objects.filter(created_at__gte=last_month).count(),
         'verified_users': CustomUser.objects.filter(kyc_status='VERIFIED').count(),
-        'active_users': CustomUser.objects.filter(last_activity__gte=last_month).count(),
+        # Utilisateurs actifs : lus dans les bitmaps d'activité, sans requête SQL
+        'active_users': count_active_users(days=30),
+        'active_users_today': count_active_users(days=1),
         'users_by_role': dict(CustomUser.objects.values('role').annotate(count=Count('role')).values_list('role', 'count')),
         'users_by_kyc_status': dict(CustomUser.objects.values('kyc_status').annotate(count=Count('kyc_status')).values_list('kyc_status', 'count')),
         'failed_login_attempts_today': LoginAttempt.objects.filter(attempted_at__date=now.date(), success=False).count(),
@@ -554,6 +619,17 @@ class PasswordResetRequestView(APIView, APIResponseMixin):
         tags=['Authentication']
     )
     def post(self, request):
+        # Chaque demande compte : limite l'envoi d'emails et l'énumération des comptes
+        limiter = RateLimiter('password_reset')
+        limit_keys = {
+            'identifier': str(request.data.get('email', '')).lower().strip(),
+            'ip': get_client_ip(request),
+        }
+        retry_after = limiter.retry_after(**limit_keys)
+        if retry_after:
+            return throttled_response(retry_after)
+        limiter.hit(**limit_keys)
+        
         serializer = PasswordResetRequestSerializer(data=request.data)
         if serializer.is_valid():
             try:
@@ -649,6 +725,15 @@ class PasswordResetConfirmView(APIView, APIResponseMixin):
         tags=['Authentication']
     )
     def post(self, request):
+        limiter = RateLimiter('password_reset_confirm')
+        limit_keys = {
+            'identifier': str(request.data.get('email', '')).lower().strip(),
+            'ip': get_client_ip(request),
+        }
+        retry_after = limiter.retry_after(**limit_keys)
+        if retry_after:
+            return throttled_response(retry_after)
+        
         serializer = PasswordResetConfirmSerializer(data=request.data)
         if serializer.is_valid():
             try:
@@ -660,8 +745,11 @@ class PasswordResetConfirmView(APIView, APIResponseMixin):
                 
                 # Vérifier le code de réinitialisation
                 if not user.verify_password_reset_token(reset_code):
+                    limiter.hit(**limit_keys)
                     return self.error_response("Code de réinitialisation invalide ou expiré", status_code=400)
                 
+                limiter.reset(identifier=limit_keys['identifier'])
+                
                 # Mettre à jour le mot de passe
                 user.set_password(new_password)
                 user.password_reset_token = None
@@ -698,4 +786,5 @@ class PasswordResetConfirmView(APIView, APIResponseMixin):
                 logger.error(f"Erreur confirmation réinitialisation: {e}")
                 return self.error_response("Erreur lors de la mise à jour du mot de passe", status_code=500)
         
+        limiter.hit(**limit_keys)
         return self.error_response("Données invalides", errors=serializer.errors, status_code=400)
\ No newline at end of file